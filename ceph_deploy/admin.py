@@ -3,6 +3,7 @@ from ceph_deploy import exc
 from ceph_deploy import conf
 from ceph_deploy.cliutil import priority
 from ceph_deploy import hosts
+from ceph_deploy.util import parallel, push
 
 LOG = logging.getLogger(__name__)
 
@@ -17,29 +18,32 @@ def admin(args):
         raise RuntimeError('%s.client.admin.keyring not found' %
                            args.cluster)
 
-    errors = 0
-    for hostname in args.client:
+    summary = push.Summary()
+
+    def push_admin(hostname):
         LOG.debug('Pushing admin keys and conf to %s', hostname)
-        try:
-            distro = hosts.get(hostname, username=args.username)
-
-            distro.conn.remote_module.write_conf(
-                args.cluster,
-                conf_data,
-                args.overwrite_conf,
-            )
-
-            distro.conn.remote_module.write_file(
-                '/etc/ceph/%s.client.admin.keyring' % args.cluster,
-                keyring,
-                0o600,
-            )
-
-            distro.conn.exit()
-
-        except RuntimeError as e:
-            LOG.error(e)
-            errors += 1
+        distro = hosts.get(hostname, username=args.username)
+
+        push.push(
+            distro.conn,
+            hostname,
+            args.cluster,
+            conf_data,
+            args.overwrite_conf,
+            keyring=keyring,
+            summary=summary,
+        )
+
+        distro.conn.exit()
+
+    outcomes = parallel.run(
+        push_admin,
+        args.client,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+    summary.log(LOG)
 
     if errors:
         raise exc.GenericError('Failed to configure %d admin hosts' % errors)
@@ -0,0 +1,139 @@
+import logging
+import socket
+
+from ceph_deploy import conf, exc
+from ceph_deploy.cliutil import priority
+from ceph_deploy.util import net, pkg_cache
+
+LOG = logging.getLogger(__name__)
+
+
+def default_bind(args):
+    """
+    The address of this host on the public network of the cluster, when the
+    ceph.conf in the working directory names one, or localhost.
+    """
+    try:
+        cfg = conf.ceph.load(args)
+    except exc.ConfigError:
+        return '127.0.0.1'
+    network = cfg.safe_get('global', 'public_network')
+    if not network:
+        return '127.0.0.1'
+    network = network.split(',')[0].strip()
+    try:
+        ip = net.get_nonlocal_ip(socket.gethostname(), network)
+        if net.ip_in_subnet(ip, network):
+            return ip
+    except (exc.UnableToResolveError, ValueError):
+        pass
+    return '127.0.0.1'
+
+
+def cache_serve(args):
+    upstreams = (
+        list(pkg_cache.default_upstreams) +
+        (args.upstream or []) +
+        pkg_cache.upstream_hosts(args.repo_url or [])
+    )
+    cache = pkg_cache.PackageCache(
+        args.cache_dir,
+        metadata_ttl=args.metadata_ttl,
+        upstreams=upstreams,
+        max_size=args.max_size * 1024 * 1024,
+    )
+    bind = args.bind or default_bind(args)
+    try:
+        server = pkg_cache.make_server(cache, bind, args.port)
+    except (OSError, IOError) as error:
+        raise exc.GenericError(
+            'Failed to listen on %s:%s: %s' % (bind, args.port, error)
+        )
+    LOG.info('caching packages in %s', cache.directory)
+    LOG.info('fetching from %s', ', '.join(cache.upstreams))
+    LOG.info(
+        'serving on http://%s:%s, install with --cache-url pointing here',
+        bind,
+        server.server_address[1],
+    )
+    if bind.startswith('127.'):
+        LOG.warning('other hosts cannot reach the cache on %s, see --bind', bind)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        LOG.info(
+            'served %d cached and %d fetched files, %d bytes from upstream',
+            cache.stats['hits'],
+            cache.stats['misses'],
+            cache.stats['bytes_fetched'],
+        )
+
+
+def cache(args):
+    if args.subcommand == 'serve':
+        cache_serve(args)
+    else:
+        LOG.error('subcommand %s not implemented', args.subcommand)
+
+
+@priority(90)
+def make(parser):
+    """
+    Serve a local cache of Ceph repositories and packages
+    """
+    cache_parser = parser.add_subparsers(dest='subcommand')
+    cache_parser.required = True
+
+    cache_serve = cache_parser.add_parser(
+        'serve',
+        help='cache packages from upstream and serve them over HTTP',
+        )
+    cache_serve.add_argument(
+        '--bind',
+        metavar='ADDRESS',
+        help='address to listen on (default: this host on the public network of the cluster, or 127.0.0.1)',
+        )
+    cache_serve.add_argument(
+        '--port',
+        type=int,
+        default=pkg_cache.default_port,
+        help='port to listen on (default: %(default)s)',
+        )
+    cache_serve.add_argument(
+        '--cache-dir',
+        metavar='PATH',
+        default=pkg_cache.default_path,
+        help='where to keep cached files (default: %(default)s)',
+        )
+    cache_serve.add_argument(
+        '--metadata-ttl',
+        metavar='SECONDS',
+        type=int,
+        default=300,
+        help='fetch repository metadata again after this many seconds (default: %(default)s)',
+        )
+    cache_serve.add_argument(
+        '--max-size',
+        metavar='MB',
+        type=int,
+        default=pkg_cache.default_max_size // (1024 * 1024),
+        help='largest file to fetch and keep, in megabytes (default: %(default)s)',
+        )
+    cache_serve.add_argument(
+        '--upstream',
+        metavar='HOST',
+        action='append',
+        help='also fetch from HOST (*.example.com for a whole domain), can be repeated',
+        )
+    cache_serve.add_argument(
+        '--repo-url',
+        metavar='URL',
+        action='append',
+        help='also fetch from the host of a repository given to install --repo-url, can be repeated',
+        )
+    parser.set_defaults(
+        func=cache,
+        )
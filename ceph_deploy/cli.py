@@ -1,4 +1,3 @@
-import pkg_resources
 import argparse
 import logging
 import textwrap
@@ -6,8 +5,9 @@ import os
 import sys
 
 import ceph_deploy
+import ceph_deploy.conf
 from ceph_deploy import exc
-from ceph_deploy.util import log
+from ceph_deploy.util import journal, log, trace
 from ceph_deploy.util.decorators import catches
 
 LOG = logging.getLogger(__name__)
@@ -36,15 +36,58 @@ def log_flags(args, logger=None):
         logger.info(' %-30s: %s' % (k, v))
 
 
-def get_parser():
-    epilog_text = "See 'ceph-deploy <command> --help' for help on a specific command"
-    parser = argparse.ArgumentParser(
+def command_entry_points():
+    """
+    Return ``(name, entry_point)`` pairs for every subcommand registered in
+    the ``ceph_deploy.cli`` group, without importing any of them.
+    """
+    try:
+        from importlib import metadata
+    except ImportError:
+        # importing pkg_resources is slow, only fall back to it when needed
+        import pkg_resources
+        entry_points = pkg_resources.iter_entry_points('ceph_deploy.cli')
+    else:
+        try:
+            entry_points = metadata.entry_points(group='ceph_deploy.cli')
+        except TypeError:
+            # Python < 3.10
+            entry_points = metadata.entry_points().get('ceph_deploy.cli', [])
+
+    commands = []
+    seen = set()
+    for ep in entry_points:
+        # the same distribution can be found more than once on sys.path
+        if ep.name not in seen:
+            seen.add(ep.name)
+            commands.append((ep.name, ep))
+    return commands
+
+
+def selected_command(global_parser, argv, names):
+    """
+    Find the subcommand ``argv`` selects, or ``None`` if there is none or if
+    help for ``ceph-deploy`` itself was requested.
+    """
+    _, remaining = global_parser.parse_known_args(argv)
+    for arg in remaining:
+        if arg in ('-h', '--help'):
+            return None
+        if not arg.startswith('-'):
+            return arg if arg in names else None
+    return None
+
+
+def get_global_parser():
+    """
+    The flags that apply to every subcommand, without any of the
+    subcommands.
+    """
+    global_parser = argparse.ArgumentParser(
         prog='ceph-deploy',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        description='Easy Ceph deployment\n\n%s' % __header__,
-        epilog=epilog_text
+        add_help=False,
         )
-    verbosity = parser.add_mutually_exclusive_group(required=False)
+    verbosity = global_parser.add_mutually_exclusive_group(required=False)
     verbosity.add_argument(
         '-v', '--verbose',
         action='store_true', dest='verbose', default=False,
@@ -55,39 +98,116 @@ def get_parser():
         action='store_true', dest='quiet',
         help='be less verbose',
         )
-    parser.add_argument(
+    global_parser.add_argument(
         '--version',
         action='version',
         version='%s' % ceph_deploy.__version__,
         help='the current installed version of ceph-deploy',
         )
-    parser.add_argument(
+    global_parser.add_argument(
         '--username',
         help='the username to connect to the remote host',
         )
-    parser.add_argument(
+    global_parser.add_argument(
         '--overwrite-conf',
         action='store_true',
         help='overwrite an existing conf file on remote host (if present)',
         )
-    parser.add_argument(
+    global_parser.add_argument(
         '--ceph-conf',
         dest='ceph_conf',
         help='use (or reuse) a given ceph.conf file',
     )
+    global_parser.add_argument(
+        '--parallel', '--max-concurrency',
+        dest='parallel',
+        metavar='N',
+        type=int,
+        default=1,
+        help='operate on up to N hosts at the same time for commands that accept many hosts (default: %(default)s)',
+    )
+    global_parser.add_argument(
+        '--facts-ttl',
+        dest='facts_ttl',
+        metavar='SECONDS',
+        type=int,
+        default=3600,
+        help='reuse detected host platform facts for this long, 0 disables the cache (default: %(default)s)',
+    )
+    global_parser.add_argument(
+        '--trace',
+        dest='trace',
+        metavar='FILE',
+        help='write timing spans for every host, remote command and package operation to FILE as a Chrome trace',
+    )
+    global_parser.add_argument(
+        '--relays-per-rack',
+        dest='relays_per_rack',
+        metavar='K',
+        type=int,
+        default=0,
+        help='reach hosts through K relay hosts per rack (the /24 network of a host unless --relay-inventory says otherwise), instead of connecting to every host from here',
+    )
+    global_parser.add_argument(
+        '--relay-inventory',
+        dest='relay_inventory',
+        metavar='FILE',
+        help='INI file with a section per rack listing its "hosts" and the "relays" to reach them through',
+    )
+    global_parser.add_argument(
+        '--resume',
+        action='store_true',
+        help=('skip the hosts that an earlier run of the same command (and '
+              'options) completed, according to ceph-deploy-{cluster}.journal'),
+    )
+    global_parser.add_argument(
+        '--refresh-facts',
+        action='store_true',
+        dest='refresh_facts',
+        help='ignore cached host platform facts and detect them again',
+    )
+    return global_parser
+
+
+def get_parser(argv=None):
+    """
+    Build the parser with every subcommand. When ``argv`` is given, only the
+    module of the subcommand it selects gets imported and configured, the
+    rest get empty placeholders, which keeps startup fast.
+    """
+    epilog_text = "See 'ceph-deploy <command> --help' for help on a specific command"
+    global_parser = get_global_parser()
+    parser = argparse.ArgumentParser(
+        prog='ceph-deploy',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Easy Ceph deployment\n\n%s' % __header__,
+        epilog=epilog_text,
+        parents=[global_parser],
+        )
     sub = parser.add_subparsers(
         title='commands',
         metavar='COMMAND',
         help='description',
         )
     sub.required = True
-    entry_points = [
-        (ep.name, ep.load())
-        for ep in pkg_resources.iter_entry_points('ceph_deploy.cli')
-        ]
+    commands = command_entry_points()
+    selected = None
+    if argv is not None:
+        selected = selected_command(
+            global_parser,
+            argv,
+            [name for (name, _) in commands],
+        )
+    entry_points = []
+    for (name, ep) in commands:
+        if selected is None or name == selected:
+            entry_points.append((name, ep.load()))
+        else:
+            sub.add_parser(name)
     entry_points.sort(
         key=lambda name_fn: getattr(name_fn[1], 'priority', 100),
         )
+    cd_conf = ceph_deploy.conf.cephdeploy.LazyConf()
     for (name, fn) in entry_points:
         p = sub.add_parser(
             name,
@@ -95,7 +215,7 @@ def get_parser():
             help=fn.__doc__,
             )
         if not os.environ.get('CEPH_DEPLOY_TEST'):
-            p.set_defaults(cd_conf=ceph_deploy.conf.cephdeploy.load())
+            p.set_defaults(cd_conf=cd_conf)
 
         # flag if the default release is being used
         p.set_defaults(default_release=False)
@@ -127,7 +247,7 @@ def _main(args=None, namespace=None):
     root_logger.setLevel(logging.DEBUG)
     root_logger.addHandler(sh)
 
-    parser = get_parser()
+    parser = get_parser(sys.argv[1:] if args is None else args)
     if len(sys.argv) < 2:
         parser.print_help()
         sys.exit()
@@ -163,7 +283,33 @@ def _main(args=None, namespace=None):
     )
     log_flags(args)
 
-    return args.func(args)
+    if args.relays_per_rack or args.relay_inventory:
+        from ceph_deploy import connection
+        connection.configure_relays(
+            per_rack=args.relays_per_rack,
+            inventory=args.relay_inventory,
+        )
+
+    from ceph_deploy.hosts import facts
+    if not os.environ.get('CEPH_DEPLOY_TEST'):
+        facts.configure(ttl=args.facts_ttl, refresh=args.refresh_facts)
+
+    journal.configure(
+        journal.default_path(args.cluster),
+        command=args.func.__name__,
+        resume=args.resume,
+    )
+
+    if args.trace:
+        trace.configure(args.trace, command=args.func.__name__)
+    try:
+        with trace.span(args.func.__name__, 'command', command=' '.join(sys.argv)):
+            return args.func(args)
+    finally:
+        trace.write()
+        # the fact cache and the journal belong to this run only
+        facts.configure()
+        journal.configure(None)
 
 
 def main(args=None, namespace=None):
@@ -1,3 +1,6 @@
+import argparse
+
+
 def priority(num):
     """
     Decorator to add a `priority` attribute to the function.
@@ -6,3 +9,18 @@ def priority(num):
         fn.priority = num
         return fn
     return add_priority
+
+
+def subcommand_args(make, argv, args):
+    """
+    Parse ``argv`` with the parser that ``make`` sets up for a subcommand, as
+    if it had been given on the command line together with the global
+    options (cluster, username...) already in ``args``.
+    """
+    parser = argparse.ArgumentParser()
+    make(parser)
+    namespace = parser.parse_args(argv)
+    for key, value in vars(args).items():
+        if not hasattr(namespace, key):
+            setattr(namespace, key, value)
+    return namespace
@@ -69,6 +69,35 @@ def load():
     return parser
 
 
+_loaded = None
+
+
+def get_conf():
+    """
+    Return the ceph-deploy configuration for this process. The file is only
+    located (and possibly created) and parsed the first time this is called,
+    every later call gets the same object.
+    """
+    global _loaded
+    if _loaded is None:
+        _loaded = load()
+    return _loaded
+
+
+class LazyConf(object):
+    """
+    A stand-in for the object returned by :func:`get_conf` that does not read
+    the configuration file until something is looked up on it, so that
+    building the CLI parser never touches the file.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_conf(), name)
+
+    def __repr__(self):
+        return repr(get_conf())
+
+
 def _locate_or_create():
     home_config = path.expanduser('~/.cephdeploy.conf')
     # With order of importance
@@ -103,7 +132,7 @@ def set_overrides(args, _conf=None):
     # subcommands that are not going to be used
     subcommand = args.func.__name__
     command_section = 'ceph-deploy-%s' % subcommand
-    conf = _conf or load()
+    conf = _conf or get_conf()
 
     for section_name in conf.sections():
         if section_name in ['ceph-deploy-global', command_section]:
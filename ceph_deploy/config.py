@@ -5,30 +5,38 @@ from ceph_deploy import exc
 from ceph_deploy import conf
 from ceph_deploy.cliutil import priority
 from ceph_deploy import hosts
+from ceph_deploy.util import parallel, push
 
 LOG = logging.getLogger(__name__)
 
 
 def config_push(args):
     conf_data = conf.ceph.load_raw(args)
+    summary = push.Summary()
 
-    errors = 0
-    for hostname in args.client:
+    def push_conf(hostname):
         LOG.debug('Pushing config to %s', hostname)
-        try:
-            distro = hosts.get(hostname, username=args.username)
-
-            distro.conn.remote_module.write_conf(
-                args.cluster,
-                conf_data,
-                args.overwrite_conf,
-            )
+        distro = hosts.get(hostname, username=args.username)
+
+        push.push(
+            distro.conn,
+            hostname,
+            args.cluster,
+            conf_data,
+            args.overwrite_conf,
+            summary=summary,
+        )
 
-            distro.conn.exit()
+        distro.conn.exit()
 
-        except RuntimeError as e:
-            LOG.error(e)
-            errors += 1
+    outcomes = parallel.run(
+        push_conf,
+        args.client,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+    summary.log(LOG)
 
     if errors:
         raise exc.GenericError('Failed to config %d hosts' % errors)
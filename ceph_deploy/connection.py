@@ -1,32 +1,403 @@
+import atexit
+import logging
 import socket
+import threading
+import time
 from ceph_deploy.lib import remoto
+from ceph_deploy.util import trace
+
+
+LOG = logging.getLogger(__name__)
+
+
+class PooledConnection(object):
+    """
+    A checked-out view of a remoto connection kept in a :class:`ConnectionPool`.
+
+    Everything is delegated to the underlying connection except for
+    ``remote_module`` (every checkout imports its own so that concurrent users
+    of the same host each get their own channel) and ``exit()``, which gives
+    the connection back to the pool instead of tearing down the gateway.
+    Attributes set on this object, like ``global_timeout``, only affect this
+    checkout.
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._released = False
+        self.remote_module = None
+
+    def __getattr__(self, name):
+        return getattr(self._entry.conn, name)
+
+    def import_module(self, module, *a, **kw):
+        # remoto stores the imported module on the connection itself, so
+        # serialize imports and keep our own reference to the result
+        with self._entry.lock:
+            remote_module = self._entry.conn.import_module(module, *a, **kw)
+        self.remote_module = trace.wrap(
+            remote_module,
+            'remote_module',
+            host=self._entry.key[0],
+            prefix='remote_module',
+        )
+        return self.remote_module
+
+    def exit(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.exit()
+        return False
+
+
+class _Entry(object):
+
+    def __init__(self, key):
+        self.key = key
+        self.conn = None
+        self.refs = 0
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+
+    def is_healthy(self):
+        try:
+            return self.conn.has_connection()
+        except Exception:
+            return False
+
+    def close(self):
+        if self.conn is None:
+            return
+        try:
+            self.conn.exit()
+        except Exception:
+            pass
+        self.conn = None
+
+
+class ConnectionPool(object):
+    """
+    Keep one remoto connection per host alive for the whole process, so that
+    every stage of a compound command (e.g. ``mon add`` pushing admin keys
+    and then deploying the monitor) reuses the same SSH session and remote
+    Python interpreter instead of paying for new ones.
+
+    Connections are reference counted: ``exit()`` on a checkout only
+    decrements the count, and connections that have not been used for
+    ``idle_timeout`` seconds are closed the next time the pool is used. A
+    connection whose gateway went away fails its health check and is
+    replaced transparently.
+    """
+
+    def __init__(self, idle_timeout=300):
+        self.idle_timeout = idle_timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, factory):
+        """
+        Return a :class:`PooledConnection` for ``key``, calling ``factory()``
+        to create the underlying connection when there is no healthy one.
+        """
+        with self._lock:
+            idle = self._evict_idle()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(key)
+                self._entries[key] = entry
+            entry.refs += 1
+            entry.last_used = time.time()
+        self._close(idle)
+
+        # connecting happens outside of the pool lock so that different hosts
+        # connect concurrently, while the same host never gets two gateways
+        with entry.lock:
+            if entry.conn is not None and not entry.is_healthy():
+                LOG.debug('pooled connection to %s is no longer usable', key[0])
+                entry.close()
+            if entry.conn is None:
+                try:
+                    entry.conn = factory()
+                except BaseException:
+                    self.release(entry)
+                    raise
+            else:
+                entry.conn.logger.debug('reusing connection to host: %s' % key[0])
+        return PooledConnection(self, entry)
+
+    def release(self, entry):
+        with self._lock:
+            entry.refs = max(entry.refs - 1, 0)
+            entry.last_used = time.time()
+            if entry.refs == 0 and entry.conn is None:
+                # the connection could not be made, do not keep it around
+                self._entries.pop(entry.key, None)
+            idle = self._evict_idle()
+        self._close(idle)
+
+    def _evict_idle(self):
+        """
+        Take the connections that have been idle for too long out of the
+        pool, for the caller to close once it no longer holds the lock.
+        """
+        now = time.time()
+        idle = []
+        for entry in list(self._entries.values()):
+            if entry.refs == 0 and now - entry.last_used > self.idle_timeout:
+                idle.append(self._entries.pop(entry.key))
+        return idle
+
+    def _close(self, entries):
+        # closing a relayed connection gives its relay back with release(),
+        # which takes the pool lock again
+        for entry in entries:
+            entry.close()
+
+    def close(self):
+        """
+        Terminate every pooled connection, regardless of references.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        self._close(entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+pool = ConnectionPool()
+atexit.register(pool.close)
+
+
+class RelayedConnection(remoto.Connection):
+    """
+    A remoto connection to ``hostname`` that is not made from this machine
+    but from ``relay`` (an already open connection): the relay host runs the
+    SSH session and proxies the execnet gateway to its peer.
+
+    The relay is kept checked out of the pool for as long as this connection
+    lives, and its execnet group is shared so that tearing this connection
+    down never takes the relay with it.
+    """
+
+    def __init__(self, hostname, relay, **kw):
+        self.relay = relay
+        super(RelayedConnection, self).__init__(hostname, **kw)
+
+    def _via(self, spec):
+        return '%s//via=%s' % (spec, self.relay.gateway.id)
+
+    def _make_gateway(self, hostname):
+        self.group = self.relay.group
+        gateway = self.group.makegateway(
+            self._via(self._make_connection_string(hostname))
+        )
+        gateway.reconfigure(py2str_as_py3str=False, py3str_as_py2str=False)
+        return gateway
+
+    def _detect_sudo(self, _execnet=None):
+        gateway = self.relay.group.makegateway(
+            self._via(self._make_connection_string(self.hostname, use_sudo=False))
+        )
+        channel = gateway.remote_exec(
+            'import getpass; channel.send(getpass.getuser())'
+        )
+        result = channel.receive()
+        gateway.exit()
+        if result == 'root':
+            return False
+        self.logger.debug('connection detected need for sudo')
+        return True
+
+    def exit(self):
+        try:
+            self.gateway.exit()
+        finally:
+            self.relay.exit()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.exit()
+        return False
+
+
+class RelayPlan(object):
+    """
+    Decide which hosts are reached through a relay (a first-tier host that
+    runs the execnet gateway to its peers) instead of directly, so that the
+    SSH sessions and traffic leaving this machine grow with the number of
+    relays rather than the number of hosts.
+
+    Hosts are grouped in racks, taken from an ``inventory`` file when there
+    is one and otherwise approximated by the /24 network of their address.
+    The first ``per_rack`` hosts connected to in a rack become its relays
+    (unless the inventory names them) and every other host of the rack is
+    assigned one of them, in turn. Relays themselves are always reached
+    directly.
+
+    The inventory is an INI file with a section per rack::
+
+        [rack1]
+        relays = node1
+        hosts = node1 node2 node3
+    """
+
+    def __init__(self, per_rack=0, inventory=None):
+        self.per_rack = per_rack or 0
+        self.racks = {}
+        self.relays = {}
+        self.fixed = set()
+        self.assigned = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        if inventory:
+            self.load(inventory)
+
+    @property
+    def enabled(self):
+        return bool(self.per_rack or self.fixed)
+
+    def load(self, path):
+        try:
+            import configparser
+        except ImportError:
+            import ConfigParser as configparser
+        parser = configparser.RawConfigParser()
+        if not parser.read(path):
+            raise RuntimeError('unable to read relay inventory: %s' % path)
+        for rack in parser.sections():
+            for option in ('hosts', 'relays'):
+                if not parser.has_option(rack, option):
+                    continue
+                for host in parser.get(rack, option).replace(',', ' ').split():
+                    self.racks[host] = rack
+                    if option == 'relays':
+                        self.relays.setdefault(rack, [])
+                        if host not in self.relays[rack]:
+                            self.relays[rack].append(host)
+                        self.fixed.add(rack)
+
+    def rack(self, hostname):
+        if hostname in self.racks:
+            return self.racks[hostname]
+        try:
+            address = socket.getaddrinfo(hostname, None, socket.AF_INET)[0][4][0]
+        except (socket.error, IndexError):
+            return None
+        return address.rsplit('.', 1)[0] + '.0/24'
+
+    def relay_for(self, hostname):
+        """
+        The host to reach ``hostname`` through, or ``None`` to connect to it
+        directly.
+        """
+        if not self.enabled or not remoto.connection.needs_ssh(hostname):
+            return None
+        with self.lock:
+            if hostname in self.assigned:
+                return self.assigned[hostname]
+            rack = self.rack(hostname)
+            if rack is None:
+                return None
+            relays = self.relays.setdefault(rack, [])
+            if hostname in relays:
+                return None
+            if rack not in self.fixed and len(relays) < self.per_rack:
+                relays.append(hostname)
+                return None
+            if not relays:
+                return None
+            count = self.counters.get(rack, 0)
+            self.counters[rack] = count + 1
+            relay = relays[count % len(relays)]
+            self.assigned[hostname] = relay
+            LOG.debug('reaching %s through relay %s', hostname, relay)
+            return relay
+
+
+relays = RelayPlan()
+
+
+def configure_relays(per_rack=0, inventory=None):
+    """
+    Reach hosts through up to ``per_rack`` relays per rack (and/or the
+    relays named in ``inventory``) for the rest of the process.
+    """
+    global relays
+    relays = RelayPlan(per_rack=per_rack, inventory=inventory)
+    return relays
 
 
 def get_connection(hostname, username, logger, threads=5, use_sudo=None, detect_sudo=True):
     """
     A very simple helper, meant to return a connection
     that will know about the need to use sudo.
+
+    Connections come from the process-wide :data:`pool`, calling ``exit()`` on
+    them makes them available for reuse. When :data:`relays` are configured,
+    the connection may be made through another host.
     """
+    relay = relays.relay_for(hostname)
     if username:
         hostname = "%s@%s" % (username, hostname)
-    try:
-        conn = remoto.Connection(
-            hostname,
-            logger=logger,
-            threads=threads,
-            detect_sudo=detect_sudo,
-        )
 
-        # Set a timeout value in seconds to disconnect and move on
-        # if no data is sent back.
-        conn.global_timeout = 300
-        logger.debug("connected to host: %s " % hostname)
-        return conn
+    if relay is not None:
+        def connect():
+            via = get_connection(
+                relay,
+                username,
+                logger=logging.getLogger(relay),
+                threads=threads,
+                use_sudo=use_sudo,
+                detect_sudo=detect_sudo,
+            )
+            try:
+                conn = RelayedConnection(
+                    hostname,
+                    via,
+                    logger=logger,
+                    threads=threads,
+                    detect_sudo=detect_sudo,
+                )
+                conn.global_timeout = 300
+                logger.debug("connected to host: %s through %s" % (hostname, relay))
+                return conn
+            except Exception as error:
+                via.exit()
+                msg = "connecting to host: %s through %s " % (hostname, relay)
+                errors = "resulted in errors: %s %s" % (error.__class__.__name__, error)
+                raise RuntimeError(msg + errors)
+
+        return pool.acquire((hostname, detect_sudo), connect)
+
+    def connect():
+        try:
+            conn = remoto.Connection(
+                hostname,
+                logger=logger,
+                threads=threads,
+                detect_sudo=detect_sudo,
+            )
+
+            # Set a timeout value in seconds to disconnect and move on
+            # if no data is sent back.
+            conn.global_timeout = 300
+            logger.debug("connected to host: %s " % hostname)
+            return conn
+
+        except Exception as error:
+            msg = "connecting to host: %s " % hostname
+            errors = "resulted in errors: %s %s" % (error.__class__.__name__, error)
+            raise RuntimeError(msg + errors)
 
-    except Exception as error:
-        msg = "connecting to host: %s " % hostname
-        errors = "resulted in errors: %s %s" % (error.__class__.__name__, error)
-        raise RuntimeError(msg + errors)
+    return pool.acquire((hostname, detect_sudo), connect)
 
 
 def get_local_connection(logger, use_sudo=False):
@@ -4,12 +4,18 @@ import logging
 import json
 import tempfile
 import shutil
+import threading
 import time
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 from ceph_deploy import hosts
 from ceph_deploy.cliutil import priority
 from ceph_deploy.lib import remoto
-from ceph_deploy.util import as_string
+from ceph_deploy.util import as_string, parallel
 import ceph_deploy.util.paths.mon
 
 LOG = logging.getLogger(__name__)
@@ -148,9 +154,40 @@ def gatherkeys_missing(args, distro, rlogger, keypath, keytype, dest_dir):
     return True
 
 
-def gatherkeys_with_mon(args, host, dest_dir):
+def gatherkeys_batch(args, distro, rlogger, keypath, keytypes, dest_dir):
+    """
+    Get or create the keyrings of all ``keytypes`` in one go from the mon
+    using the mon keyring, and copy them to dest_dir. Returns the keytypes
+    that could not be gathered this way.
+    """
+    entities = dict(
+        (keytype_identity(keytype), keytype_capabilities(keytype))
+        for keytype in keytypes
+    )
+    keyrings = distro.conn.remote_module.auth_keyrings(
+        args.cluster,
+        keypath,
+        entities,
+    )
+    missing = []
+    for keytype in keytypes:
+        keyring = keyrings.get(keytype_identity(keytype))
+        if keyring is None:
+            missing.append(keytype)
+            continue
+        keyring_path_local = os.path.join(dest_dir, keytype_path_to(args, keytype))
+        with open(keyring_path_local, 'w') as f:
+            f.write(as_string(keyring))
+    return missing
+
+
+def gatherkeys_with_mon(args, host, dest_dir, claim=None):
     """
     Connect to mon and gather keys if mon is in quorum.
+
+    When several mons are tried at once, ``claim(host)`` is called once this
+    mon is known to be in quorum; if it returns ``False`` another mon got
+    there first and nothing is gathered from this one.
     """
     distro = hosts.get(host, username=args.username)
     remote_hostname = distro.conn.remote_module.shortname()
@@ -160,10 +197,6 @@ def gatherkeys_with_mon(args, host, dest_dir):
     if mon_key is None:
         LOG.warning("No mon key found in host: %s", host)
         return False
-    mon_name_local = keytype_path_to(args, "mon")
-    mon_path_local = os.path.join(dest_dir, mon_name_local)
-    with open(mon_path_local, 'w') as f:
-        f.write(as_string(mon_key))
     rlogger = logging.getLogger(host)
     path_asok = ceph_deploy.util.paths.mon.asok(args.cluster, remote_hostname)
     out, err, code = remoto.process.check(
@@ -213,14 +246,97 @@ def gatherkeys_with_mon(args, host, dest_dir):
     if not mon_number in mon_quorum:
         rlogger.error("Not yet quorum for '%s'", host)
         return False
-    for keytype in ["admin", "mds", "mgr", "osd", "rgw"]:
-        if not gatherkeys_missing(args, distro, rlogger, path_keytype_mon, keytype, dest_dir):
+    if claim is not None and not claim(host):
+        rlogger.debug("keys are being gathered from another mon already")
+        return False
+    mon_name_local = keytype_path_to(args, "mon")
+    mon_path_local = os.path.join(dest_dir, mon_name_local)
+    with open(mon_path_local, 'w') as f:
+        f.write(as_string(mon_key))
+
+    keytypes = gatherkeys_batch(
+        args, distro, rlogger, path_keytype_mon,
+        ["admin", "mds", "mgr", "osd", "rgw"], dest_dir
+    )
+    # whatever could not be gathered at once is retried key by key, which
+    # also reports why it failed
+    outcomes = parallel.run(
+        lambda keytype: gatherkeys_missing(
+            args, distro, rlogger, path_keytype_mon, keytype, dest_dir
+        ),
+        keytypes,
+        workers=len(keytypes) or 1,
+        logger=rlogger,
+    )
+    for outcome in outcomes:
+        if outcome.failed or not outcome.value:
             # We will return failure if we fail to gather any key
-            rlogger.error("Failed to return '%s' key from host %s", keytype, host)
+            rlogger.error("Failed to return '%s' key from host %s", outcome.item, host)
             return False
     return True
 
 
+def race_mons(args, dest_dir):
+    """
+    Try every mon in ``args.mon`` at the same time and gather keys from the
+    first one that is found to be in quorum, so that unreachable or slow mons
+    do not hold up the rest. Returns the host keys were gathered from, or
+    ``None`` if no mon could provide them.
+
+    Only one mon gathers at a time: the others wait once they reach quorum
+    checking, and take over if it fails. Mons still being tried when keys
+    have been gathered are not waited for.
+    """
+    results = queue.Queue()
+    condition = threading.Condition()
+    state = {'holder': None, 'gathered': False}
+
+    def claim(host):
+        with condition:
+            while state['holder'] is not None and not state['gathered']:
+                condition.wait()
+            if state['gathered']:
+                return False
+            state['holder'] = host
+            return True
+
+    def release(host, gathered):
+        with condition:
+            if state['holder'] == host:
+                state['holder'] = None
+                state['gathered'] = bool(gathered)
+                condition.notify_all()
+
+    def attempt(host):
+        gathered = False
+        try:
+            gathered = gatherkeys_with_mon(args, host, dest_dir, claim=claim)
+            results.put((host, gathered, None))
+        except RuntimeError as error:
+            LOG.error(error)
+            results.put((host, False, None))
+        except Exception as error:
+            results.put((host, False, error))
+        finally:
+            release(host, gathered)
+
+    if len(args.mon) == 1:
+        attempt(args.mon[0])
+    else:
+        for host in args.mon:
+            thread = threading.Thread(target=attempt, args=(host,))
+            thread.daemon = True
+            thread.start()
+
+    for _ in args.mon:
+        host, gathered, error = results.get()
+        if error is not None:
+            raise error
+        if gathered:
+            return host
+    return None
+
+
 def gatherkeys(args):
     """
     Gather keys from any mon and store in current working directory.
@@ -232,11 +348,7 @@ def gatherkeys(args):
         try:
             tmpd = tempfile.mkdtemp()
             LOG.info("Storing keys in temp directory %s", tmpd)
-            sucess = False
-            for host in args.mon:
-                sucess = gatherkeys_with_mon(args, host, tmpd)
-                if sucess:
-                    break
+            sucess = race_mons(args, tmpd) is not None
             if not sucess:
                 LOG.error("Failed to connect to host:%s" ,', '.join(args.mon))
                 raise RuntimeError('Failed to connect any mon')
@@ -6,8 +6,9 @@ on the type of distribution/version we are dealing with.
 """
 import logging
 from ceph_deploy import exc
-from ceph_deploy.util import versions
+from ceph_deploy.util import trace, versions
 from ceph_deploy.hosts import debian, centos, fedora, suse, remotes, rhel, arch, alt, clear
+from ceph_deploy.hosts import facts
 from ceph_deploy.connection import get_connection
 
 logger = logging.getLogger()
@@ -22,8 +23,9 @@ def get(hostname,
     """
     Retrieve the module that matches the distribution of a ``hostname``. This
     function will connect to that host and retrieve the distribution
-    information, then return the appropriate module and slap a few attributes
-    to that module defining the information it found from the hostname.
+    information, then return the appropriate module (wrapped in a per-host
+    :class:`Host`) and slap a few attributes to it defining the information it
+    found from the hostname.
 
     For example, if host ``node1.example.com`` is an Ubuntu server, the
     ``debian`` module would be returned and the following would be set::
@@ -42,47 +44,85 @@ def get(hostname,
                        called, in order at the end of the instantiation of the
                        module.
     """
-    conn = get_connection(
-        hostname,
-        username=username,
-        logger=logging.getLogger(hostname),
-        detect_sudo=detect_sudo
-    )
-    try:
-        conn.import_module(remotes)
-    except IOError as error:
-        if 'already closed' in getattr(error, 'message', ''):
-            raise RuntimeError('remote connection got closed, ensure ``requiretty`` is disabled for %s' % hostname)
-    distro_name, release, codename = conn.remote_module.platform_information()
-    if not codename or not _get_distro(distro_name):
-        raise exc.UnsupportedPlatform(
-            distro=distro_name,
-            codename=codename,
-            release=release)
-
-    machine_type = conn.remote_module.machine_type()
-    module = _get_distro(distro_name, use_rhceph=use_rhceph)
-    module.name = distro_name
-    module.normalized_name = _normalized_distro_name(distro_name)
-    module.normalized_release = _normalized_release(release)
-    module.distro = module.normalized_name
-    module.is_el = module.normalized_name in ['redhat', 'centos', 'fedora', 'scientific', 'oracle', 'virtuozzo']
-    module.is_rpm = module.normalized_name in ['redhat', 'centos',
-                                               'fedora', 'scientific', 'suse', 'oracle', 'virtuozzo', 'alt']
-    module.is_deb = module.normalized_name in ['debian', 'ubuntu']
-    module.is_pkgtarxz = module.normalized_name in ['arch']
-    module.is_swupd = module.normalized_name in ['clear']
-    module.release = release
-    module.codename = codename
-    module.conn = conn
-    module.machine_type = machine_type
-    module.init = module.choose_init(module)
-    module.packager = module.get_packager(module)
-    # execute each callback if any
-    if callbacks:
-        for c in callbacks:
-            c(module)
-    return module
+    with trace.span('hosts.get', 'connection', host=hostname):
+        conn = get_connection(
+            hostname,
+            username=username,
+            logger=logging.getLogger(hostname),
+            detect_sudo=detect_sudo
+        )
+        try:
+            conn.import_module(remotes)
+        except IOError as error:
+            if 'already closed' in getattr(error, 'message', ''):
+                raise RuntimeError('remote connection got closed, ensure ``requiretty`` is disabled for %s' % hostname)
+        cached = facts.cache.get(hostname)
+        if cached:
+            logger.debug('using cached platform facts for %s', hostname)
+            distro_name = cached['distro']
+            release = cached['release']
+            codename = cached['codename']
+        else:
+            distro_name, release, codename = conn.remote_module.platform_information()
+        if not codename or not _get_distro(distro_name):
+            raise exc.UnsupportedPlatform(
+                distro=distro_name,
+                codename=codename,
+                release=release)
+
+        if cached:
+            machine_type = cached['machine_type']
+        else:
+            machine_type = conn.remote_module.machine_type()
+        module = Host(_get_distro(distro_name, use_rhceph=use_rhceph))
+        module.name = distro_name
+        module.normalized_name = _normalized_distro_name(distro_name)
+        module.normalized_release = _normalized_release(release)
+        module.distro = module.normalized_name
+        module.is_el = module.normalized_name in ['redhat', 'centos', 'fedora', 'scientific', 'oracle', 'virtuozzo']
+        module.is_rpm = module.normalized_name in ['redhat', 'centos',
+                                                   'fedora', 'scientific', 'suse', 'oracle', 'virtuozzo', 'alt']
+        module.is_deb = module.normalized_name in ['debian', 'ubuntu']
+        module.is_pkgtarxz = module.normalized_name in ['arch']
+        module.is_swupd = module.normalized_name in ['clear']
+        module.release = release
+        module.codename = codename
+        module.conn = conn
+        module.machine_type = machine_type
+        if cached:
+            module.init = cached['init']
+        else:
+            module.init = module.choose_init(module)
+            facts.cache.set(
+                hostname,
+                distro=distro_name,
+                release=release,
+                codename=codename,
+                machine_type=machine_type,
+                init=module.init,
+            )
+        module.packager = trace.wrap(module.get_packager(module), 'packager', host=hostname)
+        # execute each callback if any
+        if callbacks:
+            for c in callbacks:
+                c(module)
+        return module
+
+
+class Host(object):
+    """
+    Per-host view of a distro module. Attributes found for a given host (like
+    ``conn`` or ``codename``) are set on this object, while everything else
+    (``install``, ``mon``, ``choose_init`` ...) is looked up in the wrapped
+    distro module. This avoids two hosts with the same distribution stepping
+    on each other when they are handled concurrently.
+    """
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
 
 
 def _get_distro(distro, fallback=None, use_rhceph=False):
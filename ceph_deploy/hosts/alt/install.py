@@ -32,7 +32,7 @@ def install(distro, version_kind, version, adjust_repos, **kw):
     )
 
     if packages:
-        distro.packager.clean()
+        distro.packager.refresh()
         distro.packager.install(packages)
 
    # Start and enable services
@@ -1,5 +1,5 @@
 from . import mon  # noqa
-from .install import install, mirror_install, repo_install, repository_url_part, rpm_dist  # noqa
+from .install import install, mirror_install, repo_install, repository_url_part, rpm_dist, NON_SPLIT_PACKAGES  # noqa
 from .uninstall import uninstall  # noqa
 from ceph_deploy.util import pkg_managers
 from ceph_deploy.util.system import is_systemd
@@ -3,7 +3,7 @@ from ceph_deploy.util import templates
 from ceph_deploy.lib import remoto
 from ceph_deploy.hosts.common import map_components
 from ceph_deploy.util.paths import gpg
-from ceph_deploy.util import net
+from ceph_deploy.util import pkg_cache, shaman
 
 
 LOG = logging.getLogger(__name__)
@@ -52,24 +52,16 @@ def install(distro, version_kind, version, adjust_repos, **kw):
     machine = distro.machine_type
     repo_part = repository_url_part(distro)
     dist = rpm_dist(distro)
+    cache = pkg_cache.cache_url(kw.get('args'))
 
-    distro.packager.clean()
-
-    # Get EPEL installed before we continue:
-    if adjust_repos:
-        distro.packager.install('epel-release')
-        distro.packager.install('yum-plugin-priorities')
-        distro.conn.remote_module.enable_yum_priority_obsoletes()
-        logger.warning('check_obsoletes has been enabled for Yum priorities plugin')
     if version_kind in ['stable', 'testing']:
         key = 'release'
     else:
         key = 'autobuild'
 
     if adjust_repos:
+        release_rpm = url = None
         if version_kind in ['stable', 'testing']:
-            distro.packager.add_repo_gpg_key(gpg.url(key))
-
             if version_kind == 'stable':
                 url = 'https://download.ceph.com/rpm-{version}/{repo}/'.format(
                     version=version,
@@ -77,39 +69,41 @@ def install(distro, version_kind, version, adjust_repos, **kw):
                     )
             elif version_kind == 'testing':
                 url = 'https://download.ceph.com/rpm-testing/{repo}/'.format(repo=repo_part)
+            if not cache:
+                release_rpm = '{url}noarch/ceph-release-1-0.{dist}.noarch.rpm'.format(url=url, dist=dist)
+                distro.packager.add_repo_gpg_key(gpg.url(key))
+        elif version_kind not in ['dev', 'dev_commit']:
+            raise Exception('unrecognized version_kind %s' % version_kind)
 
-            # remove any old ceph-release package from prevoius release
-            remoto.process.run(
-                distro.conn,
-                [
-                    'yum',
-                    'remove',
-                    '-y',
-                    'ceph-release'
-                ],
-            )
-            remoto.process.run(
-                distro.conn,
-                [
-                    'yum',
-                    'install',
-                    '-y',
-                    '{url}noarch/ceph-release-1-0.{dist}.noarch.rpm'.format(url=url, dist=dist),
-                ],
+        # Get EPEL (and ceph-release) installed before we continue:
+        install_repo_packages(distro, release_rpm, url)
+        distro.conn.remote_module.enable_yum_priority_obsoletes()
+        logger.warning('check_obsoletes has been enabled for Yum priorities plugin')
+
+        if version_kind in ['stable', 'testing'] and cache:
+            # the repo file that comes with ceph-release points at upstream,
+            # write one that goes through the cache instead
+            logger.info('skipping install of ceph-release package')
+            mirror_install(
+                distro,
+                pkg_cache.rewrite(url, cache),
+                pkg_cache.rewrite(gpg.url(key), cache),
+                adjust_repos=True,
+                extra_installs=False,
+                gpgcheck=gpgcheck,
             )
 
         elif version_kind in ['dev', 'dev_commit']:
             logger.info('skipping install of ceph-release package')
             logger.info('repo file will be created manually')
-            shaman_url = 'https://shaman.ceph.com/api/repos/ceph/{version}/{sha1}/{distro}/{distro_version}/repo/?arch={arch}'.format(
-                distro=distro.normalized_name,
-                distro_version=distro.normalized_release.major,
-                version=kw['args'].dev,
-                sha1=kw['args'].dev_commit or 'latest',
-                arch=machine
+            _, content = shaman.repo(
+                kw['args'].dev,
+                kw['args'].dev_commit,
+                distro.normalized_name,
+                distro.normalized_release.major,
+                machine,
                 )
-            LOG.debug('fetching repo information from: %s' % shaman_url)
-            content = net.get_chacra_repo(shaman_url)
+            content = pkg_cache.rewrite_content(content, cache)
             mirror_install(
                 distro,
                 '',  # empty repo_url
@@ -120,18 +114,74 @@ def install(distro, version_kind, version, adjust_repos, **kw):
                 repo_content=content
             )
 
-        else:
-            raise Exception('unrecognized version_kind %s' % version_kind)
-
         # set the right priority
         logger.warning('ensuring that /etc/yum.repos.d/ceph.repo contains a high priority')
         distro.conn.remote_module.set_repo_priority(['Ceph', 'Ceph-noarch', 'ceph-source'])
         logger.warning('altered ceph.repo priorities to contain: priority=1')
 
     if packages:
+        # only invalidate yum metadata once the repo files are in place, and
+        # only if they changed
+        distro.packager.refresh()
         distro.packager.install(packages)
 
 
+def install_repo_packages(distro, release_rpm=None, url=None):
+    """
+    Install EPEL, the Yum priorities plugin and, replacing the one of any
+    previous release, the ``release_rpm`` of ceph-release whose repo file
+    points at ``url``. Whatever is missing goes in a single transaction,
+    falling back to one package manager run per step if that fails.
+    """
+    packager = distro.packager
+    installed = packager.installed(['epel-release', 'yum-plugin-priorities', 'ceph-release'])
+    install = [
+        package for package in ['epel-release', 'yum-plugin-priorities']
+        if installed.get(package) is None
+    ]
+    remove = []
+    if release_rpm:
+        install.append(release_rpm)
+        if installed.get('ceph-release') is not None:
+            remove.append('ceph-release')
+    if not install:
+        return
+
+    try:
+        packager.transaction(install=install, remove=remove)
+        if release_rpm and not distro.conn.remote_module.grep(url, '/etc/yum.repos.d/ceph.repo'):
+            raise RuntimeError('ceph.repo does not point at %s' % url)
+        return
+    except RuntimeError as error:
+        distro.conn.logger.warning(
+            'installing repository packages in one transaction failed, '
+            'installing them one at a time: %s', error
+        )
+
+    packager.install('epel-release')
+    packager.install('yum-plugin-priorities')
+    if release_rpm:
+        # remove any old ceph-release package from prevoius release
+        remoto.process.run(
+            distro.conn,
+            [
+                'yum',
+                'remove',
+                '-y',
+                'ceph-release'
+            ],
+        )
+        remoto.process.run(
+            distro.conn,
+            [
+                'yum',
+                'install',
+                '-y',
+                release_rpm,
+            ],
+        )
+
+
 def mirror_install(distro, repo_url, gpg_url, adjust_repos, extra_installs=True, **kw):
     packages = map_components(
         NON_SPLIT_PACKAGES,
@@ -140,8 +190,6 @@ def mirror_install(distro, repo_url, gpg_url, adjust_repos, extra_installs=True,
     repo_url = repo_url.strip('/')  # Remove trailing slashes
     gpgcheck = kw.pop('gpgcheck', 1)
 
-    distro.packager.clean()
-
     if adjust_repos:
         if gpg_url:
             distro.packager.add_repo_gpg_key(gpg_url)
@@ -155,13 +203,13 @@ def mirror_install(distro, repo_url, gpg_url, adjust_repos, extra_installs=True,
 
         distro.conn.remote_module.write_yum_repo(content)
         # set the right priority
-        if distro.packager.name == 'yum':
+        if distro.packager.name == 'yum' and distro.packager.missing('yum-plugin-priorities'):
             distro.packager.install('yum-plugin-priorities')
         distro.conn.remote_module.set_repo_priority(['Ceph', 'Ceph-noarch', 'ceph-source'])
         distro.conn.logger.warning('altered ceph.repo priorities to contain: priority=1')
 
-
     if extra_installs and packages:
+        distro.packager.refresh()
         distro.packager.install(packages)
 
 
@@ -180,8 +228,6 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
     _type = 'repo-md'
     baseurl = baseurl.strip('/')  # Remove trailing slashes
 
-    distro.packager.clean()
-
     if gpgkey:
         distro.packager.add_repo_gpg_key(gpgkey)
 
@@ -216,4 +262,5 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
 
     # Some custom repos do not need to install ceph
     if install_ceph and packages:
+        distro.packager.refresh()
         distro.packager.install(packages)
@@ -2,7 +2,8 @@ from ceph_deploy.util import paths
 from ceph_deploy import conf
 from ceph_deploy.lib import remoto
 from ceph_deploy.util import constants
-from ceph_deploy.util import system
+from ceph_deploy.util import push, system
+from ceph_deploy.util.batch import RemoteBatch
 
 
 def ceph_version(conn):
@@ -13,41 +14,44 @@ def ceph_version(conn):
 
 
 def mon_create(distro, args, monitor_keyring):
-    hostname = distro.conn.remote_module.shortname()
     logger = distro.conn.logger
+    conf_data = conf.ceph.load_raw(args)
+    pending = push.FilePush(args.cluster, conf_data, args.overwrite_conf, logger=logger)
+
+    batch = RemoteBatch(distro.conn)
+    batch.shortname()
+    batch.path_getuid(constants.base_path)
+    batch.path_getgid(constants.base_path)
+    batch.path_exists(paths.mon.constants.tmp_path)
+    pending.check(batch)
+    hostname, uid, gid, tmp_path_exists, _ = batch.execute()
     logger.debug('remote hostname: %s' % hostname)
     path = paths.mon.path(args.cluster, hostname)
-    uid = distro.conn.remote_module.path_getuid(constants.base_path)
-    gid = distro.conn.remote_module.path_getgid(constants.base_path)
     done_path = paths.mon.done(args.cluster, hostname)
     init_path = paths.mon.init(args.cluster, hostname, distro.init)
 
-    conf_data = conf.ceph.load_raw(args)
-
-    # write the configuration file
-    distro.conn.remote_module.write_conf(
-        args.cluster,
-        conf_data,
-        args.overwrite_conf,
-    )
+    # write the configuration file, unless it is already there
+    pending.write(batch)
 
     # if the mon path does not exist, create it
-    distro.conn.remote_module.create_mon_path(path, uid, gid)
+    batch.create_mon_path(path, uid, gid)
 
     logger.debug('checking for done path: %s' % done_path)
-    if not distro.conn.remote_module.path_exists(done_path):
+    batch.path_exists(done_path)
+    if not batch.execute()[-1]:
         logger.debug('done path does not exist: %s' % done_path)
-        if not distro.conn.remote_module.path_exists(paths.mon.constants.tmp_path):
+        if not tmp_path_exists:
             logger.info('creating tmp path: %s' % paths.mon.constants.tmp_path)
-            distro.conn.remote_module.makedir(paths.mon.constants.tmp_path)
+            batch.makedir(paths.mon.constants.tmp_path)
         keyring = paths.mon.keyring(args.cluster, hostname)
 
         logger.info('creating keyring file: %s' % keyring)
-        distro.conn.remote_module.write_monitor_keyring(
+        batch.write_monitor_keyring(
             keyring,
             monitor_keyring,
             uid, gid,
         )
+        batch.execute()
 
         user_args = []
         if uid != 0:
@@ -67,54 +71,58 @@ def mon_create(distro, args, monitor_keyring):
         )
 
         logger.info('unlinking keyring file %s' % keyring)
-        distro.conn.remote_module.unlink(keyring)
+        batch.unlink(keyring)
 
     # create the done file
-    distro.conn.remote_module.create_done_path(done_path, uid, gid)
+    batch.create_done_path(done_path, uid, gid)
 
     # create init path
-    distro.conn.remote_module.create_init_path(init_path, uid, gid)
+    batch.create_init_path(init_path, uid, gid)
+    batch.execute()
 
     # start mon service
     start_mon_service(distro, args.cluster, hostname)
 
 
 def mon_add(distro, args, monitor_keyring):
-    hostname = distro.conn.remote_module.shortname()
     logger = distro.conn.logger
+    conf_data = conf.ceph.load_raw(args)
+    pending = push.FilePush(args.cluster, conf_data, args.overwrite_conf, logger=logger)
+
+    batch = RemoteBatch(distro.conn)
+    batch.shortname()
+    batch.path_getuid(constants.base_path)
+    batch.path_getgid(constants.base_path)
+    batch.path_exists(paths.mon.constants.tmp_path)
+    pending.check(batch)
+    hostname, uid, gid, tmp_path_exists, _ = batch.execute()
     path = paths.mon.path(args.cluster, hostname)
-    uid = distro.conn.remote_module.path_getuid(constants.base_path)
-    gid = distro.conn.remote_module.path_getgid(constants.base_path)
     monmap_path = paths.mon.monmap(args.cluster, hostname)
     done_path = paths.mon.done(args.cluster, hostname)
     init_path = paths.mon.init(args.cluster, hostname, distro.init)
 
-    conf_data = conf.ceph.load_raw(args)
-
-    # write the configuration file
-    distro.conn.remote_module.write_conf(
-        args.cluster,
-        conf_data,
-        args.overwrite_conf,
-    )
+    # write the configuration file, unless it is already there
+    pending.write(batch)
 
     # if the mon path does not exist, create it
-    distro.conn.remote_module.create_mon_path(path, uid, gid)
+    batch.create_mon_path(path, uid, gid)
 
     logger.debug('checking for done path: %s' % done_path)
-    if not distro.conn.remote_module.path_exists(done_path):
+    batch.path_exists(done_path)
+    if not batch.execute()[-1]:
         logger.debug('done path does not exist: %s' % done_path)
-        if not distro.conn.remote_module.path_exists(paths.mon.constants.tmp_path):
+        if not tmp_path_exists:
             logger.info('creating tmp path: %s' % paths.mon.constants.tmp_path)
-            distro.conn.remote_module.makedir(paths.mon.constants.tmp_path)
+            batch.makedir(paths.mon.constants.tmp_path)
         keyring = paths.mon.keyring(args.cluster, hostname)
 
         logger.info('creating keyring file: %s' % keyring)
-        distro.conn.remote_module.write_monitor_keyring(
+        batch.write_monitor_keyring(
             keyring,
             monitor_keyring,
             uid, gid,
         )
+        batch.execute()
 
         # get the monmap
         remoto.process.run(
@@ -150,13 +158,14 @@ def mon_add(distro, args, monitor_keyring):
         )
 
         logger.info('unlinking keyring file %s' % keyring)
-        distro.conn.remote_module.unlink(keyring)
+        batch.unlink(keyring)
 
     # create the done file
-    distro.conn.remote_module.create_done_path(done_path, uid, gid)
+    batch.create_done_path(done_path, uid, gid)
 
     # create init path
-    distro.conn.remote_module.create_init_path(init_path, uid, gid)
+    batch.create_init_path(init_path, uid, gid)
+    batch.execute()
 
     # start mon service
     start_mon_service(distro, args.cluster, hostname)
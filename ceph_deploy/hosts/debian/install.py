@@ -4,7 +4,7 @@ except ImportError:
     from urlparse import urlparse
 import logging
 from ceph_deploy.util.paths import gpg
-from ceph_deploy.util import net
+from ceph_deploy.util import pkg_cache, shaman
 
 
 LOG = logging.getLogger(__name__)
@@ -15,14 +15,18 @@ def install(distro, version_kind, version, adjust_repos, **kw):
     codename = distro.codename
     machine = distro.machine_type
     extra_install_flags = []
+    cache = pkg_cache.cache_url(kw.get('args'))
 
     if version_kind in ['stable', 'testing']:
         key = 'release'
     else:
         key = 'autobuild'
 
-    distro.packager.clean()
-    distro.packager.install(['ca-certificates', 'apt-transport-https'])
+    # hosts that already have them skip a metadata refresh and an apt-get run
+    needed = distro.packager.missing(['ca-certificates', 'apt-transport-https'])
+    if needed:
+        distro.packager.refresh()
+        distro.packager.install(needed)
 
     if adjust_repos:
         # Wheezy does not like the download.ceph.com SSL cert
@@ -31,23 +35,21 @@ def install(distro, version_kind, version, adjust_repos, **kw):
             protocol = 'http'
 
         if version_kind in ['dev', 'dev_commit']:
-            shaman_url = 'https://shaman.ceph.com/api/repos/ceph/{version}/{sha1}/{distro}/{distro_version}/repo/?arch={arch}'.format(
-                distro=distro.normalized_name,
-                distro_version=distro.codename,
-                version=kw['args'].dev,
-                sha1=kw['args'].dev_commit or 'latest',
-                arch=machine
+            chacra_url, content = shaman.repo(
+                kw['args'].dev,
+                kw['args'].dev_commit,
+                distro.normalized_name,
+                distro.codename,
+                machine,
                 )
-            LOG.debug('fetching repo information from: %s' % shaman_url)
-            chacra_url = net.get_request(shaman_url).geturl()
-            content = net.get_chacra_repo(shaman_url)
+            content = pkg_cache.rewrite_content(content, cache)
             # set the repo priority for the right domain
-            fqdn = urlparse(chacra_url).hostname
+            fqdn = urlparse(pkg_cache.rewrite(chacra_url, cache)).hostname
             distro.conn.remote_module.set_apt_priority(fqdn)
             distro.conn.remote_module.write_sources_list_content(content)
             extra_install_flags = ['-o', 'Dpkg::Options::=--force-confnew', '--allow-unauthenticated']
         else:
-            distro.packager.add_repo_gpg_key(gpg.url(key, protocol=protocol))
+            distro.packager.add_repo_gpg_key(pkg_cache.rewrite(gpg.url(key, protocol=protocol), cache))
             if version_kind == 'stable':
                 url = '{protocol}://download.ceph.com/debian-{version}/'.format(
                     protocol=protocol,
@@ -59,6 +61,7 @@ def install(distro, version_kind, version, adjust_repos, **kw):
                     )
             else:
                 raise RuntimeError('Unknown version kind: %r' % version_kind)
+            url = pkg_cache.rewrite(url, cache)
 
             # set the repo priority for the right domain
             fqdn = urlparse(url).hostname
@@ -66,7 +69,7 @@ def install(distro, version_kind, version, adjust_repos, **kw):
             distro.conn.remote_module.write_sources_list(url, codename)
             extra_install_flags = ['-o', 'Dpkg::Options::=--force-confnew']
 
-    distro.packager.clean()
+    distro.packager.refresh()
 
     # TODO this does not downgrade -- should it?
     if packages:
@@ -93,7 +96,7 @@ def mirror_install(distro, repo_url, gpg_url, adjust_repos, **kw):
     extra_install_flags = ['--allow-unauthenticated'] if version_kind in 'dev' else []
 
     if packages:
-        distro.packager.clean()
+        distro.packager.refresh()
         distro.packager.install(
             packages,
             extra_install_flags=extra_install_flags)
@@ -119,7 +122,7 @@ def repo_install(distro, repo_name, baseurl, gpgkey, **kw):
     distro.conn.remote_module.set_apt_priority(fqdn)
 
     # repo is not operable until an update
-    distro.packager.clean()
+    distro.packager.refresh()
 
     if install_ceph and packages:
         distro.packager.install(packages)
@@ -0,0 +1,108 @@
+"""
+A small on-disk cache for the platform facts that :func:`ceph_deploy.hosts.get`
+detects on every connection: distro name, release, codename, machine type and
+init system. Detecting those costs several round-trips per host, while they
+almost never change between two runs against the same fleet.
+
+Facts are stored as one JSON file per host so that hosts handled concurrently
+never contend on the same file. The cache is disabled (``ttl=0``) until the
+CLI configures it, so library users and tests always detect facts live.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+default_path = os.path.expanduser('~/.cache/ceph-deploy/facts')
+
+# the keys a cached entry must have to be usable
+keys = ('distro', 'release', 'codename', 'machine_type', 'init')
+
+
+class FactCache(object):
+    """
+    Read and write per-host facts, expiring them after ``ttl`` seconds. When
+    ``refresh`` is set, cached entries are ignored (but still rewritten with
+    the freshly detected facts).
+    """
+
+    def __init__(self, path=None, ttl=0, refresh=False):
+        self.path = path or default_path
+        # values coming from the ceph-deploy config file are strings
+        self.ttl = int(ttl or 0)
+        self.refresh = refresh
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _file(self, hostname):
+        safe_name = re.sub(r'[^\w.@-]', '_', hostname)
+        return os.path.join(self.path, '%s.json' % safe_name)
+
+    def get(self, hostname):
+        """
+        Return the cached facts for ``hostname`` as a dictionary, or ``None``
+        if there are none, they expired, or they could not be read.
+        """
+        if not self.enabled or self.refresh:
+            return None
+        try:
+            with open(self._file(hostname)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if time.time() - entry.get('timestamp', 0) > self.ttl:
+            LOG.debug('cached facts for %s have expired', hostname)
+            return None
+        if not all(key in entry for key in keys):
+            return None
+        return entry
+
+    def set(self, hostname, **facts):
+        if not self.enabled:
+            return
+        entry = dict((key, facts[key]) for key in keys)
+        entry['timestamp'] = time.time()
+        try:
+            content = json.dumps(entry)
+        except (TypeError, ValueError) as error:
+            LOG.debug('unable to cache facts for %s: %s', hostname, error)
+            return
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            # write to a temporary file first, so that a concurrent reader
+            # never sees a partially written entry
+            tmp_file = tempfile.NamedTemporaryFile(
+                'w', dir=self.path, delete=False
+            )
+            with tmp_file:
+                tmp_file.write(content)
+            os.rename(tmp_file.name, self._file(hostname))
+        except (IOError, OSError) as error:
+            LOG.debug('unable to cache facts for %s: %s', hostname, error)
+
+    def forget(self, hostname):
+        try:
+            os.unlink(self._file(hostname))
+        except OSError:
+            pass
+
+
+cache = FactCache()
+
+
+def configure(ttl=0, refresh=False, path=None):
+    """
+    Set up the process-wide cache used by :func:`ceph_deploy.hosts.get`.
+    Calling it without arguments disables the cache again.
+    """
+    global cache
+    cache = FactCache(path=path, ttl=ttl, refresh=refresh)
+    return cache
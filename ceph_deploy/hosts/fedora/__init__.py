@@ -1,6 +1,6 @@
 from . import mon  # noqa
 from ceph_deploy.hosts.centos.install import repo_install  # noqa
-from .install import install, mirror_install  # noqa
+from .install import install, mirror_install, NON_SPLIT_PACKAGES  # noqa
 from .uninstall import uninstall  # noqa
 from ceph_deploy.util import pkg_managers
 
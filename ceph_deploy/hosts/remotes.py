@@ -3,12 +3,17 @@ try:
 except ImportError:
     import ConfigParser as configparser
 import errno
+import hashlib
+import json
 import socket
 import os
 import shutil
 import tempfile
 import platform
 import re
+import subprocess
+import time
+import traceback
 
 
 def platform_information(_linux_distribution=None):
@@ -158,7 +163,6 @@ def set_repo_priority(sections, path='/etc/yum.repos.d/ceph.repo', priority='1')
 def write_conf(cluster, conf, overwrite):
     """ write cluster configuration to /etc/ceph/{cluster}.conf """
     path = '/etc/ceph/{cluster}.conf'.format(cluster=cluster)
-    tmp_file = tempfile.NamedTemporaryFile('w', dir='/etc/ceph', delete=False)
     err_msg = 'config file %s exists with different content; use --overwrite-conf to overwrite' % path
 
     if not os.path.isdir('/etc/ceph'):
@@ -168,15 +172,123 @@ def write_conf(cluster, conf, overwrite):
     if os.path.exists(path):
         with open(path, 'r') as f:
             old = f.read()
-            if old != conf and not overwrite:
-                raise RuntimeError(err_msg)
-        tmp_file.write(conf)
-        tmp_file.close()
-        shutil.move(tmp_file.name, path)
+        if old == conf:
+            return False
+        if not overwrite:
+            raise RuntimeError(err_msg)
+    # write next to the destination and rename, so that readers never see a
+    # partially written file
+    tmp_file = tempfile.NamedTemporaryFile('w', dir='/etc/ceph', delete=False)
+    tmp_file.write(conf)
+    tmp_file.close()
+    os.chmod(tmp_file.name, 0o644)
+    os.rename(tmp_file.name, path)
+    return True
+
+
+def file_checksums(paths):
+    """
+    SHA-256 of the content of each file in ``paths``, as a dictionary of path
+    to hex digest, with ``None`` for files that do not exist
+    """
+    checksums = {}
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                checksums[path] = hashlib.sha256(f.read()).hexdigest()
+        except IOError:
+            checksums[path] = None
+    return checksums
+
+
+def tree_checksums(path):
+    """
+    SHA-256 of every file under the directory ``path``, as a dictionary of
+    path relative to ``path`` to hex digest. Empty if ``path`` does not exist
+    """
+    checksums = {}
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            full_path = os.path.join(root, name)
+            digest = hashlib.sha256()
+            with open(full_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            checksums[os.path.relpath(full_path, path)] = digest.hexdigest()
+    return checksums
+
+
+def repo_state(paths, state_path):
+    """
+    Fingerprint of the package manager configuration in ``paths`` (files, or
+    directories whose files are all included), along with the fingerprint and
+    the age in seconds recorded in ``state_path`` at the last metadata
+    refresh. Both are ``None`` when nothing was recorded
+    """
+    digest = hashlib.sha256()
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        elif os.path.exists(path):
+            files.append(path)
+    for path in sorted(files):
+        digest.update(path.encode('utf-8') + b'\0')
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+        digest.update(b'\0')
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        return digest.hexdigest(), state['fingerprint'], time.time() - state['refreshed']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return digest.hexdigest(), None, None
+
+
+def save_repo_state(state_path, fingerprint):
+    """
+    Record that package metadata was refreshed just now, for the package
+    manager configuration with ``fingerprint``
+    """
+    directory = os.path.dirname(state_path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(state_path, 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'refreshed': time.time()}, f)
+
+
+def installed_versions(packages, query='rpm'):
+    """
+    Installed version of each of ``packages``, asking rpm or dpkg (``query``)
+    about all of them at once. Packages that are not installed are ``None``
+    """
+    versions = dict((package, None) for package in packages)
+    if not packages:
+        return versions
+    if query == 'dpkg':
+        command = ['dpkg-query', '-W', '-f', '${Package} ${Version} ${db:Status-Abbrev}\n']
     else:
-        with open(path, 'w') as f:
-            f.write(conf)
-    os.chmod(path, 0o644)
+        command = ['rpm', '-q', '--qf', '%{NAME} %{VERSION}-%{RELEASE}\n']
+    try:
+        process = subprocess.Popen(
+            command + list(packages),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError:
+        return versions
+    out, _ = process.communicate()
+    for line in out.decode('utf-8', 'replace').splitlines():
+        parts = line.split()
+        if len(parts) < 2 or parts[0] not in versions:
+            # "package foo is not installed"
+            continue
+        # dpkg also knows about removed packages that left files behind
+        if query == 'dpkg' and (len(parts) < 3 or parts[2] != 'ii'):
+            continue
+        versions[parts[0]] = parts[1]
+    return versions
 
 
 def write_keyring(path, key, uid=-1, gid=-1):
@@ -279,6 +391,18 @@ def write_file(path, content, mode=0o644, directory=None, uid=-1, gid=-1):
     os.chown(path, uid, gid)
 
 
+def write_temp_file(content, prefix='tmp'):
+    """
+    Write ``content`` to a new file in the temporary directory, readable by
+    the owner only, and return its path. ``mkstemp`` creates it exclusively,
+    so it cannot be a file or symlink planted there beforehand.
+    """
+    fd, path = tempfile.mkstemp(prefix=prefix)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    return path
+
+
 def touch_file(path):
     with open(path, 'wb') as f:  # noqa
         pass
@@ -411,6 +535,85 @@ def enable_yum_priority_obsoletes(path="/etc/yum/pluginconf.d/priorities.conf"):
         config.write(fout)
 
 
+def parse_keyrings(content):
+    """
+    Split the output of ``ceph auth export`` (or ``auth get``) into a
+    dictionary of entity name to its keyring section.
+    """
+    keyrings = {}
+    entity = None
+    for line in content.splitlines():
+        match = re.match(r'^\[(.+)\]\s*$', line.strip())
+        if match:
+            entity = match.group(1)
+            keyrings[entity] = line.strip() + '\n'
+        elif entity and line.strip():
+            keyrings[entity] += line + '\n'
+    return keyrings
+
+
+def auth_keyrings(cluster, keyring, entities, name='mon.'):
+    """
+    Fetch the keyrings of ``entities`` (a dictionary of entity name to the
+    capabilities it should be created with) using a single ``ceph auth
+    export``, then ``get-or-create`` only the ones that do not exist yet.
+    Returns a dictionary of entity name to keyring, entities that could not be
+    fetched or created are left out.
+    """
+    command = [
+        '/usr/bin/ceph',
+        '--connect-timeout=25',
+        '--cluster=%s' % cluster,
+        '--name', name,
+        '--keyring=%s' % keyring,
+        'auth',
+    ]
+
+    def ceph_auth(*args):
+        process = subprocess.Popen(
+            command + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        out, _ = process.communicate()
+        if process.returncode != 0:
+            return {}
+        return parse_keyrings(out.decode('utf-8'))
+
+    exported = ceph_auth('export')
+    keyrings = {}
+    for entity, caps in entities.items():
+        if entity not in exported:
+            exported.update(ceph_auth('get-or-create', entity, *caps))
+        if entity in exported:
+            keyrings[entity] = exported[entity]
+    return keyrings
+
+
+def batch(calls, stop_on_error=True):
+    """
+    Run several functions of this module in one round-trip. ``calls`` is a
+    list of ``(name, args, kwargs)`` tuples, and the reply is a list with one
+    ``(result, error)`` tuple per call, in order. ``error`` is the last line of
+    the traceback for calls that raised, and calls after a failure are not run
+    (their result is ``None`` with a ``'not run'`` error) unless
+    ``stop_on_error`` is disabled.
+    """
+    results = []
+    failed = False
+    for name, args, kwargs in calls:
+        if failed and stop_on_error:
+            results.append((None, 'not run'))
+            continue
+        try:
+            results.append((globals()[name](*args, **kwargs), None))
+        except Exception:
+            failed = True
+            lines = [line for line in traceback.format_exc().split('\n') if line]
+            results.append((None, lines[-1]))
+    return results
+
+
 # remoto magic, needed to execute these functions remotely
 if __name__ == '__channelexec__':
     for item in channel:  # noqa
@@ -3,7 +3,7 @@ from ceph_deploy.util import templates
 
 def install(distro, version_kind, version, adjust_repos, **kw):
     packages = kw.get('components', [])
-    distro.packager.clean()
+    distro.packager.refresh()
     distro.packager.install(packages)
 
 
@@ -13,8 +13,6 @@ def mirror_install(distro, repo_url,
     repo_url = repo_url.strip('/')  # Remove trailing slashes
     gpgcheck = kw.pop('gpgcheck', 1)
 
-    distro.packager.clean()
-
     if adjust_repos:
         distro.packager.add_repo_gpg_key(gpg_url)
 
@@ -27,6 +25,7 @@ def mirror_install(distro, repo_url,
         distro.conn.remote_module.write_yum_repo(ceph_repo_content)
 
     if extra_installs and packages:
+        distro.packager.refresh()
         distro.packager.install(packages)
 
 
@@ -44,8 +43,6 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
     _type = 'repo-md'
     baseurl = baseurl.strip('/')  # Remove trailing slashes
 
-    distro.packager.clean()
-
     if gpgkey:
         distro.packager.add_repo_gpg_key(gpgkey)
 
@@ -68,4 +65,5 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
 
     # Some custom repos do not need to install ceph
     if install_ceph and packages:
+        distro.packager.refresh()
         distro.packager.install(packages)
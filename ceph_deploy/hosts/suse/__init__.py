@@ -1,5 +1,5 @@
 from . import mon  # noqa
-from .install import install, mirror_install, repo_install  # noqa
+from .install import install, mirror_install, repo_install, NON_SPLIT_PACKAGES  # noqa
 from .uninstall import uninstall  # noqa
 import logging
 
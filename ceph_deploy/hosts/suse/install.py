@@ -15,7 +15,7 @@ def install(distro, version_kind, version, adjust_repos, **kw):
         kw.get('components', [])
     )
 
-    distro.packager.clean()
+    distro.packager.refresh()
     if packages:
         distro.packager.install(packages)
 
@@ -47,7 +47,7 @@ def mirror_install(distro, repo_url, gpg_url, adjust_repos, **kw):
         distro.conn.remote_module.write_file(
             '/etc/zypp/repos.d/ceph.repo',
             ceph_repo_content.encode('utf-8'))
-        distro.packager.clean()
+        distro.packager.refresh()
 
     if packages:
         distro.packager.install(packages)
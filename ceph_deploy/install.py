@@ -2,10 +2,11 @@ import argparse
 import logging
 import os
 
-from ceph_deploy import hosts
+from ceph_deploy import exc, hosts
 from ceph_deploy.cliutil import priority
 from ceph_deploy.lib import remoto
-from ceph_deploy.util.constants import default_components
+from ceph_deploy.util import journal, mirror, packages, parallel, pkg_cache, shaman
+from ceph_deploy.util.constants import default_components, release_versions
 from ceph_deploy.util.paths import gpg
 
 LOG = logging.getLogger(__name__)
@@ -100,6 +101,8 @@ def install(args):
         return install_repo(args)
 
     gpgcheck = 0 if args.nogpgcheck else 1
+    # hosts sharing a platform resolve a dev repository only once
+    shaman.configure(ttl=getattr(args, 'shaman_ttl', 0))
 
     if args.version_kind == 'stable':
         version = args.release
@@ -117,99 +120,267 @@ def install(args):
         ' '.join(args.host),
     )
 
-    for hostname in args.host:
-        LOG.debug('Detecting platform for host %s ...', hostname)
-        distro = hosts.get(
-            hostname,
-            username=args.username,
-            # XXX this should get removed once ceph packages are split for
-            # upstream. If default_release is True, it means that the user is
-            # trying to install on a RHEL machine and should expect to get RHEL
-            # packages. Otherwise, it will need to specify either a specific
-            # version, or repo, or a development branch. Other distro users
-            # should not see any differences.
-            use_rhceph=args.default_release,
+    params = journal_params(args, version)
+    host_list = args.host
+    staged = False
+    errors = 0
+    if args.local_mirror and getattr(args, 'mirror_seeds', 0):
+        # hosts that --resume skips do not need the mirror either
+        done = [
+            hostname for hostname in args.host
+            if journal.completed('install', hostname, params)
+        ]
+        pending = [hostname for hostname in args.host if hostname not in done]
+        host_list = done
+        if pending:
+            distribution = mirror.Distribution(
+                args.local_mirror,
+                pending,
+                seeds=args.mirror_seeds,
+                username=args.username,
+                logger=LOG,
             )
-        LOG.info(
-            'Distro info: %s %s %s',
-            distro.name,
-            distro.release,
-            distro.codename
+            staged_hosts = distribution.run()
+            host_list = [
+                hostname for hostname in args.host
+                if hostname in done or hostname in staged_hosts
+            ]
+            errors += len(distribution.failed)
+        staged = True
+
+    outcomes = parallel.run(
+        journal.wrap(
+            'install',
+            lambda hostname: install_host(args, hostname, version, gpgcheck, staged=staged),
+            params=params,
+        ),
+        host_list,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors += parallel.count_failed(outcomes)
+    log_plan(outcomes)
+
+    if errors:
+        raise exc.GenericError('Failed to install Ceph on %d hosts' % errors)
+
+
+def journal_params(args, version):
+    """
+    The options that make an ``install`` on a host different from another,
+    so that ``--resume`` only skips hosts that got the same install.
+    """
+    return {
+        'version_kind': args.version_kind,
+        'version': version,
+        'components': sorted(
+            key for key, value in vars(args).items()
+            if key.startswith('install_') and value
+        ),
+        # a dev commit is built from a branch, both pick the packages
+        'dev': args.dev,
+        'dev_commit': args.dev_commit,
+        'repo_url': os.environ.get('CEPH_DEPLOY_REPO_URL') or args.repo_url,
+        'gpg_url': os.environ.get('CEPH_DEPLOY_GPG_URL') or args.gpg_url,
+        'gpgcheck': not args.nogpgcheck,
+        'cache_url': pkg_cache.cache_url(args),
+        'local_mirror': args.local_mirror,
+        'adjust_repos': args.adjust_repos,
+    }
+
+
+UP_TO_DATE = 'release already installed'
+
+
+def log_plan(outcomes, logger=None):
+    """
+    Summarize what happened to every host, one line for every group of
+    hosts that got the same treatment.
+    """
+    logger = logger or LOG
+    plans = {}
+    for outcome in outcomes:
+        plan = 'failed' if outcome.failed else outcome.value or 'skipped'
+        plans.setdefault(plan, []).append(outcome.item)
+    up_to_date = len(plans.get(UP_TO_DATE, []))
+    logger.info(
+        'install plan: %d host%s already had the release installed, %d needed work',
+        up_to_date,
+        '' if up_to_date == 1 else 's',
+        len(outcomes) - up_to_date,
+    )
+    for plan, hostnames in sorted(plans.items()):
+        logger.info('  %s: %s', plan, ' '.join(hostnames))
+    if up_to_date:
+        logger.info(
+            'hosts that had the release installed keep their point release, '
+            'use --reinstall to update them'
         )
 
-        components = detect_components(args, distro)
-        if distro.init == 'sysvinit' and args.cluster != 'ceph':
-            LOG.error('refusing to install on host: %s, with custom cluster name: %s' % (
-                    hostname,
-                    args.cluster,
-                )
+
+def probe_components(args, distro, components):
+    """
+    Ask the host for the installed versions of all ``components`` at once,
+    and return the ones that are missing or not from the requested release.
+    Only the release is compared, so a component on an older point release of
+    it counts as installed.
+    Returns ``None`` when installed packages cannot be compared with what
+    would be installed: development builds, releases that are not known, or
+    hosts that use neither rpm nor dpkg.
+    """
+    if args.version_kind != 'stable' or not components:
+        return None
+    if str(args.release).lower() not in release_versions:
+        return None
+    if distro.is_deb:
+        query = 'dpkg'
+    elif distro.is_rpm:
+        query = 'rpm'
+    else:
+        return None
+    # some distros ship several components in the ``ceph`` package
+    not_split = getattr(distro, 'NON_SPLIT_PACKAGES', [])
+    names = dict(
+        (component, 'ceph' if component in not_split else component)
+        for component in components
+    )
+    installed = distro.conn.remote_module.installed_versions(
+        sorted(set(names.values())),
+        query,
+    )
+    return [
+        component for component in components
+        if not packages.matches_release(installed.get(names[component]), args.release)
+    ]
+
+
+def install_host(args, hostname, version, gpgcheck, staged=False):
+    """
+    Install Ceph on a single host, this is the body that :func:`install` runs
+    for every host in ``args.host``. With ``staged``, the ``--local-mirror``
+    is already in place on the host and is not pushed again.
+
+    Returns a short description of what was done, for :func:`log_plan`.
+    """
+    LOG.debug('Detecting platform for host %s ...', hostname)
+    distro = hosts.get(
+        hostname,
+        username=args.username,
+        # XXX this should get removed once ceph packages are split for
+        # upstream. If default_release is True, it means that the user is
+        # trying to install on a RHEL machine and should expect to get RHEL
+        # packages. Otherwise, it will need to specify either a specific
+        # version, or repo, or a development branch. Other distro users
+        # should not see any differences.
+        use_rhceph=args.default_release,
+        )
+    LOG.info(
+        'Distro info: %s %s %s',
+        distro.name,
+        distro.release,
+        distro.codename
+    )
+
+    components = detect_components(args, distro)
+    if distro.init == 'sysvinit' and args.cluster != 'ceph':
+        LOG.error('refusing to install on host: %s, with custom cluster name: %s' % (
+                hostname,
+                args.cluster,
             )
-            LOG.error('custom cluster names are not supported on sysvinit hosts')
-            continue
+        )
+        LOG.error('custom cluster names are not supported on sysvinit hosts')
+        return 'skipped, custom cluster name on sysvinit'
 
-        rlogger = logging.getLogger(hostname)
-        rlogger.info('installing Ceph on %s' % hostname)
+    rlogger = logging.getLogger(hostname)
 
-        cd_conf = getattr(args, 'cd_conf', None)
+    cd_conf = getattr(args, 'cd_conf', None)
 
-        # custom repo arguments
-        repo_url = os.environ.get('CEPH_DEPLOY_REPO_URL') or args.repo_url
-        gpg_url = os.environ.get('CEPH_DEPLOY_GPG_URL') or args.gpg_url
-        gpg_fallback = gpg.url('release')
+    # custom repo arguments
+    repo_url = os.environ.get('CEPH_DEPLOY_REPO_URL') or args.repo_url
+    gpg_url = os.environ.get('CEPH_DEPLOY_GPG_URL') or args.gpg_url
+    gpg_fallback = gpg.url('release')
 
-        if gpg_url is None and repo_url:
-            LOG.warning('--gpg-url was not used, will fallback')
-            LOG.warning('using GPG fallback: %s', gpg_fallback)
-            gpg_url = gpg_fallback
+    if gpg_url is None and repo_url:
+        LOG.warning('--gpg-url was not used, will fallback')
+        LOG.warning('using GPG fallback: %s', gpg_fallback)
+        gpg_url = gpg_fallback
 
-        if args.local_mirror:
+    if args.local_mirror:
+        if not staged:
             if args.username:
                 hostname = "%s@%s" % (args.username, hostname)
-            remoto.rsync(hostname, args.local_mirror, '/opt/ceph-deploy/repo', distro.conn.logger, sudo=True)
-            repo_url = 'file:///opt/ceph-deploy/repo'
-            gpg_url = 'file:///opt/ceph-deploy/repo/release.asc'
-
-        if repo_url:  # triggers using a custom repository
-            # the user used a custom repo url, this should override anything
-            # we can detect from the configuration, so warn about it
-            if cd_conf:
-                if cd_conf.get_default_repo():
-                    rlogger.warning('a default repo was found but it was \
-                        overridden on the CLI')
-                if args.release in cd_conf.get_repos():
-                    rlogger.warning('a custom repo was found but it was \
-                        overridden on the CLI')
-
-            rlogger.info('using custom repository location: %s', repo_url)
-            distro.mirror_install(
-                distro,
-                repo_url,
-                gpg_url,
-                args.adjust_repos,
-                components=components,
-                gpgcheck=gpgcheck,
-                args=args
+            remoto.rsync(hostname, args.local_mirror, mirror.REPO_PATH, distro.conn.logger, sudo=True)
+        repo_url = 'file://' + mirror.REPO_PATH
+        gpg_url = 'file://%s/release.asc' % mirror.REPO_PATH
+
+    cache = pkg_cache.cache_url(args)
+    if cache:
+        rlogger.info('fetching packages through the cache at %s', cache)
+        repo_url = pkg_cache.rewrite(repo_url, cache)
+        gpg_url = pkg_cache.rewrite(gpg_url, cache)
+
+    if not (repo_url or args.reinstall or should_use_custom_repo(args, cd_conf, repo_url)):
+        needed = probe_components(args, distro, components)
+        if needed is not None and not needed:
+            rlogger.info(
+                'Ceph %s is already installed on %s, not looking for a newer point release',
+                args.release,
+                hostname,
             )
-
-        # Detect and install custom repos here if needed
-        elif should_use_custom_repo(args, cd_conf, repo_url):
-            LOG.info('detected valid custom repositories from config file')
-            custom_repo(distro, args, cd_conf, rlogger)
-
-        else:  # otherwise a normal installation
-            distro.install(
-                distro,
-                args.version_kind,
-                version,
-                args.adjust_repos,
-                components=components,
-                gpgcheck = gpgcheck,
-                args=args
+            distro.conn.exit()
+            return UP_TO_DATE
+        if needed is not None and len(needed) < len(components):
+            rlogger.info(
+                'already installed from %s: %s',
+                args.release,
+                ', '.join(c for c in components if c not in needed),
             )
+            components = needed
+
+    rlogger.info('installing Ceph on %s' % hostname)
+
+    if repo_url:  # triggers using a custom repository
+        # the user used a custom repo url, this should override anything
+        # we can detect from the configuration, so warn about it
+        if cd_conf:
+            if cd_conf.get_default_repo():
+                rlogger.warning('a default repo was found but it was \
+                    overridden on the CLI')
+            if args.release in cd_conf.get_repos():
+                rlogger.warning('a custom repo was found but it was \
+                    overridden on the CLI')
+
+        rlogger.info('using custom repository location: %s', repo_url)
+        distro.mirror_install(
+            distro,
+            repo_url,
+            gpg_url,
+            args.adjust_repos,
+            components=components,
+            gpgcheck=gpgcheck,
+            args=args
+        )
 
-        # Check the ceph version we just installed
-        hosts.common.ceph_version(distro.conn)
-        distro.conn.exit()
+    # Detect and install custom repos here if needed
+    elif should_use_custom_repo(args, cd_conf, repo_url):
+        LOG.info('detected valid custom repositories from config file')
+        custom_repo(distro, args, cd_conf, rlogger)
+
+    else:  # otherwise a normal installation
+        distro.install(
+            distro,
+            args.version_kind,
+            version,
+            args.adjust_repos,
+            components=components,
+            gpgcheck = gpgcheck,
+            args=args
+        )
+
+    # Check the ceph version we just installed
+    hosts.common.ceph_version(distro.conn)
+    distro.conn.exit()
+    return 'installed %s' % ', '.join(components)
 
 
 def should_use_custom_repo(args, cd_conf, repo_url):
@@ -240,6 +411,7 @@ def custom_repo(distro, args, cd_conf, rlogger, install_ceph=None):
     """
     default_repo = cd_conf.get_default_repo()
     components = detect_components(args, distro)
+    cache = pkg_cache.cache_url(args)
     if args.release in cd_conf.get_repos():
         LOG.info('will use repository from conf: %s' % args.release)
         default_repo = args.release
@@ -260,8 +432,8 @@ def custom_repo(distro, args, cd_conf, rlogger, install_ceph=None):
             distro.repo_install(
                 distro,
                 default_repo,
-                options.pop('baseurl'),
-                options.pop('gpgkey'),
+                pkg_cache.rewrite(options.pop('baseurl'), cache),
+                pkg_cache.rewrite(options.pop('gpgkey'), cache),
                 components=components,
                 **options
             )
@@ -275,8 +447,8 @@ def custom_repo(distro, args, cd_conf, rlogger, install_ceph=None):
                 distro.repo_install(
                     distro,
                     xrepo,
-                    options.pop('baseurl'),
-                    options.pop('gpgkey'),
+                    pkg_cache.rewrite(options.pop('baseurl'), cache),
+                    pkg_cache.rewrite(options.pop('gpgkey'), cache),
                     components=components,
                     **options
                 )
@@ -291,7 +463,7 @@ def install_repo(args):
     """
     cd_conf = getattr(args, 'cd_conf', None)
 
-    for hostname in args.host:
+    def install_repo_host(hostname):
         LOG.debug('Detecting platform for host %s ...', hostname)
         distro = hosts.get(
             hostname,
@@ -315,6 +487,18 @@ def install_repo(args):
 
         custom_repo(distro, args, cd_conf, rlogger, install_ceph=False)
 
+    outcomes = parallel.run(
+        install_repo_host,
+        args.host,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+
+    if errors:
+        raise exc.GenericError('Failed to install repositories on %d hosts' % errors)
+
+
 def remove(args, purge):
     LOG.info('note that some dependencies *will not* be removed because they can cause issues with qemu-kvm')
     LOG.info('like: librbd1 and librados2')
@@ -328,7 +512,7 @@ def remove(args, purge):
         ' '.join(args.host),
         )
 
-    for hostname in args.host:
+    def remove_host(hostname):
         LOG.debug('Detecting platform for host %s ...', hostname)
 
         distro = hosts.get(
@@ -341,6 +525,19 @@ def remove(args, purge):
         distro.uninstall(distro, purge=purge)
         distro.conn.exit()
 
+    outcomes = parallel.run(
+        remove_host,
+        args.host,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+
+    if errors:
+        raise exc.GenericError('Failed to %s Ceph on %d hosts' % (
+            'purge' if purge else 'uninstall', errors)
+        )
+
 def uninstall(args):
     remove(args, False)
 
@@ -354,19 +551,28 @@ def purgedata(args):
         ' '.join(args.host),
         )
 
-    installed_hosts = []
-    for hostname in args.host:
+    def check_installed(hostname):
         distro = hosts.get(hostname, username=args.username)
         ceph_is_installed = distro.conn.remote_module.which('ceph')
-        if ceph_is_installed:
-            installed_hosts.append(hostname)
         distro.conn.exit()
+        return bool(ceph_is_installed)
 
+    outcomes = parallel.run(
+        check_installed,
+        args.host,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+    if errors:
+        raise exc.GenericError('Failed to check for Ceph on %d hosts' % errors)
+
+    installed_hosts = [o.item for o in outcomes if o.value]
     if installed_hosts:
         LOG.error("Ceph is still installed on: %s", installed_hosts)
         raise RuntimeError("refusing to purge data while Ceph is still installed")
 
-    for hostname in args.host:
+    def purgedata_host(hostname):
         distro = hosts.get(hostname, username=args.username)
         LOG.info(
             'Distro info: %s %s %s',
@@ -422,6 +628,17 @@ def purgedata(args):
 
         distro.conn.exit()
 
+    outcomes = parallel.run(
+        purgedata_host,
+        args.host,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+
+    if errors:
+        raise exc.GenericError('Failed to purge data from %d hosts' % errors)
+
 
 class StoreVersion(argparse.Action):
     """
@@ -596,6 +813,40 @@ def make(parser):
         help='Fetch packages and push them to hosts for a local repo mirror',
     )
 
+    parser.add_argument(
+        '--reinstall',
+        action='store_true',
+        help=('set up repositories and install packages even on hosts that '
+              'already have the requested release installed, which is needed '
+              'to move them to its latest point release'),
+    )
+
+    parser.add_argument(
+        '--shaman-ttl',
+        metavar='SECONDS',
+        type=int,
+        default=0,
+        help=('reuse dev repositories resolved through shaman for a '
+              '--dev-commit in later runs for this long (default: '
+              '%(default)s, only within a run)'),
+    )
+
+    parser.add_argument(
+        '--cache-url',
+        metavar='URL',
+        help=('fetch repositories and packages through the cache served by '
+              '`ceph-deploy cache serve` at URL, e.g. http://admin:8080'),
+    )
+
+    parser.add_argument(
+        '--mirror-seeds',
+        metavar='N',
+        type=int,
+        default=0,
+        help=('with --local-mirror, push the mirror from this node to N seed '
+              'hosts only and let hosts copy it from each other'),
+    )
+
     parser.add_argument(
         '--repo-url',
         nargs='?',
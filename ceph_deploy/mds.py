@@ -1,11 +1,13 @@
 import logging
 import os
+from collections import OrderedDict
 
 from ceph_deploy import conf
 from ceph_deploy import exc
 from ceph_deploy import hosts
-from ceph_deploy.util import system
+from ceph_deploy.util import parallel, push, system
 from ceph_deploy.lib import remoto
+from ceph_deploy.util.batch import RemoteBatch
 from ceph_deploy.cliutil import priority
 
 
@@ -64,8 +66,10 @@ def create_mds(distro, name, cluster, init):
         conn.logger.error('exit code from command was: %s' % returncode)
         raise RuntimeError('could not create mds')
 
-    conn.remote_module.touch_file(os.path.join(path, 'done'))
-    conn.remote_module.touch_file(os.path.join(path, init))
+    batch = RemoteBatch(conn)
+    batch.touch_file(os.path.join(path, 'done'))
+    batch.touch_file(os.path.join(path, init))
+    batch.execute()
 
     if init == 'upstart':
         remoto.process.run(
@@ -133,13 +137,17 @@ def mds_create(args):
 
     key = get_bootstrap_mds_key(cluster=args.cluster)
 
-    bootstrapped = set()
-    errors = 0
-    failed_on_rhel = False
+    failed_on_rhel = []
 
+    # daemons on the same host are created one after the other so that the
+    # bootstrap (conf and keyring) happens only once per host
+    names_by_host = OrderedDict()
     for hostname, name in args.mds:
+        names_by_host.setdefault(hostname, []).append(name)
+
+    def create_host_mds(hostname):
+        distro = None
         try:
-            distro = None
             distro = hosts.get(hostname, username=args.username)
             rlogger = distro.conn.logger
             LOG.info(
@@ -151,31 +159,48 @@ def mds_create(args):
 
             LOG.debug('remote host will use %s', distro.init)
 
-            if hostname not in bootstrapped:
-                bootstrapped.add(hostname)
-                LOG.debug('deploying mds bootstrap to %s', hostname)
-                distro.conn.remote_module.write_conf(
-                    args.cluster,
-                    conf_data,
-                    args.overwrite_conf,
-                )
+            LOG.debug('deploying mds bootstrap to %s', hostname)
+            batch = RemoteBatch(distro.conn)
+            pending = push.FilePush(
+                args.cluster,
+                conf_data,
+                args.overwrite_conf,
+                logger=rlogger,
+            )
+            pending.check(batch)
+
+            path = '/var/lib/ceph/bootstrap-mds/{cluster}.keyring'.format(
+                cluster=args.cluster,
+            )
 
-                path = '/var/lib/ceph/bootstrap-mds/{cluster}.keyring'.format(
-                    cluster=args.cluster,
-                )
+            keyring_exists = batch.path_exists(path)
+            batch.execute()
 
-                if not distro.conn.remote_module.path_exists(path):
-                    rlogger.warning('mds keyring does not exist yet, creating one')
-                    distro.conn.remote_module.write_keyring(path, key)
+            # only the files that differ (if any) go out in the second round-trip
+            pending.write(batch)
+            if not keyring_exists.get():
+                rlogger.warning('mds keyring does not exist yet, creating one')
+                batch.write_keyring(path, key)
+            batch.execute()
 
-            create_mds(distro, name, args.cluster, distro.init)
+            for name in names_by_host[hostname]:
+                create_mds(distro, name, args.cluster, distro.init)
             distro.conn.exit()
-        except RuntimeError as e:
+        except RuntimeError:
             if distro and distro.normalized_name == 'redhat':
                 LOG.error('this feature may not yet available for %s %s' % (distro.name, distro.release))
-                failed_on_rhel = True
-            LOG.error(e)
-            errors += 1
+                failed_on_rhel.append(hostname)
+            raise
+
+    outcomes = parallel.run(
+        create_host_mds,
+        names_by_host,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = sum(
+        len(names_by_host[o.item]) for o in outcomes if o.failed
+    )
 
     if errors:
         if failed_on_rhel:
@@ -4,8 +4,9 @@ import os
 from ceph_deploy import conf
 from ceph_deploy import exc
 from ceph_deploy import hosts
-from ceph_deploy.util import system
+from ceph_deploy.util import push, system
 from ceph_deploy.lib import remoto
+from ceph_deploy.util.batch import RemoteBatch
 from ceph_deploy.cliutil import priority
 
 
@@ -64,8 +65,10 @@ def create_mgr(distro, name, cluster, init):
         conn.logger.error('exit code from command was: %s' % returncode)
         raise RuntimeError('could not create mgr')
 
-    conn.remote_module.touch_file(os.path.join(path, 'done'))
-    conn.remote_module.touch_file(os.path.join(path, init))
+    batch = RemoteBatch(conn)
+    batch.touch_file(os.path.join(path, 'done'))
+    batch.touch_file(os.path.join(path, init))
+    batch.execute()
 
     if init == 'upstart':
         remoto.process.run(
@@ -154,19 +157,28 @@ def mgr_create(args):
             if hostname not in bootstrapped:
                 bootstrapped.add(hostname)
                 LOG.debug('deploying mgr bootstrap to %s', hostname)
-                distro.conn.remote_module.write_conf(
+                batch = RemoteBatch(distro.conn)
+                pending = push.FilePush(
                     args.cluster,
                     conf_data,
                     args.overwrite_conf,
+                    logger=rlogger,
                 )
+                pending.check(batch)
 
                 path = '/var/lib/ceph/bootstrap-mgr/{cluster}.keyring'.format(
                     cluster=args.cluster,
                 )
 
-                if not distro.conn.remote_module.path_exists(path):
+                keyring_exists = batch.path_exists(path)
+                batch.execute()
+
+                # only the files that differ (if any) go out in the second round-trip
+                pending.write(batch)
+                if not keyring_exists.get():
                     rlogger.warning('mgr keyring does not exist yet, creating one')
-                    distro.conn.remote_module.write_keyring(path, key)
+                    batch.write_keyring(path, key)
+                batch.execute()
 
             create_mgr(distro, name, args.cluster, distro.init)
             distro.conn.exit()
@@ -2,12 +2,11 @@ import json
 import logging
 import re
 import os
-import time
 
 from ceph_deploy import conf, exc, admin
 from ceph_deploy.cliutil import priority
 from ceph_deploy.util.help_formatters import ToggleRawTextHelpFormatter
-from ceph_deploy.util import paths, net, files, packages, system
+from ceph_deploy.util import paths, net, files, packages, parallel, system, wait
 from ceph_deploy.lib import remoto
 from ceph_deploy.new import new_mon_keyring
 from ceph_deploy import hosts
@@ -49,6 +48,35 @@ def mon_status_check(conn, logger, hostname, args):
         return {}
 
 
+# states of a monitor that is up and talking to its peers
+mon_running_states = ('probing', 'synchronizing', 'electing', 'peon', 'leader')
+
+
+def wait_for_mon(conn, logger, hostname, args, states=mon_running_states, timeout=30):
+    """
+    Poll the admin socket of ``mon.hostname`` until the monitor reports one of
+    ``states`` and return its status, or an empty dictionary if ``timeout``
+    seconds pass first. Nothing is asked of the monitor until its admin
+    socket exists.
+    """
+    asok_path = paths.mon.asok(args.cluster, hostname)
+
+    def reached_state():
+        if not conn.remote_module.path_exists(asok_path):
+            return {}
+        status = mon_status_check(conn, logger, hostname, args)
+        if status.get('state') in states:
+            return status
+        return {}
+
+    return wait.until(
+        reached_state,
+        timeout=timeout,
+        logger=logger,
+        description='mon.%s to reach %s' % (hostname, ' or '.join(states)),
+    ) or {}
+
+
 def catch_mon_errors(conn, logger, hostname, cfg, args):
     """
     Make sure we are able to catch up common mishaps with monitors
@@ -222,7 +250,7 @@ def mon_add(args):
         distro.mon.add(distro, args, monitor_keyring)
 
         # tell me the status of the deployed mon
-        time.sleep(2)  # give some room to start
+        wait_for_mon(distro.conn, rlogger, mon_host, args)
         catch_mon_errors(distro.conn, rlogger, mon_host, cfg, args)
         mon_status(distro.conn, rlogger, mon_host, args)
         distro.conn.exit()
@@ -255,33 +283,36 @@ def mon_create(args):
         ' '.join(args.mon),
         )
 
-    errors = 0
-    for (name, host) in mon_hosts(args.mon):
-        try:
-            # TODO add_bootstrap_peer_hint
-            LOG.debug('detecting platform for host %s ...', name)
-            distro = hosts.get(
-                host,
-                username=args.username,
-                callbacks=[packages.ceph_is_installed]
-            )
-            LOG.info('distro info: %s %s %s', distro.name, distro.release, distro.codename)
-            rlogger = logging.getLogger(name)
-
-            # ensure remote hostname is good to go
-            hostname_is_compatible(distro.conn, rlogger, name)
-            rlogger.debug('deploying mon to %s', name)
-            distro.mon.create(distro, args, monitor_keyring)
-
-            # tell me the status of the deployed mon
-            time.sleep(2)  # give some room to start
-            mon_status(distro.conn, rlogger, name, args)
-            catch_mon_errors(distro.conn, rlogger, name, cfg, args)
-            distro.conn.exit()
+    def create_mon(name_host):
+        name, host = name_host
+        # TODO add_bootstrap_peer_hint
+        LOG.debug('detecting platform for host %s ...', name)
+        distro = hosts.get(
+            host,
+            username=args.username,
+            callbacks=[packages.ceph_is_installed]
+        )
+        LOG.info('distro info: %s %s %s', distro.name, distro.release, distro.codename)
+        rlogger = logging.getLogger(name)
 
-        except RuntimeError as e:
-            LOG.error(e)
-            errors += 1
+        # ensure remote hostname is good to go
+        hostname_is_compatible(distro.conn, rlogger, name)
+        rlogger.debug('deploying mon to %s', name)
+        distro.mon.create(distro, args, monitor_keyring)
+
+        # tell me the status of the deployed mon
+        wait_for_mon(distro.conn, rlogger, name, args)
+        mon_status(distro.conn, rlogger, name, args)
+        catch_mon_errors(distro.conn, rlogger, name, cfg, args)
+        distro.conn.exit()
+
+    outcomes = parallel.run(
+        create_mon,
+        mon_hosts(args.mon),
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
 
     if errors:
         raise exc.GenericError('Failed to create %d monitors' % errors)
@@ -304,10 +335,8 @@ def hostname_is_compatible(conn, logger, provided_hostname):
     logger.warning('*'*80)
 
 
-def destroy_mon(conn, cluster, hostname):
+def destroy_mon(conn, cluster, hostname, timeout=25):
     import datetime
-    import time
-    retries = 5
 
     path = paths.mon.path(cluster, hostname)
 
@@ -353,15 +382,15 @@ def destroy_mon(conn, cluster, hostname):
         else:
             raise RuntimeError('could not detect a supported init system, cannot continue')
 
-        while retries:
-            conn.logger.info('polling the daemon to verify it stopped')
-            if is_running(conn, status_args):
-                time.sleep(5)
-                retries -= 1
-                if retries <= 0:
-                    raise RuntimeError('ceph-mon deamon did not stop')
-            else:
-                break
+        conn.logger.info('polling the daemon to verify it stopped')
+        stopped = wait.until(
+            lambda: not is_running(conn, status_args),
+            timeout=timeout,
+            logger=conn.logger,
+            description='mon.%s to stop' % hostname,
+        )
+        if not stopped:
+            raise RuntimeError('ceph-mon deamon did not stop')
 
         # archive old monitor directory
         fn = '{cluster}-{hostname}-{stamp}'.format(
@@ -410,54 +439,144 @@ def mon_destroy(args):
         raise exc.GenericError('Failed to destroy %d monitors' % errors)
 
 
-def mon_create_initial(args):
-    mon_initial_members = get_mon_initial_members(args, error_on_empty=True)
+def merge_mon_status(statuses):
+    """
+    Combine the ``mon_status`` output of several monitors, keyed by host, into
+    a single view of the cluster. The newest monmap any of them reports wins,
+    and the quorum comes from the monitor that says it is the leader (or from
+    a peon if no leader answered).
+
+    Returns a dictionary with the ``leader`` host (``None`` if unknown), the
+    names of the ``mons`` in the monmap, the names of the mons in the
+    ``quorum``, and whether that quorum is a ``majority`` of the monmap.
+    """
+    monmap = {}
+    for status in statuses.values():
+        candidate = status.get('monmap') or {}
+        if candidate.get('epoch', -1) > monmap.get('epoch', -1):
+            monmap = candidate
+    names = dict(
+        (mon.get('rank'), mon.get('name'))
+        for mon in monmap.get('mons', [])
+    )
 
-    # create them normally through mon_create
-    args.mon = mon_initial_members
-    mon_create(args)
+    leader = None
+    view = None
+    for host, status in sorted(statuses.items()):
+        state = status.get('state')
+        if state == 'leader':
+            leader, view = host, status
+            break
+        if state == 'peon' and view is None:
+            view = status
+
+    quorum = []
+    if view is not None:
+        quorum = sorted(
+            names[rank] for rank in view.get('quorum', []) if rank in names
+        )
+    return {
+        'leader': leader,
+        'mons': sorted(names.values()),
+        'quorum': quorum,
+        'majority': bool(names) and len(quorum) > len(names) / 2.0,
+    }
 
-    # make the sets to be able to compare late
-    mon_in_quorum = set([])
-    mon_members = set([host for host in mon_initial_members])
 
-    for host in mon_initial_members:
-        mon_name = 'mon.%s' % host
-        LOG.info('processing monitor %s', mon_name)
-        sleeps = [20, 20, 15, 10, 10, 5]
-        tries = 5
-        rlogger = logging.getLogger(host)
-        distro = hosts.get(
+def wait_for_quorum(args, mon_members, timeout=300):
+    """
+    Ask every monitor in ``mon_members`` for its status at the same time,
+    over and over, until a majority of the monmap has formed a quorum or
+    ``timeout`` seconds pass. Returns the last :func:`merge_mon_status`
+    view, or raises right away when none of the monitors can be reached.
+    """
+    def connect(host):
+        return hosts.get(
             host,
             username=args.username,
             callbacks=[packages.ceph_is_installed]
         )
 
-        while tries:
-            status = mon_status_check(distro.conn, rlogger, host, args)
-            has_reached_quorum = status.get('state', '') in ['peon', 'leader']
-            if not has_reached_quorum:
-                LOG.warning('%s monitor is not yet in quorum, tries left: %s' % (mon_name, tries))
-                tries -= 1
-                sleep_seconds = sleeps.pop()
-                LOG.warning('waiting %s seconds before retrying', sleep_seconds)
-                time.sleep(sleep_seconds)  # Magic number
-            else:
-                mon_in_quorum.add(host)
-                LOG.info('%s monitor has reached quorum!', mon_name)
-                break
-        distro.conn.exit()
+    connected = parallel.run(connect, mon_members, workers=len(mon_members), logger=LOG)
+    distros = dict(
+        (outcome.item, outcome.value)
+        for outcome in connected if not outcome.failed
+    )
+    if not distros:
+        raise exc.GenericError(
+            'unable to connect to any monitor to check for quorum: %s' % ', '.join(
+                outcome.item for outcome in connected
+            )
+        )
+    state = {'view': merge_mon_status({})}
+
+    def has_quorum():
+        outcomes = parallel.run(
+            lambda host: mon_status_check(
+                distros[host].conn, logging.getLogger(host), host, args
+            ),
+            list(distros),
+            workers=len(distros) or 1,
+            logger=LOG,
+        )
+        view = merge_mon_status(dict(
+            (outcome.item, outcome.value or {})
+            for outcome in outcomes if not outcome.failed
+        ))
+        state['view'] = view
+        if not view['majority']:
+            LOG.warning(
+                'monitors in quorum: %s of %s',
+                ', '.join(view['quorum']) or 'none',
+                ', '.join(view['mons']) or ', '.join(mon_members),
+            )
+        return view['majority']
 
-    if mon_in_quorum == mon_members:
-        LOG.info('all initial monitors are running and have formed quorum')
-        LOG.info('Running gatherkeys...')
-        gatherkeys.gatherkeys(args)
-    else:
+    try:
+        wait.until(
+            has_quorum,
+            timeout=timeout,
+            initial=1,
+            maximum=10,
+            logger=LOG,
+            description='monitors to form quorum',
+        )
+    finally:
+        for distro in distros.values():
+            distro.conn.exit()
+    return state['view']
+
+
+def mon_create_initial(args):
+    mon_initial_members = get_mon_initial_members(args, error_on_empty=True)
+
+    # create them normally through mon_create
+    args.mon = mon_initial_members
+    mon_create(args)
+
+    view = wait_for_quorum(args, mon_initial_members)
+    if not view['majority']:
         LOG.error('Some monitors have still not reached quorum:')
-        for host in mon_members - mon_in_quorum:
-            LOG.error('%s', host)
+        for host in mon_initial_members:
+            if host not in view['quorum']:
+                LOG.error('%s', host)
         raise SystemExit('cluster may not be in a healthy state')
 
+    missing = set(mon_initial_members) - set(view['quorum'])
+    if missing:
+        LOG.warning('a majority of monitors formed quorum, still missing: %s', ', '.join(sorted(missing)))
+    else:
+        LOG.info('all initial monitors are running and have formed quorum')
+
+    # the leader is known to be in quorum, ask it first
+    if view['leader']:
+        LOG.info('mon.%s is the leader', view['leader'])
+        args.mon = [view['leader']] + [
+            host for host in mon_initial_members if host != view['leader']
+        ]
+    LOG.info('Running gatherkeys...')
+    gatherkeys.gatherkeys(args)
+
 
 def mon(args):
     if args.subcommand == 'create':
@@ -2,11 +2,10 @@ import argparse
 import json
 import logging
 import sys
-import time
 from textwrap import dedent
 
 from ceph_deploy import conf, exc, hosts
-from ceph_deploy.util import system, packages
+from ceph_deploy.util import disks, journal, system, packages, parallel, push, wait
 from ceph_deploy.cliutil import priority
 from ceph_deploy.lib import remoto
 
@@ -138,6 +137,61 @@ def osd_status_check(conn, cluster):
         return {}
 
 
+def osd_states(conn, cluster):
+    """
+    Whether every OSD in the cluster is up, by id, from ``ceph osd dump``, or
+    ``None`` if the cluster could not be asked.
+    """
+    ceph_executable = system.executable_path(conn, 'ceph')
+    try:
+        out, err, code = remoto.process.check(
+            conn,
+            [
+                ceph_executable,
+                '--cluster={cluster}'.format(cluster=cluster),
+                'osd',
+                'dump',
+                '--format=json',
+            ],
+        )
+    except TypeError:
+        # the same remoto bug as in osd_status_check
+        return None
+    if code != 0:
+        return None
+    try:
+        osds = json.loads(''.join(out)).get('osds', [])
+        return dict((osd['osd'], bool(osd.get('up'))) for osd in osds)
+    except (ValueError, KeyError, AttributeError):
+        return None
+
+
+def wait_for_osds(conn, cluster, before, timeout=15):
+    """
+    Poll ``ceph osd dump`` until every OSD that is not in ``before`` (the ids
+    from :func:`osd_states` before creating any) is up, returning their
+    states, or an empty dictionary if ``timeout`` seconds pass first. OSDs
+    that were there before are not waited for, whatever their state.
+    """
+    if before is None:
+        conn.logger.debug('OSDs before creating were unknown, not waiting for new ones')
+        return {}
+
+    def new_osds_up():
+        states = osd_states(conn, cluster) or {}
+        new = dict((osd, up) for osd, up in states.items() if osd not in before)
+        if new and all(new.values()):
+            return new
+        return {}
+
+    return wait.until(
+        new_osds_up,
+        timeout=timeout,
+        logger=conn.logger,
+        description='new OSDs to come up',
+    ) or {}
+
+
 def catch_osd_errors(conn, logger, args):
     """
     Look for possible issues when checking the status of an OSD and
@@ -248,7 +302,7 @@ def create(args, cfg, create=False):
     errors = 0
     hostname = args.host
 
-    try:
+    def create_host(hostname):
         if args.data is None:
             raise exc.NeedDiskError(hostname)
 
@@ -269,10 +323,12 @@ def create(args, cfg, create=False):
             LOG.debug('Deploying osd to %s', hostname)
 
             conf_data = conf.ceph.load_raw(args)
-            distro.conn.remote_module.write_conf(
+            push.push(
+                distro.conn,
+                hostname,
                 args.cluster,
                 conf_data,
-                args.overwrite_conf
+                args.overwrite_conf,
             )
 
             create_osd_keyring(distro.conn, args.cluster, key)
@@ -282,6 +338,7 @@ def create(args, cfg, create=False):
         if args.filestore:
             storetype = 'filestore'
 
+        before = osd_states(distro.conn, args.cluster)
         create_osd(
             distro.conn,
             cluster=args.cluster,
@@ -297,12 +354,20 @@ def create(args, cfg, create=False):
             debug=args.debug,
         )
 
-        # give the OSD a few seconds to start
-        time.sleep(5)
+        # give the OSD some room to start
+        wait_for_osds(distro.conn, args.cluster, before)
         catch_osd_errors(distro.conn, distro.conn.logger, args)
         LOG.debug('Host %s is now ready for osd use.', hostname)
         distro.conn.exit()
 
+    # the same device on the same host with the same options is only
+    # created again when it did not complete (with --resume)
+    params = dict(
+        (option, getattr(args, option))
+        for option in ('data', 'journal', 'filestore', 'block_db', 'block_wal', 'dmcrypt')
+    )
+    try:
+        journal.wrap('create %s' % args.data, create_host, params=params)(hostname)
     except RuntimeError as e:
         LOG.error(e)
         errors += 1
@@ -311,6 +376,177 @@ def create(args, cfg, create=False):
         raise exc.GenericError('Failed to create %d OSDs' % errors)
 
 
+def batch_devices(entries):
+    """
+    Turn ``HOST:DEVICE[,DEVICE...]`` entries into a list of ``(host,
+    devices)``, in the order the hosts were first given. Only the first
+    colon separates the host, since ``/dev/disk/by-path`` names have colons
+    of their own.
+    """
+    layout = []
+    by_host = {}
+    for entry in entries:
+        if ':' not in entry:
+            raise RuntimeError('expected HOST:DEVICE[,DEVICE...] but got "%s"' % entry)
+        hostname, devices = entry.split(':', 1)
+        devices = [device for device in devices.split(',') if device]
+        if not hostname or not devices:
+            raise RuntimeError('expected HOST:DEVICE[,DEVICE...] but got "%s"' % entry)
+        if hostname not in by_host:
+            by_host[hostname] = []
+            layout.append((hostname, by_host[hostname]))
+        for device in devices:
+            if device not in by_host[hostname]:
+                by_host[hostname].append(device)
+    return layout
+
+
+def spec_devices(path):
+    """
+    The data devices of every host in the ``[osd]`` section of a cluster
+    spec file, as :func:`batch_devices` returns them.
+    """
+    # spec builds on this module, so it can only be imported here
+    from ceph_deploy.spec import ClusterSpec
+    entries = [
+        '%s:%s' % (action.host, action.name)
+        for action in ClusterSpec.load(path).actions
+        if action.kind == 'osd'
+    ]
+    return batch_devices(entries)
+
+
+def create_batch_osds(conn, cluster, devices, storetype, dmcrypt, debug=False):
+    """
+    Run on osd node, creates an OSD on each of ``devices`` with a single
+    ``ceph-volume lvm batch``, which prepares them one after the other.
+    Every device is a data device: without ``--no-auto``, solid state devices
+    next to rotational ones would hold their block.db instead.
+    """
+    ceph_volume_executable = system.executable_path(conn, 'ceph-volume')
+    command = [
+        ceph_volume_executable,
+        '--cluster', cluster,
+        'lvm',
+        'batch',
+        '--yes',
+        '--no-auto',
+        '--%s' % storetype,
+    ]
+    if dmcrypt:
+        command.append('--dmcrypt')
+    command.extend(devices)
+
+    if debug:
+        remoto.process.run(
+            conn,
+            command,
+            extend_env={'CEPH_VOLUME_DEBUG': '1'}
+        )
+    else:
+        remoto.process.run(
+            conn,
+            command
+        )
+
+
+def create_batch(args, cfg):
+    """
+    Create OSDs on many devices of many hosts: every host is bootstrapped
+    once and gets a single ``ceph-volume lvm batch`` for all of its devices,
+    hosts run concurrently, and the cluster is checked once at the end.
+    """
+    if args.host or args.data:
+        raise RuntimeError('HOST and --data cannot be combined with --batch or --spec')
+    for option in ('journal', 'block_db', 'block_wal'):
+        if getattr(args, option):
+            raise RuntimeError(
+                '--%s names a single device and cannot be used with --batch or --spec'
+                % option.replace('_', '-')
+            )
+
+    if args.spec:
+        layout = spec_devices(args.spec)
+    else:
+        layout = batch_devices(args.batch)
+    if not layout:
+        raise exc.NeedDiskError(args.spec)
+    devices = dict(layout)
+
+    key = get_bootstrap_osd_key(cluster=args.cluster)
+    conf_data = conf.ceph.load_raw(args)
+
+    # default to bluestore unless explicitly told not to
+    storetype = 'bluestore'
+    if args.filestore:
+        storetype = 'filestore'
+
+    # the OSDs every host saw before creating its own
+    snapshots = []
+
+    def create_host(hostname):
+        LOG.debug(
+            'Creating OSDs on %s with data devices %s',
+            hostname,
+            ', '.join(devices[hostname])
+        )
+        distro = hosts.get(
+            hostname,
+            username=args.username,
+            callbacks=[packages.ceph_is_installed]
+        )
+        try:
+            snapshots.append(osd_states(distro.conn, args.cluster))
+            push.push(
+                distro.conn,
+                hostname,
+                args.cluster,
+                conf_data,
+                args.overwrite_conf,
+            )
+            create_osd_keyring(distro.conn, args.cluster, key)
+            create_batch_osds(
+                distro.conn,
+                cluster=args.cluster,
+                devices=devices[hostname],
+                storetype=storetype,
+                dmcrypt=args.dmcrypt,
+                debug=args.debug,
+            )
+        finally:
+            distro.conn.exit()
+
+    def create_journaled(hostname):
+        params = dict(devices=devices[hostname], filestore=args.filestore, dmcrypt=args.dmcrypt)
+        return journal.wrap('batch', create_host, params=params)(hostname)
+
+    outcomes = parallel.run(
+        create_journaled,
+        [hostname for hostname, _ in layout],
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+
+    # a single look at the cluster once every host is done, from any host
+    # that made it
+    created = [outcome.item for outcome in outcomes if not outcome.failed]
+    if created:
+        # every OSD created in this run is missing from the snapshot of the
+        # host that created it, so from what all the snapshots share
+        known = [set(states) for states in snapshots if states is not None]
+        before = set.intersection(*known) if known else None
+        distro = hosts.get(created[0], username=args.username)
+        try:
+            wait_for_osds(distro.conn, args.cluster, before)
+            catch_osd_errors(distro.conn, distro.conn.logger, args)
+        finally:
+            distro.conn.exit()
+
+    if errors:
+        raise exc.GenericError('Failed to create OSDs on %d hosts' % errors)
+
+
 def disk_zap(args):
 
     hostname = args.host
@@ -359,26 +595,43 @@ def disk_zap(args):
 
 
 def disk_list(args, cfg):
-    command = ['fdisk', '-l']
-
-    for hostname in args.host:
+    def list_host_disks(hostname):
         distro = hosts.get(
             hostname,
             username=args.username,
             callbacks=[packages.ceph_is_installed]
         )
-        out, err, code = remoto.process.check(
-            distro.conn,
-            command,
+        try:
+            records = disks.lsblk(distro.conn)
+            if args.ceph_volume:
+                disks.merge_inventory(records, disks.inventory(distro.conn, debug=args.debug))
+        finally:
+            distro.conn.exit()
+        if args.format == 'plain':
+            for record in records:
+                distro.conn.logger.info(disks.describe(record))
+        return records
+
+    outcomes = parallel.run(
+        list_host_disks,
+        args.host,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+
+    if args.format == 'json':
+        inventory = dict(
+            (outcome.item, outcome.value) for outcome in outcomes if not outcome.failed
         )
-        for line in out:
-            line = line.decode('utf-8')
-            if line.startswith('Disk /'):
-                distro.conn.logger.info(line)
+        sys.stdout.write(json.dumps(inventory, indent=2, sort_keys=True) + '\n')
+
+    if errors:
+        raise exc.GenericError('Failed to list disks on %d hosts' % errors)
 
 
 def osd_list(args, cfg):
-    for hostname in args.host:
+    def list_host_osds(hostname):
         distro = hosts.get(
             hostname,
             username=args.username,
@@ -415,12 +668,25 @@ def osd_list(args, cfg):
             )
         distro.conn.exit()
 
+    outcomes = parallel.run(
+        list_host_osds,
+        args.host,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+
+    if errors:
+        raise exc.GenericError('Failed to list OSDs on %d hosts' % errors)
+
 
 def osd(args):
     cfg = conf.ceph.load(args)
 
     if args.subcommand == 'list':
         osd_list(args, cfg)
+    elif args.subcommand == 'create' and (args.batch or args.spec):
+        create_batch(args, cfg)
     elif args.subcommand == 'create':
         create(args, cfg)
     else:
@@ -465,6 +731,12 @@ def make(parser):
     For data devices, it can be an existing logical volume in the format of:
     vg/lv, or a device. For other OSD components like wal, db, and journal, it
     can be logical volume (in vg/lv format) or it must be a GPT partition.
+
+    Many devices on many hosts can be created at once, from the command line
+    or from the [osd] section of a cluster spec file::
+
+        ceph-deploy osd create --batch {node1}:/dev/sdb,/dev/sdc {node2}:/dev/sdb
+        ceph-deploy osd create --spec cluster.spec
     """
     )
     parser.formatter_class = argparse.RawDescriptionHelpFormatter
@@ -557,6 +829,18 @@ def make(parser):
         action='store_true',
         help='Enable debug mode on remote ceph-volume calls',
         )
+    osd_batch = osd_create.add_mutually_exclusive_group()
+    osd_batch.add_argument(
+        '--batch',
+        nargs='+',
+        metavar='HOST:DEVICE[,DEVICE]',
+        help='create OSDs on every DEVICE of every HOST',
+        )
+    osd_batch.add_argument(
+        '--spec',
+        metavar='SPEC',
+        help='create OSDs on the devices in the [osd] section of a cluster spec file',
+        )
     parser.set_defaults(
         func=osd,
         )
@@ -606,6 +890,17 @@ def make_disk(parser):
         action='store_true',
         help='Enable debug mode on remote ceph-volume calls',
         )
+    disk_list.add_argument(
+        '--ceph-volume',
+        action='store_true',
+        help='Also report what ceph-volume inventory knows about every disk',
+        )
+    disk_list.add_argument(
+        '--format',
+        choices=['plain', 'json'],
+        default='plain',
+        help='Log a line per disk (plain) or print every host as JSON',
+        )
     parser.set_defaults(
         func=disk,
         )
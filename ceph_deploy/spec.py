@@ -0,0 +1,376 @@
+"""
+Describe a cluster in a spec file and let ``plan`` and ``apply`` work out
+what is missing, instead of running every deploy step again.
+
+The spec is an INI file with a section per daemon type, using the same
+``HOST[:NAME]`` (``[NAME:]HOST`` for monitors) notation as the ``create``
+subcommands, and the OSD data devices of every host::
+
+    [mon]
+    hosts = node1 node2 node3
+
+    [mgr]
+    hosts = node1 node2
+
+    [mds]
+    hosts = node1
+
+    [rgw]
+    hosts = node2 node3:gateway
+
+    [osd]
+    node1 = /dev/sdb /dev/sdc
+    node2 = /dev/sdb
+
+The state of every host is gathered concurrently: the ``done`` files that
+``create`` leaves in each daemon directory, and the data devices that
+``ceph-volume lvm list`` reports. Only the daemons that are missing are
+created, independent ones at the same time.
+"""
+import configparser
+import json
+import logging
+import os
+
+from ceph_deploy import exc, gatherkeys, hosts, mds, mgr, mon, osd, rgw
+from ceph_deploy.cliutil import priority, subcommand_args
+from ceph_deploy.lib import remoto
+from ceph_deploy.misc import mon_hosts
+from ceph_deploy.util import parallel
+from ceph_deploy.util.batch import RemoteBatch
+from ceph_deploy.util.paths import mon as mon_paths
+
+
+LOG = logging.getLogger(__name__)
+
+# daemon types in the order they are created, with their directory in
+# /var/lib/ceph
+KINDS = (
+    ('mon', 'mon'),
+    ('mgr', 'mgr'),
+    ('osd', 'osd'),
+    ('mds', 'mds'),
+    ('rgw', 'radosgw'),
+)
+
+
+class Action(object):
+    """
+    A daemon the spec asks for: ``name`` is the daemon name (the data device
+    for OSDs) and ``entry`` how it is passed to its ``create`` subcommand.
+    """
+
+    def __init__(self, kind, host, name, entry=None):
+        self.kind = kind
+        self.host = host
+        self.name = name
+        self.entry = entry or host
+
+    def done_path(self, cluster):
+        if self.kind == 'mon':
+            return mon_paths.done(cluster, self.name)
+        directory = dict(KINDS)[self.kind]
+        return '/var/lib/ceph/%s/%s-%s/done' % (directory, cluster, self.name)
+
+    def __eq__(self, other):
+        return (self.kind, self.host, self.name) == (other.kind, other.host, other.name)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.kind, self.host, self.name))
+
+    def __str__(self):
+        if self.kind == 'osd':
+            return 'create osd %s on %s' % (self.name, self.host)
+        return 'create %s.%s on %s' % (self.kind, self.name, self.host)
+
+    def __repr__(self):
+        return '<Action %s>' % self
+
+
+class ClusterSpec(object):
+    """
+    The daemons a spec file asks for, as a list of :class:`Action`.
+    """
+
+    def __init__(self, actions):
+        self.actions = actions
+
+    @classmethod
+    def load(cls, path):
+        parser = configparser.RawConfigParser()
+        try:
+            with open(path) as f:
+                parser.read_file(f)
+        except (IOError, OSError, configparser.Error) as error:
+            raise exc.ConfigError(path, error)
+        unknown = set(parser.sections()) - set(dict(KINDS))
+        if unknown:
+            raise exc.ConfigError(path, 'unknown sections: %s' % ', '.join(sorted(unknown)))
+
+        def entries(section):
+            if not parser.has_option(section, 'hosts'):
+                return []
+            return parser.get(section, 'hosts').split()
+
+        actions = []
+        for entry in entries('mon'):
+            name, host = next(mon_hosts([entry]))
+            actions.append(Action('mon', host, name, entry))
+        for kind, colon_separated in (('mgr', mgr.colon_separated),
+                                      ('mds', mds.colon_separated),
+                                      ('rgw', rgw.colon_separated)):
+            for entry in entries(kind):
+                host, name = colon_separated(entry)
+                actions.append(Action(kind, host, name, entry))
+        if parser.has_section('osd'):
+            for host, devices in parser.items('osd'):
+                for device in devices.split():
+                    actions.append(Action('osd', host, device))
+        return cls(actions)
+
+    def hosts(self):
+        seen = []
+        for action in self.actions:
+            if action.host not in seen:
+                seen.append(action.host)
+        return seen
+
+
+class HostState(object):
+    """
+    What a host is missing from the spec, along with the names of every
+    daemon directory on it (which may include daemons the spec does not
+    know about).
+    """
+
+    def __init__(self, hostname, missing=None, directories=None):
+        self.hostname = hostname
+        self.missing = missing or []
+        self.directories = directories or {}
+
+
+def osd_devices(conn, cluster):
+    """
+    The data devices of the OSDs of ``cluster`` on a host, according to
+    ``ceph-volume lvm list``.
+    """
+    ceph_volume = conn.remote_module.which('ceph-volume')
+    if not ceph_volume:
+        return set()
+    out, err, code = remoto.process.check(
+        conn,
+        [ceph_volume, 'lvm', 'list', '--format', 'json'],
+    )
+    if code != 0 and any('No valid Ceph' in line for line in err):
+        return set()
+    if code != 0:
+        raise RuntimeError('ceph-volume lvm list failed on %s' % conn.hostname)
+    try:
+        listing = json.loads(''.join(out) or '{}')
+    except ValueError:
+        raise RuntimeError('unable to parse the output of ceph-volume lvm list on %s' % conn.hostname)
+    devices = set()
+    for volumes in listing.values():
+        for volume in volumes:
+            tags = volume.get('tags', {})
+            if tags.get('ceph.cluster_name', cluster) != cluster:
+                continue
+            if volume.get('type') in ('block', 'data'):
+                devices.update(volume.get('devices', []))
+    return devices
+
+
+def gather(args, spec, hostname):
+    """
+    Look up everything about ``hostname`` that ``spec`` cares about, in one
+    round trip plus ``ceph-volume`` for hosts that should have OSDs, and
+    return its :class:`HostState`.
+    """
+    actions = [action for action in spec.actions if action.host == hostname]
+    distro = hosts.get(hostname, username=args.username)
+    try:
+        batch = RemoteBatch(distro.conn, stop_on_error=False)
+        checks = []
+        for action in actions:
+            if action.kind == 'osd':
+                # the spec may use a /dev/disk/by-* link
+                checks.append(batch.get_realpath(action.name))
+            else:
+                checks.append(batch.path_exists(action.done_path(args.cluster)))
+        listings = [
+            (kind, batch.listdir('/var/lib/ceph/%s' % directory))
+            for kind, directory in KINDS
+        ]
+        batch.execute(raise_errors=False)
+
+        devices = set()
+        if any(action.kind == 'osd' for action in actions):
+            devices = osd_devices(distro.conn, args.cluster)
+    finally:
+        distro.conn.exit()
+
+    state = HostState(hostname)
+    prefix = '%s-' % args.cluster
+    for kind, call in listings:
+        state.directories[kind] = sorted(
+            name[len(prefix):] for name in call.value or [] if name.startswith(prefix)
+        )
+    for action, call in zip(actions, checks):
+        if action.kind == 'osd':
+            present = (call.value or action.name) in devices
+        else:
+            present = call.value
+        if not present:
+            state.missing.append(action)
+    return state
+
+
+def plan(args, spec):
+    """
+    Gather the state of every host in ``spec`` concurrently and return the
+    actions that are missing, in the order they have to run.
+    """
+    outcomes = parallel.run(
+        lambda hostname: gather(args, spec, hostname),
+        spec.hosts(),
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+    if errors:
+        raise exc.GenericError('Failed to gather the state of %d hosts' % errors)
+
+    missing = set()
+    for outcome in outcomes:
+        state = outcome.value
+        missing.update(state.missing)
+        wanted = dict(
+            (kind, set(a.name for a in spec.actions if a.host == state.hostname and a.kind == kind))
+            for kind, _ in KINDS
+        )
+        for kind, names in sorted(state.directories.items()):
+            # OSD directories are named after ids, not devices
+            if kind == 'osd':
+                continue
+            for name in names:
+                if name not in wanted[kind]:
+                    LOG.info('%s.%s on %s is not in the spec, leaving it alone', kind, name, state.hostname)
+
+    order = [kind for kind, _ in KINDS]
+    return sorted(
+        (action for action in spec.actions if action in missing),
+        key=lambda action: order.index(action.kind),
+    )
+
+
+def log_plan(actions):
+    if not actions:
+        LOG.info('the cluster matches the spec, nothing to do')
+        return
+    LOG.info('%d action%s needed:', len(actions), '' if len(actions) == 1 else 's')
+    for action in actions:
+        LOG.info('  %s', action)
+
+
+def run_osds(args, actions):
+    """
+    Create the missing OSDs with a single ``osd create --batch``, which
+    bootstraps every host once and creates hosts concurrently.
+    """
+    by_host = {}
+    for action in actions:
+        by_host.setdefault(action.host, []).append(action.name)
+    entries = [
+        '%s:%s' % (hostname, ','.join(devices))
+        for hostname, devices in sorted(by_host.items())
+    ]
+    osd_args = subcommand_args(osd.make, ['create', '--batch'] + entries, args)
+    osd_args.func(osd_args)
+
+
+def run_kind(args, kind, actions):
+    if kind == 'osd':
+        return run_osds(args, actions)
+    make = dict(mgr=mgr.make, mds=mds.make, rgw=rgw.make, mon=mon.make)[kind]
+    entries = [action.entry for action in actions]
+    kind_args = subcommand_args(make, ['create'] + entries, args)
+    kind_args.func(kind_args)
+
+
+def apply_actions(args, actions):
+    """
+    Create monitors first, then everything else at the same time since
+    managers, OSDs, metadata servers and gateways do not depend on each
+    other.
+    """
+    by_kind = {}
+    for action in actions:
+        by_kind.setdefault(action.kind, []).append(action)
+
+    if 'mon' in by_kind:
+        run_kind(args, 'mon', by_kind.pop('mon'))
+        bootstrap = '{cluster}.bootstrap-osd.keyring'.format(cluster=args.cluster)
+        if by_kind and not os.path.exists(bootstrap):
+            LOG.info('gathering keys from the new monitors')
+            hostnames = sorted(set(action.host for action in actions if action.kind == 'mon'))
+            keys_args = subcommand_args(gatherkeys.make, hostnames, args)
+            keys_args.func(keys_args)
+
+    outcomes = parallel.run(
+        lambda kind: run_kind(args, kind, by_kind[kind]),
+        [kind for kind, _ in KINDS if kind in by_kind],
+        workers=len(by_kind),
+        catch=(RuntimeError, exc.DeployError),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+    if errors:
+        raise exc.GenericError(
+            'Failed to create %s' % ', '.join(o.item for o in outcomes if o.failed)
+        )
+
+
+def spec_plan(args):
+    actions = plan(args, ClusterSpec.load(args.spec))
+    log_plan(actions)
+
+
+def spec_apply(args):
+    actions = plan(args, ClusterSpec.load(args.spec))
+    log_plan(actions)
+    if actions:
+        apply_actions(args, actions)
+        LOG.info('applied %d action%s', len(actions), '' if len(actions) == 1 else 's')
+
+
+@priority(15)
+def make_plan(parser):
+    """
+    Show what it takes to make the cluster match a spec file.
+    """
+    parser.add_argument(
+        'spec',
+        metavar='SPEC',
+        help='cluster spec file',
+        )
+    parser.set_defaults(
+        func=spec_plan,
+        )
+
+
+@priority(15)
+def make_apply(parser):
+    """
+    Create whatever the cluster is missing from a spec file.
+    """
+    parser.add_argument(
+        'spec',
+        metavar='SPEC',
+        help='cluster spec file',
+        )
+    parser.set_defaults(
+        func=spec_apply,
+        )
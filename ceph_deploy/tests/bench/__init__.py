@@ -0,0 +1,17 @@
+"""
+Benchmarks for ceph-deploy against simulated hosts, no SSH required.
+
+The real code path is exercised from the command line down to
+``ceph_deploy/hosts/remotes.py``: only the execnet gateway is replaced (see
+:mod:`ceph_deploy.tests.bench.backend`), with a configurable latency per
+round-trip. Run it with::
+
+    python -m ceph_deploy.tests.bench --hosts 1,10,100 --latency 5
+
+and use ``--output`` and ``--baseline`` to catch regressions in wall time,
+round-trips and bytes moved between runs.
+
+``--startup`` compares instead how long the command line takes to start with
+only the selected command imported and with every command imported, and how
+many times ``cephdeploy.conf`` is read and parsed before a command runs.
+"""
@@ -0,0 +1,147 @@
+import argparse
+import json
+import sys
+
+from ceph_deploy.tests.bench import backend, runner, scenarios, startup
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m ceph_deploy.tests.bench',
+        description='Benchmark ceph-deploy subcommands against simulated hosts',
+    )
+    parser.add_argument(
+        '--scenario',
+        action='append',
+        choices=[scenario.name for scenario in scenarios.scenarios],
+        help='scenario to run, can be repeated (default: all of them)',
+    )
+    parser.add_argument(
+        '--hosts',
+        default='1,10,100,1000',
+        help='comma separated numbers of hosts to run every scenario with (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0,
+        help='milliseconds injected on every round-trip (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--backend',
+        choices=sorted(backend.backends),
+        default='local',
+        help='where remote functions run (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--parallel',
+        type=int,
+        default=1,
+        help='value for the --parallel flag of ceph-deploy (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--image',
+        choices=['ubuntu', 'centos'],
+        default='ubuntu',
+        help='distribution of the simulated hosts (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--startup',
+        action='store_true',
+        help='compare the startup time of one command with loading every command, '
+             'and count the reads of cephdeploy.conf, instead of running the '
+             'scenarios unless --scenario is given',
+    )
+    parser.add_argument(
+        '--output',
+        metavar='FILE',
+        help='write the results as JSON to FILE',
+    )
+    parser.add_argument(
+        '--baseline',
+        metavar='FILE',
+        help='compare with results previously written with --output, and fail on regressions',
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.05,
+        help='allowed increase in round-trips and bytes against the baseline (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--time-tolerance',
+        type=float,
+        help='allowed increase in wall time against the baseline, not compared unless given',
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.startup:
+        timings = startup.measure()
+        print('startup: %.3fs with %s only, %.3fs with every command' % (
+            timings['selected'], timings['command'], timings['all']))
+        conf = startup.measure_conf()
+        print('cephdeploy.conf: %.3fs to set up %s, %d load%s in %.4fs, was %d loads in %.4fs' % (
+            conf['seconds'], conf['command'], conf['loads'], '' if conf['loads'] == 1 else 's',
+            conf['load_seconds'], conf['loads_before'], conf['load_seconds_before']))
+        if timings['selected'] >= timings['all']:
+            print('regression: loading one command is not faster than loading them all')
+            return 1
+        if conf['loads'] > 1:
+            print('regression: cephdeploy.conf is read more than once')
+            return 1
+        if not args.scenario:
+            return 0
+
+    counts = [int(count) for count in args.hosts.split(',')]
+    names = args.scenario or [scenario.name for scenario in scenarios.scenarios]
+
+    row = '%-12s %6s %10s %12s %9s %12s %12s'
+    print(row % ('scenario', 'hosts', 'seconds', 'round-trips', 'rt/host', 'sent', 'received'))
+    results = []
+    for name in names:
+        for count in counts:
+            result = runner.run(
+                scenarios.get(name),
+                count,
+                latency=args.latency / 1000.0,
+                backend=args.backend,
+                parallel=args.parallel,
+                image=args.image,
+            )
+            results.append(result)
+            print(row % (
+                name,
+                count,
+                '%.3f' % result['seconds'],
+                result['round_trips'],
+                result['round_trips_per_host'],
+                result['bytes_sent'],
+                result['bytes_received'],
+            ))
+            sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = runner.compare(
+            results,
+            baseline,
+            tolerance=args.tolerance,
+            time_tolerance=args.time_tolerance,
+        )
+        for regression in regressions:
+            print('regression: %s' % regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,469 @@
+"""
+Local stand-ins for remote hosts, plugged in where ``ceph_deploy.connection``
+creates ``remoto`` connections.
+
+Everything above the execnet gateway is the real thing: ``remoto`` sends
+``remotes.py`` calls through :class:`ModuleChannel` exactly as it would over
+SSH, and ``remoto.process.run``/``check`` go through ``Gateway.remote_exec``.
+Each gateway injects ``latency`` seconds per round-trip and counts trips
+and bytes (the ``repr`` size of what goes each way) in :class:`Stats`.
+
+Two backends are available:
+
+* ``local`` runs the ``remotes.py`` functions in-process, each host loading
+  its own copy against its :class:`~ceph_deploy.tests.bench.sandbox.Sandbox`.
+  This is what makes 1000 hosts practical.
+* ``subprocess`` runs them in a local Python interpreter per host, over a
+  real execnet ``popen`` gateway, so that serialization is exercised too.
+
+Commands are never executed, :class:`Simulator` answers them from a small
+model of the cluster (monitors that were started, OSDs that were created).
+"""
+import inspect
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+import types
+
+from ceph_deploy import connection
+from ceph_deploy.lib import remoto
+from ceph_deploy.tests.bench import sandbox
+
+
+class RemoteError(Exception):
+    """
+    Mimics ``execnet.RemoteError``: the message is the remote traceback, and
+    ``remoto`` only looks at its last line.
+    """
+
+    def __init__(self, formatted):
+        Exception.__init__(self, formatted)
+        self.formatted = formatted
+
+    def __str__(self):
+        return self.formatted
+
+
+class Stats(object):
+    """
+    Round-trips and bytes, per host.
+    """
+
+    fields = ('round_trips', 'bytes_sent', 'bytes_received')
+
+    def __init__(self):
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def add(self, host, **counts):
+        with self.lock:
+            stats = self.hosts.setdefault(host, dict.fromkeys(self.fields, 0))
+            for key, value in counts.items():
+                stats[key] += value
+
+    def total(self):
+        with self.lock:
+            totals = dict.fromkeys(self.fields, 0)
+            for stats in self.hosts.values():
+                for key in self.fields:
+                    totals[key] += stats[key]
+            return totals
+
+    def max(self, field):
+        with self.lock:
+            return max([stats[field] for stats in self.hosts.values()] or [0])
+
+
+class Cluster(object):
+    """
+    What the simulated cluster knows about itself.
+    """
+
+    def __init__(self):
+        self.mons = []
+        self.osds = 0
+        self.lock = threading.Lock()
+
+    def add_mon(self, name, address):
+        with self.lock:
+            if name not in [mon['name'] for mon in self.mons]:
+                self.mons.append({
+                    'rank': len(self.mons),
+                    'name': name,
+                    'addr': '%s:6789/0' % address,
+                })
+
+    def add_osd(self):
+        with self.lock:
+            self.osds += 1
+
+    def mon_status(self, name):
+        with self.lock:
+            rank = [mon['rank'] for mon in self.mons if mon['name'] == name]
+            return {
+                'name': name,
+                'rank': rank[0] if rank else -1,
+                'state': 'leader' if rank == [0] else 'peon',
+                'election_epoch': 1,
+                'quorum': [mon['rank'] for mon in self.mons],
+                'monmap': {
+                    'epoch': 1,
+                    'mons': list(self.mons),
+                },
+            }
+
+    def osd_stat(self):
+        with self.lock:
+            return {
+                'epoch': self.osds + 1,
+                'num_osds': self.osds,
+                'num_up_osds': self.osds,
+                'num_in_osds': self.osds,
+                'full': 'false',
+                'nearfull': 'false',
+            }
+
+
+class Simulator(object):
+    """
+    Answer the commands that depend on the whole cluster, and leave the rest
+    to the host's sandbox.
+    """
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+    def run(self, box, command):
+        command = [str(part) for part in command]
+        executable = os.path.basename(command[0]) if command else ''
+
+        if executable == 'ceph' and 'mon_status' in command:
+            return json.dumps(self.cluster.mon_status(box.hostname)), '', 0
+
+        if executable == 'ceph' and command[-3:-1] == ['osd', 'stat']:
+            return json.dumps(self.cluster.osd_stat()), '', 0
+
+        if executable == 'systemctl' and command[1:2] == ['start']:
+            if command[2].startswith('ceph-mon@'):
+                self.cluster.add_mon(command[2][len('ceph-mon@'):], box.address)
+
+        if executable == 'ceph-volume' and 'create' in command:
+            self.cluster.add_osd()
+
+        return box.run(command)
+
+
+class Channel(object):
+    """
+    A channel that answers with a fixed list of ``items``, optionally
+    followed by ``error``, and then ``EOFError``. The first ``receive()``
+    waits for the round-trip.
+    """
+
+    def __init__(self, gateway, items, error=None):
+        self.gateway = gateway
+        self.items = list(items)
+        self.error = error
+        self.waited = False
+
+    def receive(self, timeout=None):
+        if not self.waited:
+            self.waited = True
+            self.gateway.round_trip()
+        if self.items:
+            item = self.items.pop(0)
+            self.gateway.received(item)
+            return item
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        raise EOFError()
+
+
+class ModuleChannel(object):
+    """
+    The channel ``remoto`` talks to after ``import_module(remotes)``: every
+    ``send()`` is evaluated in the host's copy of the module and the reply is
+    picked up by the next ``receive()``. Like with execnet, an exception
+    closes the channel.
+    """
+
+    def __init__(self, gateway, namespace):
+        self.gateway = gateway
+        self.namespace = namespace
+        self.closed = False
+        self.replies = []
+
+    def send(self, item):
+        if self.closed:
+            raise IOError('cannot send to %r' % self)
+        self.gateway.sent(item)
+        try:
+            self.replies.append((eval(item, self.namespace), None))
+        except Exception:
+            self.closed = True
+            self.replies.append((None, RemoteError(traceback.format_exc())))
+
+    def receive(self, timeout=None):
+        self.gateway.round_trip()
+        value, error = self.replies.pop(0)
+        if error is not None:
+            raise error
+        self.gateway.received(value)
+        return value
+
+    def __repr__(self):
+        return '<ModuleChannel %s%s>' % (
+            self.gateway.hostname, ' closed' if self.closed else '')
+
+
+class Gateway(object):
+    """
+    Stands in for an execnet gateway to ``hostname``, running everything
+    in-process.
+    """
+
+    def __init__(self, backend, hostname):
+        self.backend = backend
+        self.hostname = hostname
+        self.sandbox = backend.sandbox(hostname)
+        self.closed = False
+
+    def round_trip(self):
+        self.backend.stats.add(self.hostname, round_trips=1)
+        if self.backend.latency:
+            time.sleep(self.backend.latency)
+
+    def sent(self, item):
+        self.backend.stats.add(self.hostname, bytes_sent=len(repr(item)))
+
+    def received(self, item):
+        self.backend.stats.add(self.hostname, bytes_received=len(repr(item)))
+
+    def remote_exec(self, source, **kw):
+        if isinstance(source, types.ModuleType):
+            self.sent(inspect.getsource(source))
+            return self.module_channel(source)
+
+        if isinstance(source, str) and 'os.environ' in source:
+            # ``remoto.process`` asking for the remote environment
+            self.sent(source)
+            return Channel(self, [{'PATH': '/usr/bin:/bin', 'HOME': '/root'}])
+
+        name = getattr(source, '__name__', None)
+        if name in ('_remote_run', '_remote_check'):
+            self.sent(inspect.getsource(source))
+            self.sent(kw)
+            stdout, stderr, code = self.backend.simulator.run(self.sandbox, kw['cmd'])
+            if name == '_remote_check':
+                return Channel(self, [(stdout.splitlines(), stderr.splitlines(), code)])
+            items = [{'debug': line} for line in stdout.splitlines()]
+            items += [{'warning': line} for line in stderr.splitlines()]
+            error = None
+            if code != 0:
+                message = 'command returned non-zero exit status: %s' % code
+                if kw.get('stop_on_nonzero', True):
+                    error = RemoteError(
+                        'Traceback (most recent call last):\n'
+                        'RuntimeError: %s' % message
+                    )
+                else:
+                    items.append({'warning': message})
+            return Channel(self, items, error)
+
+        raise NotImplementedError('cannot simulate remote_exec of %r' % (source,))
+
+    def module_channel(self, module):
+        namespace = self.sandbox.load(inspect.getsource(module))
+        namespace['subprocess'] = _SimulatedSubprocess(self)
+        return ModuleChannel(self, namespace)
+
+    def hasreceiver(self):
+        return not self.closed
+
+    def reconfigure(self, **kw):
+        pass
+
+    def terminate(self, timeout=None):
+        self.closed = True
+
+
+class _SimulatedSubprocess(object):
+    # commands started from ``remotes.py`` also go through the simulator
+
+    PIPE = -1
+    STDOUT = -2
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def Popen(self, command, *a, **kw):
+        gateway = self.gateway
+        return sandbox._Process(*gateway.backend.simulator.run(gateway.sandbox, command))
+
+
+class CountingChannel(object):
+    """
+    Wrap a real execnet channel to inject latency and count what goes
+    through it.
+    """
+
+    def __init__(self, gateway, channel):
+        self.gateway = gateway
+        self.channel = channel
+
+    def send(self, item):
+        self.gateway.sent(item)
+        self.channel.send(item)
+
+    def receive(self, timeout=None):
+        self.gateway.round_trip()
+        value = self.channel.receive(timeout)
+        self.gateway.received(value)
+        return value
+
+
+class SubprocessGateway(Gateway):
+    """
+    Like :class:`Gateway`, but ``remotes.py`` runs in a local Python
+    interpreter behind a real execnet ``popen`` gateway.
+    """
+
+    def __init__(self, backend, hostname):
+        Gateway.__init__(self, backend, hostname)
+        self.gateway = None
+
+    def module_channel(self, module):
+        import execnet
+        if self.gateway is None:
+            self.gateway = execnet.makegateway('popen//python=%s' % sys.executable)
+        channel = self.gateway.remote_exec(inspect.getsource(sandbox))
+        channel.send({
+            'sandbox': {
+                'root': self.sandbox.root,
+                'hostname': self.sandbox.hostname,
+                'address': self.sandbox.address,
+                'image': self.sandbox.image,
+            },
+            'source': inspect.getsource(module),
+        })
+        return CountingChannel(self, channel)
+
+    def terminate(self, timeout=None):
+        Gateway.terminate(self, timeout)
+        if self.gateway is not None:
+            self.gateway.exit()
+            self.gateway = None
+
+
+class Connection(remoto.Connection):
+    """
+    A ``remoto`` connection whose gateway is simulated.
+    """
+
+    def __init__(self, gateway, logger=None, threads=1, detect_sudo=False):
+        super(Connection, self).__init__(
+            gateway.hostname,
+            logger=logger,
+            threads=threads,
+            eager=False,
+        )
+        self.gateway = gateway
+        self.group = gateway
+
+
+class Backend(object):
+    """
+    A set of simulated hosts, each with its own sandbox under ``root``.
+    Use :meth:`installed` to have ceph-deploy connect to them.
+    """
+
+    gateway_class = Gateway
+
+    def __init__(self, root, latency=0, image='ubuntu'):
+        self.root = root
+        self.latency = latency
+        self.image = image
+        self.stats = Stats()
+        self.cluster = Cluster()
+        self.simulator = Simulator(self.cluster)
+        self.addresses = {}
+        self.sandboxes = {}
+        self.lock = threading.Lock()
+
+    def add_hosts(self, hostnames):
+        for hostname in hostnames:
+            self.address(hostname)
+
+    def address(self, hostname):
+        with self.lock:
+            if hostname not in self.addresses:
+                index = len(self.addresses) + 1
+                self.addresses[hostname] = '10.0.%d.%d' % (index // 250, index % 250 + 1)
+            return self.addresses[hostname]
+
+    def sandbox(self, hostname):
+        hostname = hostname.split('@')[-1]
+        address = self.address(hostname)
+        with self.lock:
+            if hostname not in self.sandboxes:
+                box = sandbox.Sandbox(
+                    os.path.join(self.root, hostname),
+                    hostname,
+                    address=address,
+                    image=self.image,
+                )
+                box.populate()
+                self.sandboxes[hostname] = box
+            return self.sandboxes[hostname]
+
+    def connect(self, hostname, logger=None, threads=1, detect_sudo=False):
+        gateway = self.gateway_class(self, hostname.split('@')[-1])
+        return Connection(gateway, logger=logger, threads=threads)
+
+    def getaddrinfo(self, original):
+        def getaddrinfo(host, port, *a, **kw):
+            if host not in self.addresses:
+                return original(host, port, *a, **kw)
+            flags = a[3] if len(a) > 3 else kw.get('flags', 0)
+            if flags & socket.AI_NUMERICHOST:
+                raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+            return [(
+                socket.AF_INET,
+                socket.SOCK_STREAM,
+                socket.IPPROTO_TCP,
+                '',
+                (self.addresses[host], port or 0),
+            )]
+        return getaddrinfo
+
+    def install(self):
+        """
+        Route new connections and name lookups for the simulated hosts to
+        this backend. Returns a callable that undoes it.
+        """
+        original_connection = connection.remoto.Connection
+        original_getaddrinfo = socket.getaddrinfo
+        connection.remoto.Connection = self.connect
+        socket.getaddrinfo = self.getaddrinfo(original_getaddrinfo)
+
+        def uninstall():
+            connection.remoto.Connection = original_connection
+            socket.getaddrinfo = original_getaddrinfo
+            connection.pool.close()
+        return uninstall
+
+
+class SubprocessBackend(Backend):
+
+    gateway_class = SubprocessGateway
+
+
+backends = {
+    'local': Backend,
+    'subprocess': SubprocessBackend,
+}
@@ -0,0 +1,123 @@
+"""
+Run a scenario against simulated hosts and compare results with a baseline.
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from ceph_deploy import cli
+from ceph_deploy.tests.bench import backend as backends
+
+
+def host_names(count):
+    return ['node%04d' % number for number in range(1, count + 1)]
+
+
+def run(scenario, count, latency=0, backend='local', parallel=1, image='ubuntu'):
+    """
+    Run every ``ceph-deploy`` invocation of ``scenario`` against ``count``
+    fresh simulated hosts and return the wall time and what went over the
+    wire. Failures are raised just like they would be from the command line.
+    """
+    workdir = tempfile.mkdtemp(prefix='ceph-deploy-bench-')
+    hosts = host_names(count)
+    remote = backends.backends[backend](
+        os.path.join(workdir, 'hosts'),
+        latency=latency,
+        image=image,
+    )
+    remote.add_hosts(hosts)
+
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+    level = root_logger.level
+    argv = sys.argv
+    cwd = os.getcwd()
+    deploy_dir = os.path.join(workdir, 'deploy')
+    os.mkdir(deploy_dir)
+    os.chdir(deploy_dir)
+    uninstall = remote.install()
+    try:
+        scenario.setup(remote, hosts)
+        started = time.time()
+        for command in scenario.commands(hosts):
+            # hosts are fresh every run, never reuse facts cached by another
+            command = ['--quiet', '--parallel', str(parallel), '--facts-ttl', '0'] + command
+            sys.argv = ['ceph-deploy'] + command
+            try:
+                cli._main(args=command)
+            finally:
+                # every invocation sets up its own console and file logging
+                for handler in root_logger.handlers[:]:
+                    if handler not in handlers:
+                        root_logger.removeHandler(handler)
+                        handler.close()
+                root_logger.setLevel(level)
+        seconds = time.time() - started
+    finally:
+        uninstall()
+        sys.argv = argv
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'scenario': scenario.name,
+        'hosts': count,
+        'backend': backend,
+        'latency': latency,
+        'parallel': parallel,
+        'seconds': round(seconds, 3),
+        'round_trips_per_host': remote.stats.max('round_trips'),
+    }
+    result.update(remote.stats.total())
+    return result
+
+
+def key(result):
+    return (
+        result['scenario'],
+        result['hosts'],
+        result['backend'],
+        result['latency'],
+        result['parallel'],
+    )
+
+
+def compare(results, baseline, tolerance=0.05, time_tolerance=None):
+    """
+    Return a message for every metric in ``results`` that got worse than in
+    ``baseline`` by more than ``tolerance`` (a fraction). Round-trips and
+    bytes are deterministic, wall time is only compared when
+    ``time_tolerance`` is given since it depends on the machine.
+    """
+    metrics = [
+        ('round_trips', tolerance),
+        ('round_trips_per_host', tolerance),
+        ('bytes_sent', tolerance),
+        ('bytes_received', tolerance),
+    ]
+    if time_tolerance is not None:
+        metrics.append(('seconds', time_tolerance))
+    previous = dict((key(result), result) for result in baseline)
+    regressions = []
+    for result in results:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        for metric, allowed in metrics:
+            if metric not in before:
+                continue
+            if result[metric] > before[metric] * (1 + allowed):
+                regressions.append(
+                    '%s with %d hosts: %s went from %s to %s' % (
+                        result['scenario'],
+                        result['hosts'],
+                        metric,
+                        before[metric],
+                        result[metric],
+                    )
+                )
+    return regressions
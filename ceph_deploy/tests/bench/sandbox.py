@@ -0,0 +1,433 @@
+"""
+A throw-away directory standing in for the root filesystem of a simulated
+host, and the shims that make the functions in ``ceph_deploy/hosts/remotes.py``
+run against it: ``os``, ``open``, ``shutil``, ``tempfile`` and ``configparser``
+map absolute paths into the sandbox, ``socket.gethostname()`` reports the simulated host
+and ``subprocess`` asks :meth:`Sandbox.run` instead of executing anything.
+
+Only the standard library may be used here: the subprocess backend ships the
+source of this module to a local interpreter, where the channel loop at the
+bottom loads ``remotes.py`` into a sandbox just like ``remoto`` would on a real
+host.
+"""
+import os
+import shutil
+import tempfile
+
+
+IMAGES = {
+    'ubuntu': (
+        'NAME="Ubuntu"\n'
+        'VERSION="18.04.5 LTS (Bionic Beaver)"\n'
+        'ID=ubuntu\n'
+        'VERSION_ID="18.04"\n'
+        'UBUNTU_CODENAME=bionic\n'
+    ),
+    'centos': (
+        'NAME="CentOS Linux"\n'
+        'VERSION="7 (Core)"\n'
+        'ID="centos"\n'
+        'VERSION_ID="7"\n'
+    ),
+}
+
+# every sandbox starts out as a host with the ceph packages installed
+directories = (
+    '/etc/apt/preferences.d',
+    '/etc/apt/sources.list.d',
+    '/etc/ceph',
+    '/etc/yum.repos.d',
+    '/etc/yum/pluginconf.d',
+    '/proc/1',
+    '/root',
+    '/tmp',
+    '/var/lib/ceph/bootstrap-mds',
+    '/var/lib/ceph/bootstrap-mgr',
+    '/var/lib/ceph/bootstrap-osd',
+    '/var/lib/ceph/bootstrap-rgw',
+    '/var/lib/ceph/mds',
+    '/var/lib/ceph/mgr',
+    '/var/lib/ceph/mon',
+    '/var/lib/ceph/osd',
+    '/var/lib/ceph/radosgw',
+    '/var/lib/ceph/tmp',
+    '/var/lib/packages',
+    '/var/run/ceph',
+)
+
+executables = (
+    '/bin/systemctl',
+    '/sbin/ip',
+    '/usr/bin/apt-get',
+    '/usr/bin/ceph',
+    '/usr/bin/ceph-mon',
+    '/usr/bin/ceph-volume',
+    '/usr/bin/rpm',
+    '/usr/bin/wget',
+    '/usr/bin/yum',
+)
+
+_compiled = {}
+
+package_version = '14.2.22'
+
+version = 'ceph version %s (ca74598065096e6fcbd8433c8779a2be0c889351) nautilus (stable)' % package_version
+
+
+class Sandbox(object):
+    """
+    The filesystem and identity of one simulated host, kept under ``root``.
+    """
+
+    def __init__(self, root, hostname, address='10.0.0.1', image='ubuntu'):
+        self.root = os.path.abspath(root)
+        self.hostname = hostname
+        self.address = address
+        self.image = image
+
+    def path(self, path):
+        """
+        Map a path on the simulated host to the local filesystem. Relative
+        paths are relative to the home directory of the remote user, and
+        paths that are already in the sandbox are left alone.
+        """
+        path = str(path)
+        if path == self.root or path.startswith(self.root + os.sep):
+            return path
+        if not os.path.isabs(path):
+            path = os.path.join('/root', path)
+        return os.path.join(self.root, path.lstrip(os.sep))
+
+    def unroot(self, path):
+        if path == self.root:
+            return os.sep
+        if path.startswith(self.root + os.sep):
+            return path[len(self.root):]
+        return path
+
+    def populate(self):
+        if os.path.isdir(self.path('/etc')):
+            return
+        for directory in directories:
+            os.makedirs(self.path(directory))
+        for executable in executables:
+            parent = os.path.dirname(self.path(executable))
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            with open(self.path(executable), 'w'):
+                pass
+            os.chmod(self.path(executable), 0o755)
+        with open(self.path('/etc/os-release'), 'w') as f:
+            f.write(IMAGES[self.image])
+        with open(self.path('/proc/1/comm'), 'w') as f:
+            f.write('systemd\n')
+        if self.image == 'centos':
+            with open(self.path('/etc/yum/pluginconf.d/priorities.conf'), 'w') as f:
+                f.write('[main]\nenabled = 1\n')
+
+    def load(self, source):
+        """
+        Execute the source of ``remotes.py`` and return its namespace, with
+        everything that would touch the local machine redirected to the
+        sandbox.
+        """
+        if source not in _compiled:
+            _compiled[source] = compile(source, 'remotes.py', 'exec')
+        namespace = {'__name__': 'remotes'}
+        exec(_compiled[source], namespace)
+        namespace.update(
+            configparser=_ConfigParserModule(self),
+            os=_OS(self),
+            open=_open(self),
+            platform=_Platform(),
+            shutil=_Shutil(self),
+            socket=_Socket(self),
+            subprocess=_Subprocess(self),
+            tempfile=_Tempfile(self),
+        )
+        return namespace
+
+    def cluster(self):
+        """
+        Name of the cluster configured on this host, ``ceph`` by default.
+        """
+        confs = sorted(os.listdir(self.path('/etc/ceph')))
+        for name in confs:
+            if name.endswith('.conf'):
+                return name[:-len('.conf')]
+        return 'ceph'
+
+    def install(self, arguments):
+        """
+        Record the packages in the ``arguments`` of an install command as
+        installed, skipping flags (and the values of ``-o``) and package files.
+        """
+        skip = False
+        for argument in arguments:
+            if skip or argument.startswith('-') or '/' in argument:
+                skip = argument == '-o'
+                continue
+            with open(self.path('/var/lib/packages/%s' % argument), 'w'):
+                pass
+
+    def installed(self, names):
+        return [
+            name for name in names
+            if os.path.exists(self.path('/var/lib/packages/%s' % name))
+        ]
+
+    def run(self, command):
+        """
+        Pretend to run ``command`` on this host and return its stdout, stderr
+        and exit status. Anything that is not known succeeds silently.
+        """
+        command = [str(part) for part in command]
+        executable = os.path.basename(command[0]) if command else ''
+
+        if executable == 'ip' and 'link' in command:
+            return (
+                '1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 state UNKNOWN\n'
+                '    link/loopback 00:00:00:00:00:00 brd 00:00:00:00:00:00\n'
+                '2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 state UP\n'
+                '    link/ether 52:54:00:12:34:56 brd ff:ff:ff:ff:ff:ff\n'
+            ), '', 0
+
+        if executable == 'ip' and 'addr' in command:
+            return (
+                '1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 state UNKNOWN\n'
+                '    inet 127.0.0.1/8 scope host lo\n'
+                '2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 state UP\n'
+                '    inet %s/16 brd 10.0.255.255 scope global eth0\n'
+            ) % self.address, '', 0
+
+        if executable == 'ceph' and '--version' in command:
+            return version + '\n', '', 0
+
+        if executable in ('yum', 'dnf') and 'shell' in command:
+            # run the install lines of a transaction script
+            with open(self.path(command[-1])) as f:
+                for line in f:
+                    if line.startswith('install '):
+                        self.run([executable, '-y'] + line.split())
+
+        if 'install' in command and ('apt-get' in command or executable in ('yum', 'dnf')):
+            self.install(command[command.index('install') + 1:])
+
+        if executable == 'dpkg-query':
+            return ''.join(
+                '%s %s-1bionic ii \n' % (name, package_version)
+                for name in self.installed(command[4:])
+            ), '', 0
+
+        if executable == 'rpm' and command[1:2] == ['-q']:
+            return ''.join(
+                '%s %s-0.el7\n' % (name, package_version)
+                for name in self.installed(command[4:])
+            ), '', 0
+
+        if executable == 'yum' and 'install' in command:
+            # the ceph-release package brings the repo file along
+            for part in command:
+                if part.endswith('.rpm') and 'ceph-release' in part:
+                    baseurl = part.split('noarch/')[0]
+                    with open(self.path('/etc/yum.repos.d/ceph.repo'), 'w') as f:
+                        for section in ('Ceph', 'Ceph-noarch', 'ceph-source'):
+                            f.write('[%s]\nname=%s\nbaseurl=%s\nenabled=1\n\n' % (
+                                section, section, baseurl))
+
+        if executable == 'systemctl' and command[1:2] == ['start']:
+            # starting a monitor brings up its admin socket
+            unit = command[2]
+            if unit.startswith('ceph-mon@'):
+                asok = '/var/run/ceph/%s-mon.%s.asok' % (
+                    self.cluster(),
+                    unit[len('ceph-mon@'):],
+                )
+                with open(self.path(asok), 'w'):
+                    pass
+
+        return '', '', 0
+
+
+class _Path(object):
+
+    def __init__(self, sandbox):
+        self._sandbox = sandbox
+
+    def __getattr__(self, name):
+        return getattr(os.path, name)
+
+    def exists(self, path):
+        return os.path.exists(self._sandbox.path(path))
+
+    def lexists(self, path):
+        return os.path.lexists(self._sandbox.path(path))
+
+    def isdir(self, path):
+        return os.path.isdir(self._sandbox.path(path))
+
+    def isfile(self, path):
+        return os.path.isfile(self._sandbox.path(path))
+
+    def islink(self, path):
+        return os.path.islink(self._sandbox.path(path))
+
+    def realpath(self, path):
+        return self._sandbox.unroot(os.path.realpath(self._sandbox.path(path)))
+
+
+class _OS(object):
+
+    rooted = (
+        'access', 'chmod', 'chown', 'listdir', 'lstat', 'makedirs', 'mkdir',
+        'open', 'remove', 'rmdir', 'stat', 'unlink',
+    )
+
+    def __init__(self, sandbox):
+        self._sandbox = sandbox
+        self.path = _Path(sandbox)
+
+    def __getattr__(self, name):
+        attr = getattr(os, name)
+        if name not in self.rooted:
+            return attr
+
+        def rooted(path, *a, **kw):
+            return attr(self._sandbox.path(path), *a, **kw)
+        return rooted
+
+    def rename(self, src, dst):
+        return os.rename(self._sandbox.path(src), self._sandbox.path(dst))
+
+    def walk(self, top, *a, **kw):
+        for root, dirs, files in os.walk(self._sandbox.path(top), *a, **kw):
+            yield self._sandbox.unroot(root), dirs, files
+
+
+def _open(sandbox):
+    def rooted_open(path, *a, **kw):
+        return open(sandbox.path(path), *a, **kw)
+    return rooted_open
+
+
+class _Shutil(object):
+
+    def __init__(self, sandbox):
+        self._sandbox = sandbox
+
+    def __getattr__(self, name):
+        return getattr(shutil, name)
+
+    def move(self, src, dst):
+        return shutil.move(self._sandbox.path(src), self._sandbox.path(dst))
+
+    def copy(self, src, dst):
+        return shutil.copy(self._sandbox.path(src), self._sandbox.path(dst))
+
+    def rmtree(self, path, *a, **kw):
+        return shutil.rmtree(self._sandbox.path(path), *a, **kw)
+
+
+class _Tempfile(object):
+
+    def __init__(self, sandbox):
+        self._sandbox = sandbox
+
+    def __getattr__(self, name):
+        return getattr(tempfile, name)
+
+    def NamedTemporaryFile(self, *a, **kw):
+        kw['dir'] = self._sandbox.path(kw.get('dir') or '/tmp')
+        return tempfile.NamedTemporaryFile(*a, **kw)
+
+    def mkstemp(self, *a, **kw):
+        kw['dir'] = self._sandbox.path(kw.get('dir') or '/tmp')
+        fd, path = tempfile.mkstemp(*a, **kw)
+        return fd, self._sandbox.unroot(path)
+
+
+class _Socket(object):
+
+    def __init__(self, sandbox):
+        self._sandbox = sandbox
+
+    def __getattr__(self, name):
+        import socket
+        return getattr(socket, name)
+
+    def gethostname(self):
+        return self._sandbox.hostname
+
+    def getfqdn(self, name=''):
+        return name or self._sandbox.hostname
+
+
+class _ConfigParserModule(object):
+
+    def __init__(self, sandbox):
+        try:
+            import configparser
+        except ImportError:
+            import ConfigParser as configparser
+        self._module = configparser
+        self._sandbox = sandbox
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+    def ConfigParser(self, *a, **kw):
+        parser = self._module.ConfigParser(*a, **kw)
+        read = parser.read
+
+        def rooted_read(filenames, *a, **kw):
+            if isinstance(filenames, str):
+                filenames = [filenames]
+            return read([self._sandbox.path(name) for name in filenames], *a, **kw)
+        parser.read = rooted_read
+        return parser
+
+
+class _Platform(object):
+    # no ``linux_distribution``, like Python 3.8 and newer, so that the
+    # sandbox's /etc/os-release is used
+
+    def machine(self):
+        return 'x86_64'
+
+    def system(self):
+        return 'Linux'
+
+
+class _Subprocess(object):
+
+    PIPE = -1
+    STDOUT = -2
+
+    def __init__(self, sandbox):
+        self._sandbox = sandbox
+
+    def Popen(self, command, *a, **kw):
+        return _Process(*self._sandbox.run(command))
+
+
+class _Process(object):
+
+    def __init__(self, stdout, stderr, returncode):
+        self.stdout = stdout.encode('utf-8')
+        self.stderr = stderr.encode('utf-8')
+        self.returncode = returncode
+
+    def communicate(self, input=None):
+        return self.stdout, self.stderr
+
+    def wait(self):
+        return self.returncode
+
+
+# the subprocess backend runs this module on the other end of an execnet
+# channel, the first message configures the sandbox
+if __name__ == '__channelexec__':
+    config = channel.receive()  # noqa
+    namespace = Sandbox(**config['sandbox']).load(config['source'])
+    for item in channel:  # noqa
+        channel.send(eval(item, namespace))  # noqa
@@ -0,0 +1,86 @@
+"""
+The subcommands that are benchmarked, as the ``ceph-deploy`` invocations
+needed to run each against a list of hosts, and the files they expect to find
+in the working directory.
+"""
+from ceph_deploy.new import generate_auth_key
+
+
+class Scenario(object):
+
+    def __init__(self, name, commands, needs_cluster=True):
+        self.name = name
+        self.commands = commands
+        self.needs_cluster = needs_cluster
+
+    def setup(self, backend, hosts):
+        """
+        Write what ``new`` and ``gatherkeys`` would have left behind, in the
+        current working directory.
+        """
+        if not self.needs_cluster:
+            return
+        with open('ceph.conf', 'w') as f:
+            f.write(
+                '[global]\n'
+                'fsid = 7bd0a6f2-3f8a-4e4a-9fa1-5b1c1b5e1d2a\n'
+                'mon initial members = %s\n'
+                'mon host = %s\n'
+                'auth cluster required = cephx\n'
+                'auth service required = cephx\n'
+                'auth client required = cephx\n' % (
+                    ', '.join(hosts),
+                    ','.join(backend.address(host) for host in hosts),
+                )
+            )
+        keyrings = {
+            'ceph.mon.keyring': ('mon.', 'caps mon = allow *\n'),
+            'ceph.client.admin.keyring': ('client.admin', 'caps mon = allow *\n'),
+            'ceph.bootstrap-osd.keyring': ('client.bootstrap-osd', 'caps mon = allow profile bootstrap-osd\n'),
+        }
+        for path, (entity, caps) in keyrings.items():
+            with open(path, 'w') as f:
+                f.write('[%s]\nkey = %s\n%s' % (entity, generate_auth_key(), caps))
+
+
+scenarios = [
+    Scenario(
+        'new',
+        lambda hosts: [['new'] + hosts],
+        needs_cluster=False,
+    ),
+    Scenario(
+        'install',
+        lambda hosts: [['install'] + hosts],
+    ),
+    Scenario(
+        # the second install finds the package metadata up to date
+        'install again',
+        lambda hosts: [['install'] + hosts] * 2,
+    ),
+    Scenario(
+        'mon create',
+        lambda hosts: [['mon', 'create'] + hosts],
+    ),
+    Scenario(
+        # one invocation per host, as ``osd create`` takes a single host
+        'osd create',
+        lambda hosts: [['osd', 'create', '--data', '/dev/sdb', host] for host in hosts],
+    ),
+    Scenario(
+        'admin',
+        lambda hosts: [['admin'] + hosts],
+    ),
+    Scenario(
+        # the second push finds every host up to date
+        'config push',
+        lambda hosts: [['config', 'push'] + hosts] * 2,
+    ),
+]
+
+
+def get(name):
+    for scenario in scenarios:
+        if scenario.name == name:
+            return scenario
+    raise KeyError(name)
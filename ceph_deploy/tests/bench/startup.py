@@ -0,0 +1,109 @@
+"""
+How long ``ceph-deploy`` takes to build its parser in a fresh interpreter
+when only the selected command is imported, compared to importing every
+command, and how often it reads and parses ``cephdeploy.conf`` on the way to
+running a command compared to once for every command plus once for the
+overrides.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def startup(argv, repeat=3):
+    """
+    The fastest of ``repeat`` runs of building the parser for ``argv``, where
+    ``None`` builds it with every command.
+    """
+    code = 'from ceph_deploy import cli; cli.get_parser(%r)' % (argv,)
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code])
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def measure(command='forgetkeys', repeat=3):
+    return {
+        'command': command,
+        'selected': startup([command], repeat),
+        'all': startup(None, repeat),
+    }
+
+
+def conf_loading(argv):
+    """
+    Build the parser for ``argv``, apply the ``cephdeploy.conf`` overrides and
+    look at the repositories in it the way ``install`` does, counting and
+    timing the calls to :func:`~ceph_deploy.conf.cephdeploy.load`. The same
+    number of loads the parser used to do (one per command and one for the
+    overrides) is then timed for comparison.
+    """
+    from ceph_deploy import cli
+    from ceph_deploy.conf import cephdeploy
+
+    load = cephdeploy.load
+    calls = []
+
+    def timed_load():
+        start = time.time()
+        try:
+            return load()
+        finally:
+            calls.append(time.time() - start)
+
+    cephdeploy.load = timed_load
+    try:
+        start = time.time()
+        args = cli.get_parser(argv).parse_args(argv)
+        cephdeploy.set_overrides(args)
+        args.cd_conf.get_repos()
+        seconds = time.time() - start
+    finally:
+        cephdeploy.load = load
+
+    before = len(cli.command_entry_points()) + 1
+    start = time.time()
+    for _ in range(before):
+        load()
+    return {
+        'seconds': seconds,
+        'loads': len(calls),
+        'load_seconds': sum(calls),
+        'loads_before': before,
+        'load_seconds_before': time.time() - start,
+    }
+
+
+def measure_conf(argv=('install', 'node1'), repeat=3):
+    """
+    The fastest of ``repeat`` runs of :func:`conf_loading` in a fresh
+    interpreter, reading the stub ``cephdeploy.conf`` from a scratch directory
+    so that ``$HOME`` is left alone.
+    """
+    from ceph_deploy.conf import cephdeploy
+
+    code = (
+        'import json; from ceph_deploy.tests.bench import startup; '
+        'print(json.dumps(startup.conf_loading(%r)))' % (list(argv),)
+    )
+    # the test suite setting skips the configuration file altogether
+    env = dict(os.environ)
+    env.pop('CEPH_DEPLOY_TEST', None)
+    scratch = tempfile.mkdtemp(prefix='ceph-deploy-bench-')
+    try:
+        cephdeploy.create_stub(os.path.join(scratch, 'cephdeploy.conf'))
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.check_output([sys.executable, '-c', code], cwd=scratch, env=env)
+            runs.append(json.loads(out.decode('utf-8').strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(scratch)
+    fastest = min(runs, key=lambda run: run['seconds'])
+    fastest['command'] = ' '.join(argv)
+    return fastest
@@ -86,6 +86,17 @@ class CLITester(object):
         return CLIProcess(**kw)
 
 
+@pytest.fixture(autouse=True)
+def facts_cache(tmpdir_factory, monkeypatch):
+    """
+    Keep the host facts that a test caches out of ~/.cache and away from
+    every other test.
+    """
+    from ceph_deploy.hosts import facts
+    monkeypatch.setattr(facts, 'default_path', str(tmpdir_factory.mktemp('facts')))
+    monkeypatch.setattr(facts, 'cache', facts.FactCache())
+
+
 @pytest.fixture
 def cli(request, tmpdir):
     """
@@ -0,0 +1,46 @@
+import pytest
+
+from ceph_deploy.cli import get_parser
+from ceph_deploy.util import pkg_cache
+
+
+class TestParserCache(object):
+
+    def setup(self):
+        self.parser = get_parser()
+
+    def test_cache_subcommand_required(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('cache'.split())
+
+    def test_cache_invalid_subcommand(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('cache bork'.split())
+        out, err = capsys.readouterr()
+        assert 'invalid choice' in err
+
+    def test_cache_serve_defaults(self):
+        args = self.parser.parse_args('cache serve'.split())
+        assert args.bind is None
+        assert args.port == pkg_cache.default_port
+        assert args.cache_dir == pkg_cache.default_path
+        assert args.metadata_ttl == 300
+        assert args.max_size == 4096
+        assert args.upstream is None
+        assert args.repo_url is None
+
+    def test_cache_serve_upstreams(self):
+        args = self.parser.parse_args(
+            'cache serve --upstream mirror.example.com --upstream *.example.org --repo-url http://repo.local/ceph'.split()
+        )
+        assert args.upstream == ['mirror.example.com', '*.example.org']
+        assert args.repo_url == ['http://repo.local/ceph']
+
+    def test_cache_serve_options(self):
+        args = self.parser.parse_args(
+            'cache serve --bind 10.0.0.1 --port 3142 --cache-dir /srv/cache --metadata-ttl 60'.split()
+        )
+        assert args.bind == '10.0.0.1'
+        assert args.port == 3142
+        assert args.cache_dir == '/srv/cache'
+        assert args.metadata_ttl == 60
@@ -86,3 +86,19 @@ class TestParserDisk(object):
         assert args.disk[0] == '/dev/sdb'
         assert args.host == 'host1'
         assert args.debug is True
+
+    def test_disk_list_format_default_plain(self):
+        args = self.parser.parse_args('disk list host1'.split())
+        assert args.format == 'plain'
+        assert args.ceph_volume is False
+
+    def test_disk_list_format_json(self):
+        args = self.parser.parse_args('disk list --format json --ceph-volume host1'.split())
+        assert args.format == 'json'
+        assert args.ceph_volume is True
+
+    def test_disk_list_format_invalid(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('disk list --format yaml host1'.split())
+        out, err = capsys.readouterr()
+        assert 'invalid choice' in err
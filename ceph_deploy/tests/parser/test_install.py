@@ -141,6 +141,30 @@ class TestParserInstall(object):
         args = self.parser.parse_args('install --local-mirror /mnt/mymirror host1'.split())
         assert args.local_mirror == "/mnt/mymirror"
 
+    def test_install_reinstall_default_is_false(self):
+        args = self.parser.parse_args('install host1'.split())
+        assert args.reinstall is False
+
+    def test_install_shaman_ttl_default_is_zero(self):
+        args = self.parser.parse_args('install host1'.split())
+        assert args.shaman_ttl == 0
+
+    def test_install_cache_url_default_is_none(self):
+        args = self.parser.parse_args('install host1'.split())
+        assert args.cache_url is None
+
+    def test_install_cache_url(self):
+        args = self.parser.parse_args('install --cache-url http://admin:8080 host1'.split())
+        assert args.cache_url == 'http://admin:8080'
+
+    def test_install_mirror_seeds_default_is_zero(self):
+        args = self.parser.parse_args('install host1'.split())
+        assert args.mirror_seeds == 0
+
+    def test_install_mirror_seeds(self):
+        args = self.parser.parse_args('install --local-mirror /mnt/mymirror --mirror-seeds 2 host1'.split())
+        assert args.mirror_seeds == 2
+
     def test_install_repo_url_default_is_none(self):
         args = self.parser.parse_args('install host1'.split())
         assert args.repo_url is None
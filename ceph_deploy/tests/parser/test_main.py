@@ -7,7 +7,7 @@ from ceph_deploy.tests.util import assert_too_few_arguments
 
 SUBCMDS_WITH_ARGS = [
     'new', 'install', 'rgw', 'mds', 'mon', 'gatherkeys', 'disk', 'osd',
-    'admin', 'config', 'uninstall', 'purgedata', 'purge', 'pkg'
+    'admin', 'config', 'uninstall', 'purgedata', 'purge', 'pkg', 'upgrade', 'plan', 'apply'
 ]
 SUBCMDS_WITHOUT_ARGS = ['forgetkeys']
 
@@ -98,3 +98,29 @@ class TestParserMain(object):
         assert 'usage: ceph-deploy' in out
         assert 'optional arguments:' in out
         assert 'commands:' in out
+
+    def test_default_parallel_is_serial(self):
+        args = self.parser.parse_args('forgetkeys'.split())
+        assert args.parallel == 1
+
+    def test_custom_parallel(self):
+        args = self.parser.parse_args('--parallel 16 forgetkeys'.split())
+        assert args.parallel == 16
+
+    def test_max_concurrency_is_an_alias_of_parallel(self):
+        args = self.parser.parse_args('--max-concurrency 8 forgetkeys'.split())
+        assert args.parallel == 8
+
+    def test_parallel_must_be_an_integer(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('--parallel many forgetkeys'.split())
+        out, err = capsys.readouterr()
+        assert 'invalid int value' in err
+
+    def test_resume_is_off_by_default(self):
+        args = self.parser.parse_args('forgetkeys'.split())
+        assert args.resume is False
+
+    def test_resume(self):
+        args = self.parser.parse_args('--resume forgetkeys'.split())
+        assert args.resume is True
@@ -99,3 +99,19 @@ class TestParserOSD(object):
         args = self.parser.parse_args('osd create --dmcrypt --dmcrypt-key-dir /tmp/keys host1 --data /dev/sdb'.split())
         assert args.dmcrypt_key_dir == "/tmp/keys"
 
+
+    def test_osd_create_batch(self):
+        args = self.parser.parse_args('osd create --batch host1:/dev/sdb,/dev/sdc host2:/dev/sdb'.split())
+        assert args.batch == ['host1:/dev/sdb,/dev/sdc', 'host2:/dev/sdb']
+        assert args.host is None
+
+    def test_osd_create_spec(self):
+        args = self.parser.parse_args('osd create --spec cluster.spec'.split())
+        assert args.spec == 'cluster.spec'
+        assert args.batch is None
+
+    def test_osd_create_batch_and_spec_are_exclusive(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('osd create --spec cluster.spec --batch host1:/dev/sdb'.split())
+        out, err = capsys.readouterr()
+        assert 'not allowed with argument' in err
@@ -0,0 +1,22 @@
+import pytest
+
+from ceph_deploy.cli import get_parser
+from ceph_deploy.tests.util import assert_too_few_arguments
+
+
+class TestParserSpec(object):
+
+    def setup(self):
+        self.parser = get_parser()
+
+    @pytest.mark.parametrize('cmd', ['plan', 'apply'])
+    def test_spec_required(self, cmd, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args([cmd])
+        out, err = capsys.readouterr()
+        assert_too_few_arguments(err)
+
+    @pytest.mark.parametrize('cmd', ['plan', 'apply'])
+    def test_spec(self, cmd):
+        args = self.parser.parse_args([cmd, 'cluster.spec'])
+        assert args.spec == 'cluster.spec'
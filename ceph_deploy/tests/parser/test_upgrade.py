@@ -0,0 +1,52 @@
+import pytest
+
+from ceph_deploy.cli import get_parser
+from ceph_deploy.tests.util import assert_too_few_arguments
+
+
+class TestParserUpgrade(object):
+
+    def setup(self):
+        self.parser = get_parser()
+
+    def test_upgrade_host_required(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('upgrade --release nautilus'.split())
+        out, err = capsys.readouterr()
+        assert_too_few_arguments(err)
+
+    def test_upgrade_release_required(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('upgrade host1'.split())
+        out, err = capsys.readouterr()
+        assert '--release' in err
+
+    def test_upgrade_unknown_release(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('upgrade --release bork host1'.split())
+        out, err = capsys.readouterr()
+        assert 'invalid choice' in err
+
+    def test_upgrade_defaults(self):
+        args = self.parser.parse_args('upgrade --release Octopus host1 host2'.split())
+        assert args.release == 'octopus'
+        assert args.host == ['host1', 'host2']
+        assert args.window == 1
+        assert args.failure_domain == 'host'
+        assert args.health_timeout == 600
+        assert args.tolerate is None
+        assert args.admin_host is None
+        assert args.adjust_repos is True
+
+    def test_upgrade_window_per_rack(self):
+        args = self.parser.parse_args(
+            'upgrade --release octopus --window 4 --failure-domain rack host1'.split()
+        )
+        assert args.window == 4
+        assert args.failure_domain == 'rack'
+
+    def test_upgrade_tolerate_can_be_repeated(self):
+        args = self.parser.parse_args(
+            'upgrade --release octopus --tolerate A --tolerate B host1'.split()
+        )
+        assert args.tolerate == ['A', 'B']
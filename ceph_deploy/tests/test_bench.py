@@ -0,0 +1,207 @@
+import inspect
+import logging
+import os
+
+import pytest
+
+from ceph_deploy.hosts import remotes
+from ceph_deploy.lib import remoto
+from ceph_deploy.tests.bench import backend, runner, scenarios, sandbox, startup
+from ceph_deploy.tests.bench.__main__ import main
+
+
+class TestSandbox(object):
+
+    def setup(self):
+        self.source = inspect.getsource(remotes)
+
+    def make_sandbox(self, tmpdir, image='ubuntu'):
+        box = sandbox.Sandbox(str(tmpdir), 'node1', address='10.0.0.7', image=image)
+        box.populate()
+        return box
+
+    def test_paths_are_mapped_into_the_root(self, tmpdir):
+        box = sandbox.Sandbox(str(tmpdir), 'node1')
+        assert box.path('/etc/ceph') == os.path.join(str(tmpdir), 'etc/ceph')
+        assert box.path(box.path('/etc/ceph')) == box.path('/etc/ceph')
+        assert box.path('ceph.conf') == os.path.join(str(tmpdir), 'root/ceph.conf')
+        assert box.unroot(box.path('/etc/ceph')) == '/etc/ceph'
+
+    def test_write_conf_stays_in_the_sandbox(self, tmpdir):
+        box = self.make_sandbox(tmpdir)
+        namespace = box.load(self.source)
+        namespace['write_conf']('ceph', '[global]\n', False)
+        assert tmpdir.join('etc', 'ceph', 'ceph.conf').read() == '[global]\n'
+        assert namespace['path_exists']('/etc/ceph/ceph.conf')
+
+    def test_platform_comes_from_the_image(self, tmpdir):
+        namespace = self.make_sandbox(tmpdir, image='centos').load(self.source)
+        assert namespace['platform_information']() == ('centos', '7', 'core')
+
+    def test_identity(self, tmpdir):
+        namespace = self.make_sandbox(tmpdir).load(self.source)
+        assert namespace['shortname']() == 'node1'
+        assert namespace['which']('ceph') == '/usr/bin/ceph'
+        assert namespace['which']('nonexistent') is None
+
+    def test_commands_are_not_executed(self, tmpdir):
+        box = self.make_sandbox(tmpdir)
+        out, err, code = box.run(['/sbin/ip', 'addr', 'show'])
+        assert '10.0.0.7/16' in out
+        assert code == 0
+        assert box.run(['rm', '-rf', '/']) == ('', '', 0)
+
+    def test_starting_a_mon_creates_its_socket(self, tmpdir):
+        box = self.make_sandbox(tmpdir)
+        box.run(['systemctl', 'start', 'ceph-mon@node1'])
+        assert tmpdir.join('var', 'run', 'ceph', 'ceph-mon.node1.asok').check()
+
+
+class TestBackend(object):
+
+    def setup(self):
+        self.logger = logging.getLogger('node1')
+
+    def make_connection(self, tmpdir, latency=0):
+        self.backend = backend.Backend(str(tmpdir), latency=latency)
+        self.backend.add_hosts(['node1'])
+        return self.backend.connect('node1', logger=self.logger)
+
+    def test_remote_module_calls_are_counted(self, tmpdir):
+        conn = self.make_connection(tmpdir)
+        conn.import_module(remotes)
+        assert conn.remote_module.shortname() == 'node1'
+        stats = self.backend.stats.hosts['node1']
+        assert stats['round_trips'] == 1
+        assert stats['bytes_sent'] > 0
+        assert stats['bytes_received'] == len(repr('node1'))
+
+    def test_remote_errors_close_the_channel(self, tmpdir):
+        conn = self.make_connection(tmpdir)
+        conn.import_module(remotes)
+        with pytest.raises(RuntimeError) as error:
+            conn.remote_module.readline('/nonexistent')
+        assert 'No such file or directory' in str(error.value)
+        with pytest.raises(IOError):
+            conn.remote_module.shortname()
+
+    def test_commands_go_through_the_simulator(self, tmpdir):
+        conn = self.make_connection(tmpdir)
+        out, err, code = remoto.process.check(conn, ['ceph', '--version'])
+        assert out == [sandbox.version]
+        # fetching the remote environment is a round-trip of its own
+        assert self.backend.stats.hosts['node1']['round_trips'] == 2
+
+    def test_failed_commands_raise(self, tmpdir):
+        conn = self.make_connection(tmpdir)
+        self.backend.simulator.run = lambda box, command: ('', 'boom', 1)
+        with pytest.raises(RuntimeError):
+            remoto.process.run(conn, ['false'])
+
+    def test_simulated_hosts_resolve(self, tmpdir):
+        self.make_connection(tmpdir)
+        uninstall = self.backend.install()
+        try:
+            import socket
+            addresses = socket.getaddrinfo('node1', 0)
+        finally:
+            uninstall()
+        assert addresses[0][4][0] == self.backend.address('node1')
+
+
+class TestRun(object):
+
+    @pytest.mark.parametrize('name', [scenario.name for scenario in scenarios.scenarios])
+    def test_scenarios_run(self, name):
+        result = runner.run(scenarios.get(name), 2)
+        assert result['hosts'] == 2
+        assert result['round_trips'] > 0
+        assert result['bytes_sent'] > 0
+
+    def test_centos_image(self):
+        result = runner.run(scenarios.get('install'), 1, image='centos')
+        assert result['round_trips'] > 0
+
+    def test_latency_is_injected(self):
+        result = runner.run(scenarios.get('admin'), 1, latency=0.01)
+        assert result['seconds'] >= result['round_trips'] * 0.01
+
+
+class TestCompare(object):
+
+    def make_result(self, **kw):
+        result = {
+            'scenario': 'admin',
+            'hosts': 10,
+            'backend': 'local',
+            'latency': 0,
+            'parallel': 1,
+            'seconds': 1.0,
+            'round_trips': 20,
+            'round_trips_per_host': 2,
+            'bytes_sent': 1000,
+            'bytes_received': 100,
+        }
+        result.update(kw)
+        return result
+
+    def test_no_regressions(self):
+        assert runner.compare([self.make_result()], [self.make_result()]) == []
+
+    def test_more_round_trips_is_a_regression(self):
+        regressions = runner.compare(
+            [self.make_result(round_trips=30)],
+            [self.make_result()],
+        )
+        assert regressions == ['admin with 10 hosts: round_trips went from 20 to 30']
+
+    def test_wall_time_is_only_compared_when_asked(self):
+        results = [self.make_result(seconds=2.0)]
+        assert runner.compare(results, [self.make_result()]) == []
+        assert len(runner.compare(results, [self.make_result()], time_tolerance=0.5)) == 1
+
+    def test_different_runs_are_not_compared(self):
+        regressions = runner.compare(
+            [self.make_result(round_trips=30, hosts=100)],
+            [self.make_result()],
+        )
+        assert regressions == []
+
+
+class TestStartup(object):
+
+    def test_measures_both_parsers(self):
+        timings = startup.measure(repeat=1)
+        assert timings['command'] == 'forgetkeys'
+        assert timings['selected'] > 0
+        assert timings['all'] > 0
+
+    def test_conf_is_loaded_once(self):
+        conf = startup.measure_conf(repeat=1)
+        assert conf['command'] == 'install node1'
+        assert conf['loads'] == 1
+        assert conf['loads_before'] > 1
+
+    def fake(self, monkeypatch, selected=0.5, loads=1):
+        monkeypatch.setattr(startup, 'measure', lambda: {'command': 'forgetkeys', 'selected': selected, 'all': 1.0})
+        monkeypatch.setattr(startup, 'measure_conf', lambda: {
+            'command': 'install node1', 'seconds': 0.1, 'loads': loads,
+            'load_seconds': 0.001, 'loads_before': 22, 'load_seconds_before': 0.01,
+        })
+
+    def test_slower_selected_command_is_a_regression(self, capsys, monkeypatch):
+        self.fake(monkeypatch, selected=2.0)
+        assert main(['--startup']) == 1
+        assert 'regression' in capsys.readouterr()[0]
+
+    def test_reading_the_conf_again_is_a_regression(self, capsys, monkeypatch):
+        self.fake(monkeypatch, loads=2)
+        assert main(['--startup']) == 1
+        assert 'cephdeploy.conf is read more than once' in capsys.readouterr()[0]
+
+    def test_faster_selected_command(self, capsys, monkeypatch):
+        self.fake(monkeypatch)
+        assert main(['--startup']) == 0
+        out = capsys.readouterr()[0]
+        assert 'regression' not in out
+        assert '1 load in' in out
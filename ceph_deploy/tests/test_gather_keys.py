@@ -23,11 +23,11 @@ def mock_time_strftime(time_format):
     return "20160412144231"
 
 
-def mock_get_keys_fail(args, host, dest_dir):
+def mock_get_keys_fail(args, host, dest_dir, claim=None):
     return False
 
 
-def mock_get_keys_sucess_static(args, host, dest_dir):
+def mock_get_keys_sucess_static(args, host, dest_dir, claim=None):
     for keytype in ["admin", "mon", "osd", "mds", "mgr", "rgw"]:
         keypath = gatherkeys.keytype_path_to(args, keytype)
         path = "%s/%s" % (dest_dir, keypath)
@@ -35,7 +35,7 @@ def mock_get_keys_sucess_static(args, host, dest_dir):
     return True
 
 
-def mock_get_keys_sucess_dynamic(args, host, dest_dir):
+def mock_get_keys_sucess_dynamic(args, host, dest_dir, claim=None):
     for keytype in ["admin", "mon", "osd", "mds", "mgr", "rgw"]:
         keypath = gatherkeys.keytype_path_to(args, keytype)
         path = "%s/%s" % (dest_dir, keypath)
@@ -139,3 +139,73 @@ class TestGatherKeys(object):
         assert "ceph.bootstrap-osd.keyring-%s" % (mocked_time) in dir_content
         assert "ceph.bootstrap-rgw.keyring-%s" % (mocked_time) in dir_content
         assert len(dir_content) == 12
+
+
+class TestRaceMons(object):
+
+    def setup(self):
+        self.args = mock.Mock()
+        self.args.cluster = "ceph"
+        self.args.mon = ['host1', 'host2', 'host3']
+
+    def test_first_mon_in_quorum_wins(self, tmpdir):
+        claimed = []
+
+        def get_keys(args, host, dest_dir, claim=None):
+            if host == 'host1':
+                return False
+            if claim(host):
+                claimed.append(host)
+                return True
+            return False
+
+        with mock.patch('ceph_deploy.gatherkeys.gatherkeys_with_mon', get_keys):
+            winner = gatherkeys.race_mons(self.args, str(tmpdir))
+        assert winner in ('host2', 'host3')
+        assert claimed == [winner]
+
+    def test_slow_mons_are_not_waited_for(self, tmpdir):
+        import threading
+        release = threading.Event()
+
+        def get_keys(args, host, dest_dir, claim=None):
+            if host != 'host3':
+                release.wait(5)
+                return False
+            return claim(host)
+
+        with mock.patch('ceph_deploy.gatherkeys.gatherkeys_with_mon', get_keys):
+            winner = gatherkeys.race_mons(self.args, str(tmpdir))
+        release.set()
+        assert winner == 'host3'
+
+    def test_next_mon_takes_over_when_the_winner_fails(self, tmpdir):
+        import threading
+        first = threading.Event()
+        attempts = []
+
+        def get_keys(args, host, dest_dir, claim=None):
+            if host == 'host3':
+                return False
+            if host == 'host2':
+                # host1 claims first
+                first.wait(5)
+            if not claim(host):
+                return False
+            attempts.append(host)
+            if host == 'host1':
+                first.set()
+                return False
+            return True
+
+        with mock.patch('ceph_deploy.gatherkeys.gatherkeys_with_mon', get_keys):
+            winner = gatherkeys.race_mons(self.args, str(tmpdir))
+        assert winner == 'host2'
+        assert attempts == ['host1', 'host2']
+
+    def test_connection_errors_count_as_failures(self, tmpdir):
+        def get_keys(args, host, dest_dir, claim=None):
+            raise RuntimeError('connecting to host: %s resulted in errors' % host)
+
+        with mock.patch('ceph_deploy.gatherkeys.gatherkeys_with_mon', get_keys):
+            assert gatherkeys.race_mons(self.args, str(tmpdir)) is None
@@ -55,6 +55,9 @@ class mock_remote_module(object):
         hostname_split = self.longhostname.split('.')
         return hostname_split[0]
 
+    def auth_keyrings(self, cluster, keypath, entities):
+        return getattr(self, 'auth_keyrings_result', {})
+
 class mock_conn(object):
     def __init__(self):
         self.remote_module = mock_remote_module()
@@ -217,3 +220,59 @@ class TestGatherKeysWithMon(object):
     def test_remoto_process_check_out_missing_monmap_host1(self):
         rc = gatherkeys.gatherkeys_with_mon(self.args, self.host, self.test_dir)
         assert rc is False
+
+    @mock.patch('ceph_deploy.gatherkeys.gatherkeys_missing', mock_gatherkeys_missing_success)
+    @mock.patch('ceph_deploy.lib.remoto.process.check', mock_remoto_process_check_success)
+    @mock.patch('ceph_deploy.hosts.get', mock_hosts_get_file_key_content)
+    def test_lost_claim_gathers_nothing(self):
+        gathered = mock.Mock(return_value=True)
+        with mock.patch('ceph_deploy.gatherkeys.gatherkeys_missing', gathered):
+            rc = gatherkeys.gatherkeys_with_mon(
+                self.args, self.host, self.test_dir, claim=lambda host: False)
+        assert rc is False
+        assert not gathered.called
+
+    @mock.patch('ceph_deploy.lib.remoto.process.check', mock_remoto_process_check_success)
+    @mock.patch('ceph_deploy.hosts.get', mock_hosts_get_file_key_content)
+    def test_every_keytype_is_gathered(self):
+        gathered = mock.Mock(return_value=True)
+        with mock.patch('ceph_deploy.gatherkeys.gatherkeys_missing', gathered):
+            rc = gatherkeys.gatherkeys_with_mon(self.args, self.host, self.test_dir)
+        assert rc is True
+        keytypes = sorted(call[0][4] for call in gathered.call_args_list)
+        assert keytypes == ['admin', 'mds', 'mgr', 'osd', 'rgw']
+
+    @mock.patch('ceph_deploy.lib.remoto.process.check', mock_remoto_process_check_success)
+    def test_keys_are_gathered_in_one_call(self, tmpdir):
+        def get(host, **kwargs):
+            distro = mock_hosts_get_file_key_content(host, **kwargs)
+            distro.conn.remote_module.auth_keyrings_result = dict(
+                (gatherkeys.keytype_identity(keytype), '[%s]\n\tkey = fred\n' % keytype)
+                for keytype in ['admin', 'mds', 'mgr', 'osd', 'rgw']
+            )
+            return distro
+
+        gathered = mock.Mock(return_value=True)
+        with mock.patch('ceph_deploy.hosts.get', get):
+            with mock.patch('ceph_deploy.gatherkeys.gatherkeys_missing', gathered):
+                rc = gatherkeys.gatherkeys_with_mon(self.args, self.host, str(tmpdir))
+        assert rc is True
+        assert not gathered.called
+        assert 'key = fred' in tmpdir.join('ceph.bootstrap-osd.keyring').read()
+
+    @mock.patch('ceph_deploy.lib.remoto.process.check', mock_remoto_process_check_success)
+    def test_only_missing_keys_are_gathered_one_by_one(self, tmpdir):
+        def get(host, **kwargs):
+            distro = mock_hosts_get_file_key_content(host, **kwargs)
+            distro.conn.remote_module.auth_keyrings_result = {
+                'client.admin': '[client.admin]\n\tkey = fred\n',
+            }
+            return distro
+
+        gathered = mock.Mock(return_value=True)
+        with mock.patch('ceph_deploy.hosts.get', get):
+            with mock.patch('ceph_deploy.gatherkeys.gatherkeys_missing', gathered):
+                rc = gatherkeys.gatherkeys_with_mon(self.args, self.host, str(tmpdir))
+        assert rc is True
+        keytypes = sorted(call[0][4] for call in gathered.call_args_list)
+        assert keytypes == ['mds', 'mgr', 'osd', 'rgw']
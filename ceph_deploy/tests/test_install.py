@@ -1,6 +1,8 @@
-from mock import Mock
+from mock import Mock, patch
+import pytest
 
 from ceph_deploy import install
+from ceph_deploy.util import journal
 
 
 class TestSanitizeArgs(object):
@@ -147,3 +149,175 @@ class TestDetectComponents(object):
         assert result == sorted([
             'ceph-osd', 'ceph-mds', 'ceph', 'ceph-mon', 'ceph-radosgw'
         ])
+
+
+class TestProbeComponents(object):
+
+    def setup(self):
+        self.args = Mock(version_kind='stable', release='nautilus')
+        self.distro = Mock(is_deb=True, is_rpm=False, NON_SPLIT_PACKAGES=[])
+
+    def installed(self, **versions):
+        def installed_versions(names, query):
+            return dict((name, versions.get(name)) for name in names)
+        self.distro.conn.remote_module.installed_versions = Mock(side_effect=installed_versions)
+
+    def test_everything_installed(self):
+        self.installed(**{'ceph': '14.2.22-1bionic', 'ceph-mon': '14.2.22-1bionic'})
+        assert install.probe_components(self.args, self.distro, ['ceph', 'ceph-mon']) == []
+        assert self.distro.conn.remote_module.installed_versions.call_count == 1
+
+    def test_missing_and_older_packages_are_needed(self):
+        self.installed(**{'ceph': '14.2.22-1bionic', 'ceph-mon': '13.2.10-1bionic'})
+        needed = install.probe_components(self.args, self.distro, ['ceph', 'ceph-mon', 'ceph-osd'])
+        assert needed == ['ceph-mon', 'ceph-osd']
+
+    def test_components_shipped_in_ceph(self):
+        self.distro = Mock(is_deb=False, is_rpm=True, NON_SPLIT_PACKAGES=['ceph-mon'])
+        self.installed(ceph='14.2.22-0.el7')
+        assert install.probe_components(self.args, self.distro, ['ceph', 'ceph-mon']) == []
+        names = self.distro.conn.remote_module.installed_versions.call_args[0][0]
+        assert names == ['ceph']
+
+    def test_dev_builds_are_not_probed(self):
+        self.args.version_kind = 'dev'
+        assert install.probe_components(self.args, self.distro, ['ceph']) is None
+
+    def test_unknown_release_is_not_probed(self):
+        self.args.release = 'future'
+        assert install.probe_components(self.args, self.distro, ['ceph']) is None
+
+    def test_other_package_formats_are_not_probed(self):
+        self.distro.is_deb = False
+        assert install.probe_components(self.args, self.distro, ['ceph']) is None
+
+
+class TestLogPlan(object):
+
+    def test_hosts_are_grouped_by_plan(self):
+        from ceph_deploy.util.parallel import Outcome
+        logger = Mock()
+        install.log_plan([
+            Outcome('node1', value=install.UP_TO_DATE),
+            Outcome('node2', value='installed ceph'),
+            Outcome('node3', value=install.UP_TO_DATE),
+            Outcome('node4', error=RuntimeError()),
+        ], logger=logger)
+        lines = [c[0][0] % c[0][1:] for c in logger.info.call_args_list]
+        assert lines == [
+            'install plan: 2 hosts already had the release installed, 2 needed work',
+            '  failed: node4',
+            '  installed ceph: node2',
+            '  release already installed: node1 node3',
+            'hosts that had the release installed keep their point release, '
+            'use --reinstall to update them',
+        ]
+
+    def test_no_point_release_note_without_skipped_hosts(self):
+        from ceph_deploy.util.parallel import Outcome
+        logger = Mock()
+        install.log_plan([Outcome('node1', value='installed ceph')], logger=logger)
+        assert logger.info.call_count == 2
+
+
+class TestJournalParams(object):
+
+    def make_args(self, **kw):
+        import argparse
+        args = dict(
+            version_kind='stable', repo_url=None, local_mirror=None, adjust_repos=True,
+            install_mon=False, install_osd=False, dev='master', dev_commit=None,
+            gpg_url=None, nogpgcheck=False, cache_url=None,
+        )
+        args.update(kw)
+        return argparse.Namespace(**args)
+
+    def test_components_are_part_of_the_params(self):
+        params = install.journal_params(self.make_args(install_osd=True), 'nautilus')
+        assert params['components'] == ['install_osd']
+        assert params['version'] == 'nautilus'
+
+    def test_different_releases_differ(self):
+        args = self.make_args()
+        assert install.journal_params(args, 'nautilus') != install.journal_params(args, 'octopus')
+
+    def test_different_dev_commits_differ(self):
+        # --dev-commit before --dev leaves version_kind at dev
+        first = self.make_args(version_kind='dev', dev_commit='abc123')
+        second = self.make_args(version_kind='dev', dev_commit='def456')
+        assert install.journal_params(first, 'master') != install.journal_params(second, 'master')
+
+    @pytest.mark.parametrize('option', [
+        {'gpg_url': 'https://example.com/release.asc'},
+        {'nogpgcheck': True},
+        {'cache_url': 'http://admin:8080'},
+    ])
+    def test_repository_options_are_part_of_the_params(self, option):
+        params = install.journal_params(self.make_args(**option), 'nautilus')
+        assert params != install.journal_params(self.make_args(), 'nautilus')
+
+
+class TestInstallResume(object):
+
+    def setup(self):
+        self.saved = journal.journal
+
+    def teardown(self):
+        journal.journal = self.saved
+
+    def make_args(self):
+        import argparse
+        parser = argparse.ArgumentParser()
+        install.make(parser)
+        args = parser.parse_args([
+            '--local-mirror', '/srv/mirror', '--mirror-seeds', '1',
+            'node1', 'node2', 'node3',
+        ])
+        args.username = None
+        args.cluster = 'ceph'
+        args.parallel = 1
+        return args
+
+    def test_resumed_hosts_do_not_get_the_mirror(self, tmpdir):
+        args = self.make_args()
+        path = str(tmpdir.join('ceph-deploy-ceph.journal'))
+        params = install.journal_params(install.sanitize_args(args), 'nautilus')
+        journal.Journal(path, command='install').record('install', 'node2', 'done', params)
+        journal.configure(path, command='install', resume=True)
+
+        distribution = Mock()
+        distribution.return_value.run.return_value = ['node1', 'node3']
+        distribution.return_value.failed = []
+        installed = []
+        with patch('ceph_deploy.install.mirror.Distribution', distribution):
+            with patch('ceph_deploy.install.install_host', lambda args, hostname, *a, **kw: installed.append(hostname)):
+                install.install(args)
+        assert distribution.call_args[0][1] == ['node1', 'node3']
+        assert installed == ['node1', 'node3']
+
+
+class TestCustomRepo(object):
+
+    def test_extra_repos_go_through_the_cache(self):
+        import argparse
+        sections = {
+            'myrepo': [('baseurl', 'https://download.ceph.com/rpm-nautilus/el7'),
+                       ('gpgkey', 'https://download.ceph.com/keys/release.asc')],
+            'extras': [('baseurl', 'https://download.ceph.com/rpm-nautilus/el7/noarch'),
+                       ('gpgkey', 'https://download.ceph.com/keys/release.asc')],
+        }
+        cd_conf = Mock()
+        cd_conf.get_default_repo.return_value = 'myrepo'
+        cd_conf.get_repos.return_value = ['myrepo', 'extras']
+        cd_conf.items.side_effect = lambda section: sections[section]
+        cd_conf.get_list.return_value = ['extras']
+        distro = Mock(is_rpm=True, is_pkgtarxz=False)
+        args = argparse.Namespace(
+            release='nautilus', repo=False, install_all=False, cache_url='http://admin:8080',
+        )
+        install.custom_repo(distro, args, cd_conf, Mock())
+        repos = [call[0][1:4] for call in distro.repo_install.call_args_list]
+        assert [name for name, _, _ in repos] == ['myrepo', 'extras']
+        for _, baseurl, gpgkey in repos:
+            assert baseurl.startswith('http://admin:8080/https/download.ceph.com/')
+            assert gpgkey.startswith('http://admin:8080/https/download.ceph.com/')
@@ -1,3 +1,6 @@
+import os
+import stat
+
 from mock import patch
 from ceph_deploy.hosts import remotes
 from ceph_deploy.hosts.remotes import platform_information, parse_os_release
@@ -253,3 +256,19 @@ BUG_REPORT_URL="https://bugs.altlinux.org/"
         assert distro == 'altlinux'
         assert release == '8.2'
         assert codename == '8.2'
+
+
+class TestWriteTempFile(object):
+
+    def test_new_private_file(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(remotes.tempfile, 'tempdir', str(tmpdir))
+        path = remotes.write_temp_file(b'run\n', 'ceph-deploy-yum-')
+        assert os.path.dirname(path) == str(tmpdir)
+        assert os.path.basename(path).startswith('ceph-deploy-yum-')
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        with open(path, 'rb') as f:
+            assert f.read() == b'run\n'
+
+    def test_every_file_is_new(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(remotes.tempfile, 'tempdir', str(tmpdir))
+        assert remotes.write_temp_file(b'') != remotes.write_temp_file(b'')
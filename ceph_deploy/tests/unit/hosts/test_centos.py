@@ -1,4 +1,5 @@
 from ceph_deploy.hosts import centos
+from ceph_deploy.hosts.centos.install import install_repo_packages
 from ceph_deploy import hosts
 from mock import Mock, patch
 
@@ -62,3 +63,45 @@ class TestCentosRepositoryUrlPart(object):
         with patch('ceph_deploy.hosts.get_connection', fake_get_connection):
             self.module = hosts.get('testhost')
         assert centos.rpm_dist(self.module) == output
+
+
+class TestInstallRepoPackages(object):
+
+    def setup(self):
+        self.distro = Mock()
+        self.distro.packager.installed.return_value = {}
+        self.rpm = 'https://download.ceph.com/rpm-nautilus/el7/noarch/ceph-release-1-0.el7.noarch.rpm'
+        self.url = 'https://download.ceph.com/rpm-nautilus/el7/'
+
+    def test_everything_in_one_transaction(self):
+        self.distro.packager.installed.return_value = {'ceph-release': '1-1.el7'}
+        install_repo_packages(self.distro, self.rpm, self.url)
+        self.distro.packager.transaction.assert_called_once_with(
+            install=['epel-release', 'yum-plugin-priorities', self.rpm],
+            remove=['ceph-release'],
+        )
+        assert not self.distro.packager.install.called
+
+    def test_installed_packages_are_skipped(self):
+        self.distro.packager.installed.return_value = {
+            'epel-release': '7-11',
+            'yum-plugin-priorities': '1.1.31-54.el7_8',
+        }
+        install_repo_packages(self.distro)
+        assert not self.distro.packager.transaction.called
+
+    def test_falls_back_to_one_step_at_a_time(self):
+        self.distro.packager.transaction.side_effect = RuntimeError('locked')
+        with patch('ceph_deploy.lib.remoto.process.run') as fake_run:
+            install_repo_packages(self.distro, self.rpm, self.url)
+        assert self.distro.packager.install.call_count == 2
+        assert fake_run.call_args_list[-1][0][-1][-1] == self.rpm
+
+    def test_falls_back_when_the_repo_file_is_wrong(self):
+        self.distro.conn.remote_module.grep.return_value = False
+        with patch('ceph_deploy.lib.remoto.process.run') as fake_run:
+            install_repo_packages(self.distro, self.rpm, self.url)
+        self.distro.conn.remote_module.grep.assert_called_once_with(
+            self.url, '/etc/yum.repos.d/ceph.repo'
+        )
+        assert fake_run.call_count == 2
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+
+from mock import Mock, patch
+
+from ceph_deploy import hosts
+from ceph_deploy.hosts import facts
+
+
+def make_facts(**kw):
+    values = dict(
+        distro='CentOS Linux',
+        release='7.0',
+        codename='Core',
+        machine_type='x86_64',
+        init='systemd',
+    )
+    values.update(kw)
+    return values
+
+
+class TestFactCache(object):
+
+    def test_disabled_by_default(self, tmpdir):
+        cache = facts.FactCache(path=str(tmpdir))
+        cache.set('node1', **make_facts())
+        assert cache.get('node1') is None
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_round_trip(self, tmpdir):
+        cache = facts.FactCache(path=str(tmpdir), ttl=60)
+        cache.set('node1', **make_facts())
+        result = cache.get('node1')
+        assert result['distro'] == 'CentOS Linux'
+        assert result['init'] == 'systemd'
+
+    def test_creates_missing_directory(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'nested', 'facts')
+        cache = facts.FactCache(path=path, ttl=60)
+        cache.set('node1', **make_facts())
+        assert cache.get('node1') is not None
+
+    def test_expired_entries_are_ignored(self, tmpdir):
+        cache = facts.FactCache(path=str(tmpdir), ttl=60)
+        cache.set('node1', **make_facts())
+        with patch('ceph_deploy.hosts.facts.time.time', Mock(return_value=time.time() + 120)):
+            assert cache.get('node1') is None
+
+    def test_refresh_ignores_entries(self, tmpdir):
+        facts.FactCache(path=str(tmpdir), ttl=60).set('node1', **make_facts())
+        cache = facts.FactCache(path=str(tmpdir), ttl=60, refresh=True)
+        assert cache.get('node1') is None
+
+    def test_facts_that_are_not_json_are_not_cached(self, tmpdir):
+        cache = facts.FactCache(path=str(tmpdir), ttl=60)
+        cache.set('node1', **make_facts(release=object()))
+        assert cache.get('node1') is None
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_corrupted_entries_are_ignored(self, tmpdir):
+        cache = facts.FactCache(path=str(tmpdir), ttl=60)
+        tmpdir.join('node1.json').write('{not json')
+        assert cache.get('node1') is None
+
+    def test_incomplete_entries_are_ignored(self, tmpdir):
+        cache = facts.FactCache(path=str(tmpdir), ttl=60)
+        tmpdir.join('node1.json').write(json.dumps({'timestamp': time.time()}))
+        assert cache.get('node1') is None
+
+    def test_hostnames_are_safe_filenames(self, tmpdir):
+        cache = facts.FactCache(path=str(tmpdir), ttl=60)
+        cache.set('fe80::1', **make_facts())
+        assert os.listdir(str(tmpdir)) == ['fe80__1.json']
+
+    def test_ttl_from_config_is_coerced(self):
+        assert facts.FactCache(ttl='30').ttl == 30
+
+    def test_forget(self, tmpdir):
+        cache = facts.FactCache(path=str(tmpdir), ttl=60)
+        cache.set('node1', **make_facts())
+        cache.forget('node1')
+        assert cache.get('node1') is None
+
+
+class TestHostGetWithFacts(object):
+
+    def setup(self):
+        self.original_cache = facts.cache
+
+    def teardown(self):
+        facts.cache = self.original_cache
+
+    def make_fake_connection(self):
+        get_connection = Mock()
+        get_connection.return_value = get_connection
+        get_connection.remote_module.platform_information = Mock(
+            return_value=('CentOS Linux', '7.0', 'Core'))
+        get_connection.remote_module.machine_type = Mock(return_value='x86_64')
+        get_connection.remote_module.grep = Mock(return_value=True)
+        return get_connection
+
+    def test_facts_are_stored_after_detection(self, tmpdir):
+        facts.configure(ttl=60, path=str(tmpdir))
+        with patch('ceph_deploy.hosts.get_connection', self.make_fake_connection()):
+            hosts.get('node1')
+        assert facts.cache.get('node1')['init'] == 'systemd'
+
+    def test_cached_facts_skip_detection(self, tmpdir):
+        facts.configure(ttl=60, path=str(tmpdir))
+        facts.cache.set('node1', **make_facts(init='sysvinit'))
+        fake_connection = self.make_fake_connection()
+        with patch('ceph_deploy.hosts.get_connection', fake_connection):
+            distro = hosts.get('node1')
+        assert not fake_connection.remote_module.platform_information.called
+        assert not fake_connection.remote_module.machine_type.called
+        assert not fake_connection.remote_module.grep.called
+        assert distro.init == 'sysvinit'
+        assert distro.machine_type == 'x86_64'
+        assert distro.normalized_name == 'centos'
+
+    def test_refresh_detects_again(self, tmpdir):
+        facts.configure(ttl=60, path=str(tmpdir))
+        facts.cache.set('node1', **make_facts(init='sysvinit'))
+        facts.configure(ttl=60, path=str(tmpdir), refresh=True)
+        fake_connection = self.make_fake_connection()
+        with patch('ceph_deploy.hosts.get_connection', fake_connection):
+            distro = hosts.get('node1')
+        assert fake_connection.remote_module.platform_information.called
+        assert distro.init == 'systemd'
@@ -377,6 +377,19 @@ class TestHostGet(object):
 
         assert error.value.__str__() == 'Platform is not supported: Solaris 12 Tijuana'
 
+    def test_hosts_with_same_distro_do_not_share_state(self):
+        first = self.make_fake_connection(('CentOS Linux', '7.0', 'Core'))
+        second = self.make_fake_connection(('CentOS Linux', '7.0', 'Core'))
+        with patch('ceph_deploy.hosts.get_connection', first):
+            node1 = hosts.get('node1')
+        with patch('ceph_deploy.hosts.get_connection', second):
+            node2 = hosts.get('node2')
+
+        assert node1.conn is first
+        assert node2.conn is second
+        # module level helpers are still reachable
+        assert node1.install is node2.install
+
 
 class TestGetDistro(object):
 
@@ -3,6 +3,8 @@ try:
 except ImportError:
     from io import StringIO
 
+from mock import Mock
+
 from ceph_deploy.hosts import remotes
 
 
@@ -35,3 +37,195 @@ class TestWhich(object):
         monkeypatch.setattr(remotes.os.path, 'exists', lambda x: True)
         monkeypatch.setattr(remotes.os.path, 'isfile', lambda x: True)
         assert remotes.which('foo') == '/usr/local/bin/foo'
+
+
+class TestBatch(object):
+
+    def test_results_are_returned_in_order(self, tmpdir):
+        path = str(tmpdir)
+        results = remotes.batch([
+            ('path_exists', (path,), {}),
+            ('path_exists', (path + '/missing',), {}),
+            ('listdir', (path,), {}),
+        ])
+        assert results == [(True, None), (False, None), ([], None)]
+
+    def test_errors_are_reported_per_call(self, tmpdir):
+        results = remotes.batch([
+            ('readline', (str(tmpdir.join('missing')),), {}),
+        ])
+        assert results[0][0] is None
+        assert 'No such file or directory' in results[0][1]
+
+    def test_stops_at_first_error(self, tmpdir):
+        results = remotes.batch([
+            ('readline', (str(tmpdir.join('missing')),), {}),
+            ('path_exists', (str(tmpdir),), {}),
+        ])
+        assert results[1] == (None, 'not run')
+
+    def test_keeps_going_when_asked_to(self, tmpdir):
+        results = remotes.batch([
+            ('readline', (str(tmpdir.join('missing')),), {}),
+            ('path_exists', (str(tmpdir),), {}),
+        ], stop_on_error=False)
+        assert results[1] == (True, None)
+
+    def test_keyword_arguments(self, tmpdir):
+        path = str(tmpdir.join('dir'))
+        remotes.batch([('makedir', (path,), {'ignored': [17]})])
+        assert tmpdir.join('dir').check(dir=True)
+
+
+class TestParseKeyrings(object):
+
+    def test_splits_entities(self):
+        content = (
+            '[client.admin]\n'
+            '\tkey = AQ==\n'
+            '\tcaps mon = "allow *"\n'
+            '[client.bootstrap-osd]\n'
+            '\tkey = AQ==\n'
+        )
+        keyrings = remotes.parse_keyrings(content)
+        assert sorted(keyrings) == ['client.admin', 'client.bootstrap-osd']
+        assert keyrings['client.admin'] == '[client.admin]\n\tkey = AQ==\n\tcaps mon = "allow *"\n'
+
+    def test_ignores_preamble(self):
+        assert remotes.parse_keyrings('export auth(key=AQ==)\n') == {}
+
+
+class TestAuthKeyrings(object):
+
+    def make_popen(self, outputs):
+        calls = []
+
+        def popen(command, **kw):
+            calls.append(command)
+            process = Mock()
+            process.returncode, out = outputs.pop(0)
+            process.communicate = Mock(return_value=(out, b''))
+            return process
+        return popen, calls
+
+    def test_existing_entities_need_a_single_call(self, monkeypatch):
+        export = b'[client.admin]\n\tkey = AQ==\n[client.bootstrap-osd]\n\tkey = AQ==\n'
+        popen, calls = self.make_popen([(0, export)])
+        monkeypatch.setattr(remotes.subprocess, 'Popen', popen)
+        keyrings = remotes.auth_keyrings(
+            'ceph', '/keyring', {'client.admin': [], 'client.bootstrap-osd': []})
+        assert sorted(keyrings) == ['client.admin', 'client.bootstrap-osd']
+        assert len(calls) == 1
+        assert calls[0][-1] == 'export'
+
+    def test_only_missing_entities_are_created(self, monkeypatch):
+        export = b'[client.admin]\n\tkey = AQ==\n'
+        created = b'[client.bootstrap-osd]\n\tkey = AQ==\n'
+        popen, calls = self.make_popen([(0, export), (0, created)])
+        monkeypatch.setattr(remotes.subprocess, 'Popen', popen)
+        caps = ['mon', 'allow profile bootstrap-osd']
+        keyrings = remotes.auth_keyrings(
+            'ceph', '/keyring', {'client.admin': [], 'client.bootstrap-osd': caps})
+        assert sorted(keyrings) == ['client.admin', 'client.bootstrap-osd']
+        assert calls[1][-4:] == ['get-or-create', 'client.bootstrap-osd'] + caps
+
+    def test_failures_leave_entities_out(self, monkeypatch):
+        popen, calls = self.make_popen([(1, b''), (1, b'')])
+        monkeypatch.setattr(remotes.subprocess, 'Popen', popen)
+        assert remotes.auth_keyrings('ceph', '/keyring', {'client.admin': []}) == {}
+
+
+class TestFileChecksums(object):
+
+    def test_checksums_match_local_ones(self, tmpdir):
+        from ceph_deploy.util import push
+        path = tmpdir.join('ceph.conf')
+        path.write('[global]\n')
+        result = remotes.file_checksums([str(path)])
+        assert result == {str(path): push.checksum('[global]\n')}
+
+    def test_missing_files_have_no_checksum(self, tmpdir):
+        path = str(tmpdir.join('missing'))
+        assert remotes.file_checksums([path]) == {path: None}
+
+
+class TestTreeChecksums(object):
+
+    def test_paths_are_relative(self, tmpdir):
+        from ceph_deploy.util import push
+        tmpdir.join('release.asc').write('key')
+        tmpdir.mkdir('pool').join('ceph.deb').write('package')
+        assert remotes.tree_checksums(str(tmpdir)) == {
+            'release.asc': push.checksum('key'),
+            'pool/ceph.deb': push.checksum('package'),
+        }
+
+    def test_missing_directory_is_empty(self, tmpdir):
+        assert remotes.tree_checksums(str(tmpdir.join('missing'))) == {}
+
+
+class TestRepoState(object):
+
+    def test_nothing_recorded(self, tmpdir):
+        sources = tmpdir.mkdir('sources.list.d')
+        sources.join('ceph.list').write('deb https://download.ceph.com/debian-nautilus/ bionic main\n')
+        fingerprint, recorded, age = remotes.repo_state([str(sources)], str(tmpdir.join('state', 'apt.json')))
+        assert fingerprint
+        assert recorded is None
+        assert age is None
+
+    def test_recorded_state(self, tmpdir):
+        sources = tmpdir.mkdir('sources.list.d')
+        sources.join('ceph.list').write('deb https://download.ceph.com/debian-nautilus/ bionic main\n')
+        state_path = str(tmpdir.join('state', 'apt.json'))
+        fingerprint, _, _ = remotes.repo_state([str(sources)], state_path)
+        remotes.save_repo_state(state_path, fingerprint)
+        assert remotes.repo_state([str(sources)], state_path)[:2] == (fingerprint, fingerprint)
+        assert remotes.repo_state([str(sources)], state_path)[2] < 60
+
+    def test_changed_repo_files_change_the_fingerprint(self, tmpdir):
+        sources = tmpdir.mkdir('sources.list.d')
+        state_path = str(tmpdir.join('apt.json'))
+        sources.join('ceph.list').write('deb https://download.ceph.com/debian-nautilus/ bionic main\n')
+        before = remotes.repo_state([str(sources)], state_path)[0]
+        sources.join('ceph.list').write('deb https://download.ceph.com/debian-octopus/ bionic main\n')
+        assert remotes.repo_state([str(sources)], state_path)[0] != before
+
+    def test_missing_paths_are_skipped(self, tmpdir):
+        state_path = str(tmpdir.join('apt.json'))
+        fingerprint = remotes.repo_state([str(tmpdir.join('missing'))], state_path)[0]
+        assert fingerprint == remotes.repo_state([], state_path)[0]
+
+
+class TestInstalledVersions(object):
+
+    def make_popen(self, out):
+        process = Mock()
+        process.communicate.return_value = (out, b'')
+        return Mock(return_value=process)
+
+    def test_rpm(self, monkeypatch):
+        popen = self.make_popen(
+            b'ceph 14.2.22-0.el7\n'
+            b'package ceph-radosgw is not installed\n'
+        )
+        monkeypatch.setattr(remotes.subprocess, 'Popen', popen)
+        result = remotes.installed_versions(['ceph', 'ceph-radosgw'])
+        assert result == {'ceph': '14.2.22-0.el7', 'ceph-radosgw': None}
+        # a single query for all of them
+        assert popen.call_count == 1
+        assert popen.call_args[0][0][-2:] == ['ceph', 'ceph-radosgw']
+
+    def test_dpkg_skips_removed_packages(self, monkeypatch):
+        popen = self.make_popen(
+            b'ceph 14.2.22-1bionic ii \n'
+            b'radosgw 14.2.22-1bionic rc \n'
+        )
+        monkeypatch.setattr(remotes.subprocess, 'Popen', popen)
+        result = remotes.installed_versions(['ceph', 'radosgw'], 'dpkg')
+        assert result == {'ceph': '14.2.22-1bionic', 'radosgw': None}
+        assert popen.call_args[0][0][0] == 'dpkg-query'
+
+    def test_missing_query_tool(self, monkeypatch):
+        monkeypatch.setattr(remotes.subprocess, 'Popen', Mock(side_effect=OSError))
+        assert remotes.installed_versions(['ceph']) == {'ceph': None}
@@ -0,0 +1,36 @@
+from mock import Mock, patch
+
+from ceph_deploy import cache, exc
+
+
+class TestDefaultBind(object):
+
+    def args(self, tmpdir, content=None):
+        path = tmpdir.join('ceph.conf')
+        if content is not None:
+            path.write(content)
+        return Mock(ceph_conf=str(path), cluster='ceph')
+
+    def test_localhost_without_a_conf(self, tmpdir):
+        assert cache.default_bind(self.args(tmpdir)) == '127.0.0.1'
+
+    def test_localhost_without_a_public_network(self, tmpdir):
+        args = self.args(tmpdir, '[global]\nfsid = 1\n')
+        assert cache.default_bind(args) == '127.0.0.1'
+
+    def test_address_on_the_public_network(self, tmpdir):
+        args = self.args(tmpdir, '[global]\npublic_network = 10.0.0.0/24, 10.1.0.0/24\n')
+        with patch('ceph_deploy.cache.net.get_nonlocal_ip', return_value='10.0.0.5') as get_ip:
+            assert cache.default_bind(args) == '10.0.0.5'
+        assert get_ip.call_args[0][1] == '10.0.0.0/24'
+
+    def test_localhost_when_not_on_the_public_network(self, tmpdir):
+        args = self.args(tmpdir, '[global]\npublic_network = 10.0.0.0/24\n')
+        with patch('ceph_deploy.cache.net.get_nonlocal_ip', return_value='192.168.1.5'):
+            assert cache.default_bind(args) == '127.0.0.1'
+
+    def test_localhost_when_unresolvable(self, tmpdir):
+        args = self.args(tmpdir, '[global]\npublic_network = 10.0.0.0/24\n')
+        error = exc.UnableToResolveError('admin')
+        with patch('ceph_deploy.cache.net.get_nonlocal_ip', side_effect=error):
+            assert cache.default_bind(args) == '127.0.0.1'
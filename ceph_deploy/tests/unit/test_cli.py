@@ -1,5 +1,12 @@
+import subprocess
+import sys
+
+from mock import patch
+
 from ceph_deploy import cli
+from ceph_deploy.hosts import facts
 from ceph_deploy.tests import util
+from ceph_deploy.util import journal
 
 
 class FakeLogger(object):
@@ -44,3 +51,65 @@ class TestLogFlags(object):
         cli.log_flags(args, logger=self.logger)
         result = self.logger._output()
         assert ' _private ' not in result
+
+
+class TestRunState(object):
+
+    def test_fact_cache_and_journal_last_for_the_run(self, tmpdir, monkeypatch):
+        monkeypatch.delenv('CEPH_DEPLOY_TEST', raising=False)
+        during = {}
+
+        def forgetkeys(args):
+            during['facts'] = facts.cache.enabled
+            during['journal'] = journal.journal.enabled
+
+        with tmpdir.as_cwd():
+            with patch('ceph_deploy.forgetkeys.forgetkeys', forgetkeys):
+                cli._main(['--facts-ttl', '60', 'forgetkeys'])
+        assert during == {'facts': True, 'journal': True}
+        assert not facts.cache.enabled
+        assert not journal.journal.enabled
+
+
+def run_python(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode('utf-8')
+
+
+class TestLazyParser(object):
+
+    def test_only_the_selected_command_is_imported(self):
+        out = run_python(
+            'import sys\n'
+            'from ceph_deploy import cli\n'
+            'cli.get_parser(["forgetkeys"]).parse_args(["forgetkeys"])\n'
+            'print(" ".join(sorted(sys.modules)))\n'
+        )
+        modules = out.split()
+        assert 'ceph_deploy.forgetkeys' in modules
+        for module in ['ceph_deploy.install', 'ceph_deploy.osd', 'ceph_deploy.hosts']:
+            assert module not in modules
+
+    def test_selected_command_parses_like_the_full_parser(self):
+        argv = '--username ceph --parallel 4 install --release luminous node1 node2'.split()
+        lazy = vars(cli.get_parser(argv).parse_args(argv))
+        full = vars(cli.get_parser().parse_args(argv))
+        # every parser has a LazyConf of its own, unless testing
+        lazy.pop('cd_conf', None)
+        full.pop('cd_conf', None)
+        assert lazy == full
+
+    def test_global_options_before_the_command(self):
+        parser = cli.get_global_parser()
+        names = [name for (name, _) in cli.command_entry_points()]
+        argv = ['--username', 'install', 'forgetkeys']
+        assert cli.selected_command(parser, argv, names) == 'forgetkeys'
+
+    def test_top_level_help_loads_everything(self):
+        parser = cli.get_global_parser()
+        names = [name for (name, _) in cli.command_entry_points()]
+        assert cli.selected_command(parser, ['-h', 'install'], names) is None
+
+    def test_unknown_commands_load_everything(self):
+        parser = cli.get_global_parser()
+        names = [name for (name, _) in cli.command_entry_points()]
+        assert cli.selected_command(parser, ['bogus'], names) is None
@@ -148,6 +148,50 @@ class TestConfGetList(object):
         assert cfg.get_default_repo() is False
 
 
+class TestGetConf(object):
+
+    def setup(self):
+        self.load = patch(
+            'ceph_deploy.conf.cephdeploy.load',
+            Mock(side_effect=lambda: Mock(sections=Mock(return_value=[]))),
+        )
+        self.loaded = patch('ceph_deploy.conf.cephdeploy._loaded', None)
+        self.load.start()
+        self.loaded.start()
+
+    def teardown(self):
+        self.loaded.stop()
+        self.load.stop()
+
+    def test_is_loaded_once(self):
+        first = conf.cephdeploy.get_conf()
+        second = conf.cephdeploy.get_conf()
+        assert first is second
+        assert conf.cephdeploy.load.call_count == 1
+
+    def test_lazy_conf_does_not_load_until_used(self):
+        lazy = conf.cephdeploy.LazyConf()
+        assert not conf.cephdeploy.load.called
+        lazy.get_repos()
+        assert conf.cephdeploy.load.call_count == 1
+
+    def test_lazy_conf_is_shared_with_set_overrides(self):
+        args = Mock()
+        args.func.__name__ = 'foo'
+        conf.cephdeploy.LazyConf().get_repos()
+        conf.cephdeploy.set_overrides(args)
+        assert conf.cephdeploy.load.call_count == 1
+
+    def test_building_the_parser_does_not_load(self, monkeypatch):
+        from ceph_deploy import cli
+        monkeypatch.delenv('CEPH_DEPLOY_TEST', raising=False)
+        parser = cli.get_parser()
+        args = parser.parse_args(['install', 'node1'])
+        assert not conf.cephdeploy.load.called
+        args.cd_conf.get_repos()
+        assert conf.cephdeploy.load.call_count == 1
+
+
 truthy_values = ['yes', 'true', 'on']
 falsy_values = ['no', 'false', 'off']
 
@@ -0,0 +1,300 @@
+import threading
+import time
+
+from mock import Mock, patch
+from pytest import raises
+
+from ceph_deploy import connection
+
+
+def make_conn(healthy=True):
+    conn = Mock()
+    conn.has_connection = Mock(return_value=healthy)
+    return conn
+
+
+class TestConnectionPool(object):
+
+    def setup(self):
+        self.pool = connection.ConnectionPool()
+
+    def test_reuses_connection_for_same_host(self):
+        factory = Mock(side_effect=lambda: make_conn())
+        first = self.pool.acquire(('node1', True), factory)
+        first.exit()
+        second = self.pool.acquire(('node1', True), factory)
+        assert factory.call_count == 1
+        assert first._entry.conn is second._entry.conn
+
+    def test_different_hosts_get_different_connections(self):
+        factory = Mock(side_effect=lambda: make_conn())
+        self.pool.acquire(('node1', True), factory)
+        self.pool.acquire(('node2', True), factory)
+        assert factory.call_count == 2
+        assert len(self.pool) == 2
+
+    def test_exit_does_not_close_the_gateway(self):
+        conn = make_conn()
+        checkout = self.pool.acquire(('node1', True), lambda: conn)
+        checkout.exit()
+        assert not conn.exit.called
+
+    def test_exit_is_idempotent(self):
+        first = self.pool.acquire(('node1', True), make_conn)
+        second = self.pool.acquire(('node1', True), make_conn)
+        first.exit()
+        first.exit()
+        assert second._entry.refs == 1
+
+    def test_context_manager_releases_the_checkout(self):
+        with self.pool.acquire(('node1', True), make_conn) as conn:
+            assert conn._entry.refs == 1
+        assert conn._entry.refs == 0
+
+    def test_unhealthy_connections_are_replaced(self):
+        stale = make_conn(healthy=False)
+        fresh = make_conn()
+        factory = Mock(side_effect=[stale, fresh])
+        self.pool.acquire(('node1', True), factory).exit()
+        checkout = self.pool.acquire(('node1', True), factory)
+        assert stale.exit.called
+        assert checkout._entry.conn is fresh
+
+    def test_idle_connections_are_evicted(self):
+        conn = make_conn()
+        self.pool.idle_timeout = 10
+        self.pool.acquire(('node1', True), lambda: conn).exit()
+        later = time.time() + 20
+        with patch('ceph_deploy.connection.time.time', Mock(return_value=later)):
+            self.pool.acquire(('node2', True), make_conn)
+        assert conn.exit.called
+        assert len(self.pool) == 1
+
+    def test_connections_in_use_are_not_evicted(self):
+        conn = make_conn()
+        self.pool.idle_timeout = 10
+        self.pool.acquire(('node1', True), lambda: conn)
+        later = time.time() + 20
+        with patch('ceph_deploy.connection.time.time', Mock(return_value=later)):
+            self.pool.acquire(('node2', True), make_conn)
+        assert not conn.exit.called
+
+    def test_failed_connections_are_not_kept(self):
+        factory = Mock(side_effect=RuntimeError('no route to host'))
+        with raises(RuntimeError):
+            self.pool.acquire(('node1', True), factory)
+        assert len(self.pool) == 0
+
+    def test_close_terminates_everything(self):
+        conn = make_conn()
+        self.pool.acquire(('node1', True), lambda: conn)
+        self.pool.close()
+        assert conn.exit.called
+        assert len(self.pool) == 0
+
+    def test_checkouts_have_their_own_remote_module(self):
+        conn = make_conn()
+        conn.import_module = Mock(side_effect=[Mock(), Mock()])
+        first = self.pool.acquire(('node1', True), lambda: conn)
+        second = self.pool.acquire(('node1', True), lambda: conn)
+        first.import_module('remotes')
+        second.import_module('remotes')
+        assert first.remote_module is not second.remote_module
+
+    def test_attributes_set_on_checkout_do_not_leak(self):
+        conn = make_conn()
+        conn.global_timeout = 300
+        first = self.pool.acquire(('node1', True), lambda: conn)
+        second = self.pool.acquire(('node1', True), lambda: conn)
+        first.global_timeout = None
+        assert second.global_timeout == 300
+
+    def test_same_host_connects_once_when_requested_concurrently(self):
+        def slow_connect():
+            time.sleep(0.05)
+            return make_conn()
+        factory = Mock(side_effect=slow_connect)
+        threads = [
+            threading.Thread(target=self.pool.acquire, args=(('node1', True), factory))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert factory.call_count == 1
+
+    def acquire_relayed(self):
+        relay_conn = make_conn()
+        relay_conn.gateway.id = 'gw0'
+        relay = self.pool.acquire(('node1', True), lambda: relay_conn)
+        relayed = self.pool.acquire(
+            ('node2', True),
+            lambda: connection.RelayedConnection('node2', relay, logger=Mock()),
+        )
+        return relay_conn, relayed
+
+    def in_thread(self, func):
+        thread = threading.Thread(target=func)
+        thread.daemon = True
+        thread.start()
+        thread.join(3)
+        return thread.is_alive()
+
+    def test_close_with_a_relayed_connection(self):
+        relay_conn, relayed = self.acquire_relayed()
+        assert not self.in_thread(self.pool.close)
+        assert relay_conn.exit.called
+        assert len(self.pool) == 0
+
+    def test_evicting_a_relayed_connection(self):
+        relay_conn, relayed = self.acquire_relayed()
+        self.pool.idle_timeout = 10
+        relayed.exit()
+        later = time.time() + 20
+        with patch('ceph_deploy.connection.time.time', Mock(return_value=later)):
+            assert not self.in_thread(lambda: self.pool.acquire(('node3', True), make_conn))
+        # the relay was only given back, it is evicted the next time around
+        assert sorted(self.pool._entries) == [('node1', True), ('node3', True)]
+        assert self.pool._entries[('node1', True)].refs == 0
+
+
+class TestGetConnection(object):
+
+    def test_username_is_part_of_the_key(self):
+        pool = connection.ConnectionPool()
+        with patch('ceph_deploy.connection.pool', pool):
+            with patch('ceph_deploy.connection.remoto.Connection', Mock(side_effect=lambda *a, **kw: make_conn())):
+                connection.get_connection('node1', None, logger=Mock())
+                connection.get_connection('node1', 'ceph', logger=Mock())
+        assert sorted(pool._entries) == [('ceph@node1', True), ('node1', True)]
+
+    def test_connection_errors_are_runtime_errors(self):
+        pool = connection.ConnectionPool()
+        with patch('ceph_deploy.connection.pool', pool):
+            with patch('ceph_deploy.connection.remoto.Connection', Mock(side_effect=OSError('boom'))):
+                with raises(RuntimeError) as error:
+                    connection.get_connection('node1', None, logger=Mock())
+        assert 'connecting to host: node1' in str(error.value)
+
+
+def fake_getaddrinfo(addresses):
+    def getaddrinfo(host, *a, **kw):
+        return [(2, 1, 6, '', (addresses[host], 0))]
+    return getaddrinfo
+
+
+class TestRelayPlan(object):
+
+    def setup(self):
+        self.addresses = {
+            'a1': '10.0.1.1', 'a2': '10.0.1.2', 'a3': '10.0.1.3', 'a4': '10.0.1.4',
+            'b1': '10.0.2.1', 'b2': '10.0.2.2',
+        }
+        self.patches = [
+            patch('ceph_deploy.connection.socket.getaddrinfo', fake_getaddrinfo(self.addresses)),
+            patch('ceph_deploy.connection.remoto.connection.needs_ssh', Mock(return_value=True)),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def teardown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_disabled_by_default(self):
+        assert connection.RelayPlan().relay_for('a1') is None
+
+    def test_first_hosts_of_a_rack_become_relays(self):
+        plan = connection.RelayPlan(per_rack=2)
+        assert [plan.relay_for(host) for host in ('a1', 'a2', 'a3', 'a4')] == [None, None, 'a1', 'a2']
+
+    def test_racks_are_separate(self):
+        plan = connection.RelayPlan(per_rack=1)
+        assert [plan.relay_for(host) for host in ('a1', 'b1', 'a2', 'b2')] == [None, None, 'a1', 'b1']
+
+    def test_assignments_are_stable(self):
+        plan = connection.RelayPlan(per_rack=1)
+        plan.relay_for('a1')
+        assert plan.relay_for('a2') == 'a1'
+        assert plan.relay_for('a2') == 'a1'
+        assert plan.relay_for('a1') is None
+
+    def test_inventory_names_racks_and_relays(self, tmpdir):
+        inventory = tmpdir.join('inventory')
+        inventory.write('[rack1]\nrelays = b2\nhosts = a1, a2 b2\n')
+        plan = connection.RelayPlan(inventory=str(inventory))
+        assert plan.relay_for('a1') == 'b2'
+        assert plan.relay_for('b2') is None
+        # not in the inventory, and no relays to pick
+        assert plan.relay_for('b1') is None
+
+    def test_missing_inventory(self, tmpdir):
+        with raises(RuntimeError):
+            connection.RelayPlan(inventory=str(tmpdir.join('missing')))
+
+    def test_local_host_is_never_relayed(self):
+        plan = connection.RelayPlan(per_rack=1)
+        plan.relay_for('a1')
+        with patch('ceph_deploy.connection.remoto.connection.needs_ssh', Mock(return_value=False)):
+            assert plan.relay_for('a2') is None
+
+
+class TestRelayedConnection(object):
+
+    def make_relay(self):
+        relay = Mock()
+        relay.gateway.id = 'gw0'
+        relay.group.makegateway = Mock(return_value=Mock())
+        return relay
+
+    def test_gateway_is_made_through_the_relay(self):
+        relay = self.make_relay()
+        conn = connection.RelayedConnection('node2', relay, logger=Mock())
+        spec = relay.group.makegateway.call_args[0][0]
+        assert spec.startswith('ssh=node2//')
+        assert spec.endswith('//via=gw0')
+        assert conn.group is relay.group
+
+    def test_exit_leaves_the_relay_up(self):
+        relay = self.make_relay()
+        conn = connection.RelayedConnection('node2', relay, logger=Mock())
+        conn.exit()
+        assert conn.gateway.exit.called
+        assert relay.exit.called
+        assert not relay.group.terminate.called
+
+
+class TestGetConnectionWithRelays(object):
+
+    def setup(self):
+        self.relays = connection.relays
+
+    def teardown(self):
+        connection.relays = self.relays
+
+    def test_relayed_hosts_go_through_the_relay(self):
+        pool = connection.ConnectionPool()
+        plan = connection.configure_relays(per_rack=1)
+        plan.relay_for = Mock(side_effect=lambda host: 'node1' if host == 'node2' else None)
+        relayed = Mock(side_effect=lambda *a, **kw: make_conn())
+        with patch('ceph_deploy.connection.pool', pool):
+            with patch('ceph_deploy.connection.remoto.Connection', Mock(side_effect=lambda *a, **kw: make_conn())):
+                with patch('ceph_deploy.connection.RelayedConnection', relayed):
+                    connection.get_connection('node2', None, logger=Mock())
+        assert relayed.call_args[0][0] == 'node2'
+        # the relay is connected to directly, and stays checked out
+        assert pool._entries[('node1', True)].refs == 1
+        assert sorted(pool._entries) == [('node1', True), ('node2', True)]
+
+    def test_relay_is_released_when_connecting_fails(self):
+        pool = connection.ConnectionPool()
+        plan = connection.configure_relays(per_rack=1)
+        plan.relay_for = Mock(side_effect=lambda host: 'node1' if host == 'node2' else None)
+        with patch('ceph_deploy.connection.pool', pool):
+            with patch('ceph_deploy.connection.remoto.Connection', Mock(side_effect=lambda *a, **kw: make_conn())):
+                with patch('ceph_deploy.connection.RelayedConnection', Mock(side_effect=OSError('boom'))):
+                    with raises(RuntimeError) as error:
+                        connection.get_connection('node2', None, logger=Mock())
+        assert 'through node1' in str(error.value)
+        assert pool._entries[('node1', True)].refs == 0
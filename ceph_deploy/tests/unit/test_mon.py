@@ -4,7 +4,7 @@ from mock import Mock, patch
 # the below import of mock again is to workaround a py.test issue:
 # https://github.com/pytest-dev/pytest/issues/1035
 import mock
-from ceph_deploy import mon
+from ceph_deploy import exc, mon
 from ceph_deploy.hosts.common import mon_create
 from ceph_deploy.misc import mon_hosts, remote_shortname
 
@@ -222,3 +222,176 @@ class TestConcatenateKeyrings(object):
 
         with py.test.raises(RuntimeError):
             mon.concatenate_keyrings(self.args)
+
+
+class TestWaitForMon(object):
+
+    def setup(self):
+        self.conn = Mock()
+        self.args = Mock(cluster='ceph')
+        self.sleep = patch('ceph_deploy.util.wait.time.sleep')
+        self.sleep.start()
+
+    def teardown(self):
+        self.sleep.stop()
+
+    def test_waits_for_the_admin_socket(self):
+        self.conn.remote_module.path_exists = Mock(side_effect=[False, False, True])
+        with patch('ceph_deploy.mon.mon_status_check', Mock(return_value={'state': 'leader'})) as check:
+            status = mon.wait_for_mon(self.conn, Mock(), 'node1', self.args)
+        assert status == {'state': 'leader'}
+        assert check.call_count == 1
+
+    def test_waits_for_a_running_state(self):
+        self.conn.remote_module.path_exists = Mock(return_value=True)
+        states = [{}, {'state': 'probing'}]
+        with patch('ceph_deploy.mon.mon_status_check', Mock(side_effect=states)):
+            status = mon.wait_for_mon(self.conn, Mock(), 'node1', self.args)
+        assert status == {'state': 'probing'}
+
+    def test_waits_for_given_states(self):
+        self.conn.remote_module.path_exists = Mock(return_value=True)
+        states = [{'state': 'probing'}, {'state': 'electing'}, {'state': 'peon'}]
+        with patch('ceph_deploy.mon.mon_status_check', Mock(side_effect=states)):
+            status = mon.wait_for_mon(
+                self.conn, Mock(), 'node1', self.args, states=('peon', 'leader'))
+        assert status == {'state': 'peon'}
+
+    def test_empty_status_on_timeout(self):
+        self.conn.remote_module.path_exists = Mock(return_value=False)
+        assert mon.wait_for_mon(self.conn, Mock(), 'node1', self.args, timeout=0) == {}
+
+
+def make_status(name, state, quorum, epoch=1, mons=('node1', 'node2', 'node3')):
+    return {
+        'name': name,
+        'state': state,
+        'quorum': quorum,
+        'monmap': {
+            'epoch': epoch,
+            'mons': [{'name': mon, 'rank': rank} for rank, mon in enumerate(mons)],
+        },
+    }
+
+
+class TestMergeMonStatus(object):
+
+    def test_no_statuses(self):
+        view = mon.merge_mon_status({})
+        assert view['leader'] is None
+        assert view['majority'] is False
+
+    def test_majority_from_leader(self):
+        view = mon.merge_mon_status({
+            'node1': make_status('node1', 'leader', [0, 1]),
+            'node2': make_status('node2', 'peon', [0, 1]),
+            'node3': make_status('node3', 'probing', []),
+        })
+        assert view['leader'] == 'node1'
+        assert view['quorum'] == ['node1', 'node2']
+        assert view['mons'] == ['node1', 'node2', 'node3']
+        assert view['majority'] is True
+
+    def test_minority_is_not_enough(self):
+        view = mon.merge_mon_status({
+            'node1': make_status('node1', 'electing', []),
+            'node2': make_status('node2', 'electing', []),
+        })
+        assert view['majority'] is False
+
+    def test_peon_view_is_used_without_a_leader(self):
+        view = mon.merge_mon_status({
+            'node2': make_status('node2', 'peon', [0, 1]),
+        })
+        assert view['leader'] is None
+        assert view['majority'] is True
+
+    def test_newest_monmap_wins(self):
+        view = mon.merge_mon_status({
+            'node1': make_status('node1', 'leader', [0, 1], epoch=1, mons=('node1', 'node2')),
+            'node2': make_status('node2', 'peon', [0, 1], epoch=2),
+        })
+        assert view['mons'] == ['node1', 'node2', 'node3']
+
+
+class TestWaitForQuorum(object):
+
+    def setup(self):
+        self.args = Mock(cluster='ceph', username=None)
+        self.sleep = patch('ceph_deploy.util.wait.time.sleep')
+        self.sleep.start()
+
+    def teardown(self):
+        self.sleep.stop()
+
+    def test_returns_once_a_majority_agrees(self):
+        rounds = {
+            'node1': [make_status('node1', 'electing', []), make_status('node1', 'leader', [0, 1])],
+            'node2': [make_status('node2', 'electing', []), make_status('node2', 'peon', [0, 1])],
+            'node3': [make_status('node3', 'probing', []), make_status('node3', 'probing', [])],
+        }
+
+        def status_check(conn, logger, hostname, args):
+            return rounds[hostname].pop(0)
+
+        with patch('ceph_deploy.mon.hosts.get', Mock()) as get:
+            with patch('ceph_deploy.mon.mon_status_check', status_check):
+                view = mon.wait_for_quorum(self.args, ['node1', 'node2', 'node3'])
+        assert view['leader'] == 'node1'
+        assert view['majority'] is True
+        assert get.return_value.conn.exit.call_count == 3
+
+    def test_unreachable_monitors_do_not_block(self):
+        def get(host, **kw):
+            if host == 'node3':
+                raise RuntimeError('no route to host')
+            return Mock()
+
+        def status_check(conn, logger, hostname, args):
+            return make_status(hostname, {'node1': 'leader', 'node2': 'peon'}[hostname], [0, 1])
+
+        with patch('ceph_deploy.mon.hosts.get', get):
+            with patch('ceph_deploy.mon.mon_status_check', status_check):
+                view = mon.wait_for_quorum(self.args, ['node1', 'node2', 'node3'])
+        assert view['majority'] is True
+
+    def test_fails_fast_when_no_monitor_is_reachable(self):
+        check = Mock()
+        with patch('ceph_deploy.mon.hosts.get', Mock(side_effect=RuntimeError('no route to host'))):
+            with patch('ceph_deploy.mon.mon_status_check', check):
+                with py.test.raises(exc.GenericError) as error:
+                    mon.wait_for_quorum(self.args, ['node1', 'node2'])
+        assert 'node1, node2' in str(error.value)
+        assert not check.called
+
+    def test_gives_up_at_the_deadline(self):
+        with patch('ceph_deploy.mon.hosts.get', Mock()):
+            with patch('ceph_deploy.mon.mon_status_check', Mock(return_value={})):
+                view = mon.wait_for_quorum(self.args, ['node1'], timeout=0)
+        assert view['majority'] is False
+
+
+class TestMonCreateInitial(object):
+
+    def setup(self):
+        self.args = Mock(cluster='ceph', username=None)
+
+    def test_gathers_keys_from_the_leader_first(self):
+        view = {'leader': 'node2', 'quorum': ['node1', 'node2'], 'mons': [], 'majority': True}
+        with patch('ceph_deploy.mon.get_mon_initial_members', Mock(return_value=['node1', 'node2', 'node3'])):
+            with patch('ceph_deploy.mon.mon_create'):
+                with patch('ceph_deploy.mon.wait_for_quorum', Mock(return_value=view)):
+                    with patch('ceph_deploy.mon.gatherkeys.gatherkeys') as gatherkeys:
+                        mon.mon_create_initial(self.args)
+        assert gatherkeys.called
+        assert self.args.mon == ['node2', 'node1', 'node3']
+
+    def test_no_majority_exits(self):
+        view = {'leader': None, 'quorum': [], 'mons': [], 'majority': False}
+        with patch('ceph_deploy.mon.get_mon_initial_members', Mock(return_value=['node1'])):
+            with patch('ceph_deploy.mon.mon_create'):
+                with patch('ceph_deploy.mon.wait_for_quorum', Mock(return_value=view)):
+                    with patch('ceph_deploy.mon.gatherkeys.gatherkeys') as gatherkeys:
+                        with py.test.raises(SystemExit):
+                            mon.mon_create_initial(self.args)
+        assert not gatherkeys.called
@@ -0,0 +1,262 @@
+import argparse
+import json
+
+import pytest
+from mock import Mock, patch
+
+from ceph_deploy import exc, osd
+
+
+def make_args(**kw):
+    args = dict(
+        cluster='ceph',
+        username=None,
+        overwrite_conf=False,
+        host=None,
+        data=None,
+        journal=None,
+        block_db=None,
+        block_wal=None,
+        filestore=None,
+        dmcrypt=False,
+        debug=False,
+        batch=['node1:/dev/sdb,/dev/sdc', 'node2:/dev/sdb'],
+        spec=None,
+        parallel=4,
+    )
+    args.update(kw)
+    return argparse.Namespace(**args)
+
+
+class TestBatchDevices(object):
+
+    def test_hosts_keep_their_order(self):
+        layout = osd.batch_devices(['node2:/dev/sdb', 'node1:/dev/sdb,/dev/sdc'])
+        assert layout == [('node2', ['/dev/sdb']), ('node1', ['/dev/sdb', '/dev/sdc'])]
+
+    def test_entries_for_the_same_host_are_merged(self):
+        layout = osd.batch_devices(['node1:/dev/sdb', 'node1:/dev/sdc,/dev/sdb'])
+        assert layout == [('node1', ['/dev/sdb', '/dev/sdc'])]
+
+    def test_devices_can_have_colons(self):
+        layout = osd.batch_devices(['node1:/dev/disk/by-path/pci-0000:00:1f.2-ata-1'])
+        assert layout == [('node1', ['/dev/disk/by-path/pci-0000:00:1f.2-ata-1'])]
+
+    @pytest.mark.parametrize('entry', ['node1', 'node1:', ':/dev/sdb', 'node1:,'])
+    def test_invalid_entries(self, entry):
+        with pytest.raises(RuntimeError):
+            osd.batch_devices([entry])
+
+
+class TestSpecDevices(object):
+
+    def test_osd_section(self, tmpdir):
+        path = tmpdir.join('cluster.spec')
+        path.write('[mon]\nhosts = node1\n\n[osd]\nnode1 = /dev/sdb /dev/sdc\nnode2 = /dev/sdb\n')
+        assert osd.spec_devices(str(path)) == [
+            ('node1', ['/dev/sdb', '/dev/sdc']),
+            ('node2', ['/dev/sdb']),
+        ]
+
+
+class TestCreateBatchOSDs(object):
+
+    def test_one_ceph_volume_call_for_all_devices(self):
+        conn = Mock()
+        conn.remote_module.which.return_value = '/usr/sbin/ceph-volume'
+        with patch('ceph_deploy.osd.remoto.process.run') as fake_run:
+            osd.create_batch_osds(conn, 'ceph', ['/dev/sdb', '/dev/sdc'], 'bluestore', dmcrypt=True)
+        assert fake_run.call_args[0][1] == [
+            '/usr/sbin/ceph-volume', '--cluster', 'ceph', 'lvm', 'batch', '--yes',
+            '--no-auto', '--bluestore', '--dmcrypt', '/dev/sdb', '/dev/sdc',
+        ]
+
+    def test_mixed_devices_are_all_data_devices(self):
+        conn = Mock()
+        conn.remote_module.which.return_value = '/usr/sbin/ceph-volume'
+        with patch('ceph_deploy.osd.remoto.process.run') as fake_run:
+            osd.create_batch_osds(conn, 'ceph', ['/dev/sdb', '/dev/nvme0n1'], 'bluestore', dmcrypt=False)
+        assert fake_run.call_args[0][1] == [
+            '/usr/sbin/ceph-volume', '--cluster', 'ceph', 'lvm', 'batch', '--yes',
+            '--no-auto', '--bluestore', '/dev/sdb', '/dev/nvme0n1',
+        ]
+
+
+class TestOSDStates(object):
+
+    def setup(self):
+        self.conn = Mock()
+        self.conn.remote_module.which.return_value = '/usr/bin/ceph'
+
+    def test_up_by_id(self):
+        dump = json.dumps({'osds': [{'osd': 0, 'up': 1}, {'osd': 4, 'up': 0}]})
+        with patch('ceph_deploy.osd.remoto.process.check', return_value=([dump], [], 0)):
+            assert osd.osd_states(self.conn, 'ceph') == {0: True, 4: False}
+
+    @pytest.mark.parametrize('reply', [([], ['no admin key'], 1), (['not json'], [], 0)])
+    def test_unknown(self, reply):
+        with patch('ceph_deploy.osd.remoto.process.check', return_value=reply):
+            assert osd.osd_states(self.conn, 'ceph') is None
+
+
+class TestWaitForOSDs(object):
+
+    def wait(self, states, before):
+        conn = Mock()
+        with patch('ceph_deploy.osd.osd_states', Mock(side_effect=states)):
+            with patch('ceph_deploy.util.wait.time.sleep'):
+                return osd.wait_for_osds(conn, 'ceph', before, timeout=1)
+
+    def test_unrelated_down_osds_do_not_matter(self):
+        states = [{0: False, 1: True, 2: True}]
+        assert self.wait(states, {0: False, 1: True}) == {2: True}
+
+    def test_waits_for_new_osds_to_come_up(self):
+        states = [{0: True, 2: False}, {0: True, 2: False}, {0: True, 2: True}]
+        assert self.wait(states, set([0])) == {2: True}
+
+    def test_unknown_before_does_not_wait(self):
+        states = Mock()
+        assert self.wait(states, None) == {}
+        assert not states.called
+
+
+class TestCreateBatch(object):
+
+    def setup(self):
+        self.distros = {}
+        self.created = []
+        self.states = {}
+
+    def get(self, hostname, **kw):
+        distro = self.distros.setdefault(hostname, Mock())
+        distro.conn.hostname = hostname
+        return distro
+
+    def create_batch(self, args, fail=()):
+        def create_batch_osds(conn, cluster, devices, storetype, dmcrypt, debug=False):
+            if conn.hostname in fail:
+                raise RuntimeError('ceph-volume failed')
+            self.created.append((conn.hostname, devices, storetype))
+
+        with patch('ceph_deploy.osd.hosts.get', self.get), \
+                patch('ceph_deploy.osd.get_bootstrap_osd_key', return_value='key'), \
+                patch('ceph_deploy.osd.conf.ceph.load_raw', return_value='conf'), \
+                patch('ceph_deploy.osd.push.push') as fake_push, \
+                patch('ceph_deploy.osd.create_osd_keyring') as fake_keyring, \
+                patch('ceph_deploy.osd.create_batch_osds', create_batch_osds), \
+                patch('ceph_deploy.osd.osd_states', self.osd_states), \
+                patch('ceph_deploy.osd.wait_for_osds') as fake_wait, \
+                patch('ceph_deploy.osd.catch_osd_errors'):
+            try:
+                osd.create_batch(args, None)
+            finally:
+                self.pushed = [call[0][1] for call in fake_push.call_args_list]
+                self.keyrings = fake_keyring.call_count
+                self.waits = fake_wait.call_count
+                self.wait_args = fake_wait.call_args
+
+    def osd_states(self, conn, cluster):
+        return self.states.get(conn.hostname)
+
+    def test_every_host_is_bootstrapped_once(self):
+        self.create_batch(make_args())
+        assert sorted(self.pushed) == ['node1', 'node2']
+        assert self.keyrings == 2
+        assert sorted(self.created) == [
+            ('node1', ['/dev/sdb', '/dev/sdc'], 'bluestore'),
+            ('node2', ['/dev/sdb'], 'bluestore'),
+        ]
+
+    def test_cluster_is_checked_once(self):
+        self.create_batch(make_args())
+        assert self.waits == 1
+
+    def test_only_osds_created_in_this_run_are_waited_for(self):
+        # node2 started after node1 had created osd.3
+        self.states = {'node1': {0: True, 1: False}, 'node2': {0: True, 1: False, 3: True}}
+        self.create_batch(make_args())
+        assert self.wait_args[0][2] == set([0, 1])
+
+    def test_nothing_to_wait_for_when_the_cluster_is_unknown(self):
+        self.create_batch(make_args())
+        assert self.wait_args[0][2] is None
+
+    def test_filestore(self):
+        self.create_batch(make_args(batch=['node1:/dev/sdb'], filestore=True))
+        assert self.created == [('node1', ['/dev/sdb'], 'filestore')]
+
+    def test_failed_host_does_not_stop_the_others(self):
+        with pytest.raises(exc.GenericError) as error:
+            self.create_batch(make_args(), fail=('node1',))
+        assert '1 hosts' in str(error.value)
+        assert self.created == [('node2', ['/dev/sdb'], 'bluestore')]
+        # the status check still runs from the host that made it
+        assert self.waits == 1
+        assert self.distros['node1'].conn.exit.called
+
+    def test_single_device_options_are_refused(self):
+        with pytest.raises(RuntimeError):
+            self.create_batch(make_args(block_db='/dev/nvme0n1p1'))
+        assert self.created == []
+
+    def test_host_and_data_are_refused(self):
+        with pytest.raises(RuntimeError):
+            self.create_batch(make_args(host='node1', data='/dev/sdb'))
+
+    def test_spec(self, tmpdir):
+        path = tmpdir.join('cluster.spec')
+        path.write('[osd]\nnode3 = /dev/sdd\n')
+        self.create_batch(make_args(batch=None, spec=str(path)))
+        assert self.created == [('node3', ['/dev/sdd'], 'bluestore')]
+
+    def test_spec_without_osds(self, tmpdir):
+        path = tmpdir.join('cluster.spec')
+        path.write('[mon]\nhosts = node1\n')
+        with pytest.raises(exc.NeedDiskError):
+            self.create_batch(make_args(batch=None, spec=str(path)))
+
+
+class TestDiskList(object):
+
+    record = {
+        'path': '/dev/sdb', 'size': 1024, 'rotational': True, 'model': None,
+        'serial': None, 'holders': [], 'mountpoints': [], 'ceph': False,
+    }
+
+    def disk_list(self, capsys, **kw):
+        args = argparse.Namespace(
+            username=None, host=['node1', 'node2'], parallel=2, debug=False,
+            ceph_volume=False, format='json',
+        )
+        for key, value in kw.items():
+            setattr(args, key, value)
+
+        def lsblk(conn):
+            if conn.hostname == 'node2':
+                raise RuntimeError('lsblk failed')
+            return [dict(self.record)]
+
+        def get(hostname, **kw):
+            distro = Mock()
+            distro.conn.hostname = hostname
+            return distro
+
+        with patch('ceph_deploy.osd.hosts.get', get), \
+                patch('ceph_deploy.osd.disks.lsblk', lsblk), \
+                patch('ceph_deploy.osd.disks.inventory', return_value=[
+                    {'path': '/dev/sdb', 'available': True}]):
+            with pytest.raises(exc.GenericError):
+                osd.disk_list(args, None)
+        return capsys.readouterr()[0]
+
+    def test_json_has_every_host_that_worked(self, capsys):
+        out = self.disk_list(capsys)
+        assert json.loads(out) == {'node1': [self.record]}
+
+    def test_ceph_volume_inventory(self, capsys):
+        out = self.disk_list(capsys, ceph_volume=True)
+        assert json.loads(out)['node1'][0]['available'] is True
+
+    def test_plain_prints_nothing(self, capsys):
+        assert self.disk_list(capsys, format='plain') == ''
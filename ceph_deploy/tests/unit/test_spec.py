@@ -0,0 +1,218 @@
+import argparse
+import json
+
+import pytest
+from mock import Mock, patch
+
+from ceph_deploy import exc, spec
+from ceph_deploy.spec import Action, ClusterSpec
+
+
+SPEC = """
+[mon]
+hosts = node1 node2
+
+[mgr]
+hosts = node1
+
+[mds]
+hosts = node2:fs
+
+[rgw]
+hosts = node2
+
+[osd]
+node1 = /dev/sdb /dev/sdc
+node3 = /dev/disk/by-id/wwn-1
+"""
+
+
+def make_args(**kw):
+    args = dict(cluster='ceph', username=None, parallel=1, spec='cluster.spec')
+    args.update(kw)
+    return argparse.Namespace(**args)
+
+
+@pytest.fixture
+def cluster_spec(tmpdir):
+    path = tmpdir.join('cluster.spec')
+    path.write(SPEC)
+    return ClusterSpec.load(str(path))
+
+
+class TestClusterSpec(object):
+
+    def test_daemons(self, cluster_spec):
+        assert [str(action) for action in cluster_spec.actions] == [
+            'create mon.node1 on node1',
+            'create mon.node2 on node2',
+            'create mgr.node1 on node1',
+            'create mds.fs on node2',
+            'create rgw.rgw.node2 on node2',
+            'create osd /dev/sdb on node1',
+            'create osd /dev/sdc on node1',
+            'create osd /dev/disk/by-id/wwn-1 on node3',
+        ]
+
+    def test_entries_are_kept_for_create(self, cluster_spec):
+        mds = [a for a in cluster_spec.actions if a.kind == 'mds'][0]
+        assert mds.entry == 'node2:fs'
+
+    def test_hosts_in_order(self, cluster_spec):
+        assert cluster_spec.hosts() == ['node1', 'node2', 'node3']
+
+    def test_done_paths(self):
+        assert Action('mon', 'node1', 'node1').done_path('ceph') == '/var/lib/ceph/mon/ceph-node1/done'
+        assert Action('rgw', 'node1', 'rgw.node1').done_path('ceph') == '/var/lib/ceph/radosgw/ceph-rgw.node1/done'
+
+    def test_unknown_sections(self, tmpdir):
+        path = tmpdir.join('cluster.spec')
+        path.write('[monitors]\nhosts = node1\n')
+        with pytest.raises(exc.ConfigError):
+            ClusterSpec.load(str(path))
+
+    def test_missing_file(self, tmpdir):
+        with pytest.raises(exc.ConfigError):
+            ClusterSpec.load(str(tmpdir.join('missing')))
+
+
+class TestOsdDevices(object):
+
+    def test_data_devices_of_the_cluster(self):
+        conn = Mock()
+        conn.remote_module.which.return_value = '/usr/sbin/ceph-volume'
+        listing = {
+            '0': [
+                {'type': 'block', 'devices': ['/dev/sdb'], 'tags': {'ceph.cluster_name': 'ceph'}},
+                {'type': 'db', 'devices': ['/dev/nvme0n1'], 'tags': {'ceph.cluster_name': 'ceph'}},
+            ],
+            '1': [{'type': 'block', 'devices': ['/dev/sdc'], 'tags': {'ceph.cluster_name': 'other'}}],
+        }
+        with patch('ceph_deploy.spec.remoto.process.check', return_value=([json.dumps(listing)], [], 0)):
+            assert spec.osd_devices(conn, 'ceph') == set(['/dev/sdb'])
+
+    def test_no_osds(self):
+        conn = Mock()
+        error = ['-->  RuntimeError: No valid Ceph lvm devices found']
+        with patch('ceph_deploy.spec.remoto.process.check', return_value=([], error, 1)):
+            assert spec.osd_devices(conn, 'ceph') == set()
+
+    def test_without_ceph_volume(self):
+        conn = Mock()
+        conn.remote_module.which.return_value = None
+        assert spec.osd_devices(conn, 'ceph') == set()
+
+
+class TestPlan(object):
+
+    def gather(self, done, devices):
+        """
+        A ``hosts.get`` whose hosts have the ``done`` files and OSD
+        ``devices`` given, with /dev/disk/by-id/wwn-1 pointing at /dev/sdb
+        """
+        def get(hostname, **kw):
+            distro = Mock()
+
+            def batch(calls, stop_on_error):
+                replies = []
+                for name, args, _ in calls:
+                    if name == 'path_exists':
+                        replies.append((args[0] in done.get(hostname, []), None))
+                    elif name == 'get_realpath':
+                        replies.append((args[0].replace('/dev/disk/by-id/wwn-1', '/dev/sdb'), None))
+                    else:
+                        replies.append((None, 'No such file or directory'))
+                return replies
+            distro.conn.remote_module.batch.side_effect = batch
+            distro.conn.hostname = hostname
+            return distro
+
+        def osd_devices(conn, cluster):
+            return set(devices.get(conn.hostname, []))
+
+        return patch('ceph_deploy.spec.hosts.get', get), patch('ceph_deploy.spec.osd_devices', osd_devices)
+
+    def test_only_missing_daemons(self, cluster_spec):
+        done = {
+            'node1': ['/var/lib/ceph/mon/ceph-node1/done', '/var/lib/ceph/mgr/ceph-node1/done'],
+            'node2': ['/var/lib/ceph/radosgw/ceph-rgw.node2/done'],
+        }
+        devices = {'node1': ['/dev/sdb'], 'node3': ['/dev/sdb']}
+        get, osd_devices = self.gather(done, devices)
+        with get, osd_devices:
+            actions = spec.plan(make_args(), cluster_spec)
+        assert [str(action) for action in actions] == [
+            'create mon.node2 on node2',
+            'create osd /dev/sdc on node1',
+            'create mds.fs on node2',
+        ]
+
+    def test_nothing_to_do(self, cluster_spec):
+        done = dict((a.host, []) for a in cluster_spec.actions)
+        for action in cluster_spec.actions:
+            done[action.host].append(action.done_path('ceph'))
+        devices = {'node1': ['/dev/sdb', '/dev/sdc'], 'node3': ['/dev/sdb']}
+        get, osd_devices = self.gather(done, devices)
+        with get, osd_devices:
+            assert spec.plan(make_args(), cluster_spec) == []
+
+    def test_unreachable_hosts_fail_the_plan(self, cluster_spec):
+        with patch('ceph_deploy.spec.hosts.get', side_effect=RuntimeError('unreachable')):
+            with pytest.raises(exc.GenericError):
+                spec.plan(make_args(), cluster_spec)
+
+
+class TestApply(object):
+
+    def test_monitors_first_then_the_rest(self, tmpdir):
+        tmpdir.join('ceph.bootstrap-osd.keyring').write('')
+        actions = [
+            Action('mon', 'node2', 'node2'),
+            Action('mgr', 'node1', 'node1'),
+            Action('osd', 'node1', '/dev/sdc'),
+            Action('osd', 'node3', '/dev/sdb'),
+        ]
+        calls = []
+        with tmpdir.as_cwd():
+            with patch('ceph_deploy.spec.run_kind', lambda args, kind, a: calls.append((kind, a))):
+                spec.apply_actions(make_args(), actions)
+        assert calls[0] == ('mon', actions[:1])
+        assert sorted(kind for kind, _ in calls[1:]) == ['mgr', 'osd']
+
+    def test_keys_are_gathered_from_new_monitors(self, tmpdir):
+        actions = [Action('mon', 'node1', 'node1'), Action('mgr', 'node1', 'node1')]
+        with tmpdir.as_cwd():
+            with patch('ceph_deploy.spec.run_kind'):
+                with patch('ceph_deploy.gatherkeys.gatherkeys') as gatherkeys:
+                    spec.apply_actions(make_args(), actions)
+        assert gatherkeys.call_args[0][0].mon == ['node1']
+
+    def test_failures_are_reported(self, tmpdir):
+        tmpdir.join('ceph.bootstrap-osd.keyring').write('')
+
+        def run_kind(args, kind, actions):
+            if kind == 'mgr':
+                raise exc.GenericError('Failed to create 1 MGRs')
+        with tmpdir.as_cwd():
+            with patch('ceph_deploy.spec.run_kind', run_kind):
+                with pytest.raises(exc.GenericError) as error:
+                    spec.apply_actions(make_args(), [Action('mgr', 'node1', 'node1'), Action('mds', 'node1', 'node1')])
+        assert 'mgr' in str(error.value)
+
+    def test_osds_are_created_in_one_batch(self):
+        actions = [
+            Action('osd', 'node2', '/dev/sdb'),
+            Action('osd', 'node1', '/dev/sdb'),
+            Action('osd', 'node1', '/dev/sdc'),
+        ]
+        with patch('ceph_deploy.osd.osd') as fake_osd:
+            spec.run_kind(make_args(), 'osd', actions)
+        assert fake_osd.call_count == 1
+        assert fake_osd.call_args[0][0].batch == ['node1:/dev/sdb,/dev/sdc', 'node2:/dev/sdb']
+        assert fake_osd.call_args[0][0].host is None
+
+    def test_daemons_are_created_with_their_entries(self):
+        actions = [Action('mds', 'node2', 'fs', 'node2:fs')]
+        with patch('ceph_deploy.mds.mds') as fake_mds:
+            spec.run_kind(make_args(), 'mds', actions)
+        assert fake_mds.call_args[0][0].mds == [('node2', 'fs')]
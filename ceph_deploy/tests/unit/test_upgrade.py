@@ -0,0 +1,255 @@
+import argparse
+
+import pytest
+from mock import Mock, patch
+
+from ceph_deploy import exc, upgrade
+from ceph_deploy.upgrade import UpgradeHost
+
+
+def make_args(**kw):
+    args = dict(
+        cluster='ceph',
+        username=None,
+        release='octopus',
+        window=1,
+        failure_domain='host',
+        health_timeout=0,
+        tolerate=None,
+        admin_host=None,
+        adjust_repos=True,
+        repo_url=None,
+        gpg_url=None,
+        nogpgcheck=False,
+        host=['node1'],
+        parallel=1,
+    )
+    args.update(kw)
+    return argparse.Namespace(**args)
+
+
+def host(name, *daemons):
+    return UpgradeHost(name, name, 'systemd', list(daemons))
+
+
+class TestHealthProblems(object):
+
+    def test_ok(self):
+        assert upgrade.health_problems({'status': 'HEALTH_OK', 'checks': {}}) == []
+
+    def test_pre_luminous_ok(self):
+        assert upgrade.health_problems({'overall_status': 'HEALTH_OK'}) == []
+
+    def test_noout_is_tolerated(self):
+        status = {'status': 'HEALTH_WARN', 'checks': {'OSDMAP_FLAGS': {}}}
+        assert upgrade.health_problems(status) == []
+
+    def test_other_warnings_are_problems(self):
+        status = {'status': 'HEALTH_WARN', 'checks': {'OSDMAP_FLAGS': {}, 'PG_DEGRADED': {}}}
+        assert upgrade.health_problems(status) == ['PG_DEGRADED']
+
+    def test_extra_tolerated_checks(self):
+        status = {'status': 'HEALTH_WARN', 'checks': {'PG_DEGRADED': {}}}
+        assert upgrade.health_problems(status, ('PG_DEGRADED',)) == []
+
+    def test_errors_are_never_tolerated(self):
+        status = {'status': 'HEALTH_ERR', 'checks': {'OSDMAP_FLAGS': {}}}
+        assert upgrade.health_problems(status) == ['HEALTH_ERR']
+
+    def test_unknown(self):
+        assert upgrade.health_problems(None) == ['cluster health is unknown']
+
+
+class TestFailureDomains(object):
+
+    tree = {'nodes': [
+        {'id': -1, 'name': 'default', 'type': 'root', 'children': [-2, -3]},
+        {'id': -2, 'name': 'rack1', 'type': 'rack', 'children': [-4, -5]},
+        {'id': -3, 'name': 'rack2', 'type': 'rack', 'children': [-6]},
+        {'id': -4, 'name': 'node1', 'type': 'host', 'children': [0]},
+        {'id': -5, 'name': 'node2', 'type': 'host', 'children': [1]},
+        {'id': -6, 'name': 'node3', 'type': 'host', 'children': [2]},
+        {'id': -7, 'name': 'node4', 'type': 'host', 'children': [3]},
+        {'id': 0, 'name': 'osd.0', 'type': 'osd'},
+    ]}
+
+    def test_hosts_map_to_their_rack(self):
+        domains = upgrade.failure_domains(self.tree, 'rack')
+        assert domains['node1'] == 'rack1'
+        assert domains['node2'] == 'rack1'
+        assert domains['node3'] == 'rack2'
+
+    def test_hosts_outside_of_a_rack_are_their_own_domain(self):
+        assert upgrade.failure_domains(self.tree, 'rack')['node4'] == 'node4'
+
+
+class TestPlanWaves(object):
+
+    def test_one_host_at_a_time_by_default(self):
+        hosts = [host('node1'), host('node2')]
+        assert upgrade.plan_waves(hosts, window=4) == [[hosts[0]], [hosts[1]]]
+
+    def test_window_within_a_failure_domain(self):
+        hosts = [host('node%d' % i) for i in range(1, 6)]
+        domains = {'node1': 'rack1', 'node2': 'rack2', 'node3': 'rack1', 'node4': 'rack1', 'node5': 'rack2'}
+        waves = upgrade.plan_waves(hosts, window=2, domains=domains)
+        assert [[h.hostname for h in wave] for wave in waves] == [
+            ['node1', 'node3'], ['node4'], ['node2', 'node5'],
+        ]
+
+    def test_domains_are_never_mixed(self):
+        hosts = [host('node1'), host('node2')]
+        waves = upgrade.plan_waves(hosts, window=10, domains={'node1': 'a', 'node2': 'b'})
+        assert len(waves) == 2
+
+
+class TestUpgrade(object):
+
+    def setup(self):
+        self.conn = Mock()
+        self.conn.remote_module.which.return_value = '/usr/bin/ceph'
+        self.hosts = [
+            host('mon1', 'mon', 'mgr'),
+            host('osd1', 'osd'),
+            host('osd2', 'osd'),
+            host('rgw1', 'rgw'),
+        ]
+        self.restarted = []
+
+    def make_upgrade(self, **kw):
+        plan = upgrade.Upgrade(make_args(**kw), self.conn, self.hosts)
+        plan.restart = lambda h, daemon, target: self.restarted.append((h.hostname, daemon))
+        plan.wait_healthy = Mock()
+        plan.ceph = Mock(return_value={'flags': 'sortbitwise'})
+        return plan
+
+    def test_daemons_are_restarted_in_order(self):
+        with patch('ceph_deploy.upgrade.remoto.process.run'):
+            self.make_upgrade().run()
+        assert self.restarted == [
+            ('mon1', 'mon'),
+            ('mon1', 'mgr'),
+            ('osd1', 'osd'),
+            ('osd2', 'osd'),
+            ('rgw1', 'rgw'),
+        ]
+
+    def test_health_is_checked_after_every_wave(self):
+        plan = self.make_upgrade()
+        with patch('ceph_deploy.upgrade.remoto.process.run'):
+            plan.run()
+        # once per wave, upgrade() already checked before installing
+        assert plan.wait_healthy.call_count == 5
+
+    def test_noout_is_set_around_osd_restarts(self):
+        with patch('ceph_deploy.upgrade.remoto.process.run') as fake_run:
+            self.make_upgrade().run()
+        commands = [call[0][1] for call in fake_run.call_args_list]
+        assert commands == [
+            ['/usr/bin/ceph', '--cluster', 'ceph', 'osd', 'set', 'noout'],
+            ['/usr/bin/ceph', '--cluster', 'ceph', 'osd', 'unset', 'noout'],
+        ]
+
+    def test_noout_already_set_is_left_alone(self):
+        plan = self.make_upgrade()
+        plan.ceph.return_value = {'flags': 'noout,sortbitwise'}
+        with patch('ceph_deploy.upgrade.remoto.process.run') as fake_run:
+            plan.run()
+        assert not fake_run.called
+
+    def test_unhealthy_cluster_stops_the_upgrade(self):
+        plan = self.make_upgrade()
+        plan.wait_healthy.side_effect = [None, exc.GenericError('unhealthy')]
+        with patch('ceph_deploy.upgrade.remoto.process.run') as fake_run:
+            with pytest.raises(exc.GenericError):
+                plan.run()
+        assert self.restarted == [('mon1', 'mon'), ('mon1', 'mgr')]
+        # nothing restarted OSDs, nothing needed noout
+        assert not fake_run.called
+
+    def test_failed_restart_stops_the_upgrade(self):
+        plan = self.make_upgrade()
+
+        def restart(h, daemon, target):
+            if daemon == 'osd':
+                raise RuntimeError('unit failed')
+            self.restarted.append((h.hostname, daemon))
+        plan.restart = restart
+        with patch('ceph_deploy.upgrade.remoto.process.run') as fake_run:
+            with pytest.raises(exc.GenericError):
+                plan.run()
+        assert ('rgw1', 'rgw') not in self.restarted
+        # noout is cleared even when the upgrade stops
+        assert fake_run.call_args[0][1][-2:] == ['unset', 'noout']
+
+    def test_osd_hosts_in_a_rack_restart_together(self):
+        plan = self.make_upgrade(window=2, failure_domain='rack')
+        tree = {'nodes': [
+            {'id': -1, 'name': 'rack1', 'type': 'rack', 'children': [-2, -3]},
+            {'id': -2, 'name': 'osd1', 'type': 'host', 'children': []},
+            {'id': -3, 'name': 'osd2', 'type': 'host', 'children': []},
+        ]}
+        plan.ceph.return_value = tree
+        waves = plan.waves('osd', [self.hosts[1], self.hosts[2]])
+        assert waves == [[self.hosts[1], self.hosts[2]]]
+
+    def test_one_gateway_keeps_serving(self):
+        plan = self.make_upgrade(window=5)
+        gateways = [host('rgw%d' % i, 'rgw') for i in range(3)]
+        assert [len(wave) for wave in plan.waves('rgw', gateways)] == [2, 1]
+
+    def test_monitors_restart_one_at_a_time(self):
+        plan = self.make_upgrade(window=5)
+        monitors = [host('mon%d' % i, 'mon') for i in range(3)]
+        assert [len(wave) for wave in plan.waves('mon', monitors)] == [1, 1, 1]
+
+
+class TestRestart(object):
+
+    def test_refuses_hosts_without_systemd(self):
+        plan = upgrade.Upgrade(make_args(), Mock(), [])
+        with pytest.raises(RuntimeError):
+            plan.restart(UpgradeHost('node1', 'node1', 'sysvinit', ['osd']), 'osd', 'ceph-osd.target')
+
+    def test_restarts_the_target(self):
+        plan = upgrade.Upgrade(make_args(), Mock(), [])
+        distro = Mock()
+        with patch('ceph_deploy.upgrade.hosts.get', return_value=distro):
+            with patch('ceph_deploy.upgrade.system.restart_service') as restart:
+                plan.restart(host('node1', 'osd'), 'osd', 'ceph-osd.target')
+        restart.assert_called_once_with(distro.conn, 'ceph-osd.target')
+        assert distro.conn.exit.called
+
+
+class TestDiscover(object):
+
+    def test_daemons_of_the_cluster(self):
+        distro = Mock(init='systemd')
+        distro.conn.remote_module.batch.return_value = [
+            ('node1', None),
+            (['ceph-node1'], None),
+            ([], None),
+            (['other-0'], None),
+            (None, 'No such file or directory'),
+            (['ceph-rgw.node1'], None),
+        ]
+        with patch('ceph_deploy.upgrade.hosts.get', return_value=distro):
+            found = upgrade.discover(make_args(), 'node1.example.com')
+        assert found.shortname == 'node1'
+        assert found.daemons == ['mon', 'rgw']
+
+
+class TestInstallArgs(object):
+
+    def test_packages_are_installed_from_the_release(self):
+        args = make_args(host=['node1', 'node2'], repo_url='http://mirror/ceph', nogpgcheck=True)
+        install_args = upgrade.install_args(args)
+        assert install_args.release == 'octopus'
+        assert install_args.version_kind == 'stable'
+        assert install_args.host == ['node1', 'node2']
+        assert install_args.repo_url == 'http://mirror/ceph'
+        assert install_args.nogpgcheck is True
+        assert install_args.adjust_repos is True
+        assert install_args.cluster == 'ceph'
+        # a point release upgrade has the release installed already
+        assert install_args.reinstall is True
@@ -0,0 +1,66 @@
+from mock import Mock
+from pytest import raises
+
+from ceph_deploy.hosts import remotes
+from ceph_deploy.util.batch import RemoteBatch
+
+
+def make_conn():
+    conn = Mock()
+    conn.remote_module.batch = Mock(side_effect=remotes.batch)
+    return conn
+
+
+class TestRemoteBatch(object):
+
+    def test_calls_are_sent_in_one_message(self, tmpdir):
+        conn = make_conn()
+        batch = RemoteBatch(conn)
+        batch.path_exists(str(tmpdir))
+        batch.listdir(str(tmpdir))
+        assert batch.execute() == [True, []]
+        assert conn.remote_module.batch.call_count == 1
+
+    def test_nothing_is_sent_until_executed(self):
+        conn = make_conn()
+        batch = RemoteBatch(conn)
+        batch.shortname()
+        assert len(batch) == 1
+        assert not conn.remote_module.batch.called
+
+    def test_empty_batch_does_not_send_anything(self):
+        conn = make_conn()
+        assert RemoteBatch(conn).execute() == []
+        assert not conn.remote_module.batch.called
+
+    def test_batch_can_be_reused(self, tmpdir):
+        batch = RemoteBatch(make_conn())
+        batch.path_exists(str(tmpdir))
+        batch.execute()
+        batch.listdir(str(tmpdir))
+        assert batch.execute() == [[]]
+
+    def test_errors_are_raised(self, tmpdir):
+        batch = RemoteBatch(make_conn())
+        batch.readline(str(tmpdir.join('missing')))
+        with raises(RuntimeError) as error:
+            batch.execute()
+        assert 'No such file or directory' in str(error.value)
+
+    def test_errors_are_kept_per_call(self, tmpdir):
+        batch = RemoteBatch(make_conn(), stop_on_error=False)
+        missing = batch.readline(str(tmpdir.join('missing')))
+        exists = batch.path_exists(str(tmpdir))
+        assert batch.execute(raise_errors=False) == [None, True]
+        assert exists.get() is True
+        with raises(RuntimeError):
+            missing.get()
+
+    def test_calls_are_not_available_before_executing(self):
+        call = RemoteBatch(make_conn()).shortname()
+        with raises(RuntimeError):
+            call.get()
+
+    def test_private_attributes_are_not_queued(self):
+        with raises(AttributeError):
+            RemoteBatch(make_conn())._private
@@ -0,0 +1,159 @@
+import json
+
+import pytest
+from mock import Mock, patch
+
+from ceph_deploy.util import disks
+
+
+LSBLK = json.dumps({'blockdevices': [
+    {'name': 'sda', 'type': 'disk', 'size': 480103981056, 'rota': False,
+     'model': 'INTEL SSDSC2KB48 ', 'serial': 'BTYF1', 'mountpoint': None,
+     'children': [
+         {'name': 'sda1', 'type': 'part', 'size': 1073741824, 'mountpoint': '/boot'},
+         {'name': 'sda2', 'type': 'part', 'size': 479029190144, 'mountpoint': None,
+          'children': [{'name': 'vg0-root', 'type': 'lvm', 'mountpoint': '/'}]},
+     ]},
+    {'name': 'sdb', 'type': 'disk', 'size': '4000787030016', 'rota': '1',
+     'model': 'ST4000NM0035', 'serial': 'ZC1A2B3C', 'fstype': 'LVM2_member',
+     'children': [{'name': 'ceph--0a1b-osd--block--2c3d', 'type': 'lvm'}]},
+    {'name': 'sdc', 'type': 'disk', 'size': 4000787030016, 'rota': True,
+     'model': None, 'serial': None},
+    {'name': 'sr0', 'type': 'rom', 'size': 1073741312, 'rota': True},
+]})
+
+
+class TestParseLsblk(object):
+
+    def setup(self):
+        self.records = dict((r['path'], r) for r in disks.parse_lsblk(LSBLK))
+
+    def test_only_disks(self):
+        assert sorted(self.records) == ['/dev/sda', '/dev/sdb', '/dev/sdc']
+
+    def test_record(self):
+        assert self.records['/dev/sda'] == {
+            'path': '/dev/sda',
+            'size': 480103981056,
+            'rotational': False,
+            'model': 'INTEL SSDSC2KB48',
+            'serial': 'BTYF1',
+            'holders': ['sda1', 'sda2', 'vg0-root'],
+            'mountpoints': ['/boot', '/'],
+            'ceph': False,
+        }
+
+    def test_older_lsblk_reports_strings(self):
+        assert self.records['/dev/sdb']['size'] == 4000787030016
+        assert self.records['/dev/sdb']['rotational'] is True
+
+    def test_osd_lv_is_ceph(self):
+        assert self.records['/dev/sdb']['ceph'] is True
+        assert self.records['/dev/sdc']['ceph'] is False
+
+    def test_every_mountpoint(self):
+        output = json.dumps({'blockdevices': [
+            {'name': 'sda', 'type': 'disk', 'mountpoints': ['/srv', '/mnt']},
+        ]})
+        assert disks.parse_lsblk(output)[0]['mountpoints'] == ['/srv', '/mnt']
+
+
+class TestParseLsblkPairs(object):
+
+    def test_devices_after_a_disk_are_its_holders(self):
+        lines = [
+            'NAME="sda" TYPE="disk" SIZE="480103981056" ROTA="0" MODEL="INTEL SSD" SERIAL="" FSTYPE="" PARTLABEL="" MOUNTPOINT=""',
+            'NAME="sda1" TYPE="part" SIZE="1073741824" ROTA="0" MODEL="" SERIAL="" FSTYPE="xfs" PARTLABEL="" MOUNTPOINT="/boot"',
+            'NAME="sdb" TYPE="disk" SIZE="4000787030016" ROTA="1" MODEL="ST4000NM0035" SERIAL="" FSTYPE="" PARTLABEL="" MOUNTPOINT=""',
+            'NAME="sdb1" TYPE="part" SIZE="104857600" ROTA="1" MODEL="" SERIAL="" FSTYPE="xfs" PARTLABEL="ceph data" MOUNTPOINT=""',
+            '',
+        ]
+        sda, sdb = disks.parse_lsblk_pairs(lines)
+        assert sda['model'] == 'INTEL SSD'
+        assert sda['rotational'] is False
+        assert sda['holders'] == ['sda1']
+        assert sda['mountpoints'] == ['/boot']
+        assert sda['serial'] is None
+        assert sdb['ceph'] is True
+
+
+class TestMergeInventory(object):
+
+    def test_availability_and_osds(self):
+        records = disks.parse_lsblk(LSBLK)
+        inventory = [
+            {'path': '/dev/sdc', 'available': False, 'rejected_reasons': ['locked'], 'lvs': []},
+            {'path': '/dev/sdd', 'available': True, 'lvs': []},
+            {'path': '/dev/sda', 'available': False, 'rejected_reasons': [],
+             'lvs': [{'osd_id': '3', 'cluster_name': 'ceph'}]},
+        ]
+        merged = dict((r['path'], r) for r in disks.merge_inventory(records, inventory))
+        assert merged['/dev/sdc']['available'] is False
+        assert merged['/dev/sdc']['rejected_reasons'] == ['locked']
+        assert merged['/dev/sda']['ceph'] is True
+        assert 'available' not in merged['/dev/sdb']
+
+
+class TestLsblk(object):
+
+    def test_json(self):
+        with patch('ceph_deploy.util.disks.remoto.process.check', return_value=([LSBLK], [], 0)) as check:
+            records = disks.lsblk(Mock())
+        assert len(records) == 3
+        assert check.call_count == 1
+
+    def test_falls_back_to_pairs(self):
+        replies = [
+            ([], ['lsblk: unrecognized option --json'], 1),
+            (['NAME="sda" TYPE="disk" SIZE="1024" ROTA="1"'], [], 0),
+        ]
+        with patch('ceph_deploy.util.disks.remoto.process.check', side_effect=replies):
+            records = disks.lsblk(Mock())
+        assert [r['path'] for r in records] == ['/dev/sda']
+
+    def test_failure(self):
+        with patch('ceph_deploy.util.disks.remoto.process.check', return_value=([], ['boom'], 1)):
+            with pytest.raises(RuntimeError):
+                disks.lsblk(Mock())
+
+
+class TestInventory(object):
+
+    def test_without_ceph_volume(self):
+        conn = Mock()
+        conn.remote_module.which.return_value = None
+        assert disks.inventory(conn) == []
+
+    def test_debug(self):
+        conn = Mock()
+        conn.remote_module.which.return_value = '/usr/sbin/ceph-volume'
+        with patch('ceph_deploy.util.disks.remoto.process.check', return_value=(['[]'], [], 0)) as check:
+            assert disks.inventory(conn, debug=True) == []
+        assert check.call_args[1]['extend_env'] == {'CEPH_VOLUME_DEBUG': '1'}
+
+    def test_unparseable(self):
+        conn = Mock()
+        conn.remote_module.which.return_value = '/usr/sbin/ceph-volume'
+        with patch('ceph_deploy.util.disks.remoto.process.check', return_value=(['nope'], [], 0)):
+            with pytest.raises(RuntimeError):
+                disks.inventory(conn)
+
+
+class TestDescribe(object):
+
+    @pytest.mark.parametrize('size, expected', [
+        (None, '-'),
+        (512, '512 B'),
+        (480103981056, '447.1 GiB'),
+        (4000787030016, '3.6 TiB'),
+    ])
+    def test_format_size(self, size, expected):
+        assert disks.format_size(size) == expected
+
+    def test_states(self):
+        records = dict((r['path'], r) for r in disks.parse_lsblk(LSBLK))
+        assert disks.describe(records['/dev/sda']).endswith(' in use')
+        assert disks.describe(records['/dev/sdb']).endswith('in use by ceph')
+        assert disks.describe(records['/dev/sdc']).endswith('available')
+        records['/dev/sdc'].update(available=False, rejected_reasons=['locked'])
+        assert disks.describe(records['/dev/sdc']).endswith('unavailable: locked')
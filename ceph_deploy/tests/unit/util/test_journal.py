@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from ceph_deploy.util import journal
+
+
+class TestJournal(object):
+
+    def setup(self):
+        self.calls = []
+
+    def step(self, host):
+        self.calls.append(host)
+        return 'installed'
+
+    def records(self, path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_disabled_by_default(self, tmpdir):
+        run = journal.Journal().wrap('install', self.step)
+        assert run('node1') == 'installed'
+        assert tmpdir.listdir() == []
+
+    def test_records_start_and_end(self, tmpdir):
+        path = str(tmpdir.join('ceph-deploy-ceph.journal'))
+        run = journal.Journal(path, command='install').wrap('install', self.step, {'release': 'nautilus'})
+        run('node1')
+        records = self.records(path)
+        assert [r['status'] for r in records] == ['started', 'done']
+        assert records[1]['host'] == 'node1'
+        assert records[1]['params'] == {'release': 'nautilus'}
+        assert records[1]['duration'] >= 0
+
+    def test_failures_are_recorded(self, tmpdir):
+        path = str(tmpdir.join('ceph-deploy-ceph.journal'))
+
+        def fail(host):
+            raise RuntimeError('ssh went away')
+        with pytest.raises(RuntimeError):
+            journal.Journal(path, command='install').wrap('install', fail)('node1')
+        assert [r['status'] for r in self.records(path)] == ['started', 'failed']
+
+    def test_resume_skips_completed_steps(self, tmpdir):
+        path = str(tmpdir.join('ceph-deploy-ceph.journal'))
+        journal.Journal(path, command='install').wrap('install', self.step)('node1')
+        resumed = journal.Journal(path, command='install', resume=True)
+        run = resumed.wrap('install', self.step)
+        assert run('node1') == journal.RESUMED
+        assert run('node2') == 'installed'
+        assert self.calls == ['node1', 'node2']
+
+    def test_without_resume_everything_runs_again(self, tmpdir):
+        path = str(tmpdir.join('ceph-deploy-ceph.journal'))
+        journal.Journal(path, command='install').wrap('install', self.step)('node1')
+        journal.Journal(path, command='install').wrap('install', self.step)('node1')
+        assert self.calls == ['node1', 'node1']
+
+    def test_different_params_run_again(self, tmpdir):
+        path = str(tmpdir.join('ceph-deploy-ceph.journal'))
+        journal.Journal(path, command='install').wrap('install', self.step, {'release': 'mimic'})('node1')
+        resumed = journal.Journal(path, command='install', resume=True)
+        resumed.wrap('install', self.step, {'release': 'nautilus'})('node1')
+        assert self.calls == ['node1', 'node1']
+
+    def test_other_commands_do_not_count(self, tmpdir):
+        path = str(tmpdir.join('ceph-deploy-ceph.journal'))
+        journal.Journal(path, command='osd').wrap('install', self.step)('node1')
+        journal.Journal(path, command='install', resume=True).wrap('install', self.step)('node1')
+        assert self.calls == ['node1', 'node1']
+
+    def test_unfinished_steps_run_again(self, tmpdir):
+        path = tmpdir.join('ceph-deploy-ceph.journal')
+        run = journal.Journal(str(path), command='install')
+        run.record('install', 'node1', 'done')
+        run.record('install', 'node1', 'started')
+        # a run killed half way through writing a line
+        path.write('{"command": "install", "st', mode='a')
+        journal.Journal(str(path), command='install', resume=True).wrap('install', self.step)('node1')
+        assert self.calls == ['node1']
+
+    def test_unwritable_journal_does_not_fail_the_step(self, tmpdir):
+        path = str(tmpdir.join('missing', 'ceph-deploy-ceph.journal'))
+        assert journal.Journal(path, command='install').wrap('install', self.step)('node1') == 'installed'
+
+
+class TestConfigure(object):
+
+    def teardown(self):
+        journal.journal = journal.Journal()
+
+    def test_wrap_uses_the_configured_journal(self, tmpdir):
+        path = str(tmpdir.join('ceph-deploy-ceph.journal'))
+        journal.configure(path, command='install')
+        journal.wrap('install', lambda host: None)('node1')
+        assert tmpdir.join('ceph-deploy-ceph.journal').check()
+
+    def test_default_path_is_next_to_the_log(self, tmpdir):
+        with tmpdir.as_cwd():
+            assert journal.default_path('backup') == str(tmpdir.join('ceph-deploy-backup.journal'))
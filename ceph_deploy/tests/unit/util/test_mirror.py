@@ -0,0 +1,137 @@
+import threading
+
+from mock import Mock, patch
+import pytest
+
+from ceph_deploy.util import mirror
+
+
+class FakeDistribution(mirror.Distribution):
+    """
+    Records transfers instead of running them, ``broken`` peers cannot send,
+    ``unreachable`` hosts cannot be pushed to and ``corrupt`` hosts never
+    verify.
+    """
+
+    def __init__(self, *a, **kw):
+        self.broken = kw.pop('broken', ())
+        self.unreachable = kw.pop('unreachable', ())
+        self.corrupt = kw.pop('corrupt', ())
+        super(FakeDistribution, self).__init__(*a, **kw)
+        self.pushed = []
+        self.copied = []
+        self.lock = threading.Lock()
+
+    def push(self, hostnames):
+        with self.lock:
+            self.pushed.append(list(hostnames))
+        for hostname in hostnames:
+            if hostname in self.unreachable:
+                raise RuntimeError('%s is unreachable' % hostname)
+
+    def copy(self, source, hostname):
+        if source in self.broken:
+            raise RuntimeError('%s cannot reach %s' % (source, hostname))
+        with self.lock:
+            self.copied.append((source, hostname))
+
+    def verify(self, hostname):
+        if hostname in self.corrupt:
+            raise RuntimeError('%s does not match' % hostname)
+        return hostname
+
+
+def hosts(count):
+    return ['node%d' % number for number in range(1, count + 1)]
+
+
+class TestSchedule(object):
+
+    def test_seeds_come_from_the_admin_node(self):
+        rounds = mirror.schedule(hosts(2), seeds=2)
+        assert rounds == [[(None, 'node1'), (None, 'node2')]]
+
+    def test_staged_hosts_double_every_round(self):
+        rounds = mirror.schedule(hosts(8))
+        assert [len(transfers) for transfers in rounds] == [1, 1, 2, 4]
+        assert rounds[3] == [
+            ('node1', 'node5'), ('node2', 'node6'),
+            ('node3', 'node7'), ('node4', 'node8'),
+        ]
+
+    def test_rounds_are_logarithmic(self):
+        assert len(mirror.schedule(hosts(200), seeds=3)) == 8
+
+
+class TestDistribution(object):
+
+    def make(self, tmpdir, count, **kw):
+        tmpdir.join('release.asc').write('key')
+        return FakeDistribution(str(tmpdir), hosts(count), logger=Mock(), **kw)
+
+    def test_admin_node_only_pushes_to_seeds(self, tmpdir):
+        distribution = self.make(tmpdir, 8, seeds=2)
+        assert distribution.run() == hosts(8)
+        assert distribution.pushed == [['node1', 'node2']]
+        assert len(distribution.copied) == 6
+        assert distribution.failed == []
+
+    def test_failed_peer_copies_are_pushed_from_the_admin_node(self, tmpdir):
+        distribution = self.make(tmpdir, 3, broken=('node1',))
+        assert distribution.run() == hosts(3)
+        assert distribution.pushed == [['node1'], ['node2'], ['node3']]
+
+    def test_hosts_that_do_not_verify_are_failed(self, tmpdir):
+        distribution = self.make(tmpdir, 4, corrupt=('node2',))
+        staged = distribution.run()
+        assert distribution.failed == ['node2']
+        assert sorted(staged) == ['node1', 'node3', 'node4']
+        # node2 never becomes a source
+        assert all(source != 'node2' for source, _ in distribution.copied)
+
+    def test_failed_seeds_are_replaced(self, tmpdir):
+        distribution = self.make(tmpdir, 3, corrupt=('node1',))
+        assert distribution.run() == ['node2', 'node3']
+        assert distribution.pushed == [['node1'], ['node2']]
+
+    def test_unreachable_seeds_fail_alone(self, tmpdir):
+        distribution = self.make(tmpdir, 4, seeds=2, unreachable=('node1',))
+        assert distribution.run() == ['node2', 'node3', 'node4']
+        assert distribution.failed == ['node1']
+        assert distribution.pushed[0] == ['node1', 'node2']
+        assert sorted(distribution.pushed[1:]) == [['node1'], ['node2']]
+
+    def test_unreachable_single_seed_is_replaced(self, tmpdir):
+        distribution = self.make(tmpdir, 3, unreachable=('node1',))
+        assert distribution.run() == ['node2', 'node3']
+        assert distribution.failed == ['node1']
+        assert distribution.pushed == [['node1'], ['node2']]
+
+    def test_empty_mirror(self, tmpdir):
+        distribution = FakeDistribution(str(tmpdir), hosts(2), logger=Mock())
+        with pytest.raises(RuntimeError):
+            distribution.run()
+
+
+class TestVerify(object):
+
+    def test_mismatched_files_are_reported(self, tmpdir):
+        distribution = mirror.Distribution(str(tmpdir), ['node1'], logger=Mock())
+        distribution.expected = {'release.asc': 'a', 'pool/ceph.deb': 'b'}
+        conn = Mock()
+        conn.remote_module.tree_checksums.return_value = {'release.asc': 'a'}
+        distribution.connect = Mock(return_value=conn)
+        with pytest.raises(RuntimeError) as error:
+            distribution.verify('node1')
+        assert '1 of 2 files differ (pool/ceph.deb)' in str(error.value)
+        assert conn.exit.called
+
+
+class TestPush(object):
+
+    def test_transport_errors_are_runtime_errors(self, tmpdir):
+        distribution = mirror.Distribution(str(tmpdir), ['node1'], logger=Mock())
+        with patch('ceph_deploy.util.mirror.remoto.rsync', Mock(side_effect=EOFError('gone'))):
+            with pytest.raises(RuntimeError) as error:
+                distribution.push(['node1', 'node2'])
+        assert 'node1, node2: gone' in str(error.value)
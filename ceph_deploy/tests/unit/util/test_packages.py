@@ -41,3 +41,25 @@ class TestCephVersion(object):
         _check = Mock(return_value=(version, b'', 1))
         c = packages.Ceph(Mock(), _check=_check)
         assert c._get_version_output() == '9.0.1-kjh234h123hd'
+
+
+class TestMatchesRelease(object):
+
+    def test_rpm_version(self):
+        assert packages.matches_release('14.2.22-0.el7', 'nautilus') is True
+
+    def test_dpkg_version_with_epoch(self):
+        assert packages.matches_release('2:15.2.17-1focal', 'octopus') is True
+
+    def test_other_release(self):
+        assert packages.matches_release('14.2.22-0.el7', 'octopus') is False
+
+    def test_prefix_is_a_whole_version_part(self):
+        assert packages.matches_release('140.1-1', 'nautilus') is False
+        assert packages.matches_release('0.94.10-1', 'hammer') is True
+
+    def test_not_installed(self):
+        assert packages.matches_release(None, 'nautilus') is False
+
+    def test_unknown_release(self):
+        assert packages.matches_release('14.2.22-0.el7', 'future') is False
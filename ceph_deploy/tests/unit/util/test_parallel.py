@@ -0,0 +1,92 @@
+import threading
+import time
+
+from mock import Mock
+from pytest import raises
+from ceph_deploy.util import parallel
+from ceph_deploy.tests.util import Empty
+
+
+class TestWorkers(object):
+
+    def test_defaults_to_serial(self):
+        assert parallel.workers(Empty()) == 1
+
+    def test_reads_parallel_flag(self):
+        assert parallel.workers(Empty(parallel=8)) == 8
+
+    def test_coerces_strings_from_config(self):
+        assert parallel.workers(Empty(parallel='4')) == 4
+
+    def test_invalid_values_fall_back_to_default(self):
+        assert parallel.workers(Empty(parallel='lots')) == 1
+
+    def test_never_below_one(self):
+        assert parallel.workers(Empty(parallel=0)) == 1
+
+
+class TestRun(object):
+
+    def test_results_keep_input_order(self):
+        def slow_for_first(host):
+            if host == 'node1':
+                time.sleep(0.05)
+            return host.upper()
+
+        outcomes = parallel.run(slow_for_first, ['node1', 'node2', 'node3'], workers=3)
+        assert [o.value for o in outcomes] == ['NODE1', 'NODE2', 'NODE3']
+
+    def test_caught_errors_are_recorded_per_host(self):
+        def fail_on_node2(host):
+            if host == 'node2':
+                raise RuntimeError('boom')
+            return host
+
+        logger = Mock()
+        outcomes = parallel.run(fail_on_node2, ['node1', 'node2', 'node3'], workers=2, logger=logger)
+        assert parallel.count_failed(outcomes) == 1
+        assert outcomes[1].failed
+        assert str(outcomes[1].error) == 'boom'
+        assert logger.error.called
+
+    def test_serial_errors_do_not_stop_other_hosts(self):
+        seen = []
+
+        def fail_on_node1(host):
+            seen.append(host)
+            if host == 'node1':
+                raise RuntimeError('boom')
+
+        outcomes = parallel.run(fail_on_node1, ['node1', 'node2'], logger=Mock())
+        assert seen == ['node1', 'node2']
+        assert parallel.count_failed(outcomes) == 1
+
+    def test_unexpected_errors_are_raised(self):
+        def explode(host):
+            raise KeyError(host)
+
+        with raises(KeyError):
+            parallel.run(explode, ['node1', 'node2'], workers=2)
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def track(host):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+
+        parallel.run(track, ['node%s' % i for i in range(10)], workers=3)
+        assert 1 < state['peak'] <= 3
+
+    def test_hosts_run_concurrently(self):
+        def nap(host):
+            time.sleep(0.1)
+
+        start = time.time()
+        parallel.run(nap, ['node%s' % i for i in range(5)], workers=5)
+        assert time.time() - start < 0.4
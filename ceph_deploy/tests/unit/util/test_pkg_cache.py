@@ -0,0 +1,260 @@
+import io
+import os
+import threading
+import time
+
+from mock import Mock
+import pytest
+
+from ceph_deploy.util import pkg_cache
+
+try:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError, URLError
+except ImportError:
+    from urllib2 import urlopen, HTTPError, URLError
+
+
+CACHE = 'http://admin:8080'
+
+
+class TestRewrite(object):
+
+    def test_url_goes_through_the_cache(self):
+        url = 'https://download.ceph.com/rpm-nautilus/el7/'
+        assert pkg_cache.rewrite(url, CACHE) == 'http://admin:8080/https/download.ceph.com/rpm-nautilus/el7/'
+
+    def test_query_string_is_kept(self):
+        url = 'https://shaman.ceph.com/api/repos/ceph/master/latest/centos/7/repo/?arch=x86_64'
+        assert pkg_cache.rewrite(url, CACHE).endswith('/centos/7/repo/?arch=x86_64')
+
+    def test_no_cache(self):
+        url = 'https://download.ceph.com/'
+        assert pkg_cache.rewrite(url, None) == url
+
+    @pytest.mark.parametrize('url', [
+        'file:///opt/ceph-deploy/repo',
+        'http://admin:8080/https/download.ceph.com/',
+        None,
+    ])
+    def test_unchanged(self, url):
+        assert pkg_cache.rewrite(url, CACHE) == url
+
+    def test_rewritten_url_maps_back_to_upstream(self):
+        url = 'https://download.ceph.com/debian-nautilus/dists/bionic/InRelease'
+        path = pkg_cache.rewrite(url, CACHE)[len(CACHE):]
+        assert pkg_cache.upstream(path) == url
+
+    @pytest.mark.parametrize('path', ['/', '/ftp/host/file', '/https'])
+    def test_not_an_upstream(self, path):
+        assert pkg_cache.upstream(path) is None
+
+    def test_repo_file_content(self):
+        content = (
+            b'[ceph]\n'
+            b'baseurl=https://chacra.ceph.com/r/ceph/master/abc/centos/7/flavors/default/x86_64/\n'
+            b'gpgkey=https://download.ceph.com/keys/autobuild.asc\n'
+        )
+        rewritten = pkg_cache.rewrite_content(content, CACHE)
+        assert b'baseurl=http://admin:8080/https/chacra.ceph.com/r/ceph/' in rewritten
+        assert b'gpgkey=http://admin:8080/https/download.ceph.com/keys/autobuild.asc\n' in rewritten
+
+    def test_cache_url_from_the_environment(self, monkeypatch):
+        monkeypatch.setenv('CEPH_DEPLOY_CACHE_URL', 'http://other:3142/')
+        assert pkg_cache.cache_url(Mock(cache_url=CACHE)) == 'http://other:3142'
+
+    def test_cache_url_from_args(self, monkeypatch):
+        monkeypatch.delenv('CEPH_DEPLOY_CACHE_URL', raising=False)
+        assert pkg_cache.cache_url(Mock(cache_url=CACHE + '/')) == CACHE
+        assert pkg_cache.cache_url(None) is None
+
+
+class TestAllowed(object):
+
+    @pytest.mark.parametrize('url', [
+        'https://download.ceph.com/rpm-nautilus/',
+        'https://DOWNLOAD.ceph.com/',
+        'https://3.chacra.ceph.com/r/ceph/',
+        'http://download.ceph.com:80/keys/release.asc',
+    ])
+    def test_default_upstreams(self, url):
+        assert pkg_cache.allowed(url, pkg_cache.default_upstreams)
+
+    @pytest.mark.parametrize('url', [
+        'http://localhost:6789/',
+        'http://10.0.0.1/',
+        'http://download.ceph.com@10.0.0.1/',
+        'https://download.ceph.com.example.com/',
+        'https://evilchacra.ceph.com/',
+        'file:///etc/passwd',
+    ])
+    def test_everything_else_is_refused(self, url):
+        assert not pkg_cache.allowed(url, pkg_cache.default_upstreams)
+
+    def test_repo_url_hosts(self):
+        hosts = pkg_cache.upstream_hosts(['http://repo.local:8000/ceph', 'not a url'])
+        assert hosts == ['repo.local']
+        assert pkg_cache.allowed('http://repo.local:8000/ceph/repodata/repomd.xml', hosts)
+
+    def test_redirects_away_from_upstreams_are_refused(self):
+        opener = pkg_cache.make_opener(pkg_cache.default_upstreams)
+        redirects = [
+            handler for handler in opener.__self__.handlers
+            if isinstance(handler, pkg_cache.HTTPRedirectHandler)
+        ][0]
+        with pytest.raises(pkg_cache.NotAllowed):
+            redirects.redirect_request(Mock(), None, 302, 'Found', {}, 'http://10.0.0.1/')
+
+
+class FakeUpstream(object):
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        self.lock = threading.Lock()
+        self.down = False
+
+    def __call__(self, url):
+        with self.lock:
+            self.requests.append(url)
+        if self.down:
+            raise URLError('unreachable')
+        if url not in self.files:
+            raise HTTPError(url, 404, 'Not Found', {}, None)
+        # give concurrent requests a chance to pile up
+        time.sleep(0.01)
+        return io.BytesIO(self.files[url])
+
+
+class TestPackageCache(object):
+
+    rpm = 'https://download.ceph.com/rpm-nautilus/el7/x86_64/ceph-14.2.22-0.el7.x86_64.rpm'
+    repomd = 'https://download.ceph.com/rpm-nautilus/el7/x86_64/repodata/repomd.xml'
+
+    def setup(self):
+        self.upstream = FakeUpstream({self.rpm: b'package', self.repomd: b'<repomd/>'})
+
+    def make_cache(self, tmpdir, **kw):
+        return pkg_cache.PackageCache(str(tmpdir), opener=self.upstream, **kw)
+
+    def test_second_request_is_served_from_disk(self, tmpdir):
+        cache = self.make_cache(tmpdir)
+        path = cache.fetch(self.rpm)
+        assert cache.fetch(self.rpm) == path
+        with open(path, 'rb') as f:
+            assert f.read() == b'package'
+        assert self.upstream.requests == [self.rpm]
+        assert cache.stats == {'hits': 1, 'misses': 1, 'bytes_fetched': 7}
+
+    def test_concurrent_requests_share_a_download(self, tmpdir):
+        cache = self.make_cache(tmpdir)
+        threads = [threading.Thread(target=cache.fetch, args=(self.rpm,)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert self.upstream.requests == [self.rpm]
+
+    def test_metadata_expires(self, tmpdir):
+        cache = self.make_cache(tmpdir, metadata_ttl=60)
+        path = cache.fetch(self.repomd)
+        cache.fetch(self.repomd)
+        assert len(self.upstream.requests) == 1
+        old = time.time() - 120
+        os.utime(path, (old, old))
+        cache.fetch(self.repomd)
+        assert len(self.upstream.requests) == 2
+
+    def test_packages_never_expire(self, tmpdir):
+        cache = self.make_cache(tmpdir, metadata_ttl=0)
+        path = cache.fetch(self.rpm)
+        os.utime(path, (0, 0))
+        cache.fetch(self.rpm)
+        assert len(self.upstream.requests) == 1
+
+    def test_stale_metadata_is_served_when_upstream_is_down(self, tmpdir):
+        cache = self.make_cache(tmpdir, metadata_ttl=0)
+        path = cache.fetch(self.repomd)
+        self.upstream.down = True
+        assert cache.fetch(self.repomd) == path
+
+    def test_unreachable_upstream_without_a_copy(self, tmpdir):
+        self.upstream.down = True
+        with pytest.raises(URLError):
+            self.make_cache(tmpdir).fetch(self.rpm)
+
+    def test_upstream_errors_are_not_cached(self, tmpdir):
+        cache = self.make_cache(tmpdir)
+        missing = 'https://download.ceph.com/missing.rpm'
+        with pytest.raises(HTTPError):
+            cache.fetch(missing)
+        assert not os.path.exists(cache.path(missing))
+
+    def test_paths_stay_in_the_cache(self, tmpdir):
+        cache = self.make_cache(tmpdir)
+        path = cache.path('https://download.ceph.com/../../etc/passwd')
+        assert path.startswith(str(tmpdir) + os.sep)
+
+    def test_only_upstreams_are_fetched(self, tmpdir):
+        cache = self.make_cache(tmpdir)
+        with pytest.raises(pkg_cache.NotAllowed):
+            cache.fetch('http://169.254.169.254/latest/meta-data/')
+        assert self.upstream.requests == []
+
+    def test_files_over_the_limit_are_not_kept(self, tmpdir):
+        cache = self.make_cache(tmpdir, max_size=3)
+        with pytest.raises(pkg_cache.TooLarge):
+            cache.fetch(self.rpm)
+        assert not os.path.exists(cache.path(self.rpm))
+        assert os.listdir(os.path.dirname(cache.path(self.rpm))) == []
+
+    def test_listings_and_queries_get_their_own_file(self, tmpdir):
+        cache = self.make_cache(tmpdir)
+        listing = cache.path('https://download.ceph.com/rpm/')
+        query = cache.path('https://download.ceph.com/rpm/?C=M;O=A')
+        assert len(set([listing, query, cache.path('https://download.ceph.com/rpm')])) == 3
+
+
+class TestServer(object):
+
+    def setup(self):
+        self.upstream = FakeUpstream({TestPackageCache.rpm: b'package'})
+
+    def serve(self, tmpdir):
+        cache = pkg_cache.PackageCache(str(tmpdir), opener=self.upstream)
+        server = pkg_cache.make_server(cache, '127.0.0.1', 0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server, 'http://127.0.0.1:%d' % server.server_address[1]
+
+    def test_files_are_served(self, tmpdir):
+        server, url = self.serve(tmpdir)
+        try:
+            response = urlopen(pkg_cache.rewrite(TestPackageCache.rpm, url))
+            assert response.read() == b'package'
+            assert response.headers['Content-Length'] == '7'
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_other_hosts_are_forbidden(self, tmpdir):
+        server, url = self.serve(tmpdir)
+        try:
+            with pytest.raises(HTTPError) as error:
+                urlopen(url + '/http/127.0.0.1:22/')
+            assert error.value.code == 403
+            assert self.upstream.requests == []
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_upstream_errors_are_passed_on(self, tmpdir):
+        server, url = self.serve(tmpdir)
+        try:
+            with pytest.raises(HTTPError) as error:
+                urlopen(url + '/https/download.ceph.com/missing.rpm')
+            assert error.value.code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
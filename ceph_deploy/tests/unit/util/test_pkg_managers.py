@@ -1,3 +1,4 @@
+import pytest
 from mock import patch, Mock
 from ceph_deploy.util import pkg_managers
 
@@ -193,3 +194,144 @@ class TestAtpRpm(object):
         assert 'remove' in result[0][-1]
         assert result[0][-1][-2:] == ['vim', 'zsh']
 
+
+
+class TestRefresh(object):
+
+    def setup(self):
+        self.to_patch = 'ceph_deploy.util.pkg_managers.remoto.process.run'
+
+    def make_apt(self, state):
+        distro = Mock()
+        distro.conn.remote_module.repo_state.return_value = state
+        return pkg_managers.Apt(distro)
+
+    def test_unchanged_repos_are_not_refreshed(self):
+        fake_run = Mock()
+        apt = self.make_apt(('abc', 'abc', 60))
+        with patch(self.to_patch, fake_run):
+            assert apt.refresh() is False
+        assert not fake_run.called
+        assert not apt.remote_conn.remote_module.save_repo_state.called
+
+    def test_changed_repos_are_refreshed(self):
+        fake_run = Mock()
+        apt = self.make_apt(('def', 'abc', 60))
+        with patch(self.to_patch, fake_run):
+            assert apt.refresh() is True
+        assert fake_run.call_args[0][-1][-1] == 'update'
+        apt.remote_conn.remote_module.save_repo_state.assert_called_once_with(
+            '/var/lib/ceph-deploy/apt-metadata.json', 'def'
+        )
+
+    def test_never_refreshed(self):
+        fake_run = Mock()
+        apt = self.make_apt(('abc', None, None))
+        with patch(self.to_patch, fake_run):
+            assert apt.refresh() is True
+
+    def test_old_metadata_is_refreshed(self):
+        fake_run = Mock()
+        apt = self.make_apt(('abc', 'abc', 2 * 24 * 60 * 60))
+        with patch(self.to_patch, fake_run):
+            assert apt.refresh() is True
+
+    def test_yum_leaves_expiry_to_yum(self):
+        fake_run = Mock()
+        distro = Mock()
+        distro.conn.remote_module.repo_state.return_value = ('abc', 'abc', 30 * 24 * 60 * 60)
+        with patch(self.to_patch, fake_run):
+            assert pkg_managers.Yum(distro).refresh() is False
+
+    def test_without_repo_paths_always_refreshes(self):
+        fake_run = Mock()
+        distro = Mock()
+        with patch(self.to_patch, fake_run):
+            assert pkg_managers.Swupd(distro).refresh() is True
+        assert fake_run.call_args[0][-1] == ['swupd', 'clean']
+        assert not distro.conn.remote_module.repo_state.called
+
+
+class TestMissing(object):
+
+    def test_asks_about_all_packages_at_once(self):
+        distro = Mock()
+        distro.conn.remote_module.installed_versions.return_value = {
+            'vim': '8.0-1', 'zsh': None,
+        }
+        assert pkg_managers.Apt(distro).missing(['vim', 'zsh']) == ['zsh']
+        distro.conn.remote_module.installed_versions.assert_called_once_with(
+            ['vim', 'zsh'], 'dpkg'
+        )
+
+    def test_single_package(self):
+        distro = Mock()
+        distro.conn.remote_module.installed_versions.return_value = {'vim': None}
+        assert pkg_managers.Yum(distro).missing('vim') == ['vim']
+
+    def test_without_query_everything_is_missing(self):
+        distro = Mock()
+        assert pkg_managers.Zypper(distro).missing(['vim']) == ['vim']
+        assert not distro.conn.remote_module.installed_versions.called
+
+
+class TestTransaction(object):
+
+    def setup(self):
+        self.to_patch = 'ceph_deploy.util.pkg_managers.remoto.process.run'
+        self.distro = Mock()
+        self.distro.conn.remote_module.installed_versions.return_value = {
+            'epel-release': '7-11',
+        }
+        self.path = '/tmp/ceph-deploy-yum-x1y2z3'
+        self.distro.conn.remote_module.write_temp_file.return_value = self.path
+
+    def test_removes_and_installs_in_one_shell_run(self):
+        fake_run = Mock()
+        with patch(self.to_patch, fake_run):
+            pkg_managers.Yum(self.distro).transaction(
+                install=['epel-release', 'http://host/ceph-release.rpm'],
+                remove=['ceph-release'],
+            )
+        assert fake_run.call_count == 1
+        assert fake_run.call_args[0][-1] == ['yum', '-y', 'shell', self.path]
+        script, prefix = self.distro.conn.remote_module.write_temp_file.call_args[0]
+        assert script == (
+            b'remove ceph-release\n'
+            b'install epel-release http://host/ceph-release.rpm\n'
+            b'run\n'
+        )
+        assert prefix == 'ceph-deploy-yum-'
+        self.distro.conn.remote_module.unlink.assert_called_once_with(self.path)
+        # package URLs cannot be looked up by name
+        self.distro.conn.remote_module.installed_versions.assert_called_once_with(
+            ['epel-release'], 'rpm'
+        )
+
+    def test_fails_when_packages_are_missing_afterwards(self):
+        self.distro.conn.remote_module.installed_versions.return_value = {
+            'epel-release': None,
+        }
+        with patch(self.to_patch, Mock()):
+            with pytest.raises(RuntimeError) as error:
+                pkg_managers.DNF(self.distro).transaction(
+                    install=['epel-release'],
+                    remove=['ceph-release'],
+                )
+        assert 'epel-release' in str(error.value)
+
+    def test_script_is_removed_when_the_run_fails(self):
+        with patch(self.to_patch, Mock(side_effect=RuntimeError)):
+            with pytest.raises(RuntimeError):
+                pkg_managers.Yum(self.distro).transaction(
+                    install=['epel-release'],
+                    remove=['ceph-release'],
+                )
+        self.distro.conn.remote_module.unlink.assert_called_once_with(self.path)
+
+    def test_installs_only_need_no_script(self):
+        fake_run = Mock()
+        with patch(self.to_patch, fake_run):
+            pkg_managers.Yum(self.distro).transaction(install=['epel-release'])
+        assert fake_run.call_args[0][-1][-2:] == ['install', 'epel-release']
+        assert not self.distro.conn.remote_module.write_temp_file.called
@@ -0,0 +1,82 @@
+from mock import Mock
+
+from ceph_deploy.util import push
+
+
+def make_conn(remote_files):
+    """
+    A connection whose remote end holds ``remote_files`` (path to content),
+    recording the calls it gets in ``conn.calls``.
+    """
+    conn = Mock()
+    conn.calls = []
+
+    def batch(calls, stop_on_error=True):
+        results = []
+        for name, args, kwargs in calls:
+            conn.calls.append(name)
+            if name == 'file_checksums':
+                results.append((dict(
+                    (path, push.checksum(remote_files[path]) if path in remote_files else None)
+                    for path in args[0]
+                ), None))
+            else:
+                results.append((None, None))
+        return results
+
+    conn.remote_module.batch = Mock(side_effect=batch)
+    return conn
+
+
+class TestChecksum(object):
+
+    def test_text_and_bytes_match(self):
+        assert push.checksum('[global]\n') == push.checksum(b'[global]\n')
+
+
+class TestPush(object):
+
+    def test_up_to_date_hosts_get_nothing(self):
+        conn = make_conn({'/etc/ceph/ceph.conf': '[global]\n'})
+        assert push.push(conn, 'node1', 'ceph', '[global]\n', False) == []
+        assert conn.calls == ['file_checksums']
+        assert conn.remote_module.batch.call_count == 1
+
+    def test_differing_conf_is_written(self):
+        conn = make_conn({'/etc/ceph/ceph.conf': '[global]\nfoo = 1\n'})
+        changed = push.push(conn, 'node1', 'ceph', '[global]\n', True)
+        assert changed == ['/etc/ceph/ceph.conf']
+        assert conn.calls == ['file_checksums', 'write_conf']
+
+    def test_missing_conf_is_written(self):
+        conn = make_conn({})
+        assert push.push(conn, 'node1', 'ceph', '[global]\n', False) == ['/etc/ceph/ceph.conf']
+
+    def test_only_the_keyring_is_written(self):
+        conn = make_conn({'/etc/ceph/ceph.conf': '[global]\n'})
+        changed = push.push(conn, 'node1', 'ceph', '[global]\n', False, keyring=b'key')
+        assert changed == ['/etc/ceph/ceph.client.admin.keyring']
+        assert conn.calls == ['file_checksums', 'write_file']
+
+    def test_custom_cluster_name(self):
+        conn = make_conn({})
+        assert push.push(conn, 'node1', 'foo', '', False) == ['/etc/ceph/foo.conf']
+
+
+class TestSummary(object):
+
+    def test_hosts_are_counted(self):
+        summary = push.Summary()
+        for hostname in ('node1', 'node2', 'node3'):
+            conn = make_conn({'/etc/ceph/ceph.conf': '[global]\n'} if hostname != 'node2' else {})
+            push.push(conn, hostname, 'ceph', '[global]\n', False, summary=summary)
+        assert summary.changed == ['node2']
+        assert summary.skipped == ['node1', 'node3']
+
+    def test_log(self):
+        summary = push.Summary()
+        summary.record('node1', ['/etc/ceph/ceph.conf'])
+        summary.record('node2', [])
+        logger = Mock()
+        summary.log(logger)
+        assert logger.info.call_args[0][1:] == (1, '', 1)
@@ -0,0 +1,110 @@
+import threading
+import time
+
+from mock import Mock, patch
+
+from ceph_deploy.util import shaman
+
+
+CHACRA = 'https://chacra.ceph.com/r/ceph/master/abc/centos/7/flavors/default/'
+
+
+def make_response(url, content=b''):
+    response = Mock()
+    response.geturl.return_value = url
+    response.read.return_value = content
+    return response
+
+
+class FakeRequests(object):
+
+    def __init__(self):
+        self.urls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, url):
+        with self.lock:
+            self.urls.append(url)
+        if 'shaman' in url:
+            # give concurrent lookups a chance to pile up
+            time.sleep(0.01)
+            return make_response(CHACRA)
+        return make_response(url, b'[ceph]\nbaseurl=%s\n' % CHACRA.encode('utf-8'))
+
+
+class TestShamanUrl(object):
+
+    def test_latest_is_the_default_sha1(self):
+        url = shaman.shaman_url('master', None, 'centos', '7', 'x86_64')
+        assert url == 'https://shaman.ceph.com/api/repos/ceph/master/latest/centos/7/repo/?arch=x86_64'
+
+
+class TestShamanCache(object):
+
+    def setup(self):
+        self.requests = FakeRequests()
+        self.patch = patch('ceph_deploy.util.shaman.net.get_request', self.requests)
+        self.patch.start()
+
+    def teardown(self):
+        self.patch.stop()
+
+    def test_one_lookup_is_two_requests(self):
+        chacra_url, content = shaman.ShamanCache().repo('master', None, 'centos', '7', 'x86_64')
+        assert chacra_url == CHACRA
+        assert content.startswith(b'[ceph]')
+        assert len(self.requests.urls) == 2
+
+    def test_same_platform_makes_no_requests(self):
+        cache = shaman.ShamanCache()
+        first = cache.repo('master', None, 'centos', '7', 'x86_64')
+        assert cache.repo('master', 'latest', 'centos', 7, 'x86_64') == first
+        assert len(self.requests.urls) == 2
+
+    def test_other_platforms_are_looked_up(self):
+        cache = shaman.ShamanCache()
+        cache.repo('master', None, 'centos', '7', 'x86_64')
+        cache.repo('master', None, 'centos', '8', 'x86_64')
+        cache.repo('master', None, 'centos', '7', 'aarch64')
+        assert len(self.requests.urls) == 6
+
+    def test_concurrent_hosts_share_a_lookup(self):
+        cache = shaman.ShamanCache()
+        threads = [
+            threading.Thread(target=cache.repo, args=('master', None, 'ubuntu', 'bionic', 'x86_64'))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(self.requests.urls) == 2
+
+    def test_disk_is_not_used_without_ttl(self, tmpdir):
+        shaman.ShamanCache(path=str(tmpdir)).repo('master', None, 'centos', '7', 'x86_64')
+        assert tmpdir.listdir() == []
+
+    def test_later_runs_reuse_lookups_on_disk(self, tmpdir):
+        first = shaman.ShamanCache(path=str(tmpdir), ttl=60).repo('master', 'abc123', 'centos', '7', 'x86_64')
+        second = shaman.ShamanCache(path=str(tmpdir), ttl=60).repo('master', 'abc123', 'centos', '7', 'x86_64')
+        assert first == second
+        assert len(self.requests.urls) == 2
+
+    def test_latest_is_never_kept_on_disk(self, tmpdir):
+        shaman.ShamanCache(path=str(tmpdir), ttl=60).repo('master', None, 'centos', '7', 'x86_64')
+        assert tmpdir.listdir() == []
+        shaman.ShamanCache(path=str(tmpdir), ttl=60).repo('master', 'latest', 'centos', '7', 'x86_64')
+        assert len(self.requests.urls) == 4
+
+    def test_expired_lookups_are_repeated(self, tmpdir):
+        shaman.ShamanCache(path=str(tmpdir), ttl=60).repo('master', 'abc123', 'centos', '7', 'x86_64')
+        with patch('ceph_deploy.util.shaman.time.time', Mock(return_value=time.time() + 120)):
+            shaman.ShamanCache(path=str(tmpdir), ttl=60).repo('master', 'abc123', 'centos', '7', 'x86_64')
+        assert len(self.requests.urls) == 4
+
+    def test_configure_starts_a_new_run(self):
+        shaman.configure()
+        shaman.repo('master', None, 'centos', '7', 'x86_64')
+        shaman.configure()
+        shaman.repo('master', None, 'centos', '7', 'x86_64')
+        assert len(self.requests.urls) == 4
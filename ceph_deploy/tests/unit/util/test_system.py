@@ -1,4 +1,4 @@
-from mock import Mock
+from mock import Mock, patch
 from pytest import raises
 from ceph_deploy.util import system
 from ceph_deploy import exc
@@ -55,3 +55,22 @@ class TestIsUpstart(object):
 
         result = system.is_upstart(fake_conn)
         assert result is False
+
+
+class TestRestartService(object):
+
+    def test_systemd(self):
+        fake_conn = Mock()
+        with patch('ceph_deploy.util.system.is_systemd', Mock(return_value=True)):
+            with patch('ceph_deploy.util.system.remoto.process.run') as fake_run:
+                system.restart_service(fake_conn, 'ceph-osd.target')
+        assert fake_run.call_args[0][1] == ['systemctl', 'restart', 'ceph-osd.target']
+
+    def test_other_init_systems_are_refused(self):
+        fake_conn = Mock(hostname='node1')
+        with patch('ceph_deploy.util.system.is_systemd', Mock(return_value=False)):
+            with patch('ceph_deploy.util.system.remoto.process.run') as fake_run:
+                with raises(RuntimeError) as error:
+                    system.restart_service(fake_conn, 'ceph-osd.target')
+        assert 'ceph-osd.target on node1' in str(error.value)
+        assert not fake_run.called
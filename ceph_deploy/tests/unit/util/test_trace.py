@@ -0,0 +1,124 @@
+import json
+
+from mock import Mock, patch
+from pytest import raises
+
+from ceph_deploy.util import trace
+
+
+class TestTracer(object):
+
+    def test_disabled_by_default(self):
+        tracer = trace.Tracer()
+        with tracer.span('hosts.get', host='node1'):
+            pass
+        assert tracer.events == []
+
+    def test_records_complete_events(self, tmpdir):
+        tracer = trace.Tracer(str(tmpdir.join('trace.json')), command='install')
+        with tracer.span('hosts.get', 'connection', host='node1'):
+            pass
+        event = tracer.events[0]
+        assert event['ph'] == 'X'
+        assert event['name'] == 'hosts.get'
+        assert event['cat'] == 'connection'
+        assert event['dur'] >= 0
+        assert event['args'] == {'host': 'node1', 'subcommand': 'install'}
+
+    def test_errors_are_recorded(self, tmpdir):
+        tracer = trace.Tracer(str(tmpdir.join('trace.json')))
+        with raises(RuntimeError):
+            with tracer.span('remoto.process.run'):
+                raise RuntimeError('command returned non-zero exit status: 1')
+        assert 'non-zero' in tracer.events[0]['args']['error']
+
+    def test_hosts_get_their_own_lanes(self, tmpdir):
+        tracer = trace.Tracer(str(tmpdir.join('trace.json')))
+        with tracer.span('a', host='node1'):
+            pass
+        with tracer.span('b', host='node2'):
+            pass
+        with tracer.span('c', host='node1'):
+            pass
+        tids = [event['tid'] for event in tracer.events]
+        assert tids[0] == tids[2] != tids[1]
+
+    def test_writes_chrome_trace_json(self, tmpdir):
+        path = tmpdir.join('trace.json')
+        tracer = trace.Tracer(str(path), command='install')
+        with tracer.span('hosts.get', host='node1'):
+            pass
+        tracer.write()
+        result = json.loads(path.read())
+        names = [event['name'] for event in result['traceEvents']]
+        assert 'process_name' in names
+        assert 'thread_name' in names
+        assert 'hosts.get' in names
+        thread_names = [
+            event['args']['name'] for event in result['traceEvents']
+            if event['name'] == 'thread_name'
+        ]
+        assert thread_names == ['node1']
+
+
+class TestWrap(object):
+
+    def setup(self):
+        self.original = trace.tracer
+
+    def teardown(self):
+        trace.tracer = self.original
+
+    def test_returns_the_object_when_disabled(self):
+        obj = Mock()
+        assert trace.wrap(obj, 'packager') is obj
+
+    def test_traces_public_calls(self, tmpdir):
+        trace.tracer = trace.Tracer(str(tmpdir.join('trace.json')))
+        obj = Mock()
+        obj.install = Mock(return_value='done')
+        traced = trace.wrap(obj, 'packager', host='node1', prefix='Yum')
+        assert traced.install(['ceph']) == 'done'
+        assert trace.tracer.events[0]['name'] == 'Yum.install'
+        assert trace.tracer.events[0]['args']['host'] == 'node1'
+
+    def test_private_and_plain_attributes_are_not_traced(self, tmpdir):
+        trace.tracer = trace.Tracer(str(tmpdir.join('trace.json')))
+        obj = Mock()
+        obj.executable = 'yum'
+        traced = trace.wrap(obj, 'packager')
+        assert traced.executable == 'yum'
+        traced._run(['yum'])
+        assert trace.tracer.events == []
+
+
+class TestInstrument(object):
+
+    def setup(self):
+        self.original = trace.tracer
+
+    def teardown(self):
+        trace.tracer = self.original
+
+    def test_remote_commands_are_traced(self, tmpdir):
+        fake_process = Mock()
+        fake_process.run = Mock(return_value=None)
+        fake_process.check = Mock(return_value=(['ok'], [], 0))
+        conn = Mock(hostname='node1')
+        with patch('ceph_deploy.lib.remoto.process', fake_process):
+            trace.configure(str(tmpdir.join('trace.json')), command='install')
+            fake_process.run(conn, ['yum', 'install', 'ceph'])
+            assert fake_process.check(conn, ['ceph', '--version']) == (['ok'], [], 0)
+        events = trace.tracer.events
+        assert [event['name'] for event in events] == ['remoto.process.run', 'remoto.process.check']
+        assert [event['args']['command'] for event in events] == ['yum install ceph', 'ceph --version']
+        assert events[0]['args']['host'] == 'node1'
+
+    def test_instrumenting_twice_does_not_nest(self, tmpdir):
+        fake_process = Mock()
+        conn = Mock(hostname='node1')
+        with patch('ceph_deploy.lib.remoto.process', fake_process):
+            trace.configure(str(tmpdir.join('trace.json')))
+            trace.instrument()
+            fake_process.run(conn, ['true'])
+        assert len(trace.tracer.events) == 1
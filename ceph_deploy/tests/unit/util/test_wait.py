@@ -0,0 +1,55 @@
+from itertools import islice
+
+from mock import Mock, patch
+from pytest import raises
+
+from ceph_deploy.util import wait
+
+
+class TestBackoff(object):
+
+    def test_grows_up_to_maximum(self):
+        delays = list(islice(wait.backoff(initial=1, maximum=4, jitter=0), 5))
+        assert delays == [1, 2, 4, 4, 4]
+
+    def test_jitter_stays_within_bounds(self):
+        for delay in islice(wait.backoff(initial=1, maximum=1, jitter=0.5), 50):
+            assert 0.5 <= delay <= 1.5
+
+
+class TestUntil(object):
+
+    def setup(self):
+        self.sleep = patch('ceph_deploy.util.wait.time.sleep')
+        self.sleep.start()
+
+    def teardown(self):
+        self.sleep.stop()
+
+    def test_returns_as_soon_as_check_passes(self):
+        check = Mock(side_effect=[None, None, {'state': 'leader'}])
+        assert wait.until(check, timeout=30) == {'state': 'leader'}
+        assert check.call_count == 3
+
+    def test_does_not_sleep_when_ready(self):
+        assert wait.until(lambda: True) is True
+        assert not wait.time.sleep.called
+
+    def test_gives_up_at_the_deadline(self):
+        check = Mock(return_value=False)
+        assert wait.until(check, timeout=0) is False
+        assert check.call_count == 1
+
+    def test_never_sleeps_past_the_deadline(self):
+        wait.until(Mock(return_value=False), timeout=0.5, initial=10)
+        delay = wait.time.sleep.call_args[0][0]
+        assert delay <= 0.5
+
+    def test_runtime_errors_are_retried(self):
+        check = Mock(side_effect=[RuntimeError('connection refused'), 'ok'])
+        assert wait.until(check) == 'ok'
+
+    def test_runtime_errors_are_raised_at_the_deadline(self):
+        check = Mock(side_effect=RuntimeError('connection refused'))
+        with raises(RuntimeError):
+            wait.until(check, timeout=0)
@@ -0,0 +1,444 @@
+"""
+Upgrade a running cluster without taking it down.
+
+Packages are upgraded on every host first, concurrently like ``install``
+does, since installing them does not restart any daemon. Daemons are then
+restarted one type at a time, in the order the Ceph release notes ask for
+(monitors, managers, OSDs, metadata servers and finally gateways), a few
+hosts at a time. Before upgrading any package and after every group of hosts
+the cluster has to be healthy, so a restart that goes wrong stops the
+upgrade while the rest of the cluster is still serving.
+
+OSD hosts are restarted together when they are in the same failure domain
+(``--failure-domain``, up to ``--window`` hosts at once), which keeps every
+placement group available as long as its replicas are spread across failure
+domains. The ``noout`` flag keeps the cluster from rebalancing while OSDs
+restart.
+"""
+import json
+import logging
+
+from ceph_deploy import exc, hosts, install
+from ceph_deploy.cliutil import priority, subcommand_args
+from ceph_deploy.lib import remoto
+from ceph_deploy.osd import osd_status_check
+from ceph_deploy.util import parallel, system, wait
+from ceph_deploy.util.batch import RemoteBatch
+from ceph_deploy.util.constants import release_versions
+
+
+LOG = logging.getLogger(__name__)
+
+# daemon type, its directory in /var/lib/ceph and its systemd target
+DAEMONS = (
+    ('mon', 'mon', 'ceph-mon.target'),
+    ('mgr', 'mgr', 'ceph-mgr.target'),
+    ('osd', 'osd', 'ceph-osd.target'),
+    ('mds', 'mds', 'ceph-mds.target'),
+    ('rgw', 'radosgw', 'ceph-radosgw.target'),
+)
+
+# health checks raised by the upgrade itself
+TOLERATED_CHECKS = ('OSDMAP_FLAGS',)
+
+
+class UpgradeHost(object):
+    """
+    What is known about a host before upgrading it: its short name (as CRUSH
+    knows it), init system and the types of the daemons it runs.
+    """
+
+    def __init__(self, hostname, shortname, init, daemons):
+        self.hostname = hostname
+        self.shortname = shortname
+        self.init = init
+        self.daemons = daemons
+
+    def __repr__(self):
+        return '<UpgradeHost %s %s>' % (self.hostname, ','.join(self.daemons))
+
+
+def discover(args, hostname):
+    """
+    Find the daemons of ``args.cluster`` that ``hostname`` runs by looking at
+    their data directories, in a single round trip.
+    """
+    distro = hosts.get(hostname, username=args.username)
+    try:
+        batch = RemoteBatch(distro.conn, stop_on_error=False)
+        batch.shortname()
+        for _, directory, _ in DAEMONS:
+            batch.listdir('/var/lib/ceph/%s' % directory)
+        results = batch.execute(raise_errors=False)
+    finally:
+        distro.conn.exit()
+    prefix = '%s-' % args.cluster
+    daemons = [
+        daemon for (daemon, _, _), names in zip(DAEMONS, results[1:])
+        if any(name.startswith(prefix) for name in names or [])
+    ]
+    return UpgradeHost(hostname, results[0] or hostname, distro.init, daemons)
+
+
+def ceph_json(conn, cluster, command):
+    """
+    Run ``ceph <command> --format=json`` and return the decoded output, or
+    ``None`` if the command failed or did not return JSON.
+    """
+    ceph_executable = system.executable_path(conn, 'ceph')
+    try:
+        out, err, code = remoto.process.check(
+            conn,
+            [ceph_executable, '--cluster={cluster}'.format(cluster=cluster)] +
+            command + ['--format=json'],
+        )
+    except TypeError:
+        # remoto returns None when the other end disconnects with a timeout
+        return None
+    if code != 0:
+        return None
+    try:
+        return json.loads(''.join(out))
+    except ValueError:
+        return None
+
+
+def health_problems(status, tolerated=TOLERATED_CHECKS):
+    """
+    The health checks in the JSON ``status`` of ``ceph health`` that keep the
+    cluster from being considered healthy, an empty list if there are none.
+    """
+    if not status:
+        return ['cluster health is unknown']
+    overall = status.get('status') or status.get('overall_status')
+    if overall == 'HEALTH_OK':
+        return []
+    checks = status.get('checks')
+    if overall == 'HEALTH_WARN' and isinstance(checks, dict):
+        return sorted(name for name in checks if name not in tolerated)
+    return [overall or 'cluster health is unknown']
+
+
+def failure_domains(tree, domain_type):
+    """
+    Map the name of every CRUSH host in ``tree`` (the JSON of ``ceph osd
+    tree``) to the name of the bucket of type ``domain_type`` that holds it.
+    Hosts outside of any such bucket are failure domains of their own.
+    """
+    nodes = dict((node['id'], node) for node in tree.get('nodes', []))
+    parents = {}
+    for node in nodes.values():
+        for child in node.get('children', []):
+            parents[child] = node['id']
+    domains = {}
+    for node in nodes.values():
+        if node.get('type') != 'host':
+            continue
+        current = node
+        while current is not None and current.get('type') != domain_type:
+            current = nodes.get(parents.get(current['id']))
+        domains[node['name']] = current['name'] if current is not None else node['name']
+    return domains
+
+
+def plan_waves(upgrade_hosts, window=1, domains=None):
+    """
+    Split ``upgrade_hosts`` into the groups that are restarted together: up
+    to ``window`` hosts that share a failure domain (from ``domains``, by
+    short host name). Without ``domains`` every host is a failure domain of
+    its own.
+    """
+    window = max(window, 1)
+    groups = []
+    by_domain = {}
+    for host in upgrade_hosts:
+        domain = (domains or {}).get(host.shortname)
+        if domain is None:
+            groups.append([host])
+            continue
+        if domain not in by_domain:
+            by_domain[domain] = []
+            groups.append(by_domain[domain])
+        by_domain[domain].append(host)
+    waves = []
+    for group in groups:
+        for start in range(0, len(group), window):
+            waves.append(group[start:start + window])
+    return waves
+
+
+class Upgrade(object):
+    """
+    Restart the daemons of ``upgrade_hosts`` in order, checking the health
+    of the cluster through ``conn`` (a host with the admin keyring) before
+    the first and after every wave.
+    """
+
+    def __init__(self, args, conn, upgrade_hosts, logger=None):
+        self.args = args
+        self.conn = conn
+        self.hosts = upgrade_hosts
+        self.logger = logger or LOG
+        self.tolerated = TOLERATED_CHECKS + tuple(args.tolerate or ())
+
+    def ceph(self, *command):
+        return ceph_json(self.conn, self.args.cluster, list(command))
+
+    def noout(self, action):
+        remoto.process.run(
+            self.conn,
+            [
+                system.executable_path(self.conn, 'ceph'),
+                '--cluster', self.args.cluster,
+                'osd', action, 'noout',
+            ],
+        )
+
+    def wait_healthy(self, description):
+        """
+        Wait for the cluster to be healthy with every OSD up, raising
+        ``exc.GenericError`` if it is not within ``--health-timeout``.
+        """
+        problems = []
+
+        def healthy():
+            status = osd_status_check(self.conn, self.args.cluster)
+            osds = int(status.get('num_osds', 0))
+            down = osds - int(status.get('num_up_osds', 0))
+            if down > 0:
+                problems[:] = ['%d of %d OSDs down' % (down, osds)]
+                return False
+            problems[:] = health_problems(self.ceph('health'), self.tolerated)
+            return not problems
+
+        if not wait.until(
+                healthy,
+                timeout=self.args.health_timeout,
+                maximum=10,
+                logger=self.logger,
+                description='the cluster to be healthy %s' % description):
+            raise exc.GenericError(
+                'cluster is not healthy %s (%s), stopping the upgrade' % (
+                    description, ', '.join(problems))
+            )
+
+    def restart(self, host, daemon, target):
+        if host.init != 'systemd':
+            raise RuntimeError(
+                'cannot restart %s daemons on %s, only systemd hosts can be '
+                'upgraded while running (init is %s)' % (daemon, host.hostname, host.init)
+            )
+        distro = hosts.get(host.hostname, username=self.args.username)
+        try:
+            distro.conn.logger.info('restarting %s daemons', daemon)
+            system.restart_service(distro.conn, target)
+        finally:
+            distro.conn.exit()
+
+    def waves(self, daemon, upgrade_hosts):
+        if daemon == 'osd':
+            domains = None
+            if self.args.failure_domain != 'host':
+                tree = self.ceph('osd', 'tree')
+                if tree is None:
+                    raise exc.GenericError('unable to read the CRUSH hierarchy')
+                domains = failure_domains(tree, self.args.failure_domain)
+            return plan_waves(upgrade_hosts, self.args.window, domains)
+        if daemon == 'rgw':
+            # gateways are interchangeable, but keep at least one serving
+            window = min(self.args.window, max(len(upgrade_hosts) - 1, 1))
+            return plan_waves(upgrade_hosts, window, dict(
+                (host.shortname, 'rgw') for host in upgrade_hosts
+            ))
+        # monitors need a quorum, and managers and metadata servers fail
+        # over to a standby: one host at a time
+        return plan_waves(upgrade_hosts)
+
+    def restart_all(self, daemon, target):
+        upgrade_hosts = [host for host in self.hosts if daemon in host.daemons]
+        if not upgrade_hosts:
+            return
+        waves = self.waves(daemon, upgrade_hosts)
+        self.logger.info(
+            'restarting %s daemons on %d host%s in %d wave%s',
+            daemon,
+            len(upgrade_hosts),
+            '' if len(upgrade_hosts) == 1 else 's',
+            len(waves),
+            '' if len(waves) == 1 else 's',
+        )
+        for number, wave in enumerate(waves, 1):
+            names = ' '.join(host.hostname for host in wave)
+            self.logger.info('%s wave %d of %d: %s', daemon, number, len(waves), names)
+            outcomes = parallel.run(
+                lambda host: self.restart(host, daemon, target),
+                wave,
+                workers=len(wave),
+                logger=self.logger,
+            )
+            errors = parallel.count_failed(outcomes)
+            if errors:
+                raise exc.GenericError(
+                    'Failed to restart %s daemons on %d hosts, stopping the upgrade' % (daemon, errors)
+                )
+            self.wait_healthy('after restarting %s on %s' % (daemon, names))
+
+    def run(self):
+        for daemon, _, target in DAEMONS:
+            if daemon != 'osd':
+                self.restart_all(daemon, target)
+                continue
+            flags = self.ceph('osd', 'dump') or {}
+            already_set = 'noout' in flags.get('flags', '').split(',')
+            if not already_set:
+                self.noout('set')
+            try:
+                self.restart_all(daemon, target)
+            finally:
+                if not already_set:
+                    self.noout('unset')
+
+        versions = self.ceph('versions') or {}
+        for version, count in sorted(versions.get('overall', {}).items()):
+            self.logger.info('%d daemon%s running %s', count, '' if count == 1 else 's', version)
+
+
+def install_args(args):
+    """
+    The arguments ``install`` would get to upgrade the packages of
+    ``args.host`` to ``args.release``. Hosts that already run the release are
+    not skipped, so they move to its latest point release.
+    """
+    argv = ['--release', args.release, '--reinstall']
+    if args.repo_url:
+        argv.extend(['--repo-url', args.repo_url])
+    if args.gpg_url:
+        argv.extend(['--gpg-url', args.gpg_url])
+    if not args.adjust_repos:
+        argv.append('--no-adjust-repos')
+    if args.nogpgcheck:
+        argv.append('--nogpgcheck')
+    return subcommand_args(install.make, argv + args.host, args)
+
+
+def upgrade(args):
+    LOG.debug(
+        'Upgrading cluster %s hosts %s to %s',
+        args.cluster,
+        ' '.join(args.host),
+        args.release,
+    )
+
+    outcomes = parallel.run(
+        lambda hostname: discover(args, hostname),
+        args.host,
+        workers=parallel.workers(args),
+        logger=LOG,
+    )
+    errors = parallel.count_failed(outcomes)
+    if errors:
+        raise exc.GenericError('Failed to connect to %d hosts' % errors)
+    upgrade_hosts = [outcome.value for outcome in outcomes]
+    for host in upgrade_hosts:
+        LOG.info('%s runs: %s', host.hostname, ', '.join(host.daemons) or 'no daemons')
+
+    admin_host = args.admin_host
+    if admin_host is None:
+        monitors = [host.hostname for host in upgrade_hosts if 'mon' in host.daemons]
+        if not monitors:
+            raise exc.GenericError(
+                'none of the hosts runs a monitor, use --admin-host to check '
+                'cluster health through a host with the admin keyring'
+            )
+        admin_host = monitors[0]
+    LOG.info('checking cluster health through %s', admin_host)
+    distro = hosts.get(admin_host, username=args.username)
+    try:
+        plan = Upgrade(args, distro.conn, upgrade_hosts)
+        # refuse to start on a cluster that is already in trouble
+        plan.wait_healthy('before upgrading')
+        # installing packages does not restart daemons
+        install.install(install_args(args))
+        plan.run()
+    finally:
+        distro.conn.exit()
+    LOG.info('upgraded %d hosts to %s', len(upgrade_hosts), args.release)
+
+
+@priority(25)
+def make(parser):
+    """
+    Upgrade a running cluster, restarting daemons a few hosts at a time.
+    """
+    parser.add_argument(
+        '--release',
+        metavar='CODENAME',
+        required=True,
+        type=str.lower,
+        choices=sorted(release_versions),
+        help='upgrade to the release known as CODENAME',
+    )
+    parser.add_argument(
+        '--window',
+        metavar='N',
+        type=int,
+        default=1,
+        help=('restart up to N OSD (or gateway) hosts at once, OSD hosts '
+              'only within a failure domain (default: %(default)s)'),
+    )
+    parser.add_argument(
+        '--failure-domain',
+        metavar='TYPE',
+        default='host',
+        help=('CRUSH bucket type that replicas are spread across, e.g. rack. '
+              'OSD hosts are only restarted together within one '
+              '(default: %(default)s)'),
+    )
+    parser.add_argument(
+        '--health-timeout',
+        metavar='SECONDS',
+        type=int,
+        default=600,
+        help=('stop the upgrade if the cluster is not healthy this long after '
+              'a restart (default: %(default)s)'),
+    )
+    parser.add_argument(
+        '--tolerate',
+        metavar='CHECK',
+        action='append',
+        help=('a health check (e.g. OSD_UPGRADE_FINISHED) that does not '
+              'count against a healthy cluster, can be repeated'),
+    )
+    parser.add_argument(
+        '--admin-host',
+        metavar='HOST',
+        help='check cluster health from HOST (default: the first monitor)',
+    )
+    parser.add_argument(
+        '--no-adjust-repos',
+        dest='adjust_repos',
+        action='store_false',
+        help='upgrade packages without modifying source repos',
+    )
+    parser.add_argument(
+        '--repo-url',
+        help='upgrade from a repo URL that mirrors/contains Ceph packages',
+    )
+    parser.add_argument(
+        '--gpg-url',
+        help='GPG key URL to be used with --repo-url',
+    )
+    parser.add_argument(
+        '--nogpgcheck',
+        action='store_true',
+        help='install packages without gpgcheck',
+    )
+    parser.add_argument(
+        'host',
+        metavar='HOST',
+        nargs='+',
+        help='hosts to upgrade',
+    )
+    parser.set_defaults(
+        func=upgrade,
+    )
@@ -0,0 +1,93 @@
+"""
+Batch several ``conn.remote_module`` calls into a single round-trip.
+
+Every ``conn.remote_module.<function>()`` call is one message through the
+remote channel and one reply back, which adds up quickly on high latency
+links. Calls queued on a :class:`RemoteBatch` are shipped together to the
+``batch`` function in ``ceph_deploy.hosts.remotes`` and their results (or
+errors) come back in one reply::
+
+    batch = RemoteBatch(distro.conn)
+    batch.shortname()
+    batch.path_getuid(constants.base_path)
+    batch.path_getgid(constants.base_path)
+    hostname, uid, gid = batch.execute()
+
+Only calls that do not depend on each other's results can be batched, so
+callers usually end up with a few small batches instead of one big one.
+"""
+
+
+class Call(object):
+    """
+    A queued remote call. Once the batch is executed it holds either the
+    returned ``value`` or the ``error`` message from the remote end.
+    """
+
+    def __init__(self, name, args, kwargs):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+        self.error = None
+        self.done = False
+
+    def get(self):
+        if not self.done:
+            raise RuntimeError('%s() has not been executed yet' % self.name)
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.value
+
+
+class RemoteBatch(object):
+    """
+    Queue calls to functions in the remote module of ``conn``. Attribute
+    access returns a callable that queues the call and returns its
+    :class:`Call`, nothing is sent until :meth:`execute`.
+
+    By default the remote end stops at the first call that fails, like a
+    sequence of individual calls would, and :meth:`execute` raises
+    a ``RuntimeError`` for it.
+    """
+
+    def __init__(self, conn, stop_on_error=True):
+        self.conn = conn
+        self.stop_on_error = stop_on_error
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            call = Call(name, args, kwargs)
+            self.calls.append(call)
+            return call
+        return queue
+
+    def __len__(self):
+        return len(self.calls)
+
+    def execute(self, raise_errors=True):
+        """
+        Send all queued calls at once and return their values in order. With
+        ``raise_errors`` disabled, failed calls have a ``None`` value and the
+        errors are only available through each :class:`Call`.
+        """
+        calls, self.calls = self.calls, []
+        if not calls:
+            return []
+        replies = self.conn.remote_module.batch(
+            [(call.name, call.args, call.kwargs) for call in calls],
+            self.stop_on_error,
+        )
+        for call, (value, error) in zip(calls, replies):
+            call.value = value
+            call.error = error
+            call.done = True
+        if raise_errors:
+            for call in calls:
+                if call.error:
+                    raise RuntimeError(call.error)
+        return [call.value for call in calls]
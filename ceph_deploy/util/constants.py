@@ -34,3 +34,26 @@ default_components.deb = tuple(_base_components + ['radosgw'])
 default_components.pkgtarxz = tuple(['ceph'])
 
 gpg_key_base_url = "download.ceph.com/keys/"
+
+# what the version of every package in a stable release starts with
+release_versions = {
+    'argonaut': '0.48',
+    'bobtail': '0.56',
+    'cuttlefish': '0.61',
+    'dumpling': '0.67',
+    'emperor': '0.72',
+    'firefly': '0.80',
+    'giant': '0.87',
+    'hammer': '0.94',
+    'infernalis': '9',
+    'jewel': '10',
+    'kraken': '11',
+    'luminous': '12',
+    'mimic': '13',
+    'nautilus': '14',
+    'octopus': '15',
+    'pacific': '16',
+    'quincy': '17',
+    'reef': '18',
+    'squid': '19',
+}
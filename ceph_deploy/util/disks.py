@@ -0,0 +1,225 @@
+"""
+Structured disk inventory of a remote host, from a single ``lsblk`` call and
+optionally ``ceph-volume inventory``.
+
+Every disk becomes a record that can be dumped as JSON as is::
+
+    {
+        "path": "/dev/sdb",
+        "size": 4000787030016,
+        "rotational": true,
+        "model": "ST4000NM0035",
+        "serial": "ZC1A2B3C",
+        "holders": ["ceph--0a1b-osd--block--2c3d"],
+        "mountpoints": [],
+        "ceph": true
+    }
+
+``holders`` are the partitions and device mapper devices on top of the disk
+and ``ceph`` tells if any of them belongs to an OSD. With ``ceph-volume
+inventory`` the record also has ``available`` and ``rejected_reasons``.
+"""
+import json
+import shlex
+
+from ceph_deploy.lib import remoto
+
+
+LSBLK = ['lsblk', '--json', '--bytes', '-O']
+
+# lsblk before util-linux 2.27 has no --json nor -O, but lists a disk followed
+# by everything on top of it
+LSBLK_PAIRS = [
+    'lsblk', '--pairs', '--bytes',
+    '-o', 'NAME,TYPE,SIZE,ROTA,MODEL,SERIAL,FSTYPE,PARTLABEL,MOUNTPOINT',
+]
+
+# what lsblk reports for the devices an OSD is made of
+CEPH_FSTYPES = ('ceph_bluestore',)
+
+
+def _text(value):
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def _flag(value):
+    return value in (True, 1, '1', 'true')
+
+
+def _size(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _mountpoints(device):
+    # util-linux 2.37 lists every mountpoint of a device
+    found = device.get('mountpoints') or [device.get('mountpoint')]
+    return [mountpoint for mountpoint in found if mountpoint]
+
+
+def is_ceph(device):
+    """
+    A device that belongs to an OSD: a bluestore device, an LV of a
+    ``ceph-*`` volume group, or a ``ceph data`` partition.
+    """
+    name = device.get('name') or ''
+    partlabel = device.get('partlabel') or ''
+    return (
+        device.get('fstype') in CEPH_FSTYPES or
+        name.startswith('ceph-') or
+        partlabel.startswith('ceph')
+    )
+
+
+def make_record(disk, holders):
+    """
+    The record of ``disk``, given every device on top of it as lsblk
+    reported them.
+    """
+    devices = [disk] + holders
+    return {
+        'path': '/dev/%s' % disk['name'],
+        'size': _size(disk.get('size')),
+        'rotational': _flag(disk.get('rota')),
+        'model': _text(disk.get('model')),
+        'serial': _text(disk.get('serial')),
+        'holders': [holder['name'] for holder in holders],
+        'mountpoints': [m for d in devices for m in _mountpoints(d)],
+        'ceph': any(is_ceph(d) for d in devices),
+    }
+
+
+def parse_lsblk(output):
+    """
+    Records for the disks in the output of ``lsblk --json``.
+    """
+    def descendants(device):
+        found = []
+        for child in device.get('children') or []:
+            found.append(child)
+            found.extend(descendants(child))
+        return found
+
+    records = []
+    for device in json.loads(output).get('blockdevices', []):
+        if device.get('type') == 'disk':
+            records.append(make_record(device, descendants(device)))
+    return records
+
+
+def parse_lsblk_pairs(lines):
+    """
+    Records for the disks in the output of ``lsblk --pairs``, where
+    everything listed after a disk up to the next one is on top of it.
+    """
+    records = []
+    disk, holders = None, []
+    for line in lines:
+        if not line.strip():
+            continue
+        device = {}
+        for pair in shlex.split(line):
+            key, _, value = pair.partition('=')
+            device[key.lower()] = value
+        if device.get('type') == 'disk':
+            if disk is not None:
+                records.append(make_record(disk, holders))
+            disk, holders = device, []
+        elif disk is not None:
+            holders.append(device)
+    if disk is not None:
+        records.append(make_record(disk, holders))
+    return records
+
+
+def merge_inventory(records, inventory):
+    """
+    Add what ``ceph-volume inventory --format json`` knows to ``records``.
+    """
+    by_path = dict((device.get('path'), device) for device in inventory)
+    for record in records:
+        device = by_path.get(record['path'])
+        if device is None:
+            continue
+        record['available'] = bool(device.get('available'))
+        record['rejected_reasons'] = device.get('rejected_reasons') or []
+        if device.get('lvs'):
+            record['ceph'] = True
+    return records
+
+
+def lsblk(conn):
+    """
+    Run on a host, the records of all of its disks.
+    """
+    out, err, code = remoto.process.check(conn, LSBLK)
+    if code == 0:
+        return parse_lsblk(''.join(out))
+    conn.logger.debug('lsblk has no JSON output, listing pairs instead')
+    out, err, code = remoto.process.check(conn, LSBLK_PAIRS)
+    if code != 0:
+        raise RuntimeError('lsblk failed on %s: %s' % (conn.hostname, ' '.join(err)))
+    return parse_lsblk_pairs(out)
+
+
+def inventory(conn, debug=False):
+    """
+    Run on a host, the devices ``ceph-volume inventory`` reports, or an empty
+    list when ``ceph-volume`` is not installed.
+    """
+    ceph_volume = conn.remote_module.which('ceph-volume')
+    if not ceph_volume:
+        conn.logger.warning('ceph-volume is not installed, skipping its inventory')
+        return []
+    kw = {}
+    if debug:
+        kw['extend_env'] = {'CEPH_VOLUME_DEBUG': '1'}
+    out, err, code = remoto.process.check(
+        conn,
+        [ceph_volume, 'inventory', '--format', 'json'],
+        **kw
+    )
+    if code != 0:
+        raise RuntimeError('ceph-volume inventory failed on %s' % conn.hostname)
+    try:
+        return json.loads(''.join(out) or '[]')
+    except ValueError:
+        raise RuntimeError('unable to parse the output of ceph-volume inventory on %s' % conn.hostname)
+
+
+def format_size(size):
+    if size is None:
+        return '-'
+    size = float(size)
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if size < 1024 or unit == 'TiB':
+            break
+        size /= 1024
+    if unit == 'B':
+        return '%d B' % size
+    return '%.1f %s' % (size, unit)
+
+
+def describe(record):
+    """
+    One line about a disk for the console.
+    """
+    if record['ceph']:
+        state = 'in use by ceph'
+    elif record.get('available') is False:
+        state = 'unavailable: %s' % ', '.join(record.get('rejected_reasons') or ['unknown'])
+    elif record['holders'] or record['mountpoints']:
+        state = 'in use'
+    else:
+        state = 'available'
+    return '%-12s %10s %-3s %-24s %s' % (
+        record['path'],
+        format_size(record['size']),
+        'hdd' if record['rotational'] else 'ssd',
+        record['model'] or '-',
+        state,
+    )
@@ -0,0 +1,149 @@
+"""
+A record of the per-host steps of every run, so that a run that died half
+way (a lost connection, Ctrl-C) can be resumed without redoing the hosts
+that were already done.
+
+Every step appends one JSON line to ``ceph-deploy-{cluster}.journal``, next to
+``ceph-deploy-{cluster}.log``, when it starts and when it ends::
+
+    {"run": "...", "command": "install", "step": "install", "host": "node1",
+     "params": {"release": "nautilus", ...}, "status": "done", "duration": 41.2,
+     "time": 1700000000.0}
+
+With ``--resume``, a step is skipped when the last record for the same host,
+step and parameters says it is done. Steps that failed, or that started
+and never finished, run again.
+
+Nothing is written unless the journal has been configured, which only the
+command line does.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+
+LOG = logging.getLogger(__name__)
+
+# the value of a step that was skipped because an earlier run completed it
+RESUMED = 'done in an earlier run'
+
+
+class Journal(object):
+
+    def __init__(self, path=None, command=None, resume=False):
+        self.path = path
+        self.command = command
+        self.resume = resume
+        self.run_id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self._completed = None
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def _key(self, step, host, params):
+        return json.dumps([self.command, step, host, params], sort_keys=True)
+
+    def load(self):
+        """
+        The steps whose last record says they are done, from every earlier
+        run. A line cut short by a run that was killed while writing it is
+        ignored.
+        """
+        completed = set()
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except (IOError, OSError):
+            return completed
+        for line in lines:
+            try:
+                record = json.loads(line)
+                key = self._key(record['step'], record['host'], record.get('params'))
+            except (ValueError, KeyError, TypeError):
+                continue
+            if record.get('command') != self.command:
+                continue
+            if record.get('status') == 'done':
+                completed.add(key)
+            else:
+                completed.discard(key)
+        return completed
+
+    def completed(self, step, host, params=None):
+        if not (self.enabled and self.resume):
+            return False
+        with self.lock:
+            if self._completed is None:
+                self._completed = self.load()
+            return self._key(step, host, params) in self._completed
+
+    def record(self, step, host, status, params=None, duration=None):
+        if not self.enabled:
+            return
+        entry = {
+            'run': self.run_id,
+            'command': self.command,
+            'step': step,
+            'host': host,
+            'params': params,
+            'status': status,
+            'time': time.time(),
+        }
+        if duration is not None:
+            entry['duration'] = round(duration, 3)
+        line = json.dumps(entry, sort_keys=True) + '\n'
+        with self.lock:
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(line)
+            except (IOError, OSError) as error:
+                # only --resume reads the journal, and it runs a step again
+                # when its done line is missing
+                LOG.warning('unable to write to the journal %s: %s', self.path, error)
+
+    def wrap(self, step, func, params=None):
+        """
+        Return a version of ``func(host)`` that is skipped (returning
+        :data:`RESUMED`) when resuming and ``step`` was already done for the
+        host, and that records how it went otherwise.
+        """
+        def journaled(host):
+            if self.completed(step, host, params):
+                LOG.info('skipping %s on %s, %s', step, host, RESUMED)
+                return RESUMED
+            self.record(step, host, 'started', params)
+            start = time.time()
+            try:
+                value = func(host)
+            except BaseException:
+                self.record(step, host, 'failed', params, time.time() - start)
+                raise
+            self.record(step, host, 'done', params, time.time() - start)
+            return value
+        return journaled
+
+
+journal = Journal()
+
+
+def default_path(cluster):
+    return os.path.abspath('ceph-deploy-{cluster}.journal'.format(cluster=cluster))
+
+
+def configure(path, command=None, resume=False):
+    global journal
+    journal = Journal(path, command=command, resume=resume)
+    return journal
+
+
+def completed(step, host, params=None):
+    return journal.completed(step, host, params)
+
+
+def wrap(step, func, params=None):
+    return journal.wrap(step, func, params)
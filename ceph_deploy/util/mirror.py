@@ -0,0 +1,236 @@
+"""
+Stage a ``--local-mirror`` on many hosts without pushing the whole mirror
+over the uplink of the admin node once per host.
+
+The admin node only rsyncs the mirror to a few seed hosts. Every host that
+holds a verified copy then pushes it to one host that does not, so the number
+of staged hosts doubles with every round (a binomial tree) and staging ``N``
+hosts takes about ``log2(N / seeds)`` rounds after seeding::
+
+    round 0:  admin -> node1
+    round 1:  node1 -> node2
+    round 2:  node1 -> node3, node2 -> node4
+    round 3:  node1 -> node5, node2 -> node6, node3 -> node7, node4 -> node8
+
+Copies between peers use ``rsync`` over SSH on the sending host, so peers
+need to be able to reach each other. Every copy is verified against the
+checksums of the local mirror on arrival, and a peer copy that fails or does
+not verify is pushed again from the admin node instead. A host the admin node
+cannot push to is failed while the others carry on.
+"""
+import logging
+
+from ceph_deploy import connection
+from ceph_deploy.hosts import remotes
+from ceph_deploy.lib import remoto
+from ceph_deploy.util import parallel
+
+
+LOG = logging.getLogger(__name__)
+
+REPO_PATH = '/opt/ceph-deploy/repo'
+
+
+def schedule(hosts, seeds=1):
+    """
+    The rounds in which ``hosts`` get the mirror when every copy succeeds, as
+    a list of ``(source, target)`` pairs per round where a ``source`` of
+    ``None`` is the admin node.
+    """
+    seeds = max(seeds, 1)
+    hosts = list(hosts)
+    rounds = [[(None, host) for host in hosts[:seeds]]]
+    staged = hosts[:seeds]
+    pending = hosts[seeds:]
+    while pending:
+        transfers = list(zip(staged, pending))
+        rounds.append(transfers)
+        staged = staged + [target for _, target in transfers]
+        pending = pending[len(transfers):]
+    return rounds
+
+
+class Distribution(object):
+    """
+    Stage the mirror at ``source`` (a local directory) in :data:`REPO_PATH`
+    on ``hosts``. :meth:`run` returns the hosts that have a verified copy,
+    the ones that could not get one are kept in ``failed``.
+    """
+
+    def __init__(self, source, hosts, seeds=1, username=None, logger=None):
+        self.source = source
+        self.hosts = list(hosts)
+        self.seeds = max(seeds, 1)
+        self.username = username
+        self.logger = logger or LOG
+        self.expected = None
+        self.failed = []
+
+    def target(self, hostname):
+        if self.username:
+            return '%s@%s' % (self.username, hostname)
+        return hostname
+
+    def connect(self, hostname):
+        conn = connection.get_connection(
+            hostname,
+            username=self.username,
+            logger=logging.getLogger(hostname),
+        )
+        conn.import_module(remotes)
+        return conn
+
+    def push(self, hostnames):
+        """
+        rsync the mirror from the admin node, reading it once for all of
+        ``hostnames``
+        """
+        try:
+            remoto.rsync(
+                [self.target(hostname) for hostname in hostnames],
+                self.source,
+                REPO_PATH,
+                self.logger,
+                sudo=True,
+            )
+        except RuntimeError:
+            raise
+        except Exception as error:
+            # unreachable hosts and broken transfers come from execnet
+            raise RuntimeError(
+                'unable to push the local mirror to %s: %s' % (', '.join(hostnames), error)
+            )
+
+    def seed(self, hostnames):
+        """
+        Push the mirror to ``hostnames`` from the admin node and verify it.
+        When pushing to all of them at once fails they are pushed to one at a
+        time, so that only the hosts that cannot be reached fail.
+        """
+        try:
+            self.push(hostnames)
+        except RuntimeError as error:
+            if len(hostnames) == 1:
+                self.logger.error('seeding the local mirror failed: %s', error)
+                return [parallel.Outcome(hostnames[0], error=error)]
+            self.logger.warning(
+                'seeding the local mirror failed, pushing it to one host at a time: %s',
+                error,
+            )
+
+            def seed_one(hostname):
+                self.push([hostname])
+                return self.verify(hostname)
+            return parallel.run(seed_one, hostnames, workers=len(hostnames), logger=self.logger)
+        return parallel.run(self.verify, hostnames, workers=len(hostnames), logger=self.logger)
+
+    def copy(self, source, hostname):
+        """
+        Have ``source``, which already holds a verified mirror, push it to
+        ``hostname``
+        """
+        conn = self.connect(source)
+        try:
+            target = self.connect(hostname)
+            try:
+                # the target directory is only writable by root
+                use_sudo = target.sudo
+            finally:
+                target.exit()
+            command = [
+                'rsync',
+                '-a',
+                '--delete',
+                '-e', 'ssh -o BatchMode=yes',
+            ]
+            if use_sudo:
+                command.append('--rsync-path=sudo rsync')
+            command.extend([
+                REPO_PATH + '/',
+                '%s:%s/' % (self.target(hostname), REPO_PATH),
+            ])
+            remoto.process.run(conn, command)
+        finally:
+            conn.exit()
+
+    def verify(self, hostname):
+        conn = self.connect(hostname)
+        try:
+            checksums = conn.remote_module.tree_checksums(REPO_PATH)
+        finally:
+            conn.exit()
+        mismatched = [
+            path for path, digest in self.expected.items()
+            if checksums.get(path) != digest
+        ]
+        if mismatched:
+            raise RuntimeError(
+                'local mirror on %s does not match: %d of %d files differ (%s)' % (
+                    hostname,
+                    len(mismatched),
+                    len(self.expected),
+                    ', '.join(sorted(mismatched)[:3]),
+                )
+            )
+        return hostname
+
+    def transfer(self, pair):
+        source, hostname = pair
+        try:
+            self.copy(source, hostname)
+            return self.verify(hostname)
+        except RuntimeError as error:
+            self.logger.warning(
+                'copying the local mirror from %s to %s failed, pushing it from the admin node: %s',
+                source,
+                hostname,
+                error,
+            )
+        self.push([hostname])
+        return self.verify(hostname)
+
+    def run(self):
+        self.expected = remotes.tree_checksums(self.source)
+        if not self.expected:
+            raise RuntimeError('local mirror %s has no files' % self.source)
+
+        staged = []
+        pending = list(self.hosts)
+        rounds = 0
+        while pending:
+            if not staged:
+                # nothing to copy from (yet), seed from the admin node
+                seeds, pending = pending[:self.seeds], pending[self.seeds:]
+                self.logger.info('seeding the local mirror on %s', ', '.join(seeds))
+                outcomes = self.seed(seeds)
+            else:
+                transfers = list(zip(staged, pending))
+                pending = pending[len(transfers):]
+                self.logger.info(
+                    'copying the local mirror between peers to %d host%s',
+                    len(transfers),
+                    '' if len(transfers) == 1 else 's',
+                )
+                outcomes = parallel.run(
+                    self.transfer,
+                    transfers,
+                    workers=len(transfers),
+                    logger=self.logger,
+                )
+                for outcome in outcomes:
+                    outcome.item = outcome.item[1]
+            rounds += 1
+            for outcome in outcomes:
+                if outcome.failed:
+                    self.failed.append(outcome.item)
+                else:
+                    staged.append(outcome.item)
+
+        self.logger.info(
+            'staged the local mirror on %d of %d hosts in %d round%s',
+            len(staged),
+            len(self.hosts),
+            rounds,
+            '' if rounds == 1 else 's',
+        )
+        return staged
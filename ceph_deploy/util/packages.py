@@ -1,5 +1,5 @@
 from ceph_deploy.exc import ExecutableNotFound
-from ceph_deploy.util import system, versions
+from ceph_deploy.util import constants, system, versions
 from ceph_deploy.lib import remoto
 
 
@@ -72,3 +72,16 @@ def ceph_is_installed(module):
         raise RuntimeError(
             'ceph needs to be installed in remote host: %s' % host
         )
+
+
+def matches_release(version, release):
+    """
+    Tell if a package ``version``, as reported by rpm (``VERSION-RELEASE``) or
+    dpkg (``[EPOCH:]VERSION``), belongs to the stable ``release`` codename.
+    Unknown releases never match.
+    """
+    prefix = constants.release_versions.get(str(release).lower())
+    if not version or prefix is None:
+        return False
+    version = version.split(':', 1)[-1]
+    return version.startswith(prefix + '.')
@@ -0,0 +1,126 @@
+"""
+Run the same per-host body against many hosts, optionally concurrently.
+
+Every multi-host subcommand used to walk its hosts in a serial loop. The
+helpers here keep that exact behavior when the concurrency is ``1`` (the
+default) and fan out to a bounded number of worker threads otherwise, so
+that deploying to a rack takes the time of the slowest host rather than the
+sum of all of them.
+
+Example usage::
+
+    >>> from ceph_deploy.util import parallel
+    >>> outcomes = parallel.run(push_conf, args.client, workers=args.parallel)
+    >>> errors = parallel.count_failed(outcomes)
+"""
+import logging
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Outcome(object):
+    """
+    The result of running the per-host body for a single ``item`` (usually
+    a hostname). Exactly one of ``value`` or ``error`` is meaningful.
+    """
+
+    def __init__(self, item, value=None, error=None):
+        self.item = item
+        self.value = value
+        self.error = error
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    def __repr__(self):
+        return '<Outcome %s %s>' % (
+            self.item, 'failed' if self.failed else 'ok'
+        )
+
+
+def workers(args, default=1):
+    """
+    Read the concurrency from the ``--parallel`` global flag. Values coming
+    from the ceph-deploy config file are strings, and anything that cannot be
+    coerced falls back to ``default``.
+    """
+    value = getattr(args, 'parallel', default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(value, 1)
+
+
+def count_failed(outcomes):
+    return len([o for o in outcomes if o.failed])
+
+
+def run(func, items, workers=1, catch=(RuntimeError,), logger=None):
+    """
+    Call ``func(item)`` for every item, running at most ``workers`` of them at
+    the same time, and return a list of :class:`Outcome` in the same order as
+    ``items``.
+
+    Exceptions listed in ``catch`` are logged and recorded in the outcome for
+    that item (mirroring the ``except RuntimeError: errors += 1`` loops this
+    replaces); anything else is re-raised in the calling thread once the
+    in-flight hosts are done.
+    """
+    logger = logger or LOG
+    items = list(items)
+    outcomes = [Outcome(item) for item in items]
+
+    def call(outcome):
+        try:
+            outcome.value = func(outcome.item)
+        except catch as error:
+            logger.error(error)
+            outcome.error = error
+
+    if workers <= 1 or len(items) <= 1:
+        for outcome in outcomes:
+            call(outcome)
+        return outcomes
+
+    pending = queue.Queue()
+    for outcome in outcomes:
+        pending.put(outcome)
+    unexpected = []
+
+    def worker():
+        while not unexpected:
+            try:
+                outcome = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                call(outcome)
+            except BaseException as error:
+                outcome.error = error
+                unexpected.append(error)
+
+    threads = []
+    for _ in range(min(workers, len(items))):
+        thread = threading.Thread(target=worker)
+        # do not block interpreter exit (e.g. on Ctrl-C) waiting for hosts
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        # a timeout is needed so that KeyboardInterrupt reaches the main
+        # thread while joining
+        while thread.is_alive():
+            thread.join(0.1)
+
+    if unexpected:
+        raise unexpected[0]
+    return outcomes
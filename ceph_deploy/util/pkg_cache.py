@@ -0,0 +1,352 @@
+"""
+A caching HTTP mirror for Ceph repositories and packages, meant to run on the
+admin node (``ceph-deploy cache serve``) so that a fleet install downloads
+every package from upstream once instead of once per host.
+
+Upstream URLs are mapped into the cache by prefixing them with the URL of the
+cache and the scheme of the original URL::
+
+    https://download.ceph.com/rpm-nautilus/el7/x86_64/ceph-14.2.22-0.el7.x86_64.rpm
+    http://admin:8080/https/download.ceph.com/rpm-nautilus/el7/x86_64/ceph-14.2.22-0.el7.x86_64.rpm
+
+which is what :func:`rewrite` (and :func:`rewrite_content` for whole repo
+files) do. The cache fills lazily: the first request for a file fetches it
+from upstream, any request that comes in meanwhile waits for that download,
+and every later one is served from disk. Packages never change once
+published and are kept forever. Repository metadata (anything else) is
+fetched again once it is older than ``metadata_ttl`` seconds, and a stale copy
+is served when upstream cannot be reached.
+
+Only the hosts in ``upstreams`` are fetched from, redirects included, and no
+file bigger than ``max_size`` is kept, so that the cache cannot be used to
+reach anything else on the network or to fill the disk.
+"""
+import errno
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+try:
+    from urllib.parse import urlparse
+    from urllib.request import HTTPRedirectHandler, build_opener
+    from urllib.error import HTTPError, URLError
+except ImportError:
+    from urlparse import urlparse
+    from urllib2 import HTTPRedirectHandler, build_opener, HTTPError, URLError
+
+
+LOG = logging.getLogger(__name__)
+
+default_path = os.path.expanduser('~/.cache/ceph-deploy/packages')
+
+default_port = 8080
+
+# the release repositories, and the development builds shaman redirects to
+# on the chacra nodes
+default_upstreams = (
+    'download.ceph.com',
+    'shaman.ceph.com',
+    'chacra.ceph.com',
+    '*.chacra.ceph.com',
+)
+
+default_max_size = 4 * 1024 ** 3
+
+# files that never change once published upstream
+immutable = ('.rpm', '.deb', '.udeb', '.ddeb', '.pkg.tar.xz')
+
+_url_re = re.compile(r'https?://[^\s\'"<>]+')
+
+
+def cache_url(args):
+    """
+    The URL of the cache that ``install`` should go through, if any, from the
+    ``CEPH_DEPLOY_CACHE_URL`` environment variable or ``--cache-url``.
+    """
+    url = os.environ.get('CEPH_DEPLOY_CACHE_URL') or getattr(args, 'cache_url', None)
+    if url:
+        return url.rstrip('/')
+
+
+def rewrite(url, cache):
+    """
+    Point ``url`` at the cache served at ``cache``. URLs that are not HTTP(S),
+    or that already go through the cache, are returned unchanged, as is
+    everything when there is no cache.
+    """
+    if not cache or not url:
+        return url
+    cache = cache.rstrip('/')
+    if url.startswith(cache + '/'):
+        return url
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return url
+    prefix = '%s://%s' % (parsed.scheme, parsed.netloc)
+    return '%s/%s/%s%s' % (cache, parsed.scheme, parsed.netloc, url[len(prefix):])
+
+
+def rewrite_content(content, cache):
+    """
+    Point every HTTP(S) URL in the repo file ``content`` at the cache.
+    """
+    if not cache or not content:
+        return content
+    is_bytes = isinstance(content, bytes)
+    if is_bytes:
+        content = content.decode('utf-8')
+    content = _url_re.sub(lambda match: rewrite(match.group(0), cache), content)
+    if is_bytes:
+        content = content.encode('utf-8')
+    return content
+
+
+def upstream(path):
+    """
+    The upstream URL for the request ``path`` of the cache, ``None`` if it
+    does not look like ``/<scheme>/<host>/...``.
+    """
+    parts = path.lstrip('/').split('/', 2)
+    if len(parts) < 2 or parts[0] not in ('http', 'https') or not parts[1]:
+        return None
+    rest = parts[2] if len(parts) == 3 else ''
+    return '%s://%s/%s' % (parts[0], parts[1], rest)
+
+
+def allowed(url, upstreams):
+    """
+    Whether the host of ``url`` is one of ``upstreams``, where ``*.example.com``
+    stands for any host in ``example.com``.
+    """
+    host = (urlparse(url).hostname or '').lower()
+    if not host:
+        return False
+    for upstream in upstreams:
+        upstream = upstream.lower()
+        if upstream.startswith('*.'):
+            if host.endswith(upstream[1:]):
+                return True
+        elif host == upstream:
+            return True
+    return False
+
+
+def upstream_hosts(urls):
+    """
+    The hosts of ``urls``, to allow fetching from a ``--repo-url``.
+    """
+    return [urlparse(url).hostname for url in urls if urlparse(url).hostname]
+
+
+class NotAllowed(Exception):
+    """
+    A URL outside of the upstreams of the cache.
+    """
+
+
+class TooLarge(Exception):
+    """
+    An upstream file bigger than the cache keeps.
+    """
+
+
+def make_opener(upstreams):
+    """
+    ``urlopen`` that refuses to follow redirects away from ``upstreams``.
+    """
+    class Redirects(HTTPRedirectHandler):
+
+        def redirect_request(self, req, fp, code, msg, headers, newurl):
+            if not allowed(newurl, upstreams):
+                raise NotAllowed(newurl)
+            return HTTPRedirectHandler.redirect_request(self, req, fp, code, msg, headers, newurl)
+
+    return build_opener(Redirects).open
+
+
+class PackageCache(object):
+    """
+    The files fetched from upstream, kept under ``directory``.
+    """
+
+    def __init__(self, directory=None, metadata_ttl=300, opener=None,
+                 upstreams=default_upstreams, max_size=default_max_size):
+        self.directory = os.path.abspath(directory or default_path)
+        self.metadata_ttl = int(metadata_ttl)
+        self.upstreams = tuple(upstreams)
+        self.max_size = int(max_size)
+        self.opener = opener or make_opener(self.upstreams)
+        self.lock = threading.Lock()
+        self.locks = {}
+        self.stats = {'hits': 0, 'misses': 0, 'bytes_fetched': 0}
+
+    def path(self, url):
+        """
+        Where the upstream ``url`` is kept. Directory listings and URLs with
+        a query string get a file name of their own so that they never
+        collide with a file at the same path.
+        """
+        parsed = urlparse(url)
+        parts = [parsed.scheme, parsed.netloc]
+        parts.extend(part for part in parsed.path.split('/') if part not in ('', '.', '..'))
+        path = os.path.join(self.directory, *parts)
+        if parsed.path.endswith('/') or not parsed.path:
+            path = os.path.join(path, '.index')
+        if parsed.query:
+            path += '.' + hashlib.sha1(parsed.query.encode('utf-8')).hexdigest()
+        return path
+
+    def fresh(self, url, path):
+        try:
+            modified = os.path.getmtime(path)
+        except OSError:
+            return False
+        if urlparse(url).path.endswith(immutable):
+            return True
+        return time.time() - modified < self.metadata_ttl
+
+    def _lock_for(self, path):
+        with self.lock:
+            return self.locks.setdefault(path, threading.Lock())
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def fetch(self, url):
+        """
+        Return the local path of ``url``, downloading it first unless a
+        fresh copy is already cached. Concurrent requests for the same URL
+        share a single download.
+
+        Raises ``HTTPError`` for upstream errors (which are not cached),
+        ``URLError`` when upstream is unreachable and nothing is cached,
+        :class:`NotAllowed` for URLs outside of the upstreams and
+        :class:`TooLarge` for files over ``max_size``.
+        """
+        if not allowed(url, self.upstreams):
+            raise NotAllowed(url)
+        path = self.path(url)
+        with self._lock_for(path):
+            if self.fresh(url, path):
+                self._count('hits')
+                return path
+            self._count('misses')
+            try:
+                self._download(url, path)
+            except HTTPError:
+                raise
+            except (URLError, socket.error) as error:
+                if not os.path.exists(path):
+                    raise
+                LOG.warning('serving stale %s, upstream failed: %s', url, error)
+            return path
+
+    def _download(self, url, path):
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+        LOG.info('fetching %s', url)
+        response = self.opener(url)
+        try:
+            headers = getattr(response, 'headers', None)
+            length = headers.get('Content-Length') if headers is not None else None
+            if length and int(length) > self.max_size:
+                raise TooLarge('%s is %s bytes, over the limit of %d' % (url, length, self.max_size))
+            tmp = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+            try:
+                with tmp:
+                    size = self._copy(url, response, tmp)
+                os.rename(tmp.name, path)
+            except Exception:
+                os.unlink(tmp.name)
+                raise
+        finally:
+            response.close()
+        self._count('bytes_fetched', size)
+
+    def _copy(self, url, response, f):
+        # upstream may not say how big a file is, or get it wrong
+        size = 0
+        while True:
+            chunk = response.read(1024 * 1024)
+            if not chunk:
+                return size
+            size += len(chunk)
+            if size > self.max_size:
+                raise TooLarge('%s is over the limit of %d bytes' % (url, self.max_size))
+            f.write(chunk)
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    # set by :func:`make_server`
+    cache = None
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        url = upstream(self.path)
+        if url is None:
+            self.send_error(404, 'expected /<scheme>/<host>/<path>')
+            return
+        try:
+            path = self.cache.fetch(url)
+        except NotAllowed as error:
+            self.send_error(403, 'not an upstream of this cache: %s' % error)
+            return
+        except TooLarge as error:
+            self.send_error(502, str(error))
+            return
+        except HTTPError as error:
+            self.send_error(error.code, str(error.reason))
+            return
+        except (URLError, socket.error) as error:
+            self.send_error(502, 'failed to fetch %s: %s' % (url, error))
+            return
+
+        self.send_response(200)
+        content_type = mimetypes.guess_type(urlparse(url).path)[0]
+        self.send_header('Content-Type', content_type or 'application/octet-stream')
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.end_headers()
+        if send_body:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+    def log_message(self, format, *args):
+        LOG.debug('%s %s', self.address_string(), format % args)
+
+
+class Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+def make_server(cache, address='127.0.0.1', port=default_port):
+    """
+    An HTTP server answering from ``cache``, call ``serve_forever()`` on it.
+    """
+    handler = type('Handler', (Handler,), {'cache': cache})
+    return Server((address, port), handler)
@@ -13,10 +13,25 @@ class PackageManager(object):
     Base class for all Package Managers
     """
 
+    # the configuration files (and directories) that decide what the package
+    # metadata looks like, ``None`` when there is no way to tell so metadata
+    # is always refreshed
+    repo_paths = None
+    # refresh metadata that is older than this many seconds even when the
+    # configuration did not change, ``None`` when the package manager expires
+    # its metadata on its own
+    metadata_max_age = None
+    # how installed packages are queried (see ``remotes.installed_versions``)
+    query = None
+
     def __init__(self, remote_conn):
         self.remote_info = remote_conn
         self.remote_conn = remote_conn.conn
 
+    @property
+    def state_path(self):
+        return '/var/lib/ceph-deploy/%s-metadata.json' % self.name
+
     def _run(self, cmd, **kw):
         return remoto.process.run(
             self.remote_conn,
@@ -43,6 +58,61 @@ class PackageManager(object):
         """Clean metadata/cache"""
         raise NotImplementedError()
 
+    def refresh(self):
+        """
+        Refresh package metadata (like :meth:`clean`) only if the repository
+        configuration changed since the last refresh, or the metadata is older
+        than ``metadata_max_age``. Returns ``True`` when it was refreshed.
+        """
+        if self.repo_paths is None:
+            self.clean()
+            return True
+        remote_module = self.remote_conn.remote_module
+        fingerprint, refreshed_fingerprint, age = remote_module.repo_state(
+            list(self.repo_paths),
+            self.state_path,
+        )
+        if fingerprint != refreshed_fingerprint:
+            reason = 'repositories changed'
+        elif self.metadata_max_age is not None and age > self.metadata_max_age:
+            reason = 'metadata is %d seconds old' % age
+        else:
+            self.remote_conn.logger.info('package metadata is up to date, not refreshing')
+            return False
+        self.remote_conn.logger.info('refreshing package metadata, %s', reason)
+        self.clean()
+        remote_module.save_repo_state(self.state_path, fingerprint)
+        return True
+
+    def installed(self, packages):
+        """
+        Installed version of each of ``packages`` (``None`` when it is not
+        installed), asking the host about all of them at once
+        """
+        if self.query is None:
+            return dict((package, None) for package in packages)
+        return self.remote_conn.remote_module.installed_versions(
+            list(packages),
+            self.query,
+        )
+
+    def missing(self, packages):
+        """The ``packages`` that are not installed"""
+        if isinstance(packages, str):
+            packages = [packages]
+        installed = self.installed(packages)
+        return [package for package in packages if installed.get(package) is None]
+
+    def transaction(self, install=(), remove=()):
+        """
+        Remove and install packages with as few package manager runs as
+        possible, one run for each by default
+        """
+        if remove:
+            self.remove(list(remove))
+        if install:
+            self.install(list(install))
+
     def add_repo_gpg_key(self, url):
         """Add given GPG key for repo verification"""
         raise NotImplementedError()
@@ -63,6 +133,9 @@ class RPMManagerBase(PackageManager):
 
     executable = None
     name = None
+    # yum and dnf expire metadata on their own (``metadata_expire``)
+    repo_paths = ('/etc/yum.repos.d',)
+    query = 'rpm'
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -100,6 +173,33 @@ class RPMManagerBase(PackageManager):
         cmd.extend(packages)
         return self._run(cmd)
 
+    def transaction(self, install=(), remove=()):
+        """
+        Remove and install packages in a single transaction with a ``shell``
+        script, which only loads repository metadata and takes the RPM
+        database lock once. Raises ``RuntimeError`` if a package that was
+        asked for by name did not end up installed.
+        """
+        if not (install and remove):
+            return super(RPMManagerBase, self).transaction(install, remove)
+        script = ''.join('remove %s\n' % package for package in remove)
+        script += 'install %s\n' % ' '.join(install)
+        script += 'run\n'
+        path = self.remote_conn.remote_module.write_temp_file(
+            script.encode('utf-8'),
+            'ceph-deploy-%s-' % self.name,
+        )
+        try:
+            self._run([self.executable, '-y', 'shell', path])
+        finally:
+            self.remote_conn.remote_module.unlink(path)
+        # package files and URLs cannot be checked by name
+        not_installed = self.missing([package for package in install if '/' not in package])
+        if not_installed:
+            raise RuntimeError(
+                '%s transaction did not install: %s' % (self.name, ', '.join(not_installed))
+            )
+
     def clean(self, item=None):
         item = item or 'all'
         cmd = [
@@ -196,6 +296,14 @@ class Apt(PackageManager):
         '-q',
     ]
     name = 'apt'
+    query = 'dpkg'
+    repo_paths = (
+        '/etc/apt/sources.list',
+        '/etc/apt/sources.list.d',
+        '/etc/apt/trusted.gpg',
+        '/etc/apt/trusted.gpg.d',
+    )
+    metadata_max_age = 24 * 60 * 60
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -288,6 +396,8 @@ class Zypper(PackageManager):
         '--quiet'
     ]
     name = 'zypper'
+    # zypper refreshes repositories with ``autorefresh`` on its own
+    repo_paths = ('/etc/zypp/repos.d',)
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -337,6 +447,8 @@ class Pacman(PackageManager):
         '--noconfirm',
     ]
     name = 'pacman'
+    repo_paths = ('/etc/pacman.conf', '/etc/pacman.d')
+    metadata_max_age = 24 * 60 * 60
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -391,6 +503,8 @@ class AptRpm(PackageManager):
         '-V',
     ]
     name = 'apt'
+    repo_paths = ('/etc/apt/sources.list', '/etc/apt/sources.list.d')
+    metadata_max_age = 24 * 60 * 60
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -0,0 +1,130 @@
+"""
+Push the cluster configuration (and the admin keyring) only to hosts where it
+is different.
+
+Before any payload goes out, the remote end is asked for a checksum of the
+files already there, which is a single round-trip that can share a
+:class:`~ceph_deploy.util.batch.RemoteBatch` with other calls. Hosts that are
+already up to date never receive the content, so re-pushing a one-line change
+to a large cluster only writes to the hosts that actually differ::
+
+    summary = push.Summary()
+    push.push(distro.conn, hostname, args.cluster, conf_data,
+              args.overwrite_conf, summary=summary)
+    ...
+    summary.log(LOG)
+"""
+import hashlib
+import logging
+import threading
+
+from ceph_deploy.util.batch import RemoteBatch
+
+
+LOG = logging.getLogger(__name__)
+
+
+def checksum(content):
+    """
+    SHA-256 hex digest of ``content``, the same way ``remotes.file_checksums``
+    computes it for files on the remote end.
+    """
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def conf_path(cluster):
+    return '/etc/ceph/{cluster}.conf'.format(cluster=cluster)
+
+
+def admin_keyring_path(cluster):
+    return '/etc/ceph/{cluster}.client.admin.keyring'.format(cluster=cluster)
+
+
+class FilePush(object):
+    """
+    The configuration (and optionally admin keyring) of ``cluster`` to push
+    to one host, in two steps that queue on a :class:`RemoteBatch`:
+    :meth:`check` asks for the remote checksums and, once that batch has been
+    executed, :meth:`write` queues writes for the files that differ.
+    """
+
+    def __init__(self, cluster, conf_data, overwrite, keyring=None, logger=None):
+        self.cluster = cluster
+        self.conf_data = conf_data
+        self.overwrite = overwrite
+        self.keyring = keyring
+        self.logger = logger or LOG
+        self.files = [(conf_path(cluster), conf_data)]
+        if keyring is not None:
+            self.files.append((admin_keyring_path(cluster), keyring))
+        self.changed = []
+        self._checksums = None
+
+    def check(self, batch):
+        self._checksums = batch.file_checksums([path for path, _ in self.files])
+        return self._checksums
+
+    def write(self, batch):
+        """
+        Queue a write for every file whose remote checksum differs, and
+        return their paths.
+        """
+        remote = self._checksums.get()
+        self.changed = []
+        for path, content in self.files:
+            if remote.get(path) == checksum(content):
+                self.logger.debug('%s is up to date', path)
+                continue
+            self.changed.append(path)
+            if path == conf_path(self.cluster):
+                batch.write_conf(self.cluster, content, self.overwrite)
+            else:
+                batch.write_file(path, content, 0o600)
+        return self.changed
+
+
+def push(conn, hostname, cluster, conf_data, overwrite, keyring=None, summary=None):
+    """
+    Push the configuration (and ``keyring`` as the admin keyring, if given)
+    to ``conn`` if it differs from what the host has, returning the paths
+    that were written.
+    """
+    pending = FilePush(cluster, conf_data, overwrite, keyring=keyring, logger=conn.logger)
+    batch = RemoteBatch(conn)
+    pending.check(batch)
+    batch.execute()
+    pending.write(batch)
+    batch.execute()
+    if summary is not None:
+        summary.record(hostname, pending.changed)
+    return pending.changed
+
+
+class Summary(object):
+    """
+    Count the hosts that got new files and the ones that were already up to
+    date, across the (possibly concurrent) pushes of one command.
+    """
+
+    def __init__(self):
+        self.changed = []
+        self.skipped = []
+        self.lock = threading.Lock()
+
+    def record(self, hostname, changed):
+        with self.lock:
+            if changed:
+                self.changed.append(hostname)
+            else:
+                self.skipped.append(hostname)
+
+    def log(self, logger=None):
+        logger = logger or LOG
+        logger.info(
+            'pushed to %d host%s, %d already up to date',
+            len(self.changed),
+            '' if len(self.changed) == 1 else 's',
+            len(self.skipped),
+        )
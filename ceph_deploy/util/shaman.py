@@ -0,0 +1,139 @@
+"""
+Resolve development repositories through shaman, once per platform.
+
+Installing a development build asks shaman (https://shaman.ceph.com) which
+chacra repository holds the build, and then fetches the repo file from chacra.
+That lookup only depends on the branch, sha1, distro, distro version and
+architecture, so hosts sharing a platform get the answer from memory instead
+of repeating both HTTP requests. With a ``ttl``, answers for an explicit sha1
+are also kept on disk (one JSON file per lookup) and reused by later runs.
+The ``latest`` build of a branch moves, so it is always looked up again.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from ceph_deploy.util import net
+
+
+LOG = logging.getLogger(__name__)
+
+default_path = os.path.expanduser('~/.cache/ceph-deploy/shaman')
+
+url_template = (
+    'https://shaman.ceph.com/api/repos/ceph/{branch}/{sha1}/'
+    '{distro}/{distro_version}/repo/?arch={arch}'
+)
+
+
+def shaman_url(branch, sha1, distro, distro_version, arch):
+    return url_template.format(
+        branch=branch,
+        sha1=sha1 or 'latest',
+        distro=distro,
+        distro_version=distro_version,
+        arch=arch,
+    )
+
+
+class ShamanCache(object):
+    """
+    Resolved chacra URLs and repo file contents, in memory for the whole run
+    and, for explicit sha1s, on disk for ``ttl`` seconds (never when ``ttl``
+    is ``0``).
+    """
+
+    def __init__(self, path=None, ttl=0):
+        self.path = path or default_path
+        # values coming from the ceph-deploy config file are strings
+        self.ttl = int(ttl or 0)
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.locks = {}
+
+    def _file(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, '%s.json' % digest)
+
+    def _load(self, key):
+        if self.ttl <= 0:
+            return None
+        try:
+            with open(self._file(key)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if time.time() - entry.get('timestamp', 0) > self.ttl:
+            return None
+        if entry.get('key') != list(key):
+            return None
+        return entry['chacra_url'], entry['content'].encode('utf-8')
+
+    def _save(self, key, chacra_url, content):
+        if self.ttl <= 0:
+            return
+        entry = {
+            'key': list(key),
+            'chacra_url': chacra_url,
+            'content': content.decode('utf-8'),
+            'timestamp': time.time(),
+        }
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            tmp_file = tempfile.NamedTemporaryFile('w', dir=self.path, delete=False)
+            with tmp_file:
+                json.dump(entry, tmp_file)
+            os.rename(tmp_file.name, self._file(key))
+        except (IOError, OSError) as error:
+            LOG.debug('unable to cache the shaman lookup for %s: %s', '/'.join(key), error)
+
+    def _lock_for(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def repo(self, branch, sha1, distro, distro_version, arch):
+        """
+        Return the chacra URL and the repo file contents for a build, asking
+        shaman and chacra only if no other host (or recent run) did.
+        """
+        key = (branch, sha1 or 'latest', distro, str(distro_version), arch)
+        # hosts sharing a platform wait for the first one to resolve it
+        with self._lock_for(key):
+            if key in self.entries:
+                return self.entries[key]
+            persist = key[1] != 'latest'
+            entry = self._load(key) if persist else None
+            if entry is not None:
+                LOG.debug('using cached shaman lookup for %s', '/'.join(key))
+            else:
+                url = shaman_url(*key)
+                LOG.debug('fetching repo information from: %s', url)
+                chacra_url = net.get_request(url).geturl()
+                content = net.get_request(chacra_url).read()
+                entry = (chacra_url, content)
+                if persist:
+                    self._save(key, chacra_url, content)
+            self.entries[key] = entry
+            return entry
+
+
+cache = ShamanCache()
+
+
+def configure(ttl=0, path=None):
+    """
+    Start a new run with an empty in-memory cache, keeping lookups on disk
+    for ``ttl`` seconds.
+    """
+    global cache
+    cache = ShamanCache(path=path, ttl=ttl)
+    return cache
+
+
+def repo(branch, sha1, distro, distro_version, arch):
+    return cache.repo(branch, sha1, distro, distro_version, arch)
@@ -148,6 +148,25 @@ def start_service(conn, service='ceph'):
         )
 
 
+def restart_service(conn, service='ceph'):
+    """
+    Restart a systemd service on a remote host, starting it if it was not
+    running. Raises ``RuntimeError`` on hosts that do not use systemd.
+    """
+    if not is_systemd(conn):
+        raise RuntimeError(
+            'unable to restart %s on %s, only systemd is supported' % (service, conn.hostname)
+        )
+    remoto.process.run(
+        conn,
+        [
+            'systemctl',
+            'restart',
+            '{service}'.format(service=service),
+        ]
+    )
+
+
 def is_systemd_service_active(conn, service='ceph'):
     """
     Detects if a systemd service is active or not.
@@ -0,0 +1,208 @@
+"""
+Timing spans for the phases of a run: connecting to hosts, every remote
+command and remote module call, and package manager operations. With
+``--trace FILE`` they are written as a Chrome trace-event file that can be
+loaded in ``chrome://tracing`` or https://ui.perfetto.dev, where every host
+gets its own row.
+
+Nothing is recorded unless tracing has been configured, and objects are
+only wrapped for tracing when it is, so the instrumentation costs nothing
+otherwise.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Tracer(object):
+    """
+    Collect complete ("X") trace events in memory until :meth:`write`.
+    Events are tagged with the host they ran against and the subcommand, and
+    are grouped in one row per host (and per thread, when several threads
+    work on the same host at once).
+    """
+
+    def __init__(self, path=None, command=None):
+        self.path = path
+        self.command = command
+        self.events = []
+        self.lanes = {}
+        self.lock = threading.Lock()
+        self.start = time.time()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def lane(self, host):
+        key = (host, threading.current_thread().ident)
+        with self.lock:
+            if key not in self.lanes:
+                same_host = len([k for k in self.lanes if k[0] == host])
+                name = host or 'ceph-deploy'
+                if same_host:
+                    name = '%s (%d)' % (name, same_host + 1)
+                self.lanes[key] = (len(self.lanes) + 1, name)
+            return self.lanes[key][0]
+
+    def record(self, name, category, start, end, host=None, **args):
+        args['subcommand'] = self.command
+        if host:
+            args['host'] = host
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': int((start - self.start) * 1e6),
+            'dur': int((end - start) * 1e6),
+            'pid': os.getpid(),
+            'tid': self.lane(host),
+            'args': args,
+        }
+        with self.lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category='ceph-deploy', host=None, **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        except BaseException as error:
+            args['error'] = '%s: %s' % (error.__class__.__name__, error)
+            raise
+        finally:
+            self.record(name, category, start, time.time(), host=host, **args)
+
+    def write(self):
+        if not self.enabled:
+            return
+        pid = os.getpid()
+        with self.lock:
+            metadata = [{
+                'name': 'process_name',
+                'ph': 'M',
+                'pid': pid,
+                'args': {'name': 'ceph-deploy %s' % (self.command or '')},
+            }]
+            for tid, name in self.lanes.values():
+                metadata.append({
+                    'name': 'thread_name',
+                    'ph': 'M',
+                    'pid': pid,
+                    'tid': tid,
+                    'args': {'name': name},
+                })
+            events = metadata + list(self.events)
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        except (IOError, OSError) as error:
+            LOG.warning('unable to write trace file %s: %s', self.path, error)
+            return
+        LOG.info('wrote %d trace events to %s', len(self.events), self.path)
+
+
+class Traced(object):
+    """
+    Proxy that records a span for every call to a public method of
+    ``obj``, named ``prefix.method``.
+    """
+
+    def __init__(self, obj, category, host=None, prefix=None):
+        self._obj = obj
+        self._category = category
+        self._host = host
+        self._prefix = prefix or obj.__class__.__name__
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def traced(*a, **kw):
+            with tracer.span(
+                '%s.%s' % (self._prefix, name),
+                self._category,
+                host=self._host,
+            ):
+                return attr(*a, **kw)
+        return traced
+
+
+tracer = Tracer()
+
+
+def span(name, category='ceph-deploy', host=None, **args):
+    """
+    Context manager that records a span on the process-wide tracer.
+    """
+    return tracer.span(name, category, host=host, **args)
+
+
+def wrap(obj, category, host=None, prefix=None):
+    """
+    Return ``obj`` wrapped in :class:`Traced` when tracing is enabled, or
+    ``obj`` itself when it is not.
+    """
+    if not tracer.enabled:
+        return obj
+    return Traced(obj, category, host=host, prefix=prefix)
+
+
+def _command_line(cmd):
+    if isinstance(cmd, (list, tuple)):
+        return ' '.join(str(part) for part in cmd)
+    return str(cmd)
+
+
+def _traced_process(func, name):
+    @functools.wraps(func)
+    def traced(conn, cmd, *a, **kw):
+        with tracer.span(
+            name,
+            'process',
+            host=getattr(conn, 'hostname', None),
+            command=_command_line(cmd),
+        ):
+            return func(conn, cmd, *a, **kw)
+    traced.traced = True
+    return traced
+
+
+def instrument():
+    """
+    Wrap ``remoto.process.run`` and ``remoto.process.check`` so that every
+    remote command gets a span. Everything in ceph-deploy looks these up on
+    the module at call time, so this covers all of them.
+    """
+    from ceph_deploy.lib import remoto
+    for name in ('run', 'check'):
+        func = getattr(remoto.process, name)
+        if getattr(func, 'traced', False) is not True:
+            setattr(remoto.process, name, _traced_process(func, 'remoto.process.%s' % name))
+
+
+def configure(path, command=None):
+    """
+    Enable tracing for the rest of the process, to be written to ``path``.
+    """
+    global tracer
+    tracer = Tracer(path, command=command)
+    if tracer.enabled:
+        instrument()
+    return tracer
+
+
+def write():
+    tracer.write()
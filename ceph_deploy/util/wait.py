@@ -0,0 +1,59 @@
+"""
+Wait for a remote condition (a daemon reaching a state, a socket appearing)
+by polling it with exponential backoff and jitter, instead of sleeping for
+a fixed amount of time that is too long on fast hosts and too short on slow
+ones.
+"""
+import logging
+import random
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+
+def backoff(initial=0.2, maximum=5, factor=2, jitter=0.25):
+    """
+    Yield an endless series of delays, starting at ``initial`` seconds and
+    multiplied by ``factor`` each time up to ``maximum``. Each delay is
+    randomly stretched or shrunk by up to ``jitter`` (a fraction of it) so
+    that many hosts polled at once do not all hit the cluster in lockstep.
+    """
+    delay = initial
+    while True:
+        spread = delay * jitter
+        yield max(0, delay + random.uniform(-spread, spread))
+        delay = min(delay * factor, maximum)
+
+
+def until(check, timeout=30, initial=0.2, maximum=5, logger=None, description=None):
+    """
+    Call ``check()`` until it returns something truthy, and return that. If
+    ``timeout`` seconds pass first, return the last (falsy) result.
+
+    ``RuntimeError`` raised by ``check`` counts as "not yet", since remote
+    commands commonly fail while the daemon they talk to is coming up. It is
+    re-raised when the deadline passes.
+    """
+    logger = logger or LOG
+    description = description or 'condition'
+    deadline = time.time() + timeout
+    delays = backoff(initial=initial, maximum=maximum)
+    while True:
+        error = None
+        try:
+            result = check()
+        except RuntimeError as exc:
+            result = None
+            error = exc
+        if result:
+            return result
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            logger.warning('timed out after %ss waiting for %s', timeout, description)
+            if error is not None:
+                raise error
+            return result
+        delay = min(next(delays), remaining)
+        logger.debug('waiting %.1fs for %s', delay, description)
+        time.sleep(delay)
@@ -68,6 +68,10 @@ setup(
             'pkg = ceph_deploy.pkg:make',
             'rgw = ceph_deploy.rgw:make',
             'repo = ceph_deploy.repo:make',
+            'cache = ceph_deploy.cache:make',
+            'upgrade = ceph_deploy.upgrade:make',
+            'plan = ceph_deploy.spec:make_plan',
+            'apply = ceph_deploy.spec:make_apply',
             ],
 
         },